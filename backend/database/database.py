@@ -1,28 +1,174 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
 from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from .models import Base
+from .migrations import run_migrations, schema_is_current
+from pathlib import Path
+from typing import Optional
 import os
 
 # 数据库配置
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./metalearn.db")
 ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", "sqlite+aiosqlite:///./metalearn.db")
+# 只读副本地址；未设置时SQLite使用同一文件的只读连接池，其他数据库复用主库
+ASYNC_READ_DATABASE_URL = os.getenv("ASYNC_READ_DATABASE_URL")
 
-# 同步数据库引擎
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# 连接池配置
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", "10"))
 
-# 异步数据库引擎
-async_engine = create_async_engine(ASYNC_DATABASE_URL)
+# SQLite 调优参数，每个新连接建立时应用
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",  # 读写互不阻塞
+    "synchronous": "NORMAL",  # WAL模式下安全，且避免每次提交都fsync
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),  # 锁冲突时等待而不是立即报错
+    "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", "-65536")),  # 负数单位为KiB，即64MB页缓存
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    "temp_store": "MEMORY",
+}
+
+# 只读连接不能切换journal_mode，改为显式禁止写入
+SQLITE_READ_PRAGMAS = {
+    name: value for name, value in SQLITE_PRAGMAS.items() if name != "journal_mode"
+}
+SQLITE_READ_PRAGMAS["query_only"] = 1
+
+
+def _is_sqlite(url: str) -> bool:
+    return make_url(url).get_backend_name() == "sqlite"
+
+
+def _is_sqlite_memory(url: str) -> bool:
+    database = make_url(url).database
+    return not database or database == ":memory:" or "mode=memory" in url
+
+
+def _set_pragmas(dbapi_connection, pragmas: dict):
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """连接建立时设置PRAGMA"""
+    _set_pragmas(dbapi_connection, SQLITE_PRAGMAS)
+
+
+def _apply_sqlite_read_pragmas(dbapi_connection, connection_record):
+    """只读连接建立时设置PRAGMA"""
+    _set_pragmas(dbapi_connection, SQLITE_READ_PRAGMAS)
+
+
+def _sqlite_read_only_url(url: str) -> str:
+    """把SQLite文件地址转换为只读URI连接"""
+    parsed = make_url(url)
+    file_uri = Path(parsed.database).resolve().as_uri()
+    return f"{parsed.drivername}:///{file_uri}?mode=ro&uri=true"
+
+
+def _engine_options(url: str, is_async: bool) -> dict:
+    """按数据库类型生成引擎参数"""
+    if not _is_sqlite(url):
+        return {
+            "pool_size": DB_POOL_SIZE,
+            "max_overflow": DB_MAX_OVERFLOW,
+            "pool_timeout": DB_POOL_TIMEOUT,
+            "pool_pre_ping": True,
+        }
+
+    options = {"connect_args": {"check_same_thread": False}}
+    if _is_sqlite_memory(url):
+        # 内存数据库沿用SQLAlchemy默认的单连接池
+        return options
+
+    # aiosqlite 文件库默认使用NullPool，每个会话都新建连接和后台线程；
+    # 改为固定大小的连接池复用连接，PRAGMA只需在建连时设置一次
+    options["connect_args"]["timeout"] = SQLITE_PRAGMAS["busy_timeout"] / 1000
+    options.update(
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+    )
+    if is_async:
+        options["poolclass"] = AsyncAdaptedQueuePool
+    return options
+
+
+def _create_async_engine(url: str, read_only: bool = False):
+    options = _engine_options(url, is_async=True)
+    if read_only and "pool_size" in options:
+        options["pool_size"] = DB_READ_POOL_SIZE
+    engine = create_async_engine(url, **options)
+    if _is_sqlite(url):
+        listener = _apply_sqlite_read_pragmas if read_only else _apply_sqlite_pragmas
+        event.listen(engine.sync_engine, "connect", listener)
+    return engine
+
+
+def _create_read_engine():
+    if ASYNC_READ_DATABASE_URL:
+        return _create_async_engine(ASYNC_READ_DATABASE_URL, read_only=True)
+    if _is_sqlite(ASYNC_DATABASE_URL) and not _is_sqlite_memory(ASYNC_DATABASE_URL):
+        # WAL模式下读连接不阻塞写入，单独的连接池避免读请求占满写连接
+        return _create_async_engine(_sqlite_read_only_url(ASYNC_DATABASE_URL), read_only=True)
+    return async_engine
+
+
+# 异步数据库引擎（主库，负责所有写入）
+async_engine = _create_async_engine(ASYNC_DATABASE_URL)
 AsyncSessionLocal = async_sessionmaker(
     async_engine, class_=AsyncSession, expire_on_commit=False
 )
 
+# 只读引擎（只读连接池或副本）
+read_engine = _create_read_engine()
+ReadSessionLocal = async_sessionmaker(
+    read_engine, class_=AsyncSession, expire_on_commit=False
+)
+
+# 同步数据库引擎：只有脚本和工具使用，首次调用时才创建，避免启动时建立两套连接
+_sync_engine: Optional[Engine] = None
+_SessionLocal: Optional[sessionmaker] = None
+
 
-async def init_db():
-    """初始化数据库，创建所有表"""
+def get_sync_engine() -> Engine:
+    """获取（按需创建）同步数据库引擎"""
+    global _sync_engine, _SessionLocal
+    if _sync_engine is None:
+        _sync_engine = create_engine(DATABASE_URL, **_engine_options(DATABASE_URL, is_async=False))
+        if _is_sqlite(DATABASE_URL):
+            event.listen(_sync_engine, "connect", _apply_sqlite_pragmas)
+        _SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=_sync_engine)
+    return _sync_engine
+
+
+async def init_db(skip_if_current: bool = False) -> bool:
+    """
+    初始化数据库，创建所有表并执行未应用的迁移，返回是否执行了建表和迁移
+    skip_if_current 为 True 时先检查表和迁移版本，已是最新则跳过 create_all（快速启动模式）
+    """
     async with async_engine.begin() as conn:
+        if skip_if_current and await conn.run_sync(schema_is_current, Base.metadata.tables.keys()):
+            return False
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(run_migrations)
+    return True
+
+
+async def close_db():
+    """关闭连接池（池中的aiosqlite连接各自持有后台线程，退出前必须释放）"""
+    await async_engine.dispose()
+    if read_engine is not async_engine:
+        await read_engine.dispose()
+    if _sync_engine is not None:
+        _sync_engine.dispose()
 
 
 async def get_async_db() -> AsyncSession:
@@ -36,7 +182,8 @@ async def get_async_db() -> AsyncSession:
 
 def get_db() -> Session:
     """获取同步数据库会话"""
-    db = SessionLocal()
+    get_sync_engine()
+    db = _SessionLocal()
     try:
         yield db
     finally:
@@ -0,0 +1,74 @@
+"""
+按数据库类型生成查询条件
+SQLite 与 PostgreSQL 的JSON、全文检索和 ON CONFLICT 语法不同，这里统一封装，调用方只关心语义。
+
+PostgreSQL 上由 pg_trgm 三元组GIN索引加速 ILIKE 子串匹配，
+由 to_tsvector 表达式索引加速全文检索（见 migrations.py）。
+"""
+
+from typing import List
+
+from sqlalchemy import Text, and_, cast, func, insert, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .models import KnowledgeCardDB
+
+POSTGRESQL = "postgresql"
+SQLITE = "sqlite"
+
+# 全文检索配置，'simple' 不做词干化，中英文混排时行为可预期
+TS_CONFIG = "simple"
+
+
+def dialect_name(db: AsyncSession) -> str:
+    """会话所绑定数据库的类型名"""
+    return db.get_bind().dialect.name
+
+
+def json_text(column, dialect: str):
+    """JSON列的文本形式，用于子串匹配"""
+    if dialect == POSTGRESQL:
+        return cast(column, Text)
+    return func.json_extract(column, '$')
+
+
+def insert_ignoring_conflicts(model, index_elements: List[str], dialect: str):
+    """插入语句，唯一键冲突的行跳过而不报错（INSERT ... ON CONFLICT DO NOTHING）"""
+    # 方言模块按需导入，不拖慢应用启动
+    if dialect == POSTGRESQL:
+        from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+        return postgresql_insert(model).on_conflict_do_nothing(index_elements=index_elements)
+    if dialect == SQLITE:
+        from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+        return sqlite_insert(model).on_conflict_do_nothing(index_elements=index_elements)
+    return insert(model)
+
+
+def card_document():
+    """卡片的全文检索文档（标题+内容），与迁移中的表达式索引保持一致"""
+    return func.to_tsvector(
+        TS_CONFIG,
+        func.coalesce(KnowledgeCardDB.title, '') + ' ' + func.coalesce(KnowledgeCardDB.content, '')
+    )
+
+
+def card_contains_conditions(query: str, dialect: str) -> List:
+    """标题、内容和关键词上的子串匹配条件（任一匹配即可）"""
+    return [
+        KnowledgeCardDB.title.ilike(f"%{query}%"),
+        KnowledgeCardDB.content.ilike(f"%{query}%"),
+        json_text(KnowledgeCardDB.keywords, dialect).ilike(f"%{query}%")
+    ]
+
+
+def card_fulltext_condition(query: str, dialect: str):
+    """
+    全文检索条件：查询中的每个词都要出现
+
+    PostgreSQL 使用 tsvector/tsquery；SQLite 退化为每个词的子串匹配取交集。
+    """
+    if dialect == POSTGRESQL:
+        return card_document().op('@@')(func.plainto_tsquery(TS_CONFIG, query))
+
+    terms = query.split() or [query]
+    return and_(*[or_(*card_contains_conditions(term, dialect)) for term in terms])
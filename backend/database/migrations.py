@@ -0,0 +1,142 @@
+"""
+数据库版本化迁移
+create_all 只会创建缺失的表，已有数据库的索引和新增列由这里的迁移按版本补齐。
+
+迁移只使用 CREATE INDEX IF NOT EXISTS / ALTER TABLE ADD COLUMN 这类原地变更，
+不会重建表；已应用的版本记录在 schema_migrations 表中。
+新增列写在 columns 中，只在列不存在时添加（新建的数据库由 create_all 直接建出这些列）。
+"""
+
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    statements: List[str]
+    dialect: Optional[str] = None  # 仅在该数据库类型上执行，None表示通用
+    columns: Tuple[Tuple[str, str, str], ...] = ()  # (表, 列, 列定义)，在 statements 之前添加
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "hot_query_indexes", [
+        "CREATE INDEX IF NOT EXISTS ix_cognitive_nodes_cognitive_map_id ON cognitive_nodes (cognitive_map_id)",
+        "CREATE INDEX IF NOT EXISTS ix_cognitive_edges_cognitive_map_id ON cognitive_edges (cognitive_map_id)",
+        "CREATE INDEX IF NOT EXISTS ix_cognitive_maps_session_id ON cognitive_maps (session_id)",
+        'CREATE INDEX IF NOT EXISTS ix_sub_tasks_session_id_order ON sub_tasks (session_id, "order")',
+        "CREATE INDEX IF NOT EXISTS ix_learning_sessions_current_step ON learning_sessions (current_step)",
+        "CREATE INDEX IF NOT EXISTS ix_learning_sessions_updated_at_id ON learning_sessions (updated_at, id)",
+        "CREATE INDEX IF NOT EXISTS ix_knowledge_cards_updated_at_id ON knowledge_cards (updated_at, id)",
+    ]),
+    Migration(2, "postgresql_jsonb_and_search_indexes", [
+        # 早期用JSON类型建的表原地转换为JSONB，已是JSONB时跳过
+        *[
+            f"""DO $$ BEGIN
+                IF EXISTS (SELECT 1 FROM information_schema.columns
+                           WHERE table_name = '{table}' AND column_name = '{column}' AND data_type = 'json') THEN
+                    ALTER TABLE {table} ALTER COLUMN {column} TYPE jsonb USING {column}::jsonb;
+                END IF;
+            END $$"""
+            for table, column in (
+                ("learning_sessions", "session_data"),
+                ("knowledge_cards", "keywords"),
+                ("learning_resources", "keywords"),
+            )
+        ],
+        # 关键词包含查询（keywords ? 'x' / @>）
+        "CREATE INDEX IF NOT EXISTS ix_knowledge_cards_keywords_gin ON knowledge_cards USING gin (keywords)",
+        # ILIKE '%q%' 子串匹配用三元组索引；pg_trgm 属于contrib，未安装时跳过，查询退化为顺序扫描
+        """DO $$ BEGIN
+            IF EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm') THEN
+                CREATE EXTENSION IF NOT EXISTS pg_trgm;
+                CREATE INDEX IF NOT EXISTS ix_knowledge_cards_title_trgm
+                    ON knowledge_cards USING gin (title gin_trgm_ops);
+                CREATE INDEX IF NOT EXISTS ix_knowledge_cards_content_trgm
+                    ON knowledge_cards USING gin (content gin_trgm_ops);
+                CREATE INDEX IF NOT EXISTS ix_knowledge_cards_keywords_trgm
+                    ON knowledge_cards USING gin ((keywords::text) gin_trgm_ops);
+            END IF;
+        END $$""",
+        # 全文检索，表达式需与 dialects.card_document 一致
+        "CREATE INDEX IF NOT EXISTS ix_knowledge_cards_fts ON knowledge_cards USING gin "
+        "(to_tsvector('simple', coalesce(title, '') || ' ' || coalesce(content, '')))",
+    ], dialect="postgresql"),
+    Migration(3, "learning_resource_url_index", [
+        "CREATE INDEX IF NOT EXISTS ix_learning_resources_url ON learning_resources (url)",
+    ]),
+    Migration(4, "map_and_card_versions", [], columns=(
+        ("cognitive_maps", "version", "INTEGER NOT NULL DEFAULT 1"),
+        ("knowledge_cards", "version", "INTEGER NOT NULL DEFAULT 1"),
+    )),
+    # 已有数据归入默认租户；列表索引改为以 tenant_id 开头，原来的索引不再被使用
+    Migration(5, "tenant_scoping", [
+        "CREATE INDEX IF NOT EXISTS ix_learning_sessions_tenant_updated_at_id "
+        "ON learning_sessions (tenant_id, updated_at, id)",
+        "CREATE INDEX IF NOT EXISTS ix_knowledge_cards_tenant_updated_at_id "
+        "ON knowledge_cards (tenant_id, updated_at, id)",
+        "DROP INDEX IF EXISTS ix_learning_sessions_updated_at_id",
+        "DROP INDEX IF EXISTS ix_knowledge_cards_updated_at_id",
+    ], columns=(
+        ("learning_sessions", "tenant_id", "VARCHAR NOT NULL DEFAULT 'default'"),
+        ("cognitive_maps", "tenant_id", "VARCHAR NOT NULL DEFAULT 'default'"),
+        ("knowledge_cards", "tenant_id", "VARCHAR NOT NULL DEFAULT 'default'"),
+    )),
+]
+
+SCHEMA_VERSION = max(migration.version for migration in MIGRATIONS)
+
+
+def _ensure_version_table(connection: Connection):
+    connection.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version INTEGER PRIMARY KEY, "
+        "name VARCHAR NOT NULL, "
+        "applied_at TIMESTAMP NOT NULL)"
+    ))
+
+
+def get_applied_versions(connection: Connection) -> List[int]:
+    _ensure_version_table(connection)
+    result = connection.execute(text("SELECT version FROM schema_migrations ORDER BY version"))
+    return [row[0] for row in result]
+
+
+def schema_is_current(connection: Connection, table_names: Iterable[str]) -> bool:
+    """所有表都已存在且所有迁移都已应用时返回 True（只读检查，不会建表）"""
+    existing = set(inspect(connection).get_table_names())
+    if "schema_migrations" not in existing or not set(table_names) <= existing:
+        return False
+    result = connection.execute(text("SELECT version FROM schema_migrations"))
+    return {migration.version for migration in MIGRATIONS} <= {row[0] for row in result}
+
+
+def run_migrations(connection: Connection) -> List[int]:
+    """按版本顺序执行未应用的迁移，返回本次应用的版本号"""
+    applied = set(get_applied_versions(connection))
+    dialect = connection.dialect.name
+    newly_applied = []
+
+    for migration in sorted(MIGRATIONS, key=lambda m: m.version):
+        if migration.version in applied:
+            continue
+
+        if migration.dialect is None or migration.dialect == dialect:
+            for table, column, definition in migration.columns:
+                if column not in {info["name"] for info in inspect(connection).get_columns(table)}:
+                    connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {definition}"))
+            for statement in migration.statements:
+                connection.execute(text(statement))
+
+        connection.execute(
+            text("INSERT INTO schema_migrations (version, name, applied_at) VALUES (:version, :name, :applied_at)"),
+            {"version": migration.version, "name": migration.name, "applied_at": datetime.utcnow()}
+        )
+        newly_applied.append(migration.version)
+
+    return newly_applied
@@ -1,12 +1,30 @@
-from sqlalchemy import Column, String, Text, DateTime, Float, Integer, JSON, ForeignKey
+from sqlalchemy import Column, String, Text, DateTime, Float, Integer, JSON, LargeBinary, ForeignKey, Index
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.types import TypeDecorator
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import uuid
 
+from .tenancy import DEFAULT_TENANT_ID
+
 Base = declarative_base()
 
 
+class JSONType(TypeDecorator):
+    """
+    PostgreSQL 上使用JSONB（可建GIN索引），其他数据库使用通用JSON
+    PostgreSQL 方言在用到时才导入（约50ms），SQLite 部署冷启动时不加载
+    """
+    impl = JSON
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == "postgresql":
+            from sqlalchemy.dialects.postgresql import JSONB
+            return dialect.type_descriptor(JSONB())
+        return dialect.type_descriptor(JSON())
+
+
 def generate_uuid():
     return str(uuid.uuid4())
 
@@ -15,29 +33,44 @@ class LearningSessionDB(Base):
     __tablename__ = "learning_sessions"
     
     id = Column(String, primary_key=True, default=generate_uuid)
+    tenant_id = Column(String, nullable=False, default=DEFAULT_TENANT_ID, server_default=DEFAULT_TENANT_ID)
     problem_statement = Column(Text, nullable=False)
-    current_step = Column(String, default="problem_input")
-    cognitive_map_id = Column(String, ForeignKey("cognitive_maps.id"), nullable=True)
+    current_step = Column(String, default="problem_input", index=True)
+    # 与 cognitive_maps.session_id 构成循环外键，命名并延后创建，PostgreSQL 上才能正常建表/删表
+    cognitive_map_id = Column(
+        String,
+        ForeignKey("cognitive_maps.id", use_alter=True, name="fk_learning_sessions_cognitive_map_id"),
+        nullable=True
+    )
     selected_edge_id = Column(String, nullable=True)
-    session_data = Column(JSON, default=dict)
+    session_data = Column(JSONType, default=dict)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # 关系
-    cognitive_map = relationship("CognitiveMapDB", back_populates="session")
+    cognitive_map = relationship("CognitiveMapDB", foreign_keys=[cognitive_map_id])
     sub_tasks = relationship("SubTaskDB", back_populates="session")
+    
+    __table_args__ = (
+        # 按租户的会话列表键集分页
+        Index("ix_learning_sessions_tenant_updated_at_id", "tenant_id", "updated_at", "id"),
+    )
 
 
 class CognitiveMapDB(Base):
     __tablename__ = "cognitive_maps"
     
     id = Column(String, primary_key=True, default=generate_uuid)
-    session_id = Column(String, ForeignKey("learning_sessions.id"), nullable=False)
+    session_id = Column(String, ForeignKey("learning_sessions.id"), nullable=False, index=True)
+    # 与所属会话相同，按ID读取地图时直接校验租户，不用联表
+    tenant_id = Column(String, nullable=False, default=DEFAULT_TENANT_ID, server_default=DEFAULT_TENANT_ID)
+    # 节点或连线每次整体替换时加一，用作 ETag
+    version = Column(Integer, nullable=False, default=1, server_default="1")
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # 关系
-    session = relationship("LearningSessionDB", back_populates="cognitive_map")
+    session = relationship("LearningSessionDB", foreign_keys=[session_id])
     nodes = relationship("CognitiveNodeDB", back_populates="cognitive_map")
     edges = relationship("CognitiveEdgeDB", back_populates="cognitive_map")
 
@@ -46,7 +79,7 @@ class CognitiveNodeDB(Base):
     __tablename__ = "cognitive_nodes"
     
     id = Column(String, primary_key=True, default=generate_uuid)
-    cognitive_map_id = Column(String, ForeignKey("cognitive_maps.id"), nullable=False)
+    cognitive_map_id = Column(String, ForeignKey("cognitive_maps.id"), nullable=False, index=True)
     name = Column(String, nullable=False)
     description = Column(Text, nullable=True)
     x = Column(Float, nullable=False)
@@ -61,7 +94,7 @@ class CognitiveEdgeDB(Base):
     __tablename__ = "cognitive_edges"
     
     id = Column(String, primary_key=True, default=generate_uuid)
-    cognitive_map_id = Column(String, ForeignKey("cognitive_maps.id"), nullable=False)
+    cognitive_map_id = Column(String, ForeignKey("cognitive_maps.id"), nullable=False, index=True)
     source_id = Column(String, ForeignKey("cognitive_nodes.id"), nullable=False)
     target_id = Column(String, ForeignKey("cognitive_nodes.id"), nullable=False)
     relationship_type = Column(String, nullable=False)  # 上级、下级、并列、相关
@@ -85,17 +118,107 @@ class SubTaskDB(Base):
     
     # 关系
     session = relationship("LearningSessionDB", back_populates="sub_tasks")
+    
+    __table_args__ = (
+        # 按会话读取子任务并按顺序排列
+        Index("ix_sub_tasks_session_id_order", "session_id", "order"),
+    )
 
 
 class KnowledgeCardDB(Base):
     __tablename__ = "knowledge_cards"
     
     id = Column(String, primary_key=True, default=generate_uuid)
+    tenant_id = Column(String, nullable=False, default=DEFAULT_TENANT_ID, server_default=DEFAULT_TENANT_ID)
     title = Column(String, nullable=False)
     content = Column(Text, nullable=False)
-    keywords = Column(JSON, default=list)  # 存储关键词列表
+    keywords = Column(JSONType, default=list)  # 存储关键词列表
+    # 每次修改（包括后台回写关键词，它不改 updated_at）加一，用作 ETag
+    version = Column(Integer, nullable=False, default=1, server_default="1")
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        # 按租户的卡片列表键集分页
+        Index("ix_knowledge_cards_tenant_updated_at_id", "tenant_id", "updated_at", "id"),
+    )
+
+
+class CardSignatureDB(Base):
+    """知识卡片的 MinHash 签名，卡片的 updated_at 变化后需要重新计算"""
+    __tablename__ = "card_signatures"
+    
+    card_id = Column(String, primary_key=True)
+    tenant_id = Column(String, nullable=False, default=DEFAULT_TENANT_ID, server_default=DEFAULT_TENANT_ID)
+    card_updated_at = Column(DateTime, nullable=True)  # 计算签名时卡片的 updated_at（关键词回写不改变它）
+    signature = Column(LargeBinary, nullable=False)  # 空表示文本没有可用的词片段，不参与分桶
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        # 增量检测从租户最近一次签名的卡片时间继续
+        Index("ix_card_signatures_tenant_card_updated_at", "tenant_id", "card_updated_at"),
+    )
+
+
+class CardLshBucketDB(Base):
+    """LSH 分桶：签名的每个 band 一行，同桶的卡片互为近似重复候选"""
+    __tablename__ = "card_lsh_buckets"
+    
+    tenant_id = Column(String, primary_key=True)
+    bucket = Column(String, primary_key=True)  # "band序号:band哈希"
+    card_id = Column(String, primary_key=True)
+    
+    __table_args__ = (
+        # 卡片重新签名或删除时按卡片清理分桶
+        Index("ix_card_lsh_buckets_card_id", "card_id"),
+    )
+
+
+class CardDuplicateDB(Base):
+    """近似重复卡片对（card_id < other_card_id），等待用户合并或忽略"""
+    __tablename__ = "card_duplicates"
+    
+    id = Column(String, primary_key=True, default=generate_uuid)
+    tenant_id = Column(String, nullable=False, default=DEFAULT_TENANT_ID, server_default=DEFAULT_TENANT_ID)
+    card_id = Column(String, nullable=False)
+    other_card_id = Column(String, nullable=False)
+    similarity = Column(Float, nullable=False)  # 签名估计的 Jaccard 相似度
+    status = Column(String, nullable=False, default="pending")  # pending / dismissed
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        Index("ux_card_duplicates_pair", "tenant_id", "card_id", "other_card_id", unique=True),
+        Index("ix_card_duplicates_other_card", "tenant_id", "other_card_id"),
+        Index("ix_card_duplicates_tenant_status", "tenant_id", "status"),
+    )
+
+
+class ReviewItemDB(Base):
+    """间隔重复复习项：每张知识卡片或每个子任务一行，保存 SM-2 调度状态和下次复习时间"""
+    __tablename__ = "review_items"
+    
+    id = Column(String, primary_key=True, default=generate_uuid)
+    tenant_id = Column(String, nullable=False, default=DEFAULT_TENANT_ID, server_default=DEFAULT_TENANT_ID)
+    item_type = Column(String, nullable=False)  # card / subtask
+    item_id = Column(String, nullable=False)
+    session_id = Column(String, nullable=True)  # 子任务所属会话，子任务重新生成时据此清理
+    repetitions = Column(Integer, nullable=False, default=0)  # 连续答对次数
+    lapses = Column(Integer, nullable=False, default=0)  # 遗忘次数
+    ease = Column(Float, nullable=False, default=2.5)
+    interval_days = Column(Float, nullable=False, default=0)
+    last_quality = Column(Integer, nullable=True)  # 最近一次的回忆质量（0-5）
+    last_reviewed_at = Column(DateTime, nullable=True)
+    due_at = Column(DateTime, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        # 到期队列：按租户沿到期时间顺序取，O(log n) 定位
+        Index("ix_review_items_tenant_due_at_id", "tenant_id", "due_at", "id"),
+        Index("ux_review_items_tenant_item", "tenant_id", "item_type", "item_id", unique=True),
+        Index("ix_review_items_session_id", "session_id"),
+    )
 
 
 class LearningResourceDB(Base):
@@ -103,8 +226,22 @@ class LearningResourceDB(Base):
     
     id = Column(String, primary_key=True, default=generate_uuid)
     title = Column(String, nullable=False)
-    url = Column(String, nullable=True)
+    url = Column(String, nullable=True, index=True)  # 导入资源库时按url去重
     content = Column(Text, nullable=True)
     resource_type = Column(String, nullable=False)  # article, video, book, etc.
-    keywords = Column(JSON, default=list)
+    keywords = Column(JSONType, default=list)
     created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class SharedEventDB(Base):
+    """多进程部署时进程间广播的事件（缓存失效、索引变更、会话通知），短期保留后清理"""
+    __tablename__ = "shared_events"
+
+    # SQLite 上使用 AUTOINCREMENT，清理后编号也不会回退，各进程按编号增量读取
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    channel = Column(String, nullable=False)
+    payload = Column(JSONType, nullable=False)
+    origin = Column(String, nullable=False)  # 发布事件的进程，自己发布的事件不重复处理
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+    __table_args__ = {"sqlite_autoincrement": True}
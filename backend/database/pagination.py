@@ -0,0 +1,71 @@
+"""
+键集分页（keyset pagination）工具
+按 (排序列, id) 降序（或升序）翻页，游标对客户端是不透明的字符串
+
+与 offset 分页不同，翻到第N页时数据库只需从游标位置沿复合索引继续扫描，
+延迟不随页码线性增长。
+"""
+
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Sequence, Tuple
+
+from sqlalchemy import Select, tuple_
+
+
+def encode_cursor(sort_value: datetime, row_id: str) -> str:
+    """把最后一行的 (排序值, id) 编码为游标"""
+    payload = json.dumps([sort_value.isoformat(), row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """解析游标，格式非法时抛出 ValueError"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return datetime.fromisoformat(sort_value), str(row_id)
+    except Exception as exc:
+        raise ValueError("Invalid cursor") from exc
+
+
+def apply_keyset(
+    stmt: Select,
+    sort_column,
+    id_column,
+    cursor: Optional[str],
+    limit: int,
+    descending: bool = True
+) -> Select:
+    """
+    给查询加上键集分页条件，默认降序（最新的在前），descending=False 时升序
+
+    多取一行用于判断是否还有下一页，配合 build_page 使用。
+    """
+    if cursor:
+        sort_value, row_id = decode_cursor(cursor)
+        position = tuple_(sort_column, id_column)
+        after = tuple_(sort_value, row_id)
+        stmt = stmt.where(position < after if descending else position > after)
+
+    if descending:
+        return stmt.order_by(sort_column.desc(), id_column.desc()).limit(limit + 1)
+    return stmt.order_by(sort_column, id_column).limit(limit + 1)
+
+
+def build_page(
+    rows: Sequence[Any],
+    limit: int,
+    sort_attr: str = "updated_at",
+    id_attr: str = "id"
+) -> Tuple[List[Any], Optional[str]]:
+    """截取本页数据并生成下一页游标"""
+    items = list(rows[:limit])
+    next_cursor = None
+
+    if len(rows) > limit and items:
+        last = items[-1]
+        next_cursor = encode_cursor(getattr(last, sort_attr), getattr(last, id_attr))
+
+    return items, next_cursor
@@ -0,0 +1,170 @@
+"""
+查询计数与 N+1 检测
+统计一段代码（包括 AsyncSession 的 execute / flush / refresh）实际发出的SQL语句数，用于：
+
+- 测试中断言某个操作的查询次数：with QueryCounter() as counter: ...
+- 比较不同规模的请求体下的查询次数，发现随数据量线性增长的 N+1 查询
+- 给路由声明查询预算 @query_budget(n)，QUERY_BUDGET_MODE=warn 时超出打印警告，
+  strict 时直接报错（测试中使用，让超预算的接口无法通过测试）
+
+计数基于引擎的 before_cursor_execute 事件，异步引擎的事件由其 sync_engine 触发；
+计数器保存在 contextvar 中，并发执行的其他请求不会计入。
+"""
+
+import contextlib
+import contextvars
+import functools
+import os
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# off：不检查；warn：超出预算时打印警告；strict：超出预算时抛出 QueryBudgetExceeded
+QUERY_BUDGET_MODE = os.getenv("QUERY_BUDGET_MODE", "off")
+
+_active_counters: contextvars.ContextVar[Tuple["QueryCounter", ...]] = contextvars.ContextVar(
+    "active_query_counters", default=()
+)
+_hooks_installed = False
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    for counter in _active_counters.get():
+        counter.statements.append(statement)
+
+
+def _install_hooks():
+    global _hooks_installed
+    if not _hooks_installed:
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        _hooks_installed = True
+
+
+class QueryCounter:
+    """记录上下文内执行的SQL语句，可以嵌套使用"""
+
+    def __init__(self):
+        self.statements: List[str] = []
+        self._token: Optional[contextvars.Token] = None
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def __enter__(self) -> "QueryCounter":
+        _install_hooks()
+        self._token = _active_counters.set(_active_counters.get() + (self,))
+        return self
+
+    def __exit__(self, *exc_info):
+        _active_counters.reset(self._token)
+        self._token = None
+
+    def report(self, limit: int = 20) -> str:
+        lines = [f"{self.count} queries:"]
+        lines.extend(f"  {i + 1}. {' '.join(sql.split())[:160]}" for i, sql in enumerate(self.statements[:limit]))
+        if self.count > limit:
+            lines.append(f"  ... {self.count - limit} more")
+        return "\n".join(lines)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+@dataclass
+class BudgetViolation:
+    endpoint: str
+    budget: int
+    count: int
+    statements: List[str]
+
+
+@dataclass
+class QueryBudgetChecker:
+    """按路由检查查询预算，记录超出预算的调用"""
+    mode: str = QUERY_BUDGET_MODE
+    violations: List[BudgetViolation] = field(default_factory=list)
+
+    def check(self, endpoint: str, budget: int, counter: QueryCounter):
+        if counter.count <= budget:
+            return
+        violation = BudgetViolation(endpoint, budget, counter.count, list(counter.statements))
+        self.violations.append(violation)
+        message = f"{endpoint} issued {counter.count} queries (budget {budget})\n{counter.report()}"
+        if self.mode == "strict":
+            raise QueryBudgetExceeded(message)
+        print(f"⚠️  Query budget exceeded: {message}")
+
+
+query_budget_checker = QueryBudgetChecker()
+
+
+@contextlib.contextmanager
+def strict_query_budgets(checker: QueryBudgetChecker = query_budget_checker):
+    """在上下文内以 strict 模式检查查询预算（测试使用），退出时恢复原模式"""
+    previous_mode, previous_violations = checker.mode, checker.violations
+    checker.mode, checker.violations = "strict", []
+    try:
+        yield checker
+    finally:
+        checker.mode, checker.violations = previous_mode, previous_violations
+
+
+def query_budget(max_queries: int) -> Callable:
+    """
+    声明路由处理函数的查询预算（放在 @router.xxx 装饰器下面）
+    检查关闭时只多一次属性判断
+    """
+    def decorator(func: Callable) -> Callable:
+        endpoint = f"{func.__module__.rsplit('.', 1)[-1]}.{func.__name__}"
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            if query_budget_checker.mode == "off":
+                return await func(*args, **kwargs)
+            with QueryCounter() as counter:
+                result = await func(*args, **kwargs)
+            query_budget_checker.check(endpoint, max_queries, counter)
+            return result
+
+        wrapper.__query_budget__ = max_queries
+        return wrapper
+    return decorator
+
+
+@dataclass
+class ScalingReport:
+    """不同规模下的查询次数"""
+    sizes: Sequence[int]
+    counts: Sequence[int]
+
+    @property
+    def extra_queries_per_item(self) -> float:
+        """最大规模相对最小规模，每多一个元素多出的查询数"""
+        span = self.sizes[-1] - self.sizes[0]
+        return (self.counts[-1] - self.counts[0]) / span if span else 0.0
+
+    @property
+    def grows_with_size(self) -> bool:
+        return self.counts[-1] > self.counts[0]
+
+    def __str__(self) -> str:
+        pairs = ", ".join(f"n={size}: {count}" for size, count in zip(self.sizes, self.counts))
+        return f"{pairs} ({self.extra_queries_per_item:+.2f} queries per item)"
+
+
+async def measure_query_scaling(
+    run: Callable[[int], Awaitable[Any]],
+    sizes: Sequence[int] = (1, 5, 25)
+) -> ScalingReport:
+    """用不同规模的请求体各执行一次 run(n)，返回每次的查询次数"""
+    sizes = sorted(sizes)
+    counts = []
+    for size in sizes:
+        with QueryCounter() as counter:
+            await run(size)
+        counts.append(counter.count)
+    return ScalingReport(sizes, counts)
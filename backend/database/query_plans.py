@@ -0,0 +1,138 @@
+"""
+热点查询的执行计划检查
+对路由中最常用的查询执行 EXPLAIN QUERY PLAN，发现全表扫描或临时排序时报告出来，
+防止索引被误删或查询改写后悄悄退化为全表扫描。（仅支持SQLite）
+"""
+
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, List
+
+from sqlalchemy import func, or_, select
+from sqlalchemy.engine import Connection
+from sqlalchemy.sql import Select
+
+from .models import (
+    LearningSessionDB, CognitiveMapDB, CognitiveNodeDB, CognitiveEdgeDB,
+    SubTaskDB, KnowledgeCardDB, ReviewItemDB, LearningResourceDB,
+    CardSignatureDB, CardLshBucketDB, CardDuplicateDB
+)
+from .pagination import apply_keyset, encode_cursor
+
+_SAMPLE_CURSOR = encode_cursor(datetime(2024, 1, 1), "00000000-0000-0000-0000-000000000000")
+
+
+@dataclass(frozen=True)
+class HotQuery:
+    name: str
+    build: Callable[[], Select]
+
+
+# 路由中的查询都带有租户条件
+_TENANT = "t"
+
+
+def _tenant_sessions() -> Select:
+    return select(LearningSessionDB).where(LearningSessionDB.tenant_id == _TENANT)
+
+
+def _tenant_cards() -> Select:
+    return select(KnowledgeCardDB).where(KnowledgeCardDB.tenant_id == _TENANT)
+
+
+HOT_QUERIES: List[HotQuery] = [
+    HotQuery("session_by_id", lambda: _tenant_sessions().where(LearningSessionDB.id == "x")),
+    HotQuery("sessions_in_step", lambda: select(LearningSessionDB.id).where(
+        LearningSessionDB.current_step == "learning_in_progress"
+    )),
+    HotQuery("sessions_keyset_page", lambda: apply_keyset(
+        _tenant_sessions(), LearningSessionDB.updated_at, LearningSessionDB.id, _SAMPLE_CURSOR, 20
+    )),
+    HotQuery("map_by_id", lambda: select(CognitiveMapDB).where(
+        CognitiveMapDB.id == "x", CognitiveMapDB.tenant_id == _TENANT
+    )),
+    HotQuery("map_version_by_id", lambda: select(CognitiveMapDB.version).where(
+        CognitiveMapDB.id == "x", CognitiveMapDB.tenant_id == _TENANT
+    )),
+    HotQuery("nodes_by_map", lambda: select(CognitiveNodeDB).where(CognitiveNodeDB.cognitive_map_id == "x")),
+    HotQuery("edges_by_map", lambda: select(CognitiveEdgeDB).where(CognitiveEdgeDB.cognitive_map_id == "x")),
+    HotQuery("sub_tasks_by_session", lambda: select(SubTaskDB).where(
+        SubTaskDB.session_id == "x"
+    ).order_by(SubTaskDB.order)),
+    HotQuery("cards_latest", lambda: _tenant_cards().order_by(
+        KnowledgeCardDB.updated_at.desc()
+    ).offset(0).limit(10)),
+    HotQuery("cards_keyset_page", lambda: apply_keyset(
+        _tenant_cards(), KnowledgeCardDB.updated_at, KnowledgeCardDB.id, _SAMPLE_CURSOR, 10
+    )),
+    HotQuery("cards_keyset_versions", lambda: apply_keyset(
+        _tenant_cards(), KnowledgeCardDB.updated_at, KnowledgeCardDB.id, _SAMPLE_CURSOR, 10
+    ).with_only_columns(KnowledgeCardDB.id, KnowledgeCardDB.version)),
+    HotQuery("card_by_id", lambda: _tenant_cards().where(KnowledgeCardDB.id == "x")),
+    # 租户的搜索索引分片首次加载
+    HotQuery("card_shard_load", lambda: _tenant_cards().with_only_columns(
+        KnowledgeCardDB.id, KnowledgeCardDB.title, KnowledgeCardDB.content, KnowledgeCardDB.keywords
+    )),
+    # 到期复习队列：沿 (tenant_id, due_at, id) 升序取一页
+    HotQuery("reviews_due_page", lambda: apply_keyset(
+        select(ReviewItemDB).where(ReviewItemDB.tenant_id == _TENANT, ReviewItemDB.due_at <= datetime(2024, 6, 1)),
+        ReviewItemDB.due_at, ReviewItemDB.id, _SAMPLE_CURSOR, 20, descending=False
+    )),
+    HotQuery("review_by_item", lambda: select(ReviewItemDB).where(
+        ReviewItemDB.tenant_id == _TENANT, ReviewItemDB.item_type == "card", ReviewItemDB.item_id == "x"
+    )),
+    HotQuery("session_subtask_reviews", lambda: select(SubTaskDB.id, ReviewItemDB.id).outerjoin(ReviewItemDB, (
+        (ReviewItemDB.tenant_id == _TENANT)
+        & (ReviewItemDB.item_type == "subtask")
+        & (ReviewItemDB.item_id == SubTaskDB.id)
+    )).where(SubTaskDB.session_id == "x")),
+    # 近似重复检测：增量签名的起点、待签名卡片、同桶候选和待处理卡片对
+    HotQuery("dedup_signature_watermark", lambda: select(func.max(CardSignatureDB.card_updated_at)).where(
+        CardSignatureDB.tenant_id == _TENANT
+    )),
+    HotQuery("dedup_unsigned_cards", lambda: apply_keyset(
+        select(KnowledgeCardDB.id, KnowledgeCardDB.title, KnowledgeCardDB.content, KnowledgeCardDB.updated_at)
+        .outerjoin(CardSignatureDB, CardSignatureDB.card_id == KnowledgeCardDB.id)
+        .where(KnowledgeCardDB.tenant_id == _TENANT, or_(
+            CardSignatureDB.card_id.is_(None),
+            CardSignatureDB.card_updated_at.is_distinct_from(KnowledgeCardDB.updated_at)
+        )),
+        KnowledgeCardDB.updated_at, KnowledgeCardDB.id, _SAMPLE_CURSOR, 500, descending=False
+    )),
+    HotQuery("dedup_bucket_members", lambda: select(CardLshBucketDB.card_id).where(
+        CardLshBucketDB.tenant_id == _TENANT, CardLshBucketDB.bucket == "0:x"
+    )),
+    HotQuery("dedup_pending_pairs", lambda: select(CardDuplicateDB.card_id, CardDuplicateDB.other_card_id).where(
+        CardDuplicateDB.tenant_id == _TENANT, CardDuplicateDB.status == "pending"
+    )),
+    HotQuery("resource_by_url", lambda: select(LearningResourceDB.id).where(LearningResourceDB.url == "x")),
+]
+
+
+def explain(connection: Connection, stmt: Select) -> List[str]:
+    """返回SQLite执行计划中每一步的描述"""
+    compiled = stmt.compile(dialect=connection.dialect)
+    result = connection.exec_driver_sql(
+        f"EXPLAIN QUERY PLAN {compiled.string}",
+        tuple(compiled.params[name] for name in compiled.positiontup)
+    )
+    return [row[-1] for row in result]
+
+
+def is_full_scan(detail: str) -> bool:
+    """'SCAN t' 是全表扫描，'SCAN t USING INDEX ...' 是按索引顺序扫描"""
+    return detail.startswith("SCAN ") and " USING " not in detail
+
+
+def find_plan_regressions(connection: Connection, queries: List[HotQuery] = HOT_QUERIES) -> List[str]:
+    """检查所有热点查询，返回退化的查询及其执行计划"""
+    problems = []
+    for query in queries:
+        plan = explain(connection, query.build())
+        bad_steps = [
+            detail for detail in plan
+            if is_full_scan(detail) or "USE TEMP B-TREE" in detail
+        ]
+        if bad_steps:
+            problems.append(f"{query.name}: {'; '.join(bad_steps)}")
+    return problems
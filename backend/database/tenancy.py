@@ -0,0 +1,34 @@
+"""
+多租户（按用户）隔离
+会话、认知地图和知识卡片都带有 tenant_id，路由通过 get_tenant_id 依赖取得当前租户，
+所有查询都加上租户条件；列表和分页使用以 tenant_id 开头的复合索引。
+
+本服务不做身份认证：租户ID来自 TENANT_HEADER 请求头，应由前置的认证网关在校验用户后写入
+（并丢弃客户端自带的同名请求头）。未带请求头的请求归入 DEFAULT_TENANT_ID，
+单用户部署和升级前的数据都属于该租户；REQUIRE_TENANT=true 时缺少请求头直接拒绝。
+"""
+
+import os
+import re
+
+from fastapi import HTTPException, Request
+
+# 迁移时已有数据的租户，也是 tenant_id 列的默认值
+DEFAULT_TENANT_ID = "default"
+
+TENANT_HEADER = os.getenv("TENANT_HEADER", "X-User-Id")
+REQUIRE_TENANT = os.getenv("REQUIRE_TENANT", "false").lower() == "true"
+
+_TENANT_PATTERN = re.compile(r"^[A-Za-z0-9_.:@-]{1,64}$")
+
+
+def get_tenant_id(request: Request) -> str:
+    """当前请求所属的租户"""
+    tenant_id = request.headers.get(TENANT_HEADER)
+    if not tenant_id:
+        if REQUIRE_TENANT:
+            raise HTTPException(status_code=401, detail=f"Missing {TENANT_HEADER} header")
+        return DEFAULT_TENANT_ID
+    if not _TENANT_PATTERN.match(tenant_id):
+        raise HTTPException(status_code=400, detail="Invalid tenant id")
+    return tenant_id
@@ -1,19 +1,55 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
-import uvicorn
 
-from database.database import init_db
-from routers import learning_flow, cognitive_map, knowledge_cards, api_integration
+from database.database import init_db, close_db
+from models.responses import FastJSONResponse
+from routers import learning_flow, cognitive_map, knowledge_cards, reviews, api_integration, resources, debug
+from routers.dependencies import LAST_WRITE_HEADER
+from services.session_timer import session_timer
+from services.card_io import shutdown_keyword_pool
+from services.card_dedup import card_dedup
+from services.indexing_queue import indexing_queue
+from services.llm_gateway import llm_gateway
+from services.decomposition_cache import decomposition_cache
+from services.http_cache import CompressionMiddleware
+from services.profiling import PROFILING_ENABLED, enable_profiling
+from services.shared_state import shared_state
+from services.warmup import FAST_STARTUP, start_prewarm, stop_prewarm
+from services.worker_sync import install_worker_sync
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # 启动时初始化数据库
-    await init_db()
-    print("Database initialized successfully")
+    # 启动时初始化数据库；快速启动模式下表和迁移已是最新时跳过
+    if await init_db(skip_if_current=FAST_STARTUP):
+        print("Database initialized successfully")
+    else:
+        print("Database schema is up to date, skipped create_all")
+    # 多进程部署时通过共享状态总线同步索引、缓存、通知和计时器
+    if install_worker_sync(shared_state):
+        await shared_state.start()
+        print(f"Shared state enabled ({shared_state.backend}), worker {shared_state.worker_id}")
+    # 恢复未到期的学习倒计时
+    await session_timer.start()
+    print(f"Session timers recovered: {session_timer.pending}")
+    await indexing_queue.start()
+    await card_dedup.start()
+    print(f"Decomposition cache entries restored: {decomposition_cache.load()}")
+    # 快速启动模式下在后台预热，不推迟端口就绪
+    warmup_task = start_prewarm(app) if FAST_STARTUP else None
     yield
     # 关闭时的清理工作
+    await stop_prewarm(warmup_task)
+    await session_timer.stop()
+    await indexing_queue.stop()
+    await card_dedup.stop()
+    await shared_state.stop()
+    shutdown_keyword_pool()
+    decomposition_cache.save()
+    await llm_gateway.aclose()
+    await close_db()
     print("Application shutting down")
 
 
@@ -21,7 +57,9 @@ app = FastAPI(
     title="MetaLearnNavigator API",
     description="元认知学习导航器后端API",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    # 未使用 render() 的路由也用 orjson 序列化
+    default_response_class=FastJSONResponse or JSONResponse
 )
 
 # CORS设置
@@ -31,13 +69,23 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[LAST_WRITE_HEADER, "ETag"],  # 前端据此实现读己之写和条件请求
 )
+# 大于 COMPRESSION_MIN_SIZE 的 JSON 响应按 Accept-Encoding 压缩
+app.add_middleware(CompressionMiddleware)
 
 # 路由注册
 app.include_router(learning_flow.router, prefix="/api/learning-flow", tags=["learning-flow"])
 app.include_router(cognitive_map.router, prefix="/api/cognitive-map", tags=["cognitive-map"])
 app.include_router(knowledge_cards.router, prefix="/api/knowledge-cards", tags=["knowledge-cards"])
+app.include_router(reviews.router, prefix="/api/reviews", tags=["reviews"])
 app.include_router(api_integration.router, prefix="/api/external", tags=["external-api"])
+app.include_router(resources.router, prefix="/api/resources", tags=["resources"])
+
+# 性能剖析（默认关闭）：请求延迟、数据库查询、服务耗时和慢请求剖析
+if PROFILING_ENABLED:
+    enable_profiling(app)
+    app.include_router(debug.router, prefix="/debug", tags=["debug"])
 
 
 @app.get("/")
@@ -51,6 +99,8 @@ async def health_check():
 
 
 if __name__ == "__main__":
+    import uvicorn
+
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
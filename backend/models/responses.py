@@ -0,0 +1,148 @@
+"""
+数据库行到响应体的映射
+路由返回的卡片、地图和会话都来自数据库中已在写入时校验过的行，这里直接按响应模型的字段
+把行转换为字典，由 orjson 序列化（render），跳过 FastAPI 按 response_model 的再次校验；
+response_model 仍然保留，用于生成 OpenAPI 文档，字段一致性由测试保证。
+
+没有用 model_construct：Pydantic 2 的校验在 Rust 中完成，model_construct 逐字段的 Python 开销
+反而比校验更大（见 benchmarks/bench_serialization.py）。需要模型实例时用
+Model.model_validate(row)，响应模型都开启了 from_attributes。
+"""
+
+from typing import Any, Dict, Iterable, Optional
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+
+try:
+    import orjson  # noqa: F401
+    from fastapi.responses import ORJSONResponse as FastJSONResponse
+except ImportError:  # 未安装 orjson 时退回标准库 json
+    FastJSONResponse = None
+
+Payload = Dict[str, Any]
+
+
+def card_payload(card) -> Payload:
+    """KnowledgeCard"""
+    return {
+        "id": card.id,
+        "title": card.title,
+        "content": card.content,
+        "keywords": card.keywords or [],
+        "created_at": card.created_at,
+        "updated_at": card.updated_at,
+    }
+
+
+def card_page_payload(cards: Iterable, next_cursor: Optional[str]) -> Payload:
+    """KnowledgeCardPage"""
+    return {"items": [card_payload(card) for card in cards], "next_cursor": next_cursor}
+
+
+def node_payload(node) -> Payload:
+    """CognitiveNode"""
+    return {
+        "id": node.id,
+        "name": node.name,
+        "description": node.description,
+        "x": node.x,
+        "y": node.y,
+        "created_at": node.created_at,
+    }
+
+
+def edge_payload(edge) -> Payload:
+    """CognitiveEdge，关系类型在库中存的就是枚举值"""
+    return {
+        "id": edge.id,
+        "source_id": edge.source_id,
+        "target_id": edge.target_id,
+        "relationship_type": edge.relationship_type,
+        "custom_name": edge.custom_name,
+        "created_at": edge.created_at,
+    }
+
+
+def map_payload(db_map, nodes: Iterable, edges: Iterable) -> Payload:
+    """CognitiveMap"""
+    return {
+        "id": db_map.id,
+        "session_id": db_map.session_id,
+        "nodes": [node_payload(node) for node in nodes],
+        "edges": [edge_payload(edge) for edge in edges],
+        "created_at": db_map.created_at,
+        "updated_at": db_map.updated_at,
+    }
+
+
+def subtask_payload(task) -> Payload:
+    """SubTask"""
+    return {
+        "id": task.id,
+        "name": task.name,
+        "description": task.description,
+        "order": task.order,
+        "mastery_expectation": task.mastery_expectation or None,
+    }
+
+
+def session_payload(db_session, sub_tasks: Iterable = ()) -> Payload:
+    """LearningSession"""
+    return {
+        "id": db_session.id,
+        "problem_statement": db_session.problem_statement,
+        "current_step": db_session.current_step,
+        "cognitive_map_id": db_session.cognitive_map_id,
+        "selected_edge_id": db_session.selected_edge_id,
+        "sub_tasks": [subtask_payload(task) for task in sub_tasks],
+        "session_data": db_session.session_data or {},
+        "created_at": db_session.created_at,
+        "updated_at": db_session.updated_at,
+    }
+
+
+def session_page_payload(sessions: Iterable, next_cursor: Optional[str]) -> Payload:
+    """LearningSessionPage（列表不含子任务）"""
+    return {"items": [session_payload(db_session) for db_session in sessions], "next_cursor": next_cursor}
+
+
+def review_payload(item) -> Payload:
+    """ReviewItem"""
+    return {
+        "item_type": item.item_type,
+        "item_id": item.item_id,
+        "session_id": item.session_id,
+        "repetitions": item.repetitions,
+        "lapses": item.lapses,
+        "ease": item.ease,
+        "interval_days": item.interval_days,
+        "last_quality": item.last_quality,
+        "last_reviewed_at": item.last_reviewed_at,
+        "due_at": item.due_at,
+    }
+
+
+def review_page_payload(items: Iterable, next_cursor: Optional[str]) -> Payload:
+    """ReviewItemPage"""
+    return {"items": [review_payload(item) for item in items], "next_cursor": next_cursor}
+
+
+def render(
+    content: Any,
+    status_code: int = 200,
+    headers: Optional[Dict[str, str]] = None,
+    base: Optional[Response] = None
+) -> JSONResponse:
+    """
+    序列化映射好的响应体（orjson 原生支持 datetime 和枚举）
+    直接返回 Response 时 FastAPI 不会合并依赖里设置的响应头和 Cookie（例如写入时间），
+    写接口需要把注入的 Response 作为 base 传入
+    """
+    if FastJSONResponse is None:
+        rendered = JSONResponse(jsonable_encoder(content), status_code=status_code, headers=headers)
+    else:
+        rendered = FastJSONResponse(content, status_code=status_code, headers=headers)
+    if base is not None:
+        rendered.headers.raw.extend(base.headers.raw)
+    return rendered
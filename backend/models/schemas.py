@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from typing import List, Optional, Dict, Any
 from enum import Enum
 from datetime import datetime
@@ -45,6 +45,8 @@ class TimeAllocation(str, Enum):
 
 # 认知地图节点
 class CognitiveNode(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
     id: str
     name: str
     description: Optional[str] = None
@@ -62,6 +64,8 @@ class CognitiveNodeCreate(BaseModel):
 
 # 认知地图连线
 class CognitiveEdge(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
     id: str
     source_id: str
     target_id: str
@@ -95,6 +99,8 @@ class CognitiveMapCreate(BaseModel):
 
 # 子任务
 class SubTask(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
     id: str
     name: str
     description: Optional[str] = None
@@ -109,8 +115,28 @@ class SubTaskCreate(BaseModel):
     mastery_expectation: Optional[MasteryLevel] = None
 
 
+class SubTaskEdgeRequest(BaseModel):
+    source_node_name: str
+    target_node_name: str
+    relationship_type: RelationshipType
+
+
+class SubTaskSuggestionRequest(BaseModel):
+    edges: List[SubTaskEdgeRequest]
+
+
+class SubTaskSuggestion(BaseModel):
+    source_node_name: str
+    target_node_name: str
+    relationship_type: RelationshipType
+    sub_tasks: List[SubTaskCreate]
+    source: str  # llm / cache / template
+
+
 # 学习会话
 class LearningSession(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
     id: str
     problem_statement: str
     current_step: str
@@ -126,8 +152,15 @@ class LearningSessionCreate(BaseModel):
     problem_statement: str
 
 
+class LearningSessionPage(BaseModel):
+    items: List[LearningSession]
+    next_cursor: Optional[str] = None  # 为空表示没有下一页
+
+
 # 知识卡片
 class KnowledgeCard(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
     id: str
     title: str
     content: str
@@ -139,7 +172,46 @@ class KnowledgeCard(BaseModel):
 class KnowledgeCardCreate(BaseModel):
     title: str
     content: str
-    keywords: List[str]
+    keywords: List[str] = []  # 为空时由后台自动提取
+
+
+class KnowledgeCardImportItem(BaseModel):
+    title: str
+    content: str
+    keywords: Optional[List[str]] = None  # 缺省时由服务端自动提取
+
+
+class KnowledgeCardPage(BaseModel):
+    items: List[KnowledgeCard]
+    next_cursor: Optional[str] = None  # 为空表示没有下一页
+
+
+# 近似重复卡片
+class DuplicateCard(BaseModel):
+    id: str
+    title: str
+    updated_at: Optional[datetime] = None
+
+
+class DuplicatePair(BaseModel):
+    card_id: str
+    other_card_id: str
+    similarity: float  # 估计的 Jaccard 相似度
+
+
+class DuplicateCluster(BaseModel):
+    cards: List[DuplicateCard]
+    pairs: List[DuplicatePair]
+
+
+class CardMergeRequest(BaseModel):
+    keep_id: str  # 保留的卡片，其余卡片的关键词并入它后删除
+    merge_ids: List[str] = Field(..., min_length=1)
+
+
+class DuplicateDismissRequest(BaseModel):
+    card_id: str
+    other_card_id: str
 
 
 # API请求和响应模型
@@ -155,10 +227,29 @@ class TaskDecompositionResponse(BaseModel):
 class ResourceSearchRequest(BaseModel):
     query: str
     task_context: Optional[str] = None
+    session_id: Optional[str] = None  # 用会话的问题描述对结果重排
+    resource_types: Optional[List[str]] = None
+    limit: int = Field(10, ge=1, le=50)
 
 
 class ResourceSearchResponse(BaseModel):
     resources: List[Dict[str, Any]]
+    facets: Dict[str, int] = {}  # resource_type -> 命中数（类型过滤之前）
+    total: int = 0
+    source: Optional[str] = None  # local / llm
+
+
+class ResourceIngestRequest(BaseModel):
+    path: str = ""  # 资源根目录下的子目录
+    recursive: bool = True
+
+
+class ResourceIngestResult(BaseModel):
+    scanned: int
+    created: int
+    updated: int
+    skipped: int
+    errors: List[Dict[str, str]]
 
 
 class JOLAssessmentRequest(BaseModel):
@@ -186,3 +277,53 @@ class FlowStateUpdate(BaseModel):
     session_id: str
     current_step: str
     step_data: Dict[str, Any] = {}
+
+
+# 间隔重复复习
+class ReviewItemType(str, Enum):
+    CARD = "card"
+    SUBTASK = "subtask"
+
+
+class ReviewOutcomeRequest(BaseModel):
+    item_type: ReviewItemType
+    item_id: str
+    # 至少提供一个，都提供时按较低的一个调度
+    jol: Optional[JOLLevel] = None
+    fok: Optional[FOKLevel] = None
+
+
+class ReviewItem(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    item_type: ReviewItemType
+    item_id: str
+    session_id: Optional[str] = None
+    repetitions: int
+    lapses: int
+    ease: float
+    interval_days: float
+    last_quality: Optional[int] = None
+    last_reviewed_at: Optional[datetime] = None
+    due_at: datetime
+
+
+class ReviewItemPage(BaseModel):
+    items: List[ReviewItem]
+    next_cursor: Optional[str] = None  # 为空表示没有下一页
+
+
+# 批量操作
+class BatchItemResult(BaseModel):
+    index: int  # 在请求数组中的位置
+    success: bool
+    id: Optional[str] = None
+    next_step: Optional[str] = None
+    error: Optional[str] = None
+
+
+class BatchResult(BaseModel):
+    total: int
+    succeeded: int
+    failed: int
+    results: List[BatchItemResult]
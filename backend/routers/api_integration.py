@@ -0,0 +1,145 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+import json
+
+from database.tenancy import get_tenant_id
+from routers.dependencies import get_read_db
+
+from models.schemas import (
+    TaskDecompositionRequest, TaskDecompositionResponse,
+    ResourceSearchRequest, ResourceSearchResponse, CognitiveNodeCreate
+)
+from services.decomposition_cache import decomposition_cache
+from services.shared_state import shared_state
+from services.subtask_generator import subtask_cache
+from services.external_api import (
+    decompose_task, local_decomposition, search_resources, stream_decomposition
+)
+from services.llm_gateway import LLMError, llm_gateway
+from services.resource_index import search_local_resources
+from services.single_flight import llm_flight
+
+router = APIRouter()
+
+
+@router.post("/task-decomposition", response_model=TaskDecompositionResponse)
+async def task_decomposition(request: TaskDecompositionRequest, tenant_id: str = Depends(get_tenant_id)):
+    """任务拆解参考方案，模型不可用时退化为本地关键词拆解"""
+    if not request.problem_statement.strip():
+        raise HTTPException(status_code=400, detail="Problem statement is required")
+
+    try:
+        return await decompose_task(request.problem_statement, tenant_id=tenant_id)
+    except LLMError:
+        return local_decomposition(request.problem_statement)
+
+
+def _format_event(event: dict, stream_format: str) -> str:
+    data = json.dumps(event, ensure_ascii=False)
+    if stream_format == "sse":
+        return f"event: {event['type']}\ndata: {data}\n\n"
+    return data + "\n"
+
+
+@router.post("/task-decomposition/stream")
+async def task_decomposition_stream(
+    request: TaskDecompositionRequest,
+    stream_format: str = Query("ndjson", alias="format", pattern="^(ndjson|sse)$"),
+    tenant_id: str = Depends(get_tenant_id)
+):
+    """
+    流式任务拆解，节点和连线生成一个就推送一个
+    事件依次为 node / edge，最后是 done（或中途失败时的 error）；
+    模型在输出任何内容前失败时改为推送本地拆解结果
+    """
+    if not request.problem_statement.strip():
+        raise HTTPException(status_code=400, detail="Problem statement is required")
+
+    async def event_stream():
+        counts = {"node": 0, "edge": 0}
+        source = "llm"
+
+        def item_event(item) -> str:
+            kind = "node" if isinstance(item, CognitiveNodeCreate) else "edge"
+            event = {"type": kind, "index": counts[kind], kind: item.model_dump(mode="json")}
+            counts[kind] += 1
+            return _format_event(event, stream_format)
+
+        try:
+            async for item in stream_decomposition(request.problem_statement, tenant_id=tenant_id):
+                yield item_event(item)
+        except LLMError as exc:
+            if counts["node"] or counts["edge"]:
+                yield _format_event({"type": "error", "detail": str(exc)}, stream_format)
+                return
+            source = "fallback"
+            fallback = local_decomposition(request.problem_statement)
+            for item in [*fallback.nodes, *fallback.edges]:
+                yield item_event(item)
+
+        yield _format_event(
+            {"type": "done", "nodes": counts["node"], "edges": counts["edge"], "source": source},
+            stream_format
+        )
+
+    media_type = "text/event-stream" if stream_format == "sse" else "application/x-ndjson"
+    return StreamingResponse(event_stream(), media_type=media_type)
+
+
+@router.post("/openai-task-decomposition", response_model=TaskDecompositionResponse)
+async def openai_task_decomposition(request: TaskDecompositionRequest, tenant_id: str = Depends(get_tenant_id)):
+    """只使用模型的任务拆解，失败时返回错误而不是兜底结果"""
+    if not request.problem_statement.strip():
+        raise HTTPException(status_code=400, detail="Problem statement is required")
+
+    try:
+        return await decompose_task(request.problem_statement, tenant_id=tenant_id)
+    except LLMError as exc:
+        raise HTTPException(status_code=502, detail=f"LLM decomposition failed: {exc}")
+
+
+@router.post("/resource-search", response_model=ResourceSearchResponse)
+async def resource_search(
+    request: ResourceSearchRequest,
+    tenant_id: str = Depends(get_tenant_id),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """学习资源推荐：优先检索本地资源库，没有结果时再由模型推荐"""
+    if not request.query.strip():
+        raise HTTPException(status_code=400, detail="Query is required")
+
+    local = await search_local_resources(request, db, tenant_id=tenant_id)
+    if local.resources:
+        return local
+
+    try:
+        response = await search_resources(request.query, request.task_context)
+        response.source = "llm"
+        return response
+    except LLMError as exc:
+        raise HTTPException(status_code=502, detail=f"Resource search failed: {exc}")
+
+
+@router.get("/llm/status")
+async def get_llm_status():
+    """模型网关、任务拆解缓存和请求合并的统计"""
+    return {
+        **llm_gateway.metrics(),
+        "decomposition_cache": decomposition_cache.metrics(),
+        "single_flight": llm_flight.metrics(),
+        "subtask_cache": subtask_cache.metrics(),
+        "shared_state": shared_state.metrics(),
+    }
+
+
+@router.delete("/cache")
+async def invalidate_cache(
+    key: str = Query(..., min_length=1, description="要失效的任务拆解问题描述"),
+    tenant_id: str = Depends(get_tenant_id)
+):
+    """
+    失效当前租户的一条任务拆解缓存，多进程部署时同步到所有工作进程
+    清空整个缓存和失效子任务缓存会影响所有租户，只在调试路由 DELETE /debug/cache 中提供
+    """
+    return {"invalidated": {"decomposition": int(decomposition_cache.invalidate(key, tenant_id))}}
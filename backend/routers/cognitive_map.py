@@ -1,29 +1,45 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, delete
-from typing import List
+from sqlalchemy import select, delete, update
+from typing import List, Optional
 
-from database.database import get_async_db
+from database.query_counter import query_budget
+from database.tenancy import get_tenant_id
 from database.models import (
     CognitiveMapDB, CognitiveNodeDB, CognitiveEdgeDB, LearningSessionDB
 )
-from models.schemas import (
-    CognitiveMap, CognitiveMapCreate, CognitiveNode, CognitiveNodeCreate,
-    CognitiveEdge, CognitiveEdgeCreate, RelationshipType
-)
+from routers.dependencies import get_read_db, get_write_db
+from models.responses import map_payload, render
+from models.schemas import CognitiveMap, CognitiveMapCreate, RelationshipType
+from services.http_cache import cache_headers, etag_matches, make_etag, not_modified
 
 router = APIRouter()
 
 
+def _map_etag(map_id: str, version: int) -> str:
+    return make_etag("map", map_id, version)
+
+
+def _owned_map(map_id: str, tenant_id: str):
+    """按ID查询地图时同时校验租户，其他租户的地图按不存在处理"""
+    return (CognitiveMapDB.id == map_id) & (CognitiveMapDB.tenant_id == tenant_id)
+
+
 @router.post("/", response_model=CognitiveMap)
+@query_budget(5)
 async def create_cognitive_map(
     map_data: CognitiveMapCreate,
-    db: AsyncSession = Depends(get_async_db)
+    response: Response,
+    tenant_id: str = Depends(get_tenant_id),
+    db: AsyncSession = Depends(get_write_db)
 ):
     """创建认知地图"""
-    # 验证会话存在
+    # 验证会话存在且属于当前租户
     result = await db.execute(
-        select(LearningSessionDB).where(LearningSessionDB.id == map_data.session_id)
+        select(LearningSessionDB).where(
+            LearningSessionDB.id == map_data.session_id,
+            LearningSessionDB.tenant_id == tenant_id
+        )
     )
     session = result.scalar_one_or_none()
     
@@ -31,7 +47,7 @@ async def create_cognitive_map(
         raise HTTPException(status_code=404, detail="Learning session not found")
     
     # 创建认知地图
-    db_map = CognitiveMapDB(session_id=map_data.session_id)
+    db_map = CognitiveMapDB(session_id=map_data.session_id, tenant_id=tenant_id)
     db.add(db_map)
     await db.flush()  # 获取map的ID
     
@@ -70,56 +86,39 @@ async def create_cognitive_map(
         db.add(db_edge)
         created_edges.append(db_edge)
     
-    await db.commit()
-    
-    # 刷新所有对象
-    await db.refresh(db_map)
-    for node in created_nodes:
-        await db.refresh(node)
-    for edge in created_edges:
-        await db.refresh(edge)
-    
-    # 更新学习会话的认知地图ID
+    # 更新学习会话的认知地图ID，与地图一起提交
     session.cognitive_map_id = db_map.id
     await db.commit()
     
-    return CognitiveMap(
-        id=db_map.id,
-        session_id=db_map.session_id,
-        nodes=[
-            CognitiveNode(
-                id=node.id,
-                name=node.name,
-                description=node.description,
-                x=node.x,
-                y=node.y,
-                created_at=node.created_at
-            ) for node in created_nodes
-        ],
-        edges=[
-            CognitiveEdge(
-                id=edge.id,
-                source_id=edge.source_id,
-                target_id=edge.target_id,
-                relationship_type=RelationshipType(edge.relationship_type),
-                custom_name=edge.custom_name,
-                created_at=edge.created_at
-            ) for edge in created_edges
-        ],
-        created_at=db_map.created_at,
-        updated_at=db_map.updated_at
+    # id、版本和时间戳在插入前已由模型默认值生成，提交后不过期，无需逐个 refresh
+    
+    return render(
+        map_payload(db_map, created_nodes, created_edges),
+        headers=cache_headers(_map_etag(db_map.id, db_map.version)),
+        base=response
     )
 
 
 @router.get("/{map_id}", response_model=CognitiveMap)
+@query_budget(4)
 async def get_cognitive_map(
     map_id: str,
-    db: AsyncSession = Depends(get_async_db)
+    if_none_match: Optional[str] = Header(None),
+    tenant_id: str = Depends(get_tenant_id),
+    db: AsyncSession = Depends(get_read_db)
 ):
-    """获取认知地图详情"""
+    """获取认知地图详情，If-None-Match 与当前版本一致时只查版本号并返回 304"""
+    if if_none_match:
+        version = (await db.execute(
+            select(CognitiveMapDB.version).where(_owned_map(map_id, tenant_id))
+        )).scalar_one_or_none()
+        etag = _map_etag(map_id, version)
+        if version is not None and etag_matches(if_none_match, etag):
+            return not_modified(etag)
+    
     # 获取地图
     result = await db.execute(
-        select(CognitiveMapDB).where(CognitiveMapDB.id == map_id)
+        select(CognitiveMapDB).where(_owned_map(map_id, tenant_id))
     )
     db_map = result.scalar_one_or_none()
     
@@ -138,46 +137,31 @@ async def get_cognitive_map(
     )
     edges = edges_result.scalars().all()
     
-    return CognitiveMap(
-        id=db_map.id,
-        session_id=db_map.session_id,
-        nodes=[
-            CognitiveNode(
-                id=node.id,
-                name=node.name,
-                description=node.description,
-                x=node.x,
-                y=node.y,
-                created_at=node.created_at
-            ) for node in nodes
-        ],
-        edges=[
-            CognitiveEdge(
-                id=edge.id,
-                source_id=edge.source_id,
-                target_id=edge.target_id,
-                relationship_type=RelationshipType(edge.relationship_type),
-                custom_name=edge.custom_name,
-                created_at=edge.created_at
-            ) for edge in edges
-        ],
-        created_at=db_map.created_at,
-        updated_at=db_map.updated_at
-    )
+    return render(map_payload(db_map, nodes, edges), headers=cache_headers(_map_etag(db_map.id, db_map.version)))
 
 
 @router.put("/{map_id}", response_model=CognitiveMap)
+@query_budget(5)
 async def update_cognitive_map(
     map_id: str,
     map_data: CognitiveMapCreate,
-    db: AsyncSession = Depends(get_async_db)
+    response: Response,
+    tenant_id: str = Depends(get_tenant_id),
+    db: AsyncSession = Depends(get_write_db)
 ):
-    """更新认知地图"""
-    # 验证地图存在
+    """更新认知地图（整体替换节点和连线，版本号加一）"""
+    # 验证地图存在并在同一条语句中递增版本
     result = await db.execute(
-        select(CognitiveMapDB).where(CognitiveMapDB.id == map_id)
+        update(CognitiveMapDB)
+        .where(_owned_map(map_id, tenant_id))
+        .values(version=CognitiveMapDB.version + 1)
+        .returning(
+            CognitiveMapDB.id, CognitiveMapDB.session_id, CognitiveMapDB.version,
+            CognitiveMapDB.created_at, CognitiveMapDB.updated_at
+        )
+        .execution_options(synchronize_session=False)
     )
-    db_map = result.scalar_one_or_none()
+    db_map = result.one_or_none()
     
     if not db_map:
         raise HTTPException(status_code=404, detail="Cognitive map not found")
@@ -227,46 +211,20 @@ async def update_cognitive_map(
     
     await db.commit()
     
-    # 刷新所有对象
-    await db.refresh(db_map)
-    for node in created_nodes:
-        await db.refresh(node)
-    for edge in created_edges:
-        await db.refresh(edge)
-    
-    return CognitiveMap(
-        id=db_map.id,
-        session_id=db_map.session_id,
-        nodes=[
-            CognitiveNode(
-                id=node.id,
-                name=node.name,
-                description=node.description,
-                x=node.x,
-                y=node.y,
-                created_at=node.created_at
-            ) for node in created_nodes
-        ],
-        edges=[
-            CognitiveEdge(
-                id=edge.id,
-                source_id=edge.source_id,
-                target_id=edge.target_id,
-                relationship_type=RelationshipType(edge.relationship_type),
-                custom_name=edge.custom_name,
-                created_at=edge.created_at
-            ) for edge in created_edges
-        ],
-        created_at=db_map.created_at,
-        updated_at=db_map.updated_at
+    return render(
+        map_payload(db_map, created_nodes, created_edges),
+        headers=cache_headers(_map_etag(db_map.id, db_map.version)),
+        base=response
     )
 
 
 @router.post("/{map_id}/select-edge")
+@query_budget(4)
 async def select_important_edge(
     map_id: str,
     edge_id: str,
-    db: AsyncSession = Depends(get_async_db)
+    tenant_id: str = Depends(get_tenant_id),
+    db: AsyncSession = Depends(get_write_db)
 ):
     """选择重要的连线"""
     # 验证连线存在
@@ -283,7 +241,7 @@ async def select_important_edge(
     
     # 获取认知地图对应的学习会话
     map_result = await db.execute(
-        select(CognitiveMapDB).where(CognitiveMapDB.id == map_id)
+        select(CognitiveMapDB).where(_owned_map(map_id, tenant_id))
     )
     cognitive_map = map_result.scalar_one_or_none()
     
@@ -0,0 +1,63 @@
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse
+
+from services.decomposition_cache import decomposition_cache
+from services.profiling import MetricsRegistry, RequestProfiler, metrics_registry, request_profiler
+from services.subtask_generator import subtask_cache
+
+router = APIRouter()
+
+
+def _registry(request: Request) -> MetricsRegistry:
+    return getattr(request.app.state, "metrics_registry", metrics_registry)
+
+
+def _profiler(request: Request) -> RequestProfiler:
+    return getattr(request.app.state, "request_profiler", request_profiler)
+
+
+@router.get("/metrics")
+async def get_metrics(request: Request):
+    """各路由的延迟分位数、每个请求的数据库查询和服务耗时"""
+    profiler = _profiler(request)
+    return {
+        **_registry(request).snapshot(),
+        "profiler": {
+            "backend": profiler.profiler,
+            "sample_rate": profiler.sample_rate,
+            "slow_ms": profiler.slow_ms,
+            "directory": str(profiler.directory),
+            "recent": profiler.list_profiles(),
+        },
+    }
+
+
+@router.get("/metrics/prometheus", response_class=PlainTextResponse)
+async def get_prometheus_metrics(request: Request):
+    """Prometheus 文本格式的指标"""
+    return PlainTextResponse(
+        _registry(request).render_prometheus(),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+@router.delete("/cache")
+async def invalidate_cache(
+    name: str = Query("all", pattern="^(decomposition|subtask|all)$"),
+    key: str = Query("", description="子任务缓存传连线签名；为空时清空整个缓存")
+):
+    """清空模型结果缓存（所有租户）或失效一条子任务缓存，多进程部署时同步到所有工作进程"""
+    if key and name != "subtask":
+        raise HTTPException(status_code=400, detail="A key is only supported for the subtask cache")
+
+    invalidated = {}
+    if name in ("decomposition", "all"):
+        invalidated["decomposition"] = decomposition_cache.metrics()["size"]
+        decomposition_cache.clear()
+    if name in ("subtask", "all"):
+        if key:
+            invalidated["subtask"] = int(subtask_cache.invalidate(key))
+        else:
+            invalidated["subtask"] = subtask_cache.metrics()["size"]
+            subtask_cache.clear()
+    return {"invalidated": invalidated}
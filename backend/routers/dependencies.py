@@ -0,0 +1,63 @@
+"""
+路由共用的数据库会话依赖
+写接口使用主库会话，事务提交成功后通过 Cookie 和响应头告知客户端最近一次写入的时间；
+读接口在客户端刚写入过的一段时间内改走主库（读己之写），其余时间使用只读会话
+"""
+
+import os
+import time
+
+from fastapi import Request, Response
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.database import AsyncSessionLocal, ReadSessionLocal
+
+# 客户端最近一次写入后的这段时间内，读请求仍走主库，保证读到自己的写入
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+LAST_WRITE_COOKIE = "mln_last_write"
+LAST_WRITE_HEADER = "X-Last-Write-At"
+
+
+def _mark_write(response: Response):
+    """记录写入时间；同一请求多次提交时只保留最后一次的 Cookie"""
+    now = f"{time.time():.3f}"
+    prefix = f"{LAST_WRITE_COOKIE}=".encode("latin-1")
+    response.raw_headers[:] = [
+        (name, value) for name, value in response.raw_headers
+        if not (name == b"set-cookie" and value.startswith(prefix))
+    ]
+    response.set_cookie(
+        LAST_WRITE_COOKIE, now, max_age=int(READ_YOUR_WRITES_SECONDS) + 1, httponly=True, samesite="lax"
+    )
+    response.headers[LAST_WRITE_HEADER] = now
+
+
+async def get_write_db(response: Response) -> AsyncSession:
+    """获取主库会话，事务提交成功后告知客户端写入时间（回滚或没有提交时不设置）"""
+    async with AsyncSessionLocal() as session:
+        event.listen(session.sync_session, "after_commit", lambda _: _mark_write(response))
+        try:
+            yield session
+        finally:
+            await session.close()
+
+
+def _wrote_recently(request: Request) -> bool:
+    last_write = request.cookies.get(LAST_WRITE_COOKIE) or request.headers.get(LAST_WRITE_HEADER)
+    if not last_write:
+        return False
+    try:
+        return time.time() - float(last_write) < READ_YOUR_WRITES_SECONDS
+    except ValueError:
+        return False
+
+
+async def get_read_db(request: Request) -> AsyncSession:
+    """获取只读会话；客户端刚写入过时改走主库，避免读到副本上的旧数据"""
+    session_factory = AsyncSessionLocal if _wrote_recently(request) else ReadSessionLocal
+    async with session_factory() as session:
+        try:
+            yield session
+        finally:
+            await session.close()
@@ -1,22 +1,157 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, or_, func
-from typing import List, Optional
+from sqlalchemy import select, delete, or_
+from typing import Iterable, List, Optional, Set, Tuple
+import asyncio
 
-from database.database import get_async_db
-from database.models import KnowledgeCardDB
-from models.schemas import KnowledgeCard, KnowledgeCardCreate
+from database.dialects import SQLITE, dialect_name, card_contains_conditions, card_fulltext_condition
+from database.models import KnowledgeCardDB, ReviewItemDB
+from database.pagination import apply_keyset, build_page
+from database.tenancy import get_tenant_id
+from routers.dependencies import get_read_db, get_write_db
+from models.responses import card_page_payload, card_payload, render
+from models.schemas import (
+    KnowledgeCard, KnowledgeCardCreate, KnowledgeCardPage,
+    CardMergeRequest, DuplicateCluster, DuplicateDismissRequest
+)
+from services.card_dedup import card_dedup
+from services.card_index import card_index
+from services.card_io import import_cards, export_cards
+from services.http_cache import cache_headers, digest_etag, etag_matches, make_etag, not_modified
+from services.indexing_queue import indexing_queue
 
 router = APIRouter()
 
+# read-your-writes 模式下等待后台关键词提取的最长时间（秒）
+INDEX_WAIT_TIMEOUT = 5.0
+
+
+def _build_search_condition(query: str, mode: str, dialect: str):
+    """
+    按数据库类型构建搜索条件
+    contains 为标题/内容/关键词子串匹配，fulltext 要求查询中每个词都出现
+    """
+    if mode == "fulltext":
+        return card_fulltext_condition(query, dialect)
+    return or_(*card_contains_conditions(query, dialect))
+
+
+def _tenant_cards(tenant_id: str):
+    """租户的全部卡片，其余条件在此基础上追加"""
+    return select(KnowledgeCardDB).where(KnowledgeCardDB.tenant_id == tenant_id)
+
+
+def _owned_card(card_id: str, tenant_id: str):
+    """按ID查询卡片时同时校验租户，其他租户的卡片按不存在处理"""
+    return (KnowledgeCardDB.id == card_id) & (KnowledgeCardDB.tenant_id == tenant_id)
+
+
+async def _schedule_keywording(card: KnowledgeCardDB, wait: bool, db: AsyncSession):
+    """关键词为空时提交后台提取；wait为True时等待回写完成后刷新卡片"""
+    future = await indexing_queue.submit(card.id, card.title, card.content, card.updated_at, card.tenant_id)
+    if not wait:
+        return
+    
+    try:
+        await asyncio.wait_for(asyncio.shield(future), INDEX_WAIT_TIMEOUT)
+    except asyncio.TimeoutError:
+        return
+    await db.refresh(card)
+
+
+async def _search_candidates(
+    queries: List[str],
+    tenant_id: str,
+    db: AsyncSession,
+    mode: str = "contains"
+) -> Optional[Set[str]]:
+    """用租户的倒排索引分片预筛候选卡片，返回None表示需要数据库全量搜索"""
+    if dialect_name(db) != SQLITE:
+        # PostgreSQL 上由 pg_trgm / tsvector 索引直接完成检索
+        return None
+    
+    shard = await card_index.ensure_loaded(tenant_id, db)
+    
+    candidate_ids: Set[str] = set()
+    for query in queries:
+        if mode == "fulltext":
+            # 每个词都必须出现，候选集取各词候选的交集
+            ids = None
+            for term in query.split() or [query]:
+                term_ids = shard.candidates(term)
+                if term_ids is None:
+                    continue
+                ids = term_ids if ids is None else ids & term_ids
+        else:
+            ids = shard.candidates(query)
+        if ids is None:
+            return None
+        candidate_ids |= ids
+    
+    if len(candidate_ids) > card_index.MAX_CANDIDATES:
+        return None
+    return candidate_ids
+
+
+def _card_etag(card) -> str:
+    return make_etag("card", card.id, card.version)
+
+
+def _cards_etag(rows: Iterable) -> str:
+    """一组卡片的 ETag：对每张卡片的 (id, 版本) 取摘要，增删改和关键词回写都会改变它"""
+    return digest_etag("cards", ((row.id, row.version) for row in rows))
+
+
+async def _load_cards(stmt, if_none_match: Optional[str], db: AsyncSession) -> Tuple[str, Optional[list]]:
+    """
+    执行卡片列表查询，返回 (ETag, 卡片)
+    带 If-None-Match 时先只查 (id, 版本)，与当前 ETag 一致则不加载卡片内容，卡片返回 None
+    """
+    if if_none_match:
+        rows = (await db.execute(stmt.with_only_columns(KnowledgeCardDB.id, KnowledgeCardDB.version))).all()
+        etag = _cards_etag(rows)
+        if etag_matches(if_none_match, etag):
+            return etag, None
+    
+    result = await db.execute(stmt)
+    cards = result.scalars().all()
+    return _cards_etag(cards), cards
+
+
+async def _fetch_card_page(
+    stmt,
+    cursor: Optional[str],
+    limit: int,
+    db: AsyncSession,
+    if_none_match: Optional[str] = None
+) -> Response:
+    """按 (updated_at, id) 键集分页执行卡片查询，内容未变化时返回 304"""
+    try:
+        stmt = apply_keyset(stmt, KnowledgeCardDB.updated_at, KnowledgeCardDB.id, cursor, limit)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    # ETag 覆盖多取的一行，是否有下一页也体现在其中
+    etag, cards = await _load_cards(stmt, if_none_match, db)
+    if cards is None:
+        return not_modified(etag)
+    cards, next_cursor = build_page(cards, limit)
+    
+    return render(card_page_payload(cards, next_cursor), headers=cache_headers(etag))
+
 
 @router.post("/", response_model=KnowledgeCard)
 async def create_knowledge_card(
     card_data: KnowledgeCardCreate,
-    db: AsyncSession = Depends(get_async_db)
+    response: Response,
+    wait_for_index: bool = Query(False, description="等待后台关键词提取完成后再返回"),
+    tenant_id: str = Depends(get_tenant_id),
+    db: AsyncSession = Depends(get_write_db)
 ):
-    """创建知识卡片"""
+    """创建知识卡片，未提供关键词时由后台自动提取"""
     db_card = KnowledgeCardDB(
+        tenant_id=tenant_id,
         title=card_data.title,
         content=card_data.content,
         keywords=card_data.keywords
@@ -25,76 +160,179 @@ async def create_knowledge_card(
     await db.commit()
     await db.refresh(db_card)
     
-    return KnowledgeCard(
-        id=db_card.id,
-        title=db_card.title,
-        content=db_card.content,
-        keywords=db_card.keywords,
-        created_at=db_card.created_at,
-        updated_at=db_card.updated_at
-    )
+    card_index.upsert(tenant_id, db_card.id, db_card.title, db_card.content, db_card.keywords)
+    card_dedup.schedule(tenant_id)
+    if not card_data.keywords:
+        await _schedule_keywording(db_card, wait_for_index, db)
+    
+    return render(card_payload(db_card), headers=cache_headers(_card_etag(db_card)), base=response)
 
 
 @router.get("/", response_model=List[KnowledgeCard])
 async def get_knowledge_cards(
     skip: int = Query(0, ge=0),
     limit: int = Query(10, ge=1, le=100),
-    db: AsyncSession = Depends(get_async_db)
+    if_none_match: Optional[str] = Header(None),
+    tenant_id: str = Depends(get_tenant_id),
+    db: AsyncSession = Depends(get_read_db)
 ):
-    """获取知识卡片列表"""
-    result = await db.execute(
-        select(KnowledgeCardDB)
+    """获取知识卡片列表，内容未变化时返回 304"""
+    etag, cards = await _load_cards(
+        _tenant_cards(tenant_id)
         .order_by(KnowledgeCardDB.updated_at.desc())
         .offset(skip)
-        .limit(limit)
+        .limit(limit),
+        if_none_match,
+        db
     )
-    cards = result.scalars().all()
+    if cards is None:
+        return not_modified(etag)
     
-    return [
-        KnowledgeCard(
-            id=card.id,
-            title=card.title,
-            content=card.content,
-            keywords=card.keywords,
-            created_at=card.created_at,
-            updated_at=card.updated_at
-        ) for card in cards
-    ]
+    return render([card_payload(card) for card in cards], headers=cache_headers(etag))
+
+
+@router.get("/page/", response_model=KnowledgeCardPage)
+async def get_knowledge_cards_page(
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(10, ge=1, le=100),
+    if_none_match: Optional[str] = Header(None),
+    tenant_id: str = Depends(get_tenant_id),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """按游标分页获取知识卡片列表，内容未变化时返回 304"""
+    return await _fetch_card_page(_tenant_cards(tenant_id), cursor, limit, db, if_none_match)
+
+
+@router.get("/indexing/status")
+async def get_indexing_status():
+    """后台关键词索引队列状态、索引延迟、搜索索引分片占用和近似重复检测状态"""
+    return {**indexing_queue.metrics(), "search_index": card_index.metrics(), "dedup": card_dedup.metrics()}
+
+
+@router.get("/duplicates/", response_model=List[DuplicateCluster])
+async def list_duplicate_cards(
+    tenant_id: str = Depends(get_tenant_id),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """列出待处理的近似重复卡片，按连通关系分簇"""
+    return await card_dedup.clusters(tenant_id, db)
+
+
+@router.post("/duplicates/scan")
+async def scan_duplicate_cards(
+    full: bool = Query(False, description="清空签名和分桶后重新检测全部卡片"),
+    tenant_id: str = Depends(get_tenant_id),
+    db: AsyncSession = Depends(get_write_db)
+):
+    """立即检测近似重复卡片；默认增量，只检查新写入或修改过的卡片"""
+    return await card_dedup.run(tenant_id, db, full=full)
+
+
+@router.post("/duplicates/merge", response_model=KnowledgeCard)
+async def merge_duplicate_cards(
+    merge: CardMergeRequest,
+    response: Response,
+    tenant_id: str = Depends(get_tenant_id),
+    db: AsyncSession = Depends(get_write_db)
+):
+    """把重复卡片的关键词并入保留的卡片，并删除重复卡片"""
+    card = await card_dedup.merge(tenant_id, merge.keep_id, merge.merge_ids, db)
+    
+    if not card:
+        raise HTTPException(status_code=404, detail="Knowledge card not found")
+    
+    await db.commit()
+    await db.refresh(card)
+    
+    for card_id in merge.merge_ids:
+        if card_id != card.id:
+            card_index.remove(tenant_id, card_id)
+    card_index.upsert(tenant_id, card.id, card.title, card.content, card.keywords)
+    
+    return render(card_payload(card), headers=cache_headers(_card_etag(card)), base=response)
+
+
+@router.post("/duplicates/dismiss")
+async def dismiss_duplicate_cards(
+    pair: DuplicateDismissRequest,
+    tenant_id: str = Depends(get_tenant_id),
+    db: AsyncSession = Depends(get_write_db)
+):
+    """忽略一对近似重复卡片，之后不再提出"""
+    if not await card_dedup.dismiss(tenant_id, pair.card_id, pair.other_card_id, db):
+        raise HTTPException(status_code=404, detail="Duplicate pair not found")
+    
+    await db.commit()
+    
+    return {"message": "Duplicate pair dismissed"}
+
+
+@router.post("/import")
+async def import_knowledge_cards(
+    request: Request,
+    tenant_id: str = Depends(get_tenant_id),
+    db: AsyncSession = Depends(get_write_db)
+):
+    """
+    以NDJSON流式批量导入知识卡片
+    
+    每行一个 {"title", "content", "keywords"?} 对象，缺少keywords时自动提取。
+    """
+    result = await import_cards(request.stream(), db, tenant_id)
+    if result["imported"]:
+        card_dedup.schedule(tenant_id)
+    return result
+
+
+@router.get("/export")
+async def export_knowledge_cards(tenant_id: str = Depends(get_tenant_id)):
+    """以NDJSON流式导出当前租户的全部知识卡片"""
+    return StreamingResponse(
+        export_cards(tenant_id),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": "attachment; filename=knowledge_cards.ndjson"}
+    )
 
 
 @router.get("/{card_id}", response_model=KnowledgeCard)
 async def get_knowledge_card(
     card_id: str,
-    db: AsyncSession = Depends(get_async_db)
+    if_none_match: Optional[str] = Header(None),
+    tenant_id: str = Depends(get_tenant_id),
+    db: AsyncSession = Depends(get_read_db)
 ):
-    """获取单个知识卡片"""
+    """获取单个知识卡片，If-None-Match 与当前版本一致时只查版本号并返回 304"""
+    if if_none_match:
+        version = (await db.execute(
+            select(KnowledgeCardDB.version).where(_owned_card(card_id, tenant_id))
+        )).scalar_one_or_none()
+        etag = make_etag("card", card_id, version)
+        if version is not None and etag_matches(if_none_match, etag):
+            return not_modified(etag)
+    
     result = await db.execute(
-        select(KnowledgeCardDB).where(KnowledgeCardDB.id == card_id)
+        select(KnowledgeCardDB).where(_owned_card(card_id, tenant_id))
     )
     card = result.scalar_one_or_none()
     
     if not card:
         raise HTTPException(status_code=404, detail="Knowledge card not found")
     
-    return KnowledgeCard(
-        id=card.id,
-        title=card.title,
-        content=card.content,
-        keywords=card.keywords,
-        created_at=card.created_at,
-        updated_at=card.updated_at
-    )
+    return render(card_payload(card), headers=cache_headers(_card_etag(card)))
 
 
 @router.put("/{card_id}", response_model=KnowledgeCard)
 async def update_knowledge_card(
     card_id: str,
     card_data: KnowledgeCardCreate,
-    db: AsyncSession = Depends(get_async_db)
+    response: Response,
+    wait_for_index: bool = Query(False, description="等待后台关键词提取完成后再返回"),
+    tenant_id: str = Depends(get_tenant_id),
+    db: AsyncSession = Depends(get_write_db)
 ):
-    """更新知识卡片"""
+    """更新知识卡片，未提供关键词时由后台自动提取"""
     result = await db.execute(
-        select(KnowledgeCardDB).where(KnowledgeCardDB.id == card_id)
+        select(KnowledgeCardDB).where(_owned_card(card_id, tenant_id))
     )
     card = result.scalar_one_or_none()
     
@@ -104,28 +342,28 @@ async def update_knowledge_card(
     card.title = card_data.title
     card.content = card_data.content
     card.keywords = card_data.keywords
+    card.version = card.version + 1
     
     await db.commit()
     await db.refresh(card)
     
-    return KnowledgeCard(
-        id=card.id,
-        title=card.title,
-        content=card.content,
-        keywords=card.keywords,
-        created_at=card.created_at,
-        updated_at=card.updated_at
-    )
+    card_index.upsert(tenant_id, card.id, card.title, card.content, card.keywords)
+    card_dedup.schedule(tenant_id)
+    if not card_data.keywords:
+        await _schedule_keywording(card, wait_for_index, db)
+    
+    return render(card_payload(card), headers=cache_headers(_card_etag(card)), base=response)
 
 
 @router.delete("/{card_id}")
 async def delete_knowledge_card(
     card_id: str,
-    db: AsyncSession = Depends(get_async_db)
+    tenant_id: str = Depends(get_tenant_id),
+    db: AsyncSession = Depends(get_write_db)
 ):
     """删除知识卡片"""
     result = await db.execute(
-        select(KnowledgeCardDB).where(KnowledgeCardDB.id == card_id)
+        select(KnowledgeCardDB).where(_owned_card(card_id, tenant_id))
     )
     card = result.scalar_one_or_none()
     
@@ -133,8 +371,18 @@ async def delete_knowledge_card(
         raise HTTPException(status_code=404, detail="Knowledge card not found")
     
     await db.delete(card)
+    await db.execute(
+        delete(ReviewItemDB).where(
+            ReviewItemDB.tenant_id == tenant_id,
+            ReviewItemDB.item_type == "card",
+            ReviewItemDB.item_id == card_id
+        )
+    )
+    await card_dedup.forget(tenant_id, [card_id], db)
     await db.commit()
     
+    card_index.remove(tenant_id, card_id)
+    
     return {"message": "Knowledge card deleted successfully"}
 
 
@@ -142,54 +390,55 @@ async def delete_knowledge_card(
 async def search_knowledge_cards(
     query: str = Query(..., min_length=1),
     limit: int = Query(10, ge=1, le=50),
-    db: AsyncSession = Depends(get_async_db)
+    mode: str = Query("contains", pattern="^(contains|fulltext)$"),
+    tenant_id: str = Depends(get_tenant_id),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """搜索知识卡片"""
     # 构建搜索条件
-    search_conditions = []
+    search_condition = _build_search_condition(query, mode, dialect_name(db))
     
-    # 在标题中搜索
-    search_conditions.append(
-        KnowledgeCardDB.title.ilike(f"%{query}%")
-    )
-    
-    # 在内容中搜索
-    search_conditions.append(
-        KnowledgeCardDB.content.ilike(f"%{query}%")
-    )
-    
-    # 在关键词中搜索（JSON字段搜索）
-    # 注意：这里的实现可能需要根据具体的数据库类型调整
-    search_conditions.append(
-        func.json_extract(KnowledgeCardDB.keywords, '$').ilike(f"%{query}%")
-    )
+    stmt = _tenant_cards(tenant_id).where(search_condition)
+    candidate_ids = await _search_candidates([query], tenant_id, db, mode)
+    if candidate_ids is not None:
+        if not candidate_ids:
+            return []
+        stmt = stmt.where(KnowledgeCardDB.id.in_(candidate_ids))
     
     # 执行搜索
     result = await db.execute(
-        select(KnowledgeCardDB)
-        .where(or_(*search_conditions))
+        stmt
         .order_by(KnowledgeCardDB.updated_at.desc())
         .limit(limit)
     )
     cards = result.scalars().all()
     
-    return [
-        KnowledgeCard(
-            id=card.id,
-            title=card.title,
-            content=card.content,
-            keywords=card.keywords,
-            created_at=card.created_at,
-            updated_at=card.updated_at
-        ) for card in cards
-    ]
+    return render([card_payload(card) for card in cards])
+
+
+@router.get("/search/page/", response_model=KnowledgeCardPage)
+async def search_knowledge_cards_page(
+    query: str = Query(..., min_length=1),
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(10, ge=1, le=50),
+    mode: str = Query("contains", pattern="^(contains|fulltext)$"),
+    tenant_id: str = Depends(get_tenant_id),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """按游标分页搜索知识卡片"""
+    stmt = _tenant_cards(tenant_id).where(_build_search_condition(query, mode, dialect_name(db)))
+    candidate_ids = await _search_candidates([query], tenant_id, db, mode)
+    if candidate_ids is not None:
+        stmt = stmt.where(KnowledgeCardDB.id.in_(candidate_ids))
+    return await _fetch_card_page(stmt, cursor, limit, db)
 
 
 @router.post("/search/by-keywords", response_model=List[KnowledgeCard])
 async def search_by_keywords(
     keywords: List[str],
     limit: int = Query(10, ge=1, le=50),
-    db: AsyncSession = Depends(get_async_db)
+    tenant_id: str = Depends(get_tenant_id),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """根据关键词搜索知识卡片"""
     if not keywords:
@@ -197,32 +446,25 @@ async def search_by_keywords(
     
     # 构建关键词搜索条件
     search_conditions = []
+    dialect = dialect_name(db)
     
     for keyword in keywords:
         # 在标题、内容和关键词中搜索每个关键词
-        keyword_conditions = [
-            KnowledgeCardDB.title.ilike(f"%{keyword}%"),
-            KnowledgeCardDB.content.ilike(f"%{keyword}%"),
-            func.json_extract(KnowledgeCardDB.keywords, '$').ilike(f"%{keyword}%")
-        ]
-        search_conditions.append(or_(*keyword_conditions))
+        search_conditions.append(_build_search_condition(keyword, "contains", dialect))
+    
+    stmt = _tenant_cards(tenant_id).where(or_(*search_conditions))
+    candidate_ids = await _search_candidates(keywords, tenant_id, db)
+    if candidate_ids is not None:
+        if not candidate_ids:
+            return []
+        stmt = stmt.where(KnowledgeCardDB.id.in_(candidate_ids))
     
     # 执行搜索（任意关键词匹配）
     result = await db.execute(
-        select(KnowledgeCardDB)
-        .where(or_(*search_conditions))
+        stmt
         .order_by(KnowledgeCardDB.updated_at.desc())
         .limit(limit)
     )
     cards = result.scalars().all()
     
-    return [
-        KnowledgeCard(
-            id=card.id,
-            title=card.title,
-            content=card.content,
-            keywords=card.keywords,
-            created_at=card.created_at,
-            updated_at=card.updated_at
-        ) for card in cards
-    ]
+    return render([card_payload(card) for card in cards])
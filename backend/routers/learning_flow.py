@@ -1,27 +1,80 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from typing import List
+from typing import List, Optional
+import asyncio
+import json
 
-from database.database import get_async_db
-from database.models import LearningSessionDB, SubTaskDB
+from database.database import AsyncSessionLocal
+from database.query_counter import query_budget
+from database.models import LearningSessionDB, SubTaskDB, ReviewItemDB
+from database.pagination import apply_keyset, build_page
+from database.tenancy import get_tenant_id
+from routers.dependencies import get_read_db, get_write_db
+from models.responses import render, session_page_payload, session_payload, subtask_payload
 from models.schemas import (
-    LearningSession, LearningSessionCreate, FlowStateUpdate,
+    LearningSession, LearningSessionCreate, LearningSessionPage, FlowStateUpdate,
     JOLAssessmentRequest, FOKAssessmentRequest, ConfidenceAssessmentRequest,
-    TimeAllocationRequest, SubTask, SubTaskCreate
+    TimeAllocationRequest, SubTask, SubTaskCreate, BatchResult,
+    SubTaskSuggestionRequest, SubTaskSuggestion
 )
 from services.flow_engine import FlowEngine
+from services.notifications import notification_hub
+from services.session_timer import session_timer
+from services.subtask_generator import SubTaskEdge, SubTaskGenerator, SUBTASK_BATCH_SIZE
 
 router = APIRouter()
 
+# 单次批量请求允许的最大条目数
+MAX_BATCH_SIZE = 5000
+
+
+def _build_batch_result(results) -> BatchResult:
+    succeeded = sum(1 for item in results if item.success)
+    return BatchResult(
+        total=len(results),
+        succeeded=succeeded,
+        failed=len(results) - succeeded,
+        results=results
+    )
+
+
+def _owned_session(session_id: str, tenant_id: str):
+    """按ID查询会话时同时校验租户，其他租户的会话按不存在处理"""
+    return (LearningSessionDB.id == session_id) & (LearningSessionDB.tenant_id == tenant_id)
+
+
+async def _require_session(session_id: str, tenant_id: str):
+    """
+    不需要读取会话内容的接口（计时器、事件流）只校验归属
+    单独开一个短会话查询，事件流不会在整个连接期间占用数据库连接
+    """
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(LearningSessionDB.id).where(_owned_session(session_id, tenant_id)))
+        if result.scalar_one_or_none() is None:
+            raise HTTPException(status_code=404, detail="Learning session not found")
+
+
+def _check_batch_size(items: list):
+    if len(items) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large: at most {MAX_BATCH_SIZE} items per request"
+        )
+
 
 @router.post("/sessions", response_model=LearningSession)
+@query_budget(2)
 async def create_learning_session(
     session_data: LearningSessionCreate,
-    db: AsyncSession = Depends(get_async_db)
+    response: Response,
+    tenant_id: str = Depends(get_tenant_id),
+    db: AsyncSession = Depends(get_write_db)
 ):
     """创建新的学习会话"""
     db_session = LearningSessionDB(
+        tenant_id=tenant_id,
         problem_statement=session_data.problem_statement,
         current_step="problem_input"
     )
@@ -29,27 +82,95 @@ async def create_learning_session(
     await db.commit()
     await db.refresh(db_session)
     
-    return LearningSession(
-        id=db_session.id,
-        problem_statement=db_session.problem_statement,
-        current_step=db_session.current_step,
-        cognitive_map_id=db_session.cognitive_map_id,
-        selected_edge_id=db_session.selected_edge_id,
-        sub_tasks=[],
-        session_data=db_session.session_data,
-        created_at=db_session.created_at,
-        updated_at=db_session.updated_at
+    return render(session_payload(db_session), base=response)
+
+
+@router.get("/sessions", response_model=LearningSessionPage)
+async def list_learning_sessions(
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(20, ge=1, le=100),
+    tenant_id: str = Depends(get_tenant_id),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """按游标分页列出当前租户的学习会话（不含子任务）"""
+    try:
+        stmt = apply_keyset(
+            select(LearningSessionDB).where(LearningSessionDB.tenant_id == tenant_id),
+            LearningSessionDB.updated_at,
+            LearningSessionDB.id,
+            cursor,
+            limit
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    result = await db.execute(stmt)
+    sessions, next_cursor = build_page(result.scalars().all(), limit)
+    
+    return render(session_page_payload(sessions, next_cursor))
+
+
+@router.post("/batch/sessions", response_model=BatchResult)
+async def create_learning_sessions_batch(
+    sessions: List[LearningSessionCreate],
+    tenant_id: str = Depends(get_tenant_id),
+    db: AsyncSession = Depends(get_write_db)
+):
+    """批量创建学习会话"""
+    _check_batch_size(sessions)
+    
+    flow_engine = FlowEngine(tenant_id)
+    results = await flow_engine.create_sessions_batch(
+        [item.problem_statement for item in sessions], db
     )
+    
+    return _build_batch_result(results)
+
+
+@router.post("/batch/jol-assessment", response_model=BatchResult)
+async def submit_jol_assessments_batch(
+    assessments: List[JOLAssessmentRequest],
+    tenant_id: str = Depends(get_tenant_id),
+    db: AsyncSession = Depends(get_write_db)
+):
+    """批量提交JOL（学习判断）评估"""
+    _check_batch_size(assessments)
+    
+    flow_engine = FlowEngine(tenant_id)
+    results = await flow_engine.process_jol_assessments_batch(
+        [(item.session_id, item.assessment) for item in assessments], db
+    )
+    
+    return _build_batch_result(results)
+
+
+@router.post("/batch/fok-assessment", response_model=BatchResult)
+async def submit_fok_assessments_batch(
+    assessments: List[FOKAssessmentRequest],
+    tenant_id: str = Depends(get_tenant_id),
+    db: AsyncSession = Depends(get_write_db)
+):
+    """批量提交FOK（知晓感判断）评估"""
+    _check_batch_size(assessments)
+    
+    flow_engine = FlowEngine(tenant_id)
+    results = await flow_engine.process_fok_assessments_batch(
+        [(item.session_id, item.assessment) for item in assessments], db
+    )
+    
+    return _build_batch_result(results)
 
 
 @router.get("/sessions/{session_id}", response_model=LearningSession)
+@query_budget(2)
 async def get_learning_session(
     session_id: str,
-    db: AsyncSession = Depends(get_async_db)
+    tenant_id: str = Depends(get_tenant_id),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """获取学习会话详情"""
     result = await db.execute(
-        select(LearningSessionDB).where(LearningSessionDB.id == session_id)
+        select(LearningSessionDB).where(_owned_session(session_id, tenant_id))
     )
     db_session = result.scalar_one_or_none()
     
@@ -62,36 +183,54 @@ async def get_learning_session(
     )
     sub_tasks = sub_tasks_result.scalars().all()
     
-    return LearningSession(
-        id=db_session.id,
-        problem_statement=db_session.problem_statement,
-        current_step=db_session.current_step,
-        cognitive_map_id=db_session.cognitive_map_id,
-        selected_edge_id=db_session.selected_edge_id,
-        sub_tasks=[
-            SubTask(
-                id=task.id,
-                name=task.name,
-                description=task.description,
-                order=task.order,
-                mastery_expectation=task.mastery_expectation
-            ) for task in sub_tasks
-        ],
-        session_data=db_session.session_data,
-        created_at=db_session.created_at,
-        updated_at=db_session.updated_at
-    )
+    return render(session_payload(db_session, sub_tasks))
+
+
+@router.get("/sessions/{session_id}/timer")
+async def get_session_timer(session_id: str, tenant_id: str = Depends(get_tenant_id)):
+    """获取会话倒计时状态"""
+    await _require_session(session_id, tenant_id)
+    deadline = session_timer.get_deadline(session_id)
+    
+    return {
+        "session_id": session_id,
+        "active": deadline is not None,
+        "deadline": deadline.isoformat() if deadline else None
+    }
+
+
+@router.get("/sessions/{session_id}/events")
+async def stream_session_events(session_id: str, tenant_id: str = Depends(get_tenant_id)):
+    """以SSE推送会话事件（如倒计时结束）"""
+    await _require_session(session_id, tenant_id)
+    queue = notification_hub.subscribe(session_id)
+    
+    async def event_stream():
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    # 保活注释，防止代理断开空闲连接
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+        finally:
+            notification_hub.unsubscribe(session_id, queue)
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
 
 
 @router.put("/sessions/{session_id}/flow-state")
 async def update_flow_state(
     session_id: str,
     flow_update: FlowStateUpdate,
-    db: AsyncSession = Depends(get_async_db)
+    tenant_id: str = Depends(get_tenant_id),
+    db: AsyncSession = Depends(get_write_db)
 ):
     """更新学习流程状态"""
     result = await db.execute(
-        select(LearningSessionDB).where(LearningSessionDB.id == session_id)
+        select(LearningSessionDB).where(_owned_session(session_id, tenant_id))
     )
     db_session = result.scalar_one_or_none()
     
@@ -113,75 +252,130 @@ async def update_flow_state(
 
 
 @router.post("/sessions/{session_id}/jol-assessment")
+@query_budget(5)
 async def submit_jol_assessment(
     session_id: str,
     assessment: JOLAssessmentRequest,
-    db: AsyncSession = Depends(get_async_db)
+    tenant_id: str = Depends(get_tenant_id),
+    db: AsyncSession = Depends(get_write_db)
 ):
     """提交JOL（学习判断）评估"""
-    flow_engine = FlowEngine()
+    flow_engine = FlowEngine(tenant_id)
     next_step = await flow_engine.process_jol_assessment(session_id, assessment.assessment, db)
     
     return {"message": "JOL assessment submitted", "next_step": next_step}
 
 
 @router.post("/sessions/{session_id}/fok-assessment")
+@query_budget(5)
 async def submit_fok_assessment(
     session_id: str,
     assessment: FOKAssessmentRequest,
-    db: AsyncSession = Depends(get_async_db)
+    tenant_id: str = Depends(get_tenant_id),
+    db: AsyncSession = Depends(get_write_db)
 ):
     """提交FOK（知晓感判断）评估"""
-    flow_engine = FlowEngine()
+    flow_engine = FlowEngine(tenant_id)
     next_step = await flow_engine.process_fok_assessment(session_id, assessment.assessment, db)
     
     return {"message": "FOK assessment submitted", "next_step": next_step}
 
 
 @router.post("/sessions/{session_id}/confidence-assessment")
+@query_budget(3)
 async def submit_confidence_assessment(
     session_id: str,
     assessment: ConfidenceAssessmentRequest,
-    db: AsyncSession = Depends(get_async_db)
+    tenant_id: str = Depends(get_tenant_id),
+    db: AsyncSession = Depends(get_write_db)
 ):
     """提交信心评估"""
-    flow_engine = FlowEngine()
+    flow_engine = FlowEngine(tenant_id)
     next_step = await flow_engine.process_confidence_assessment(session_id, assessment.confidence, db)
     
     return {"message": "Confidence assessment submitted", "next_step": next_step}
 
 
 @router.post("/sessions/{session_id}/time-allocation")
+@query_budget(3)
 async def submit_time_allocation(
     session_id: str,
     time_request: TimeAllocationRequest,
-    db: AsyncSession = Depends(get_async_db)
+    tenant_id: str = Depends(get_tenant_id),
+    db: AsyncSession = Depends(get_write_db)
 ):
     """提交学习时间分配"""
-    flow_engine = FlowEngine()
+    flow_engine = FlowEngine(tenant_id)
     next_step = await flow_engine.process_time_allocation(session_id, time_request.time_allocation, db)
     
     return {"message": "Time allocation submitted", "next_step": next_step}
 
 
+@router.post("/sessions/{session_id}/sub-tasks/suggestions", response_model=List[SubTaskSuggestion])
+@query_budget(1)
+async def suggest_sub_tasks(
+    session_id: str,
+    request: SubTaskSuggestionRequest,
+    tenant_id: str = Depends(get_tenant_id),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """为多条连线生成子任务建议（不写入数据库）"""
+    if len(request.edges) > SUBTASK_BATCH_SIZE * 4:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Too many edges: at most {SUBTASK_BATCH_SIZE * 4} per request"
+        )
+    result = await db.execute(
+        select(LearningSessionDB.problem_statement).where(_owned_session(session_id, tenant_id))
+    )
+    problem_statement = result.scalar_one_or_none()
+    if problem_statement is None:
+        raise HTTPException(status_code=404, detail="Learning session not found")
+    
+    edges = [
+        SubTaskEdge(edge.source_node_name, edge.target_node_name, edge.relationship_type.value)
+        for edge in request.edges
+    ]
+    generated = await SubTaskGenerator().generate_subtasks_batch(edges, problem_statement)
+    return [
+        SubTaskSuggestion(
+            source_node_name=edge.source_node_name,
+            target_node_name=edge.target_node_name,
+            relationship_type=edge.relationship_type,
+            sub_tasks=item.sub_tasks,
+            source=item.source
+        )
+        for edge, item in zip(request.edges, generated)
+    ]
+
+
 @router.post("/sessions/{session_id}/sub-tasks", response_model=List[SubTask])
+@query_budget(4)
 async def create_sub_tasks(
     session_id: str,
     sub_tasks: List[SubTaskCreate],
-    db: AsyncSession = Depends(get_async_db)
+    response: Response,
+    tenant_id: str = Depends(get_tenant_id),
+    db: AsyncSession = Depends(get_write_db)
 ):
     """为会话创建子任务"""
-    # 验证会话存在
+    # 验证会话存在且属于当前租户
     result = await db.execute(
-        select(LearningSessionDB).where(LearningSessionDB.id == session_id)
+        select(LearningSessionDB).where(_owned_session(session_id, tenant_id))
     )
     db_session = result.scalar_one_or_none()
     
     if not db_session:
         raise HTTPException(status_code=404, detail="Learning session not found")
     
-    # 删除现有子任务
+    # 删除现有子任务及其复习项
     from sqlalchemy import delete
+    await db.execute(
+        delete(ReviewItemDB).where(
+            ReviewItemDB.session_id == session_id,
+            ReviewItemDB.item_type == "subtask"
+        )
+    )
     await db.execute(
         delete(SubTaskDB).where(SubTaskDB.session_id == session_id)
     )
@@ -201,16 +395,4 @@ async def create_sub_tasks(
     
     await db.commit()
     
-    # 刷新并返回创建的任务
-    for task in created_tasks:
-        await db.refresh(task)
-    
-    return [
-        SubTask(
-            id=task.id,
-            name=task.name,
-            description=task.description,
-            order=task.order,
-            mastery_expectation=task.mastery_expectation
-        ) for task in created_tasks
-    ]
+    return render([subtask_payload(task) for task in created_tasks], base=response)
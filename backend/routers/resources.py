@@ -0,0 +1,46 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.tenancy import get_tenant_id
+from routers.dependencies import get_read_db, get_write_db
+from models.schemas import (
+    ResourceSearchRequest, ResourceSearchResponse, ResourceIngestRequest, ResourceIngestResult
+)
+from services.resource_index import resource_index, search_local_resources
+from services.resource_library import ingest_directory, resolve_library_path
+
+router = APIRouter()
+
+
+@router.post("/ingest", response_model=ResourceIngestResult)
+async def ingest_resources(
+    request: ResourceIngestRequest,
+    db: AsyncSession = Depends(get_write_db)
+):
+    """导入资源根目录（RESOURCE_LIBRARY_DIR）下某个子目录中的文件和链接"""
+    try:
+        directory = resolve_library_path(request.path)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    
+    return await ingest_directory(directory, db, recursive=request.recursive)
+
+
+@router.post("/search", response_model=ResourceSearchResponse)
+async def search_resources(
+    request: ResourceSearchRequest,
+    tenant_id: str = Depends(get_tenant_id),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """本地资源检索，按资源类型分面，并按学习任务上下文重排"""
+    if not request.query.strip():
+        raise HTTPException(status_code=400, detail="Query is required")
+    
+    return await search_local_resources(request, db, tenant_id=tenant_id)
+
+
+@router.get("/facets")
+async def get_resource_facets(db: AsyncSession = Depends(get_read_db)):
+    """资源库中各类型的资源数量"""
+    await resource_index.ensure_loaded(db)
+    return {"total": len(resource_index), "facets": resource_index.facets()}
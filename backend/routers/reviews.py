@@ -0,0 +1,132 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from datetime import datetime
+from typing import Optional
+
+from database.query_counter import query_budget
+from database.models import KnowledgeCardDB, LearningSessionDB, ReviewItemDB, SubTaskDB
+from database.pagination import apply_keyset, build_page
+from database.tenancy import get_tenant_id
+from routers.dependencies import get_read_db, get_write_db
+from models.responses import render, review_page_payload, review_payload
+from models.schemas import ReviewItem, ReviewItemPage, ReviewItemType, ReviewOutcomeRequest
+from services.flow_engine import FlowEngine
+from services.review_scheduler import ReviewOutcome, SCORE_TO_QUALITY, review_scheduler
+
+router = APIRouter()
+
+
+async def _owned_item_session(item_type: ReviewItemType, item_id: str, tenant_id: str, db: AsyncSession):
+    """
+    校验复习对象属于当前租户，返回子任务所属会话ID（卡片为 None）
+    其他租户的卡片或子任务按不存在处理
+    """
+    if item_type == ReviewItemType.CARD:
+        stmt = select(KnowledgeCardDB.id).where(
+            KnowledgeCardDB.id == item_id, KnowledgeCardDB.tenant_id == tenant_id
+        )
+    else:
+        stmt = (
+            select(SubTaskDB.session_id)
+            .join(LearningSessionDB, LearningSessionDB.id == SubTaskDB.session_id)
+            .where(SubTaskDB.id == item_id, LearningSessionDB.tenant_id == tenant_id)
+        )
+    found = (await db.execute(stmt)).scalar_one_or_none()
+    if found is None:
+        raise HTTPException(status_code=404, detail=f"{item_type.value.capitalize()} not found")
+    return found if item_type == ReviewItemType.SUBTASK else None
+
+
+@router.post("/", response_model=ReviewItem)
+@query_budget(3)
+async def record_review(
+    outcome: ReviewOutcomeRequest,
+    response: Response,
+    tenant_id: str = Depends(get_tenant_id),
+    db: AsyncSession = Depends(get_write_db)
+):
+    """记录一次复习的 JOL/FOK 自评，按 SM-2 安排下次复习时间"""
+    scores = []
+    if outcome.jol is not None:
+        scores.append(FlowEngine.JOL_SCORES[outcome.jol])
+    if outcome.fok is not None:
+        scores.append(FlowEngine.FOK_SCORES[outcome.fok])
+    if not scores:
+        raise HTTPException(status_code=400, detail="Either jol or fok is required")
+
+    session_id = await _owned_item_session(outcome.item_type, outcome.item_id, tenant_id, db)
+
+    # 两项都提供时按较低的一项调度
+    items = await review_scheduler.record(
+        tenant_id,
+        [ReviewOutcome(outcome.item_type.value, outcome.item_id, SCORE_TO_QUALITY[min(scores)], session_id)],
+        db
+    )
+    await db.commit()
+
+    return render(review_payload(items[0]), base=response)
+
+
+@router.get("/due", response_model=ReviewItemPage)
+@query_budget(1)
+async def get_due_reviews(
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(20, ge=1, le=100),
+    tenant_id: str = Depends(get_tenant_id),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """按到期时间从早到晚分页获取已到期的复习项"""
+    try:
+        stmt = apply_keyset(
+            select(ReviewItemDB).where(
+                ReviewItemDB.tenant_id == tenant_id,
+                ReviewItemDB.due_at <= datetime.utcnow()
+            ),
+            ReviewItemDB.due_at,
+            ReviewItemDB.id,
+            cursor,
+            limit,
+            descending=False
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    result = await db.execute(stmt)
+    items, next_cursor = build_page(result.scalars().all(), limit, sort_attr="due_at")
+
+    return render(review_page_payload(items, next_cursor))
+
+
+@router.post("/recompute")
+async def recompute_due_dates(
+    tenant_id: str = Depends(get_tenant_id),
+    db: AsyncSession = Depends(get_write_db)
+):
+    """按当前间隔系数和上限重算本租户全部复习项的到期时间（调整配置后使用）"""
+    updated = await review_scheduler.recompute_due_dates(db, tenant_id)
+    return {"message": "Due dates recomputed", "updated": updated}
+
+
+@router.get("/{item_type}/{item_id}", response_model=ReviewItem)
+@query_budget(1)
+async def get_review_item(
+    item_type: ReviewItemType,
+    item_id: str,
+    tenant_id: str = Depends(get_tenant_id),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """获取某张卡片或某个子任务的复习调度状态"""
+    result = await db.execute(
+        select(ReviewItemDB).where(
+            ReviewItemDB.tenant_id == tenant_id,
+            ReviewItemDB.item_type == item_type.value,
+            ReviewItemDB.item_id == item_id
+        )
+    )
+    item = result.scalar_one_or_none()
+
+    if not item:
+        raise HTTPException(status_code=404, detail="Review item not found")
+
+    return render(review_payload(item))
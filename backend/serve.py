@@ -0,0 +1,81 @@
+"""
+生产环境启动入口
+按 WEB_CONCURRENCY 启动多个工作进程：安装了 gunicorn 时用 gunicorn 管理 uvicorn 工作进程
+（崩溃自动重启、平滑重载），否则使用 uvicorn 自带的多进程模式。
+
+多个工作进程各自持有搜索索引、模型结果缓存和 SSE 订阅者，需要 SHARED_STATE_BACKEND=database
+才能互相同步；未设置时这里自动设置（工作进程继承环境变量）。
+建表和迁移在启动工作进程之前执行一次，避免多个进程同时建表。
+
+用法:
+    WEB_CONCURRENCY=4 python serve.py
+"""
+
+import asyncio
+import importlib.util
+import os
+import sys
+
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "8000"))
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1)))
+# auto：安装了 gunicorn 时使用 gunicorn；uvicorn：总是使用 uvicorn 多进程模式
+SERVER = os.getenv("SERVER", "auto")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "info")
+# gunicorn 工作进程处理请求超时后被重启（秒）
+WORKER_TIMEOUT = int(os.getenv("WORKER_TIMEOUT", "60"))
+
+
+def configure_shared_state(workers: int) -> str:
+    """多进程时确保启用共享状态，返回最终使用的后端"""
+    backend = os.getenv("SHARED_STATE_BACKEND", "")
+    if workers > 1 and backend in ("", "memory"):
+        if backend == "memory":
+            print("⚠️  SHARED_STATE_BACKEND=memory with multiple workers, switching to database")
+        backend = "database"
+        os.environ["SHARED_STATE_BACKEND"] = backend
+    return backend or "memory"
+
+
+async def prepare_database():
+    """建表并执行迁移，之后工作进程启动时表和迁移都已是最新"""
+    from database.database import init_db, close_db
+
+    try:
+        await init_db()
+    finally:
+        await close_db()
+
+
+def gunicorn_args(workers: int) -> list:
+    return [
+        "gunicorn", "main:app",
+        "--worker-class", "uvicorn.workers.UvicornWorker",
+        "--workers", str(workers),
+        "--bind", f"{HOST}:{PORT}",
+        "--timeout", str(WORKER_TIMEOUT),
+        "--log-level", LOG_LEVEL,
+    ]
+
+
+def main():
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    workers = max(1, WEB_CONCURRENCY)
+    backend = configure_shared_state(workers)
+    use_gunicorn = SERVER == "auto" and importlib.util.find_spec("gunicorn") is not None
+    print(f"Starting {workers} worker(s) with {'gunicorn' if use_gunicorn else 'uvicorn'}, "
+          f"shared state: {backend}")
+    if workers > 1:
+        asyncio.run(prepare_database())
+
+    if use_gunicorn:
+        args = gunicorn_args(workers)
+        os.execvp(sys.executable, [sys.executable, "-m", *args])
+
+    import uvicorn
+
+    uvicorn.run("main:app", host=HOST, port=PORT, workers=workers, log_level=LOG_LEVEL)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,457 @@
+"""
+知识卡片近似重复检测
+对每张卡片标题和正文的词片段（KeywordExtractor.extract_shingles）计算 MinHash 签名，
+按 LSH 把签名切成若干 band 分桶：只有至少一个 band 完全相同的卡片才会被比较，
+检测的开销与候选对数量成正比，而不是与卡片数的平方成正比。
+
+签名和分桶保存在数据库中。增量模式只为新写入或修改过的卡片计算签名，
+并在已有分桶中查找候选；全量模式清空租户的签名和分桶后重建。
+签名估计的相似度不低于 CARD_DEDUP_THRESHOLD 的卡片对记为待处理，由用户合并或忽略。
+
+卡片写入后调用 schedule(tenant_id)，后台工作协程合并一段时间内的写入后做一次增量检测。
+"""
+
+import asyncio
+import hashlib
+import os
+import random
+import struct
+import time
+from collections import defaultdict
+from datetime import timedelta
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import delete, func, insert, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.database import AsyncSessionLocal
+from database.models import (
+    CardDuplicateDB, CardLshBucketDB, CardSignatureDB, KnowledgeCardDB, ReviewItemDB
+)
+from database.pagination import apply_keyset, build_page, encode_cursor
+from services.card_io import map_parallel
+from services.keyword_extractor import KeywordExtractor
+
+try:
+    import numpy as np
+except ImportError:  # numpy 是可选依赖，没有时逐个排列计算
+    np = None
+
+# 估计相似度不低于该值的卡片对视为近似重复
+CARD_DEDUP_THRESHOLD = float(os.getenv("CARD_DEDUP_THRESHOLD", "0.7"))
+# 卡片写入后等待多久再做增量检测，期间的写入合并为一次
+CARD_DEDUP_DEBOUNCE_SECONDS = float(os.getenv("CARD_DEDUP_DEBOUNCE_SECONDS", "2"))
+# 增量检测从最近一次签名的卡片时间往前回看的秒数，覆盖提交顺序与时间戳顺序不一致的写入
+CARD_DEDUP_LOOKBACK_SECONDS = float(os.getenv("CARD_DEDUP_LOOKBACK_SECONDS", "300"))
+
+# 16 个 band × 每个 band 4 行：相似度 0.5 时约 65% 的卡片对成为候选，0.7 时约 99%
+LSH_BANDS = 16
+LSH_ROWS = 4
+NUM_PERMUTATIONS = LSH_BANDS * LSH_ROWS
+
+# 排列 h -> (a*h + b) mod P，a、b < 2^31、h < 2^32，乘积在 uint64 内不会溢出
+_PRIME = (1 << 31) - 1
+_rng = random.Random(20240601)  # 固定种子，签名在进程和重启之间保持一致
+_PERM_A = [_rng.randrange(1, _PRIME) for _ in range(NUM_PERMUTATIONS)]
+_PERM_B = [_rng.randrange(0, _PRIME) for _ in range(NUM_PERMUTATIONS)]
+_SIGNATURE_FORMAT = f"<{NUM_PERMUTATIONS}I"
+
+_extractor = KeywordExtractor()
+
+
+def _shingle_hash(shingle: str) -> int:
+    return int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=4).digest(), "little")
+
+
+def minhash(shingles: Iterable[str]) -> Optional[Tuple[int, ...]]:
+    """词片段集合的 MinHash 签名，集合为空时返回 None"""
+    hashes = [_shingle_hash(shingle) for shingle in shingles]
+    if not hashes:
+        return None
+    if np is not None:
+        values = np.asarray(hashes, dtype=np.uint64)
+        a = np.asarray(_PERM_A, dtype=np.uint64)[:, None]
+        b = np.asarray(_PERM_B, dtype=np.uint64)[:, None]
+        return tuple(int(v) for v in ((a * values + b) % _PRIME).min(axis=1))
+    return tuple(min((a * h + b) % _PRIME for h in hashes) for a, b in zip(_PERM_A, _PERM_B))
+
+
+def signature_batch(texts: List[str]) -> List[bytes]:
+    """批量计算打包后的签名（模块级函数，可提交到进程池并行执行），没有词片段的文本为空字节串"""
+    packed = []
+    for text in texts:
+        signature = minhash(_extractor.extract_shingles(text))
+        packed.append(struct.pack(_SIGNATURE_FORMAT, *signature) if signature else b"")
+    return packed
+
+
+def unpack_signature(packed: bytes) -> Optional[Tuple[int, ...]]:
+    return struct.unpack(_SIGNATURE_FORMAT, packed) if packed else None
+
+
+def band_keys(signature: Tuple[int, ...]) -> List[str]:
+    """签名每个 band 的分桶键"""
+    keys = []
+    for band in range(LSH_BANDS):
+        rows = struct.pack(f"<{LSH_ROWS}I", *signature[band * LSH_ROWS:(band + 1) * LSH_ROWS])
+        keys.append(f"{band}:{hashlib.blake2b(rows, digest_size=8).hexdigest()}")
+    return keys
+
+
+def similarity(left: Tuple[int, ...], right: Tuple[int, ...]) -> float:
+    """两个签名取值相同的比例，即 Jaccard 相似度的估计"""
+    return sum(1 for x, y in zip(left, right) if x == y) / NUM_PERMUTATIONS
+
+
+def _pair(card_id: str, other_card_id: str) -> Tuple[str, str]:
+    return (card_id, other_card_id) if card_id < other_card_id else (other_card_id, card_id)
+
+
+def _chunks(items: List[Any], size: int):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class CardDedupJob:
+    """近似重复检测任务及其后台调度"""
+
+    # 每次签名的卡片数，每块单独提交
+    CHUNK_SIZE = 500
+    # 每条 IN (...) 查询的参数个数
+    LOOKUP_CHUNK_SIZE = 500
+    # 列出重复卡片时最多读取的卡片对
+    MAX_LISTED_PAIRS = 1000
+
+    def __init__(
+        self,
+        threshold: float = CARD_DEDUP_THRESHOLD,
+        debounce: float = CARD_DEDUP_DEBOUNCE_SECONDS,
+        session_factory=AsyncSessionLocal
+    ):
+        self.threshold = threshold
+        self.debounce = debounce
+        self._session_factory = session_factory
+        self._scheduled: Set[str] = set()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+        # 指标
+        self.runs = 0
+        self.signed = 0
+        self.pairs_found = 0
+        self.failed = 0
+        self.last_run_seconds = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    async def start(self):
+        if self._task:
+            return
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._worker())
+
+    async def stop(self):
+        if not self._task:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        self._wakeup = None
+
+    def schedule(self, tenant_id: str):
+        """卡片写入后安排一次增量检测；后台协程未启动时不做任何事，由手动检测补上"""
+        if self._wakeup is None:
+            return
+        self._scheduled.add(tenant_id)
+        self._wakeup.set()
+
+    async def _worker(self):
+        while True:
+            await self._wakeup.wait()
+            await asyncio.sleep(self.debounce)
+            self._wakeup.clear()
+            tenants, self._scheduled = self._scheduled, set()
+            for tenant_id in tenants:
+                try:
+                    async with self._session_factory() as db:
+                        await self.run(tenant_id, db)
+                except Exception as exc:
+                    self.failed += 1
+                    print(f"Card deduplication failed for tenant {tenant_id}: {exc}")
+
+    async def run(self, tenant_id: str, db: AsyncSession, full: bool = False) -> Dict[str, int]:
+        """
+        检测租户的近似重复卡片，返回签名的卡片数和新发现的卡片对数
+
+        增量模式沿 (tenant_id, updated_at, id) 索引从最近一次签名的时间继续，
+        跳过签名仍然有效的卡片；全量模式先清空租户的签名、分桶和待处理卡片对。
+        """
+        started = time.perf_counter()
+        cursor = None
+        if full:
+            await self._reset(tenant_id, db)
+        else:
+            watermark = (await db.execute(
+                select(func.max(CardSignatureDB.card_updated_at)).where(CardSignatureDB.tenant_id == tenant_id)
+            )).scalar()
+            if watermark is not None:
+                cursor = encode_cursor(watermark - timedelta(seconds=CARD_DEDUP_LOOKBACK_SECONDS), "")
+
+        signed = found = 0
+        while True:
+            stmt = apply_keyset(
+                select(KnowledgeCardDB.id, KnowledgeCardDB.title, KnowledgeCardDB.content, KnowledgeCardDB.updated_at)
+                .outerjoin(CardSignatureDB, CardSignatureDB.card_id == KnowledgeCardDB.id)
+                .where(
+                    KnowledgeCardDB.tenant_id == tenant_id,
+                    or_(
+                        CardSignatureDB.card_id.is_(None),
+                        CardSignatureDB.card_updated_at.is_distinct_from(KnowledgeCardDB.updated_at)
+                    )
+                ),
+                KnowledgeCardDB.updated_at,
+                KnowledgeCardDB.id,
+                cursor,
+                self.CHUNK_SIZE,
+                descending=False
+            )
+            rows, cursor = build_page((await db.execute(stmt)).all(), self.CHUNK_SIZE)
+            if not rows:
+                break
+
+            found += await self._process_chunk(tenant_id, rows, db)
+            await db.commit()
+            signed += len(rows)
+
+            if cursor is None:
+                break
+
+        self.runs += 1
+        self.signed += signed
+        self.pairs_found += found
+        self.last_run_seconds = time.perf_counter() - started
+        return {"signed": signed, "pairs": found}
+
+    async def _reset(self, tenant_id: str, db: AsyncSession):
+        await db.execute(delete(CardLshBucketDB).where(CardLshBucketDB.tenant_id == tenant_id))
+        await db.execute(delete(CardSignatureDB).where(CardSignatureDB.tenant_id == tenant_id))
+        await db.execute(delete(CardDuplicateDB).where(
+            CardDuplicateDB.tenant_id == tenant_id, CardDuplicateDB.status == "pending"
+        ))
+
+    async def _process_chunk(self, tenant_id: str, rows: List[Any], db: AsyncSession) -> int:
+        """为一块卡片签名、查找同桶候选并记录近似重复对，返回新记录的卡片对数（不提交）"""
+        card_ids = [row.id for row in rows]
+        packed = await map_parallel(signature_batch, [f"{row.title} {row.content}" for row in rows])
+        signatures = {card_id: unpack_signature(data) for card_id, data in zip(card_ids, packed)}
+
+        # 旧签名、旧分桶和涉及这些卡片的待处理卡片对都作废
+        for part in _chunks(card_ids, self.LOOKUP_CHUNK_SIZE):
+            await db.execute(delete(CardSignatureDB).where(CardSignatureDB.card_id.in_(part)))
+            await db.execute(delete(CardLshBucketDB).where(
+                CardLshBucketDB.tenant_id == tenant_id, CardLshBucketDB.card_id.in_(part)
+            ))
+            await db.execute(delete(CardDuplicateDB).where(
+                CardDuplicateDB.tenant_id == tenant_id,
+                CardDuplicateDB.status == "pending",
+                or_(CardDuplicateDB.card_id.in_(part), CardDuplicateDB.other_card_id.in_(part))
+            ))
+
+        # 本块内同桶的卡片，以及已有分桶中的卡片，都是候选
+        buckets: Dict[str, List[str]] = defaultdict(list)
+        for card_id, signature in signatures.items():
+            if signature:
+                for key in band_keys(signature):
+                    buckets[key].append(card_id)
+
+        candidates: Dict[str, Set[str]] = defaultdict(set)
+        for members in buckets.values():
+            for card_id in members:
+                candidates[card_id].update(other for other in members if other != card_id)
+        for part in _chunks(list(buckets), self.LOOKUP_CHUNK_SIZE):
+            result = await db.execute(
+                select(CardLshBucketDB.bucket, CardLshBucketDB.card_id).where(
+                    CardLshBucketDB.tenant_id == tenant_id, CardLshBucketDB.bucket.in_(part)
+                )
+            )
+            for bucket, other in result:
+                for card_id in buckets[bucket]:
+                    candidates[card_id].add(other)
+
+        # 只为候选加载签名，按签名估计相似度
+        known = dict(signatures)
+        missing = list({other for others in candidates.values() for other in others} - set(known))
+        for part in _chunks(missing, self.LOOKUP_CHUNK_SIZE):
+            result = await db.execute(
+                select(CardSignatureDB.card_id, CardSignatureDB.signature).where(CardSignatureDB.card_id.in_(part))
+            )
+            known.update((card_id, unpack_signature(data)) for card_id, data in result)
+
+        pairs: Dict[Tuple[str, str], float] = {}
+        for card_id, others in candidates.items():
+            for other in others:
+                other_signature = known.get(other)
+                if other_signature is None:
+                    continue
+                score = similarity(signatures[card_id], other_signature)
+                if score >= self.threshold:
+                    pairs[_pair(card_id, other)] = score
+
+        # 用户忽略过的卡片对不再提出
+        if pairs:
+            existing = set()
+            for part in _chunks(list({card_id for card_id, _ in pairs}), self.LOOKUP_CHUNK_SIZE):
+                result = await db.execute(
+                    select(CardDuplicateDB.card_id, CardDuplicateDB.other_card_id).where(
+                        CardDuplicateDB.tenant_id == tenant_id, CardDuplicateDB.card_id.in_(part)
+                    )
+                )
+                existing.update(result.all())
+            pairs = {pair: score for pair, score in pairs.items() if pair not in existing}
+
+        updated_at = {row.id: row.updated_at for row in rows}
+        await db.execute(insert(CardSignatureDB), [
+            {"card_id": card_id, "tenant_id": tenant_id, "card_updated_at": updated_at[card_id], "signature": data}
+            for card_id, data in zip(card_ids, packed)
+        ])
+        bucket_rows = [
+            {"tenant_id": tenant_id, "bucket": bucket, "card_id": card_id}
+            for bucket, members in buckets.items() for card_id in members
+        ]
+        for part in _chunks(bucket_rows, self.CHUNK_SIZE * 4):
+            await db.execute(insert(CardLshBucketDB), part)
+        if pairs:
+            await db.execute(insert(CardDuplicateDB), [
+                {"tenant_id": tenant_id, "card_id": card_id, "other_card_id": other, "similarity": score}
+                for (card_id, other), score in pairs.items()
+            ])
+        return len(pairs)
+
+    async def forget(self, tenant_id: str, card_ids: List[str], db: AsyncSession):
+        """卡片删除或被合并后清理其签名、分桶和卡片对（不提交）"""
+        for part in _chunks(card_ids, self.LOOKUP_CHUNK_SIZE):
+            await db.execute(delete(CardSignatureDB).where(CardSignatureDB.card_id.in_(part)))
+            await db.execute(delete(CardLshBucketDB).where(
+                CardLshBucketDB.tenant_id == tenant_id, CardLshBucketDB.card_id.in_(part)
+            ))
+            await db.execute(delete(CardDuplicateDB).where(
+                CardDuplicateDB.tenant_id == tenant_id,
+                or_(CardDuplicateDB.card_id.in_(part), CardDuplicateDB.other_card_id.in_(part))
+            ))
+
+    async def clusters(self, tenant_id: str, db: AsyncSession) -> List[Dict[str, Any]]:
+        """把待处理的卡片对按连通关系归并成簇，相似度最高的簇在前"""
+        result = await db.execute(
+            select(CardDuplicateDB.card_id, CardDuplicateDB.other_card_id, CardDuplicateDB.similarity)
+            .where(CardDuplicateDB.tenant_id == tenant_id, CardDuplicateDB.status == "pending")
+            .order_by(CardDuplicateDB.similarity.desc())
+            .limit(self.MAX_LISTED_PAIRS)
+        )
+        pairs = result.all()
+        if not pairs:
+            return []
+
+        parent: Dict[str, str] = {}
+
+        def find(card_id: str) -> str:
+            parent.setdefault(card_id, card_id)
+            while parent[card_id] != card_id:
+                parent[card_id] = parent[parent[card_id]]
+                card_id = parent[card_id]
+            return card_id
+
+        for card_id, other, _ in pairs:
+            parent[find(card_id)] = find(other)
+
+        cards = {}
+        for part in _chunks(list(parent), self.LOOKUP_CHUNK_SIZE):
+            result = await db.execute(
+                select(KnowledgeCardDB.id, KnowledgeCardDB.title, KnowledgeCardDB.updated_at)
+                .where(KnowledgeCardDB.tenant_id == tenant_id, KnowledgeCardDB.id.in_(part))
+            )
+            cards.update((row.id, row) for row in result)
+
+        grouped: Dict[str, Dict[str, Any]] = {}
+        for card_id, other, score in pairs:
+            if card_id not in cards or other not in cards:
+                continue
+            cluster = grouped.setdefault(find(card_id), {"cards": {}, "pairs": []})
+            for member in (card_id, other):
+                row = cards[member]
+                cluster["cards"][member] = {"id": row.id, "title": row.title, "updated_at": row.updated_at}
+            cluster["pairs"].append({"card_id": card_id, "other_card_id": other, "similarity": score})
+
+        return [
+            {"cards": list(cluster["cards"].values()), "pairs": cluster["pairs"]}
+            for cluster in grouped.values()
+        ]
+
+    async def merge(
+        self,
+        tenant_id: str,
+        keep_id: str,
+        merge_ids: List[str],
+        db: AsyncSession
+    ) -> Optional[KnowledgeCardDB]:
+        """
+        把 merge_ids 的关键词并入 keep_id 后删除这些卡片，返回保留的卡片
+        任一卡片不存在（或属于其他租户）时返回 None，不做任何修改；调用方负责提交和更新搜索索引
+        """
+        merge_ids = [card_id for card_id in dict.fromkeys(merge_ids) if card_id != keep_id]
+        result = await db.execute(
+            select(KnowledgeCardDB).where(
+                KnowledgeCardDB.tenant_id == tenant_id,
+                KnowledgeCardDB.id.in_([keep_id] + merge_ids)
+            )
+        )
+        cards = {card.id: card for card in result.scalars().all()}
+        if len(cards) != len(merge_ids) + 1:
+            return None
+
+        keep = cards[keep_id]
+        keywords = list(keep.keywords or [])
+        for card_id in merge_ids:
+            keywords.extend(cards[card_id].keywords or [])
+        keep.keywords = list(dict.fromkeys(keywords))
+        keep.version = keep.version + 1
+
+        if merge_ids:
+            await db.execute(delete(KnowledgeCardDB).where(KnowledgeCardDB.id.in_(merge_ids)))
+            await db.execute(delete(ReviewItemDB).where(
+                ReviewItemDB.tenant_id == tenant_id,
+                ReviewItemDB.item_type == "card",
+                ReviewItemDB.item_id.in_(merge_ids)
+            ))
+            await self.forget(tenant_id, merge_ids, db)
+        return keep
+
+    async def dismiss(self, tenant_id: str, card_id: str, other_card_id: str, db: AsyncSession) -> bool:
+        """忽略一对近似重复卡片，之后的检测不再提出（不提交）"""
+        card_id, other_card_id = _pair(card_id, other_card_id)
+        result = await db.execute(
+            update(CardDuplicateDB)
+            .where(
+                CardDuplicateDB.tenant_id == tenant_id,
+                CardDuplicateDB.card_id == card_id,
+                CardDuplicateDB.other_card_id == other_card_id
+            )
+            .values(status="dismissed")
+        )
+        return result.rowcount > 0
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "scheduled": len(self._scheduled),
+            "runs": self.runs,
+            "signed": self.signed,
+            "pairs_found": self.pairs_found,
+            "failed": self.failed,
+            "last_run_seconds": round(self.last_run_seconds, 3),
+            "threshold": self.threshold
+        }
+
+
+card_dedup = CardDedupJob()
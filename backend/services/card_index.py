@@ -0,0 +1,335 @@
+"""
+知识卡片搜索索引
+进程内的字符二元组（bigram）倒排索引，用于给 ILIKE '%q%' 搜索预筛候选卡片
+
+包含查询串 q 的卡片一定包含 q 的全部二元组，因此候选集是真实结果的超集，
+数据库只需在候选集上用原搜索条件校验，结果与全表扫描一致。
+
+索引按租户分片（ShardedCardIndex）：每个租户的分片在该租户首次搜索时加载，
+搜索只在自己的分片里进行；所有分片的倒排项总数超过 CARD_INDEX_MAX_POSTINGS 时，
+淘汰最久没有使用的分片，下次搜索时重新加载。
+"""
+
+import asyncio
+import json
+import os
+from collections import OrderedDict
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.models import KnowledgeCardDB
+
+# (id, title, content, keywords)
+CardRecord = Tuple[str, str, str, list]
+
+# 所有分片合计的倒排项（卡片 × 二元组）上限，约 100 字节一项
+CARD_INDEX_MAX_POSTINGS = int(os.getenv("CARD_INDEX_MAX_POSTINGS", "5000000"))
+# 常驻分片数上限，没有卡片的租户也占一个分片
+CARD_INDEX_MAX_SHARDS = int(os.getenv("CARD_INDEX_MAX_SHARDS", "1000"))
+
+
+class CardSearchIndex:
+    """知识卡片二元组倒排索引，tenant_id 为 None 时索引全部卡片，否则只索引该租户的卡片"""
+
+    # 候选集超过该数量时预筛已无意义，直接交给数据库扫描
+    MAX_CANDIDATES = 2000
+    LOAD_CHUNK_SIZE = 1000
+
+    def __init__(self, tenant_id: Optional[str] = None):
+        self.tenant_id = tenant_id
+        self._postings: Dict[str, Set[str]] = {}
+        self._doc_grams: Dict[str, FrozenSet[str]] = {}
+        self.postings = 0  # 倒排项总数，用于估算内存占用
+        self.loaded = False
+        self._loading = False
+        self._touched: Set[str] = set()  # 加载期间被写入或删除的卡片，加载时跳过
+        self._load_lock: Optional[asyncio.Lock] = None
+        # 本进程写入或删除卡片后调用，参数为变更的卡片ID（多进程部署时据此通知其他进程）
+        self.listeners: List[Callable[[List[str]], None]] = []
+
+    def __len__(self) -> int:
+        return len(self._doc_grams)
+
+    @property
+    def loading(self) -> bool:
+        return self._loading
+
+    @staticmethod
+    def _grams(text: str) -> Set[str]:
+        text = text.lower()
+        return {text[i:i + 2] for i in range(len(text) - 1)}
+
+    def _card_grams(self, title: str, content: str, keywords: list) -> FrozenSet[str]:
+        # 关键词按数据库中JSON文本的形式索引，与 json_extract(...) ILIKE 的匹配对象一致
+        keywords_text = json.dumps(keywords or [])
+        return frozenset(
+            self._grams(title or "") | self._grams(content or "") | self._grams(keywords_text)
+        )
+
+    def _apply(self, card_id: str, grams: Optional[FrozenSet[str]]):
+        old_grams = self._doc_grams.pop(card_id, frozenset())
+        self.postings -= len(old_grams)
+        for gram in old_grams:
+            ids = self._postings.get(gram)
+            if ids is not None:
+                ids.discard(card_id)
+                if not ids:
+                    del self._postings[gram]
+
+        if grams is None:
+            return
+
+        self._doc_grams[card_id] = grams
+        self.postings += len(grams)
+        for gram in grams:
+            self._postings.setdefault(gram, set()).add(card_id)
+
+    def upsert(self, card_id: str, title: str, content: str, keywords: list):
+        """写入或更新一张卡片"""
+        self.upsert_many([(card_id, title, content, keywords)])
+
+    def upsert_many(self, records: Iterable[CardRecord]):
+        """批量写入或更新卡片，未加载时忽略（加载时会从数据库读取）"""
+        records = list(records)
+        self._upsert_records(records)
+        self._notify([record[0] for record in records])
+
+    def remove(self, card_id: str):
+        """删除一张卡片"""
+        self._remove_card(card_id)
+        self._notify([card_id])
+
+    def _upsert_records(self, records: List[CardRecord]):
+        if not (self.loaded or self._loading):
+            return
+        for card_id, title, content, keywords in records:
+            if self._loading:
+                self._touched.add(card_id)
+            self._apply(card_id, self._card_grams(title, content, keywords))
+
+    def _remove_card(self, card_id: str):
+        if not (self.loaded or self._loading):
+            return
+        if self._loading:
+            self._touched.add(card_id)
+        self._apply(card_id, None)
+
+    def _notify(self, card_ids: List[str]):
+        if card_ids:
+            for listener in self.listeners:
+                listener(card_ids)
+
+    async def refresh(self, card_ids: Iterable[str], db: AsyncSession):
+        """按数据库中的最新内容更新指定卡片（其他进程写入后调用），不再通知监听者"""
+        card_ids = list(card_ids)
+        if not (self.loaded or self._loading) or not card_ids:
+            return
+        result = await db.execute(self._scoped(
+            select(KnowledgeCardDB.id, KnowledgeCardDB.title, KnowledgeCardDB.content, KnowledgeCardDB.keywords)
+            .where(KnowledgeCardDB.id.in_(card_ids))
+        ))
+        records = [tuple(row) for row in result.all()]
+        self._upsert_records(records)
+        for card_id in set(card_ids) - {record[0] for record in records}:
+            self._remove_card(card_id)
+
+    def _scoped(self, stmt):
+        if self.tenant_id is None:
+            return stmt
+        return stmt.where(KnowledgeCardDB.tenant_id == self.tenant_id)
+
+    def candidates(self, query: str) -> Optional[Set[str]]:
+        """
+        返回可能匹配 query 的卡片ID集合
+
+        返回 None 表示索引无法缩小范围（未加载、查询过短、含LIKE通配符或候选过多），
+        调用方应退回数据库全量搜索。
+        """
+        if not self.loaded or len(query) < 2 or "%" in query or "_" in query:
+            return None
+
+        grams = sorted(
+            (self._postings.get(gram, set()) for gram in self._grams(query)),
+            key=len
+        )
+        if not grams or not grams[0]:
+            return set()
+
+        result = set(grams[0])
+        for ids in grams[1:]:
+            result &= ids
+            if not result:
+                break
+
+        if len(result) > self.MAX_CANDIDATES:
+            return None
+        return result
+
+    async def ensure_loaded(self, db: AsyncSession):
+        """首次使用时从数据库流式加载全部卡片"""
+        if self.loaded:
+            return
+        if self._load_lock is None:
+            self._load_lock = asyncio.Lock()
+
+        async with self._load_lock:
+            if self.loaded:
+                return
+
+            self._loading = True
+            try:
+                result = await db.stream(self._scoped(
+                    select(
+                        KnowledgeCardDB.id,
+                        KnowledgeCardDB.title,
+                        KnowledgeCardDB.content,
+                        KnowledgeCardDB.keywords
+                    )
+                ))
+                async for rows in result.partitions(self.LOAD_CHUNK_SIZE):
+                    for card_id, title, content, keywords in rows:
+                        if card_id not in self._touched:
+                            self._apply(card_id, self._card_grams(title, content, keywords))
+                self.loaded = True
+            except Exception:
+                self._postings.clear()
+                self._doc_grams.clear()
+                self.postings = 0
+                raise
+            finally:
+                self._loading = False
+                self._touched.clear()
+
+
+class ShardedCardIndex:
+    """
+    按租户分片的卡片索引
+
+    分片在租户首次搜索时从数据库加载（只读取该租户的卡片，走 tenant_id 开头的索引），
+    按最近使用顺序保存；倒排项总数或分片数超出上限时从最久未用的分片开始淘汰，
+    正在加载的分片和刚刚使用的分片不会被淘汰。写入只更新已加载的分片。
+    """
+
+    MAX_CANDIDATES = CardSearchIndex.MAX_CANDIDATES
+
+    def __init__(self, max_postings: int = CARD_INDEX_MAX_POSTINGS, max_shards: int = CARD_INDEX_MAX_SHARDS):
+        self.max_postings = max_postings
+        self.max_shards = max_shards
+        self._shards: "OrderedDict[str, CardSearchIndex]" = OrderedDict()
+        # 本进程写入或删除卡片后调用，参数为变更的卡片ID（多进程部署时据此通知其他进程）
+        self.listeners: List[Callable[[List[str]], None]] = []
+        self.loads = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return sum(len(shard) for shard in self._shards.values())
+
+    @property
+    def postings(self) -> int:
+        return sum(shard.postings for shard in self._shards.values())
+
+    def shard(self, tenant_id: str) -> Optional[CardSearchIndex]:
+        """已加载（或正在加载）的分片"""
+        return self._shards.get(tenant_id)
+
+    async def ensure_loaded(self, tenant_id: str, db: AsyncSession) -> CardSearchIndex:
+        """返回租户的分片，首次使用或已被淘汰时从数据库加载"""
+        shard = self._shards.get(tenant_id)
+        if shard is None:
+            shard = self._shards[tenant_id] = CardSearchIndex(tenant_id)
+        self._shards.move_to_end(tenant_id)
+
+        if not shard.loaded:
+            await shard.ensure_loaded(db)
+            self.loads += 1
+            self._evict(keep=tenant_id)
+        return shard
+
+    def _evict(self, keep: str):
+        """淘汰最久未用的分片，直到总量回到上限以内"""
+        total = self.postings
+        for tenant_id in list(self._shards):
+            if total <= self.max_postings and len(self._shards) <= self.max_shards:
+                break
+            shard = self._shards[tenant_id]
+            if tenant_id == keep or shard.loading:
+                continue
+            del self._shards[tenant_id]
+            total -= shard.postings
+            self.evictions += 1
+
+    def candidates(self, tenant_id: str, query: str) -> Optional[Set[str]]:
+        """在租户的分片中预筛，分片未加载时返回 None"""
+        shard = self._shards.get(tenant_id)
+        if shard is None:
+            return None
+        self._shards.move_to_end(tenant_id)
+        return shard.candidates(query)
+
+    def upsert(self, tenant_id: str, card_id: str, title: str, content: str, keywords: list):
+        """写入或更新一张卡片"""
+        self.upsert_many(tenant_id, [(card_id, title, content, keywords)])
+
+    def upsert_many(self, tenant_id: str, records: Iterable[CardRecord]):
+        """批量写入或更新同一租户的卡片，分片未加载时忽略（加载时会从数据库读取）"""
+        records = list(records)
+        shard = self._shards.get(tenant_id)
+        if shard is not None:
+            shard._upsert_records(records)
+        self._notify([record[0] for record in records])
+
+    def remove(self, tenant_id: str, card_id: str):
+        """删除一张卡片"""
+        shard = self._shards.get(tenant_id)
+        if shard is not None:
+            shard._remove_card(card_id)
+        self._notify([card_id])
+
+    def _notify(self, card_ids: List[str]):
+        if card_ids:
+            for listener in self.listeners:
+                listener(card_ids)
+
+    async def refresh(self, card_ids: Iterable[str], db: AsyncSession):
+        """按数据库中的最新内容更新指定卡片所在的分片（其他进程写入后调用），不再通知监听者"""
+        card_ids = list(card_ids)
+        if not self._shards or not card_ids:
+            return
+        result = await db.execute(
+            select(
+                KnowledgeCardDB.tenant_id,
+                KnowledgeCardDB.id,
+                KnowledgeCardDB.title,
+                KnowledgeCardDB.content,
+                KnowledgeCardDB.keywords
+            ).where(KnowledgeCardDB.id.in_(card_ids))
+        )
+        found: Set[str] = set()
+        by_tenant: Dict[str, List[CardRecord]] = {}
+        for tenant_id, *record in result.all():
+            found.add(record[0])
+            by_tenant.setdefault(tenant_id, []).append(tuple(record))
+
+        for tenant_id, records in by_tenant.items():
+            shard = self._shards.get(tenant_id)
+            if shard is not None:
+                shard._upsert_records(records)
+        # 已删除的卡片不知道属于哪个租户，从所有分片中移除（不在分片中时是空操作）
+        for card_id in set(card_ids) - found:
+            for shard in self._shards.values():
+                shard._remove_card(card_id)
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "shards": len(self._shards),
+            "cards": len(self),
+            "postings": self.postings,
+            "max_postings": self.max_postings,
+            "loads": self.loads,
+            "evictions": self.evictions,
+        }
+
+
+card_index = ShardedCardIndex()
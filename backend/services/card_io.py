@@ -0,0 +1,202 @@
+"""
+知识卡片批量导入/导出服务
+以 NDJSON（每行一个JSON对象）流式处理，导入和导出都不需要把整个卡片库放进内存
+"""
+
+import asyncio
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.database import ReadSessionLocal
+from database.models import KnowledgeCardDB, generate_uuid
+from database.tenancy import DEFAULT_TENANT_ID
+from models.schemas import KnowledgeCardImportItem
+from services.card_index import card_index
+from services.keyword_extractor import extract_keywords_batch
+
+# 每个事务写入的卡片数
+IMPORT_CHUNK_SIZE = 500
+# 单行最大字节数，防止没有换行的超大请求体撑爆缓冲区
+MAX_LINE_BYTES = 1024 * 1024
+# 导出时每次从服务端游标读取的行数
+EXPORT_CHUNK_SIZE = 1000
+# 导入结果中最多返回的错误条数
+MAX_REPORTED_ERRORS = 100
+
+# 少于该数量的文本直接在当前进程提取，进程间传输的开销不划算
+PARALLEL_THRESHOLD = 50
+
+_keyword_pool: Optional[ProcessPoolExecutor] = None
+_keyword_workers = int(os.getenv("KEYWORD_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+
+def _get_keyword_pool() -> ProcessPoolExecutor:
+    """关键词提取是纯CPU计算，使用进程池绕开GIL"""
+    global _keyword_pool
+    if _keyword_pool is None:
+        _keyword_pool = ProcessPoolExecutor(max_workers=_keyword_workers)
+    return _keyword_pool
+
+
+def shutdown_keyword_pool():
+    global _keyword_pool
+    if _keyword_pool is not None:
+        _keyword_pool.shutdown(cancel_futures=True)
+        _keyword_pool = None
+
+
+async def map_parallel(func: Callable[[List[Any]], List[Any]], items: List[Any]) -> List[Any]:
+    """
+    把列表分片后在进程池中并行执行 func，按原顺序拼接结果，进程池不可用时退回当前进程
+    func 必须是接受并返回列表的模块级函数（可被子进程导入）
+    """
+    if len(items) < PARALLEL_THRESHOLD or _keyword_workers <= 1:
+        return func(items)
+
+    slice_size = -(-len(items) // _keyword_workers)
+    slices = [items[i:i + slice_size] for i in range(0, len(items), slice_size)]
+
+    loop = asyncio.get_running_loop()
+    try:
+        pool = _get_keyword_pool()
+        results = await asyncio.gather(*[
+            loop.run_in_executor(pool, func, part) for part in slices
+        ])
+    except (BrokenProcessPool, OSError):
+        shutdown_keyword_pool()
+        return func(items)
+
+    return [result for part in results for result in part]
+
+
+async def extract_keywords_parallel(texts: List[str]) -> List[List[str]]:
+    """把文本分片后在进程池中并行提取关键词"""
+    return await map_parallel(extract_keywords_batch, texts)
+
+
+async def iter_ndjson_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, bytes]]:
+    """把字节流增量切分成行，返回 (行号, 行内容)，跳过空行"""
+    buffer = b""
+    line_number = 0
+
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line_number += 1
+            if line.strip():
+                yield line_number, line
+        if len(buffer) > MAX_LINE_BYTES:
+            raise ValueError(f"Line {line_number + 1} exceeds {MAX_LINE_BYTES} bytes")
+
+    if buffer.strip():
+        yield line_number + 1, buffer
+
+
+async def import_cards(
+    chunks: AsyncIterator[bytes],
+    db: AsyncSession,
+    tenant_id: str = DEFAULT_TENANT_ID
+) -> Dict[str, Any]:
+    """流式导入NDJSON卡片到租户名下，按块并行提取缺失的关键词并分事务写入"""
+    imported = 0
+    failed = 0
+    errors: List[Dict[str, Any]] = []
+    pending: List[KnowledgeCardImportItem] = []
+
+    def record_error(line_number: int, message: str):
+        nonlocal failed
+        failed += 1
+        if len(errors) < MAX_REPORTED_ERRORS:
+            errors.append({"line": line_number, "error": message})
+
+    async def flush():
+        nonlocal imported
+        if not pending:
+            return
+        imported += await _insert_chunk(pending, tenant_id, db)
+        pending.clear()
+
+    try:
+        async for line_number, line in iter_ndjson_lines(chunks):
+            try:
+                pending.append(KnowledgeCardImportItem.model_validate_json(line))
+            except ValidationError as exc:
+                record_error(line_number, exc.errors()[0]["msg"])
+                continue
+
+            if len(pending) >= IMPORT_CHUNK_SIZE:
+                await flush()
+        await flush()
+    except ValueError as exc:
+        # 已提交的块保留，返回时说明中断原因
+        record_error(-1, str(exc))
+
+    return {"imported": imported, "failed": failed, "errors": errors}
+
+
+async def _insert_chunk(items: List[KnowledgeCardImportItem], tenant_id: str, db: AsyncSession) -> int:
+    missing = [i for i, item in enumerate(items) if item.keywords is None]
+    extracted = await extract_keywords_parallel(
+        [f"{items[i].title} {items[i].content}" for i in missing]
+    )
+    keywords_by_index = dict(zip(missing, extracted))
+
+    now = datetime.utcnow()
+    rows = [
+        {
+            "id": generate_uuid(),
+            "tenant_id": tenant_id,
+            "title": item.title,
+            "content": item.content,
+            "keywords": item.keywords if item.keywords is not None else keywords_by_index[i],
+            "created_at": now,
+            "updated_at": now
+        }
+        for i, item in enumerate(items)
+    ]
+
+    await db.execute(insert(KnowledgeCardDB), rows)
+    await db.commit()
+
+    # 整块提交后再批量更新搜索索引
+    card_index.upsert_many(
+        tenant_id,
+        [(row["id"], row["title"], row["content"], row["keywords"]) for row in rows]
+    )
+    return len(rows)
+
+
+async def export_cards(tenant_id: str = DEFAULT_TENANT_ID) -> AsyncIterator[str]:
+    """以NDJSON逐行导出租户的所有卡片，数据从服务端游标分批读取"""
+    async with ReadSessionLocal() as db:
+        result = await db.stream(
+            select(
+                KnowledgeCardDB.id,
+                KnowledgeCardDB.title,
+                KnowledgeCardDB.content,
+                KnowledgeCardDB.keywords,
+                KnowledgeCardDB.created_at,
+                KnowledgeCardDB.updated_at
+            ).where(KnowledgeCardDB.tenant_id == tenant_id).order_by(KnowledgeCardDB.updated_at.desc(), KnowledgeCardDB.id.desc())
+        )
+        async for rows in result.partitions(EXPORT_CHUNK_SIZE):
+            yield "".join(
+                json.dumps({
+                    "id": card_id,
+                    "title": title,
+                    "content": content,
+                    "keywords": keywords or [],
+                    "created_at": created_at.isoformat() if created_at else None,
+                    "updated_at": updated_at.isoformat() if updated_at else None
+                }, ensure_ascii=False) + "\n"
+                for card_id, title, content, keywords, created_at, updated_at in rows
+            )
@@ -0,0 +1,265 @@
+"""
+任务拆解结果缓存
+两级查找：先按规范化后的问题文本精确匹配，未命中时按字符二元组的 Jaccard 相似度查找近似问题
+（如“学习Python数据分析”与“如何学习 Python 数据分析？”）。
+
+条目按租户隔离：缓存键和二元组都带上 tenant_id，一个租户的问题（拆解结果中含有问题原文）
+不会命中其他租户的条目。条目按 LRU 淘汰并有过期时间，关闭时写入磁盘，重启后继续使用。
+"""
+
+import json
+import os
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Set, Tuple
+
+from database.tenancy import DEFAULT_TENANT_ID
+from models.schemas import TaskDecompositionResponse
+
+DECOMPOSITION_CACHE_SIZE = int(os.getenv("DECOMPOSITION_CACHE_SIZE", "1000"))
+DECOMPOSITION_CACHE_TTL = float(os.getenv("DECOMPOSITION_CACHE_TTL", str(24 * 3600)))
+DECOMPOSITION_CACHE_SIMILARITY = float(os.getenv("DECOMPOSITION_CACHE_SIMILARITY", "0.8"))
+# 为空时不持久化
+DECOMPOSITION_CACHE_PATH = os.getenv("DECOMPOSITION_CACHE_PATH", "./decomposition_cache.json")
+
+# 缓存键中租户ID与规范化问题之间的分隔符
+_KEY_SEPARATOR = "\x1f"
+# 持久化文件格式版本，版本 1 的条目没有租户信息，不再加载
+_FILE_VERSION = 2
+
+# 规范化时去掉的口语化前后缀，不影响问题本身的含义
+_FILLER_PATTERN = re.compile(r"^(请问|请|我想|我要|如何|怎么|怎样)+|(方法|呢|吗)+$")
+
+
+def normalize_problem(text: str) -> str:
+    """全角转半角、小写、去掉标点空白、助词“的”和口语化前后缀"""
+    text = unicodedata.normalize("NFKC", text).lower()
+    text = re.sub(r"[^\w]+|的", "", text)
+    return _FILLER_PATTERN.sub("", text) or text
+
+
+def cache_key(problem_statement: str, tenant_id: str = DEFAULT_TENANT_ID) -> str:
+    """缓存键：租户ID + 规范化后的问题"""
+    return f"{tenant_id}{_KEY_SEPARATOR}{normalize_problem(problem_statement)}"
+
+
+def _features(key: str) -> FrozenSet[str]:
+    """缓存键的字符二元组，每个二元组带上租户前缀，近似查找只会落到同一租户的条目"""
+    tenant_id, _, normalized = key.partition(_KEY_SEPARATOR)
+    prefix = tenant_id + _KEY_SEPARATOR
+    if len(normalized) < 2:
+        return frozenset({prefix + normalized})
+    return frozenset(prefix + normalized[i:i + 2] for i in range(len(normalized) - 1))
+
+
+@dataclass
+class CacheEntry:
+    response: TaskDecompositionResponse
+    features: FrozenSet[str]
+    created_at: float  # 墙上时间，重启后仍可判断是否过期
+    hits: int = 0
+
+
+class DecompositionCache:
+    """LRU + TTL 的两级任务拆解缓存"""
+
+    def __init__(
+        self,
+        max_size: int = DECOMPOSITION_CACHE_SIZE,
+        ttl: float = DECOMPOSITION_CACHE_TTL,
+        similarity: float = DECOMPOSITION_CACHE_SIMILARITY,
+        path: Optional[str] = DECOMPOSITION_CACHE_PATH
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.similarity = similarity
+        self.path = path or None
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()  # 末尾为最近使用
+        self._postings: Dict[str, Set[str]] = {}  # 带租户前缀的二元组 -> 缓存键
+        # 本进程写入或失效条目后调用 listener(op, key, response)，op 为 put/invalidate/clear
+        # （多进程部署时据此同步其他进程）
+        self.listeners: List[Callable[[str, Optional[str], Optional[TaskDecompositionResponse]], None]] = []
+
+        # 指标
+        self.exact_hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _expired(self, entry: CacheEntry, now: float) -> bool:
+        return now - entry.created_at > self.ttl
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for feature in entry.features:
+            keys = self._postings.get(feature)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._postings[feature]
+
+    def _add(self, key: str, entry: CacheEntry):
+        self._remove(key)
+        self._entries[key] = entry
+        for feature in entry.features:
+            self._postings.setdefault(feature, set()).add(key)
+        while len(self._entries) > self.max_size:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _touch(self, key: str, entry: CacheEntry):
+        entry.hits += 1
+        self._entries.move_to_end(key)
+
+    def _nearest(self, features: FrozenSet[str], now: float) -> Optional[Tuple[str, float]]:
+        """按共享二元组数量找候选，返回 Jaccard 相似度最高的条目"""
+        overlap: Dict[str, int] = {}
+        for feature in features:
+            for key in self._postings.get(feature, ()):
+                overlap[key] = overlap.get(key, 0) + 1
+
+        best: Optional[Tuple[str, float]] = None
+        for key, shared in overlap.items():
+            entry = self._entries[key]
+            score = shared / (len(features) + len(entry.features) - shared)
+            if score < self.similarity or self._expired(entry, now):
+                continue
+            if best is None or score > best[1]:
+                best = (key, score)
+        return best
+
+    def get(self, problem_statement: str, tenant_id: str = DEFAULT_TENANT_ID) -> Optional[TaskDecompositionResponse]:
+        """查找租户的缓存，未命中返回None"""
+        now = time.time()
+        key = cache_key(problem_statement, tenant_id)
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            if not self._expired(entry, now):
+                self._touch(key, entry)
+                self.exact_hits += 1
+                return entry.response
+            self._remove(key)
+            self.expirations += 1
+
+        nearest = self._nearest(_features(key), now) if self.similarity < 1 else None
+        if nearest is not None:
+            near_key = nearest[0]
+            self._touch(near_key, self._entries[near_key])
+            self.near_hits += 1
+            return self._entries[near_key].response
+
+        self.misses += 1
+        return None
+
+    def put(self, problem_statement: str, response: TaskDecompositionResponse, tenant_id: str = DEFAULT_TENANT_ID):
+        key = cache_key(problem_statement, tenant_id)
+        self._add(key, CacheEntry(response=response, features=_features(key), created_at=time.time()))
+        self._notify("put", key, response)
+
+    def invalidate(self, problem_statement: str, tenant_id: str = DEFAULT_TENANT_ID) -> bool:
+        """删除租户下问题对应的条目（只删除精确匹配的规范化问题），返回条目是否存在"""
+        key = cache_key(problem_statement, tenant_id)
+        found = key in self._entries
+        self._remove(key)
+        self._notify("invalidate", key, None)
+        return found
+
+    def clear(self):
+        self._entries.clear()
+        self._postings.clear()
+        self._notify("clear", None, None)
+
+    def _notify(self, op: str, key: Optional[str], response: Optional[TaskDecompositionResponse]):
+        for listener in self.listeners:
+            listener(op, key, response)
+
+    def apply_remote(self, op: str, key: Optional[str], response: Optional[TaskDecompositionResponse]):
+        """应用其他进程的写入或失效，不再通知监听者"""
+        if op == "put" and key is not None and response is not None:
+            self._add(key, CacheEntry(response=response, features=_features(key), created_at=time.time()))
+        elif op == "invalidate" and key is not None:
+            self._remove(key)
+        elif op == "clear":
+            self._entries.clear()
+            self._postings.clear()
+
+    def save(self) -> int:
+        """把未过期的条目写入磁盘，返回写入条数"""
+        if not self.path:
+            return 0
+        now = time.time()
+        records = [
+            {
+                "key": key,
+                "created_at": entry.created_at,
+                "hits": entry.hits,
+                "response": entry.response.model_dump(mode="json"),
+            }
+            for key, entry in self._entries.items()
+            if not self._expired(entry, now)
+        ]
+        # 先写临时文件再替换，避免进程中途退出留下半个文件
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": _FILE_VERSION, "entries": records}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+        return len(records)
+
+    def load(self) -> int:
+        """从磁盘恢复条目（按LRU顺序），跳过已过期和无法解析的条目，返回恢复条数"""
+        if not self.path or not os.path.exists(self.path):
+            return 0
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return 0
+        if not isinstance(data, dict) or data.get("version") != _FILE_VERSION:
+            return 0
+        records = data.get("entries", [])
+
+        now = time.time()
+        loaded = 0
+        for record in records:
+            try:
+                entry = CacheEntry(
+                    response=TaskDecompositionResponse.model_validate(record["response"]),
+                    features=_features(record["key"]),
+                    created_at=float(record["created_at"]),
+                    hits=int(record.get("hits", 0))
+                )
+            except (KeyError, TypeError, ValueError):
+                continue
+            if self._expired(entry, now):
+                continue
+            self._add(record["key"], entry)
+            loaded += 1
+        return loaded
+
+    def metrics(self) -> Dict[str, Any]:
+        lookups = self.exact_hits + self.near_hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "lookups": lookups,
+            "exact_hits": self.exact_hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.exact_hits + self.near_hits) / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+decomposition_cache = DecompositionCache()
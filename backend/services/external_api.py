@@ -0,0 +1,251 @@
+"""
+外部API集成服务
+通过大模型网关完成任务拆解和学习资源推荐，并把模型输出校验为接口模型
+"""
+
+import json
+from typing import Any, AsyncIterator, Dict, List, Optional, Union
+
+from pydantic import ValidationError
+
+from database.tenancy import DEFAULT_TENANT_ID
+from models.schemas import (
+    TaskDecompositionResponse, ResourceSearchResponse,
+    CognitiveNodeCreate, CognitiveEdgeCreate, RelationshipType
+)
+from services.decomposition_cache import DecompositionCache, decomposition_cache, normalize_problem
+from services.json_stream import ArrayItemScanner
+from services.llm_gateway import (
+    LLMError, LLMGateway, LLMRequest, llm_gateway, build_stub_decomposition
+)
+from services.single_flight import SingleFlight, llm_flight
+
+DECOMPOSITION_SYSTEM_PROMPT = (
+    "你是元认知学习导航助手，帮助学习者把陌生领域中的问题拆解为认知地图。"
+    "只输出JSON，格式为："
+    '{"nodes": [{"name": "概念名", "description": "一句话说明"}], '
+    '"edges": [{"source": 节点下标, "target": 节点下标, '
+    '"relationship_type": "上级|下级|并列|相关", "custom_name": "仅相关关系需要"}]}。'
+    "第一个节点是问题本身，节点数量 4 到 8 个，名称不超过 12 个字。"
+)
+
+RESOURCE_SYSTEM_PROMPT = (
+    "你是学习资源推荐助手。根据查询和学习任务推荐学习资源，只输出JSON，格式为："
+    '{"resources": [{"title": "...", "url": "...", '
+    '"resource_type": "article|video|course|book|documentation", "description": "..."}]}'
+)
+
+MAX_NODES = 12
+MAX_RESOURCES = 10
+
+DecompositionItem = Union[CognitiveNodeCreate, CognitiveEdgeCreate]
+
+
+def _node_index(ref: Any, names: Dict[str, int], count: int) -> Optional[int]:
+    """连线端点可以是下标、'node_下标' 或节点名称"""
+    if isinstance(ref, int):
+        index = ref
+    elif isinstance(ref, str) and ref.isdigit():
+        index = int(ref)
+    elif isinstance(ref, str) and ref.startswith("node_") and ref[5:].isdigit():
+        index = int(ref[5:])
+    else:
+        index = names.get(str(ref).strip(), -1)
+    return index if 0 <= index < count else None
+
+
+def parse_node(raw: Any, index: int) -> Optional[CognitiveNodeCreate]:
+    """把模型输出的单个节点转换为接口模型，无效时返回None"""
+    if not isinstance(raw, dict) or not str(raw.get("name", "")).strip():
+        return None
+    try:
+        return CognitiveNodeCreate(
+            name=str(raw["name"]).strip(),
+            description=raw.get("description"),
+            x=float(raw.get("x", 150.0 + 200.0 * (index % 4))),
+            y=float(raw.get("y", 120.0 + 160.0 * (index // 4)))
+        )
+    except (ValidationError, TypeError, ValueError):
+        return None
+
+
+def parse_edge(raw: Any, names: Dict[str, int], count: int) -> Optional[CognitiveEdgeCreate]:
+    """把模型输出的单条连线转换为接口模型，端点不存在或关系类型无效时返回None"""
+    if not isinstance(raw, dict):
+        return None
+    source = _node_index(raw.get("source", raw.get("source_id")), names, count)
+    target = _node_index(raw.get("target", raw.get("target_id")), names, count)
+    if source is None or target is None or source == target:
+        return None
+    try:
+        relationship_type = RelationshipType(raw.get("relationship_type"))
+    except ValueError:
+        return None
+    custom_name = raw.get("custom_name")
+    if relationship_type == RelationshipType.RELATED and not custom_name:
+        custom_name = relationship_type.value
+    return CognitiveEdgeCreate(
+        source_id=f"node_{source}",
+        target_id=f"node_{target}",
+        relationship_type=relationship_type,
+        custom_name=custom_name
+    )
+
+
+def parse_decomposition(data: Any) -> TaskDecompositionResponse:
+    """
+    把模型输出转换为任务拆解结果
+    无效的节点和连线直接丢弃；连线端点统一为 'node_下标'，与前端的节点编号一致
+    """
+    if not isinstance(data, dict):
+        raise LLMError("Decomposition must be a JSON object")
+
+    nodes: List[CognitiveNodeCreate] = []
+    names: Dict[str, int] = {}
+    for raw in data.get("nodes") or []:
+        if len(nodes) >= MAX_NODES:
+            break
+        node = parse_node(raw, len(nodes))
+        if node is not None:
+            names.setdefault(node.name, len(nodes))
+            nodes.append(node)
+    if not nodes:
+        raise LLMError("Decomposition contains no nodes")
+
+    edges = [
+        edge for edge in (parse_edge(raw, names, len(nodes)) for raw in data.get("edges") or [])
+        if edge is not None
+    ]
+    return TaskDecompositionResponse(nodes=nodes, edges=edges)
+
+
+def local_decomposition(problem_statement: str) -> TaskDecompositionResponse:
+    """不调用模型的本地拆解，模型不可用时兜底"""
+    return parse_decomposition(build_stub_decomposition(problem_statement))
+
+
+def _decomposition_request(problem_statement: str) -> LLMRequest:
+    return LLMRequest(
+        task="task_decomposition",
+        messages=[
+            {"role": "system", "content": DECOMPOSITION_SYSTEM_PROMPT},
+            {"role": "user", "content": f"需要解决的问题：{problem_statement}"},
+        ],
+        context={"problem_statement": problem_statement}
+    )
+
+
+async def decompose_task(
+    problem_statement: str,
+    gateway: LLMGateway = llm_gateway,
+    cache: Optional[DecompositionCache] = decomposition_cache,
+    flight: Optional[SingleFlight] = llm_flight,
+    tenant_id: str = DEFAULT_TENANT_ID
+) -> TaskDecompositionResponse:
+    """
+    调用模型拆解任务，模型调用失败或输出无效时抛出 LLMError
+    同一租户相同或相近的问题直接使用缓存；同一租户同时到达的相同问题只调用一次模型
+    """
+    if cache is not None:
+        cached = cache.get(problem_statement, tenant_id)
+        if cached is not None:
+            return cached
+
+    async def call_model() -> TaskDecompositionResponse:
+        data = await gateway.complete_json(_decomposition_request(problem_statement))
+        try:
+            response = parse_decomposition(data)
+        except (ValidationError, TypeError, ValueError) as exc:
+            raise LLMError(f"Invalid decomposition: {exc}") from exc
+
+        if cache is not None:
+            cache.put(problem_statement, response, tenant_id)
+        return response
+
+    if flight is None:
+        return await call_model()
+    return await flight.do(("task_decomposition", tenant_id, normalize_problem(problem_statement)), call_model)
+
+
+async def stream_decomposition(
+    problem_statement: str,
+    gateway: LLMGateway = llm_gateway,
+    cache: Optional[DecompositionCache] = decomposition_cache,
+    tenant_id: str = DEFAULT_TENANT_ID
+) -> AsyncIterator[DecompositionItem]:
+    """
+    流式拆解任务，每个节点、连线在模型输出中完整出现后立即返回
+    引用了尚未出现的节点的连线暂存，输出结束后再解析；完整结果写入缓存
+    """
+    if cache is not None:
+        cached = cache.get(problem_statement, tenant_id)
+        if cached is not None:
+            for item in [*cached.nodes, *cached.edges]:
+                yield item
+            return
+
+    scanner = ArrayItemScanner()
+    nodes: List[CognitiveNodeCreate] = []
+    names: Dict[str, int] = {}
+    edges: List[CognitiveEdgeCreate] = []
+    pending_edges: List[Any] = []
+
+    async for chunk in gateway.stream(_decomposition_request(problem_statement)):
+        for key, raw in scanner.feed(chunk):
+            if key == "nodes" and len(nodes) < MAX_NODES:
+                node = parse_node(raw, len(nodes))
+                if node is not None:
+                    names.setdefault(node.name, len(nodes))
+                    nodes.append(node)
+                    yield node
+            elif key == "edges":
+                edge = parse_edge(raw, names, len(nodes))
+                if edge is None:
+                    pending_edges.append(raw)
+                else:
+                    edges.append(edge)
+                    yield edge
+
+    if not nodes:
+        raise LLMError("Decomposition contains no nodes")
+    for raw in pending_edges:
+        edge = parse_edge(raw, names, len(nodes))
+        if edge is not None:
+            edges.append(edge)
+            yield edge
+
+    if cache is not None:
+        cache.put(problem_statement, TaskDecompositionResponse(nodes=nodes, edges=edges), tenant_id)
+
+
+async def search_resources(
+    query: str,
+    task_context: Optional[str] = None,
+    gateway: LLMGateway = llm_gateway,
+    flight: Optional[SingleFlight] = llm_flight
+) -> ResourceSearchResponse:
+    """调用模型推荐学习资源，同时到达的相同查询只调用一次模型"""
+    prompt = f"查询：{query}"
+    if task_context:
+        prompt += f"\n学习任务：{task_context}"
+    request = LLMRequest(
+        task="resource_search",
+        messages=[
+            {"role": "system", "content": RESOURCE_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt},
+        ],
+        context={"query": query, "task_context": task_context}
+    )
+    if flight is None:
+        data = await gateway.complete_json(request)
+    else:
+        key = ("resource_search", normalize_problem(query), normalize_problem(task_context or ""))
+        data = await flight.do(key, lambda: gateway.complete_json(request))
+
+    resources = data.get("resources") if isinstance(data, dict) else None
+    if not isinstance(resources, list):
+        raise LLMError(f"Invalid resource list: {json.dumps(data, ensure_ascii=False)[:200]}")
+    return ResourceSearchResponse(resources=[
+        resource for resource in resources[:MAX_RESOURCES]
+        if isinstance(resource, dict) and resource.get("title")
+    ])
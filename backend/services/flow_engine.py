@@ -1,9 +1,16 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update
-from database.models import LearningSessionDB, SubTaskDB
-from models.schemas import JOLLevel, FOKLevel, ConfidenceLevel, TimeAllocation, MasteryLevel, SubTaskCreate
+from sqlalchemy import select, update, insert
+from database.models import LearningSessionDB, SubTaskDB, ReviewItemDB, generate_uuid
+from database.tenancy import DEFAULT_TENANT_ID
+from models.schemas import (
+    JOLLevel, FOKLevel, ConfidenceLevel, TimeAllocation, MasteryLevel, SubTaskCreate,
+    BatchItemResult
+)
 from services.subtask_generator import SubTaskGenerator
-from typing import Dict, Any, List
+from services.session_timer import session_timer
+from services.review_scheduler import review_scheduler, SCORE_TO_QUALITY
+from typing import Dict, Any, List, Tuple
+from datetime import datetime, timedelta
 
 
 class FlowEngine:
@@ -29,6 +36,16 @@ class FlowEngine:
         MasteryLevel.INTUITIVE_UNDERSTANDING: 2
     }
     
+    # 批量操作时每个分块的行数，限制单次executemany和ORM身份映射的内存占用
+    BATCH_CHUNK_SIZE = 500
+    
+    def __init__(self, tenant_id: str = DEFAULT_TENANT_ID):
+        # 只处理该租户的会话，其他租户的会话按不存在处理
+        self.tenant_id = tenant_id
+    
+    def _owned(self, session_id: str):
+        return (LearningSessionDB.id == session_id) & (LearningSessionDB.tenant_id == self.tenant_id)
+    
     async def process_jol_assessment(
         self, 
         session_id: str, 
@@ -38,7 +55,7 @@ class FlowEngine:
         """处理JOL评估，返回下一步"""
         # 获取会话
         result = await db.execute(
-            select(LearningSessionDB).where(LearningSessionDB.id == session_id)
+            select(LearningSessionDB).where(self._owned(session_id))
         )
         session = result.scalar_one_or_none()
         
@@ -56,6 +73,11 @@ class FlowEngine:
         # 进行预期对比
         next_step = await self._compare_with_expectation(session, jol_score, db)
         
+        # 自评结果同时安排会话下子任务的间隔复习
+        await review_scheduler.record_session_subtasks(
+            self.tenant_id, {session_id: SCORE_TO_QUALITY[jol_score]}, db
+        )
+        
         # 更新会话
         await db.execute(
             update(LearningSessionDB)
@@ -78,7 +100,7 @@ class FlowEngine:
         """处理FOK评估，返回下一步"""
         # 获取会话
         result = await db.execute(
-            select(LearningSessionDB).where(LearningSessionDB.id == session_id)
+            select(LearningSessionDB).where(self._owned(session_id))
         )
         session = result.scalar_one_or_none()
         
@@ -96,6 +118,11 @@ class FlowEngine:
         # 进行预期对比
         next_step = await self._compare_with_expectation(session, fok_score, db)
         
+        # 自评结果同时安排会话下子任务的间隔复习
+        await review_scheduler.record_session_subtasks(
+            self.tenant_id, {session_id: SCORE_TO_QUALITY[fok_score]}, db
+        )
+        
         # 更新会话
         await db.execute(
             update(LearningSessionDB)
@@ -144,7 +171,7 @@ class FlowEngine:
         """处理信心评估，返回下一步"""
         # 获取会话
         result = await db.execute(
-            select(LearningSessionDB).where(LearningSessionDB.id == session_id)
+            select(LearningSessionDB).where(self._owned(session_id))
         )
         session = result.scalar_one_or_none()
         
@@ -185,7 +212,7 @@ class FlowEngine:
         """处理时间分配，返回下一步"""
         # 获取会话
         result = await db.execute(
-            select(LearningSessionDB).where(LearningSessionDB.id == session_id)
+            select(LearningSessionDB).where(self._owned(session_id))
         )
         session = result.scalar_one_or_none()
         
@@ -207,6 +234,12 @@ class FlowEngine:
         session_data['allocated_minutes'] = time_minutes[time_allocation]
         next_step = "learning_in_progress"
         
+        # 记录倒计时截止时间，服务重启后据此恢复计时器
+        started_at = datetime.utcnow()
+        deadline = started_at + timedelta(minutes=session_data['allocated_minutes'])
+        session_data['timer_started_at'] = started_at.isoformat()
+        session_data['timer_deadline'] = deadline.isoformat()
+        
         # 更新会话
         await db.execute(
             update(LearningSessionDB)
@@ -218,6 +251,8 @@ class FlowEngine:
         )
         await db.commit()
         
+        session_timer.schedule(session_id, deadline)
+        
         return next_step
     
     async def process_obstacle_assessment(
@@ -229,7 +264,7 @@ class FlowEngine:
         """处理学习阻碍评估"""
         # 获取会话
         result = await db.execute(
-            select(LearningSessionDB).where(LearningSessionDB.id == session_id)
+            select(LearningSessionDB).where(self._owned(session_id))
         )
         session = result.scalar_one_or_none()
         
@@ -270,7 +305,7 @@ class FlowEngine:
 
         # 获取会话信息
         result = await db.execute(
-            select(LearningSessionDB).where(LearningSessionDB.id == session_id)
+            select(LearningSessionDB).where(self._owned(session_id))
         )
         session = result.scalar_one_or_none()
 
@@ -279,15 +314,21 @@ class FlowEngine:
 
         # 使用子任务生成器
         generator = SubTaskGenerator()
-        subtasks = generator.generate_subtasks(
+        subtasks = await generator.generate_subtasks_async(
             source_node_name=source_node_name,
             target_node_name=target_node_name,
             relationship_type=relationship_type,
             problem_context=session.problem_statement
         )
 
-        # 删除现有子任务
+        # 删除现有子任务及其复习项
         from sqlalchemy import delete
+        await db.execute(
+            delete(ReviewItemDB).where(
+                ReviewItemDB.session_id == session_id,
+                ReviewItemDB.item_type == "subtask"
+            )
+        )
         await db.execute(
             delete(SubTaskDB).where(SubTaskDB.session_id == session_id)
         )
@@ -305,14 +346,145 @@ class FlowEngine:
             db.add(db_task)
             created_tasks.append(task_data)
 
-        await db.commit()
-
-        # 更新会话状态
-        await db.execute(
-            update(LearningSessionDB)
-            .where(LearningSessionDB.id == session_id)
-            .values(current_step="expectation_setting")
-        )
+        # 更新会话状态，与子任务在同一个事务中提交
+        session.current_step = "expectation_setting"
         await db.commit()
 
         return created_tasks
+
+    async def create_sessions_batch(
+        self,
+        problem_statements: List[str],
+        db: AsyncSession
+    ) -> List[BatchItemResult]:
+        """批量创建学习会话，分块executemany插入，整体在一个事务中提交"""
+        results = []
+        
+        for start in range(0, len(problem_statements), self.BATCH_CHUNK_SIZE):
+            chunk = problem_statements[start:start + self.BATCH_CHUNK_SIZE]
+            now = datetime.utcnow()
+            rows = []
+            
+            for offset, problem_statement in enumerate(chunk):
+                index = start + offset
+                if not problem_statement or not problem_statement.strip():
+                    results.append(BatchItemResult(
+                        index=index, success=False, error="Problem statement is empty"
+                    ))
+                    continue
+                
+                session_id = generate_uuid()
+                rows.append({
+                    "id": session_id,
+                    "tenant_id": self.tenant_id,
+                    "problem_statement": problem_statement,
+                    "current_step": "problem_input",
+                    "session_data": {},
+                    "created_at": now,
+                    "updated_at": now
+                })
+                results.append(BatchItemResult(
+                    index=index, success=True, id=session_id, next_step="problem_input"
+                ))
+            
+            if rows:
+                await db.execute(insert(LearningSessionDB), rows)
+        
+        await db.commit()
+        
+        return results
+    
+    async def process_jol_assessments_batch(
+        self,
+        assessments: List[Tuple[str, JOLLevel]],
+        db: AsyncSession
+    ) -> List[BatchItemResult]:
+        """批量处理JOL评估，输入为(session_id, JOL等级)列表"""
+        items = [
+            (session_id, jol_level.value, self.JOL_SCORES[jol_level])
+            for session_id, jol_level in assessments
+        ]
+        return await self._process_scores_batch(items, "jol", db)
+    
+    async def process_fok_assessments_batch(
+        self,
+        assessments: List[Tuple[str, FOKLevel]],
+        db: AsyncSession
+    ) -> List[BatchItemResult]:
+        """批量处理FOK评估，输入为(session_id, FOK等级)列表"""
+        items = [
+            (session_id, fok_level.value, self.FOK_SCORES[fok_level])
+            for session_id, fok_level in assessments
+        ]
+        return await self._process_scores_batch(items, "fok", db)
+    
+    async def _process_scores_batch(
+        self,
+        items: List[Tuple[str, str, int]],
+        prefix: str,
+        db: AsyncSession
+    ) -> List[BatchItemResult]:
+        """
+        批量评估的公共流程
+        
+        每个分块只查询一次会话，逐条做预期对比后用executemany按主键更新，
+        所有分块在同一个事务中提交。
+        """
+        results = []
+        
+        for start in range(0, len(items), self.BATCH_CHUNK_SIZE):
+            chunk = items[start:start + self.BATCH_CHUNK_SIZE]
+            session_ids = {session_id for session_id, _, _ in chunk}
+            
+            result = await db.execute(
+                select(LearningSessionDB).where(
+                    LearningSessionDB.id.in_(session_ids),
+                    LearningSessionDB.tenant_id == self.tenant_id
+                )
+            )
+            sessions = {session.id: session for session in result.scalars().all()}
+            
+            # 同一会话在批次中出现多次时，后面的评估覆盖前面的
+            updates: Dict[str, Dict[str, Any]] = {}
+            for offset, (session_id, assessment_value, score) in enumerate(chunk):
+                index = start + offset
+                session = sessions.get(session_id)
+                
+                if not session:
+                    results.append(BatchItemResult(
+                        index=index, success=False, id=session_id, error="Session not found"
+                    ))
+                    continue
+                
+                session_data = session.session_data or {}
+                session_data[f'{prefix}_assessment'] = assessment_value
+                session_data[f'{prefix}_score'] = score
+                
+                next_step = await self._compare_with_expectation(session, score, db)
+                
+                updates[session_id] = {
+                    "id": session_id,
+                    "current_step": next_step,
+                    "session_data": dict(session_data)
+                }
+                results.append(BatchItemResult(
+                    index=index, success=True, id=session_id, next_step=next_step
+                ))
+            
+            if updates:
+                await db.execute(update(LearningSessionDB), list(updates.values()))
+                await review_scheduler.record_session_subtasks(
+                    self.tenant_id,
+                    {
+                        session_id: SCORE_TO_QUALITY[values["session_data"][f'{prefix}_score']]
+                        for session_id, values in updates.items()
+                    },
+                    db
+                )
+            
+            # 释放本分块加载的ORM对象
+            db.expunge_all()
+        
+        await db.commit()
+        
+        return results
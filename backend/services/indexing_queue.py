@@ -0,0 +1,207 @@
+"""
+知识卡片后台关键词索引队列
+卡片写入时立即返回，由后台工作协程提取关键词和短语，回写卡片并更新搜索索引
+"""
+
+import asyncio
+import itertools
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import update
+
+from database.database import AsyncSessionLocal
+from database.models import KnowledgeCardDB
+from database.tenancy import DEFAULT_TENANT_ID
+from services.card_index import card_index
+from services.keyword_extractor import KeywordExtractor
+
+
+@dataclass
+class IndexingJob:
+    card_id: str
+    title: str
+    content: str
+    updated_at: Optional[datetime]  # 写入时的版本，卡片之后又被修改则放弃本次回写
+    tenant_id: str = DEFAULT_TENANT_ID  # 回写后更新该租户的搜索索引分片
+    enqueued_at: float = field(default_factory=time.monotonic)
+    attempts: int = 0
+    future: Optional[asyncio.Future] = None
+
+
+class KeywordIndexingQueue:
+    """有界的关键词提取队列"""
+
+    MAX_KEYWORDS = 10
+    MAX_PHRASES = 3
+
+    def __init__(
+        self,
+        workers: int = int(os.getenv("INDEXING_WORKERS", "2")),
+        maxsize: int = int(os.getenv("INDEXING_QUEUE_SIZE", "1000")),
+        max_retries: int = 3,
+        session_factory=AsyncSessionLocal
+    ):
+        self.workers = workers
+        self.maxsize = maxsize
+        self.max_retries = max_retries
+        self._session_factory = session_factory
+        self._extractor = KeywordExtractor()
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._pending: "OrderedDict[int, IndexingJob]" = OrderedDict()  # 按入队顺序，首个即最老的任务
+        self._job_ids = itertools.count()
+
+        # 指标
+        self.processed = 0
+        self.failed = 0
+        self.retried = 0
+        self.skipped = 0
+        self.inline = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self):
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+
+    async def submit(
+        self,
+        card_id: str,
+        title: str,
+        content: str,
+        updated_at: Optional[datetime],
+        tenant_id: str = DEFAULT_TENANT_ID
+    ) -> asyncio.Future:
+        """
+        提交一张卡片的关键词提取任务，返回任务完成时结束的future
+
+        队列满或后台工作协程未启动时直接在当前请求中处理，以此形成背压。
+        """
+        job = IndexingJob(card_id, title, content, updated_at, tenant_id)
+        job.future = asyncio.get_running_loop().create_future()
+
+        if self._queue is None:
+            self.inline += 1
+            await self._run_job(job)
+            return job.future
+
+        job_id = next(self._job_ids)
+        try:
+            self._queue.put_nowait((job_id, job))
+        except asyncio.QueueFull:
+            self.inline += 1
+            await self._run_job(job)
+            return job.future
+
+        self._pending[job_id] = job
+        return job.future
+
+    def extract(self, title: str, content: str) -> List[str]:
+        """提取关键词和短语，合并去重"""
+        text = f"{title} {content}"
+        keywords = self._extractor.extract_keywords(text, self.MAX_KEYWORDS)
+        phrases = self._extractor.extract_phrases(text, self.MAX_PHRASES)
+        return list(dict.fromkeys(keywords + phrases))
+
+    async def _worker(self):
+        while True:
+            job_id, job = await self._queue.get()
+            try:
+                await self._run_job(job)
+            finally:
+                self._pending.pop(job_id, None)
+                self._queue.task_done()
+
+    async def _run_job(self, job: IndexingJob):
+        while True:
+            try:
+                keywords = await asyncio.to_thread(self.extract, job.title, job.content)
+                applied = await self._apply(job, keywords)
+            except Exception as exc:
+                job.attempts += 1
+                if job.attempts > self.max_retries:
+                    self.failed += 1
+                    print(f"Keyword indexing failed for card {job.card_id}: {exc}")
+                    if not job.future.done():
+                        job.future.set_result(None)
+                    return
+                self.retried += 1
+                await asyncio.sleep(min(2 ** job.attempts * 0.1, 5))
+                continue
+
+            lag = time.monotonic() - job.enqueued_at
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            if applied:
+                self.processed += 1
+            else:
+                self.skipped += 1
+            if not job.future.done():
+                job.future.set_result(keywords if applied else None)
+            return
+
+    async def _apply(self, job: IndexingJob, keywords: List[str]) -> bool:
+        """回写关键词并更新搜索索引，卡片已被删除或修改时返回False"""
+        async with self._session_factory() as db:
+            stmt = update(KnowledgeCardDB).where(KnowledgeCardDB.id == job.card_id)
+            if job.updated_at is not None:
+                stmt = stmt.where(KnowledgeCardDB.updated_at == job.updated_at)
+            # 关键词回写属于同一次写入，不改变卡片的更新时间
+            result = await db.execute(
+                stmt.values(
+                    keywords=keywords,
+                    version=KnowledgeCardDB.version + 1,
+                    updated_at=KnowledgeCardDB.updated_at
+                )
+            )
+            await db.commit()
+
+        if result.rowcount == 0:
+            return False
+
+        card_index.upsert(job.tenant_id, job.card_id, job.title, job.content, keywords)
+        return True
+
+    def metrics(self) -> Dict[str, Any]:
+        """队列状态和索引延迟指标（秒）"""
+        oldest_pending_age = 0.0
+        if self._pending:
+            oldest = next(iter(self._pending.values()))
+            oldest_pending_age = time.monotonic() - oldest.enqueued_at
+
+        return {
+            "running": self.running,
+            "workers": self.workers,
+            "queue_size": self._queue.qsize() if self._queue else 0,
+            "queue_capacity": self.maxsize,
+            "pending": len(self._pending),
+            "processed": self.processed,
+            "skipped": self.skipped,
+            "failed": self.failed,
+            "retried": self.retried,
+            "inline": self.inline,
+            "index_lag_seconds": oldest_pending_age,
+            "last_lag_seconds": self.last_lag,
+            "max_lag_seconds": self.max_lag
+        }
+
+
+indexing_queue = KeywordIndexingQueue()
@@ -0,0 +1,62 @@
+"""
+增量JSON扫描
+模型的流式输出是 {"nodes": [{...}, {...}], "edges": [...]} 这样的文本片段，
+这里逐字符扫描，顶层对象中数组的某个元素对象一旦完整就立即返回，不必等整段输出结束。
+"""
+
+import json
+from typing import Any, List, Optional, Tuple
+
+
+class ArrayItemScanner:
+    """返回顶层对象中各数组的已完成元素 (数组键名, 元素)"""
+
+    def __init__(self):
+        self._stack: List[str] = []  # 尚未闭合的 '{' / '['
+        self._in_string = False
+        self._escape = False
+        self._string_chars: List[str] = []
+        self._last_key: Optional[str] = None  # 顶层对象中最近出现的字符串，即下一个值的键名
+        self._array_key: Optional[str] = None
+        self._item_chars: Optional[List[str]] = None  # 正在读取的数组元素
+
+    def feed(self, text: str) -> List[Tuple[Optional[str], Any]]:
+        items = []
+        for ch in text:
+            if self._item_chars is not None:
+                self._item_chars.append(ch)
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if len(self._stack) == 1:
+                        self._last_key = "".join(self._string_chars)
+                elif len(self._stack) == 1:
+                    self._string_chars.append(ch)
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                self._string_chars = []
+            elif ch == "[":
+                if len(self._stack) == 1:
+                    self._array_key = self._last_key
+                self._stack.append(ch)
+            elif ch == "{":
+                if self._stack == ["{", "["]:
+                    self._item_chars = ["{"]
+                self._stack.append(ch)
+            elif ch in "}]" and self._stack:
+                self._stack.pop()
+                if ch == "}" and self._item_chars is not None and self._stack == ["{", "["]:
+                    raw = "".join(self._item_chars)
+                    self._item_chars = None
+                    try:
+                        items.append((self._array_key, json.loads(raw)))
+                    except ValueError:
+                        pass
+        return items
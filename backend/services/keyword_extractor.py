@@ -3,29 +3,54 @@ from typing import List, Set
 from collections import Counter
 
 
+# 中文停用词
+CHINESE_STOPWORDS = frozenset({
+    '的', '了', '在', '是', '我', '有', '和', '就', '不', '人', '都', '一', '一个',
+    '上', '也', '很', '到', '说', '要', '去', '你', '会', '着', '没有', '看', '好',
+    '自己', '这', '那', '里', '就是', '什么', '怎么', '可以', '这个', '那个',
+    '如何', '为什么', '怎样', '学习', '了解', '掌握', '理解', '知道'
+})
+
+# 英文停用词
+ENGLISH_STOPWORDS = frozenset({
+    'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for',
+    'of', 'with', 'by', 'is', 'are', 'was', 'were', 'be', 'been', 'being',
+    'have', 'has', 'had', 'do', 'does', 'did', 'will', 'would', 'could',
+    'should', 'may', 'might', 'must', 'can', 'this', 'that', 'these',
+    'those', 'i', 'you', 'he', 'she', 'it', 'we', 'they', 'me', 'him',
+    'her', 'us', 'them', 'my', 'your', 'his', 'her', 'its', 'our', 'their',
+    'what', 'how', 'when', 'where', 'why', 'which', 'who', 'whom', 'whose',
+    'learn', 'study', 'understand', 'know', 'master'
+})
+
+# 技术术语词典：概念 -> 同义写法
+TECH_TERMS = {
+    '大模型': ['大模型', 'LLM', 'Large Language Model'],
+    '内存管理': ['内存管理', 'Memory Management', '内存优化'],
+    '记忆机制': ['记忆', '记忆机制', 'Memory Mechanism'],
+    '神经网络': ['神经网络', 'Neural Network', 'NN'],
+    '深度学习': ['深度学习', 'Deep Learning', 'DL'],
+    '机器学习': ['机器学习', 'Machine Learning', 'ML'],
+    '人工智能': ['人工智能', 'AI', 'Artificial Intelligence'],
+    '自然语言处理': ['NLP', '自然语言处理', 'Natural Language Processing'],
+    '注意力机制': ['注意力机制', 'Attention Mechanism', 'Attention'],
+    'Transformer': ['Transformer', 'transformer'],
+    'GPT': ['GPT', 'gpt'],
+    '向量数据库': ['向量数据库', 'Vector Database'],
+    '嵌入': ['嵌入', 'Embedding', 'embeddings']
+}
+# 匹配时使用的小写形式，模块加载时只计算一次
+_TECH_TERMS_LOWER = [
+    (concept, [term.lower() for term in terms]) for concept, terms in TECH_TERMS.items()
+]
+
+
 class KeywordExtractor:
     """关键词提取服务"""
     
     def __init__(self):
-        # 中文停用词
-        self.chinese_stopwords = {
-            '的', '了', '在', '是', '我', '有', '和', '就', '不', '人', '都', '一', '一个',
-            '上', '也', '很', '到', '说', '要', '去', '你', '会', '着', '没有', '看', '好',
-            '自己', '这', '那', '里', '就是', '什么', '怎么', '可以', '这个', '那个',
-            '如何', '为什么', '怎样', '学习', '了解', '掌握', '理解', '知道'
-        }
-        
-        # 英文停用词
-        self.english_stopwords = {
-            'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for',
-            'of', 'with', 'by', 'is', 'are', 'was', 'were', 'be', 'been', 'being',
-            'have', 'has', 'had', 'do', 'does', 'did', 'will', 'would', 'could',
-            'should', 'may', 'might', 'must', 'can', 'this', 'that', 'these',
-            'those', 'i', 'you', 'he', 'she', 'it', 'we', 'they', 'me', 'him',
-            'her', 'us', 'them', 'my', 'your', 'his', 'her', 'its', 'our', 'their',
-            'what', 'how', 'when', 'where', 'why', 'which', 'who', 'whom', 'whose',
-            'learn', 'study', 'understand', 'know', 'master'
-        }
+        self.chinese_stopwords = CHINESE_STOPWORDS
+        self.english_stopwords = ENGLISH_STOPWORDS
     
     def extract_keywords(self, text: str, max_keywords: int = 10) -> List[str]:
         """从文本中提取关键词"""
@@ -61,28 +86,11 @@ class KeywordExtractor:
         """提取技术术语"""
         tech_terms = []
 
-        # 定义技术术语词典
-        tech_dict = {
-            '大模型': ['大模型', 'LLM', 'Large Language Model'],
-            '内存管理': ['内存管理', 'Memory Management', '内存优化'],
-            '记忆机制': ['记忆', '记忆机制', 'Memory Mechanism'],
-            '神经网络': ['神经网络', 'Neural Network', 'NN'],
-            '深度学习': ['深度学习', 'Deep Learning', 'DL'],
-            '机器学习': ['机器学习', 'Machine Learning', 'ML'],
-            '人工智能': ['人工智能', 'AI', 'Artificial Intelligence'],
-            '自然语言处理': ['NLP', '自然语言处理', 'Natural Language Processing'],
-            '注意力机制': ['注意力机制', 'Attention Mechanism', 'Attention'],
-            'Transformer': ['Transformer', 'transformer'],
-            'GPT': ['GPT', 'gpt'],
-            '向量数据库': ['向量数据库', 'Vector Database'],
-            '嵌入': ['嵌入', 'Embedding', 'embeddings']
-        }
-
         text_lower = text.lower()
 
-        for concept, terms in tech_dict.items():
+        for concept, terms in _TECH_TERMS_LOWER:
             for term in terms:
-                if term.lower() in text_lower:
+                if term in text_lower:
                     tech_terms.append(concept)
                     break
 
@@ -152,6 +160,27 @@ class KeywordExtractor:
         
         return filtered
     
+    def extract_shingles(self, text: str, size: int = 2) -> Set[str]:
+        """
+        提取词片段（shingle）集合，用于近似重复检测
+
+        中文按重叠的二字组切分（插入或删除一个字只影响附近的片段），英文按单词并去掉停用词，
+        再把相邻 size 个词拼成一个片段；词数不足 size 时返回各个词本身。
+        """
+        if not text:
+            return set()
+
+        words = []
+        for token in re.findall(r'[a-z]+|[\u4e00-\u9fa5]+|[0-9]+', self._clean_text(text)):
+            if self._is_chinese_word(token):
+                words.extend(token[i:i + 2] for i in range(max(len(token) - 1, 1)))
+            elif token not in self.english_stopwords:
+                words.append(token)
+
+        if len(words) < size:
+            return set(words)
+        return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
     def extract_keywords_with_weights(self, text: str, max_keywords: int = 10) -> List[tuple[str, float]]:
         """提取关键词并返回权重"""
         if not text:
@@ -201,3 +230,9 @@ class KeywordExtractor:
         # 计算短语频率并返回最常见的
         phrase_freq = Counter(phrases)
         return [phrase for phrase, freq in phrase_freq.most_common(max_phrases)]
+
+
+def extract_keywords_batch(texts: List[str], max_keywords: int = 10) -> List[List[str]]:
+    """批量提取关键词（模块级函数，可提交到进程池并行执行）"""
+    extractor = KeywordExtractor()
+    return [extractor.extract_keywords(text, max_keywords) for text in texts]
@@ -0,0 +1,493 @@
+"""
+大模型调用网关
+统一处理连接复用、并发上限、超时和带抖动的指数退避重试，具体的模型服务由 Provider 实现。
+未配置 OPENAI_API_KEY 时使用确定性的本地 Stub，离线环境下也能完整运行和压测。
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import time
+from abc import ABC, abstractmethod
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, List, Optional
+
+from services.keyword_extractor import KeywordExtractor
+
+if TYPE_CHECKING:
+    import httpx
+
+# openai / stub；为空时配置了 OPENAI_API_KEY 就用 openai，否则用 stub
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "")
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "30"))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5"))
+LLM_RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", "8"))
+LLM_HTTP2 = os.getenv("LLM_HTTP2", "true").lower() == "true"
+# Stub 模拟的响应延迟，压测时用来近似真实模型的耗时；流式输出时均摊到每个分段
+LLM_STUB_LATENCY_MS = float(os.getenv("LLM_STUB_LATENCY_MS", "0"))
+LLM_STUB_CHUNK_SIZE = int(os.getenv("LLM_STUB_CHUNK_SIZE", "24"))
+
+
+def http2_available() -> bool:
+    """httpx 的 HTTP/2 支持依赖 h2（可选）"""
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class LLMError(Exception):
+    """模型调用失败；retryable 表示可以重试（超时、限流、服务端错误）"""
+
+    def __init__(self, message: str, retryable: bool = False, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+
+@dataclass
+class LLMRequest:
+    task: str  # 调用用途，如 task_decomposition，用于统计和Stub生成结果
+    messages: List[Dict[str, str]]
+    context: Dict[str, Any] = field(default_factory=dict)  # 结构化输入，Stub据此生成结果
+    temperature: float = 0.3
+    max_tokens: int = 1500
+    json_mode: bool = True
+
+
+class LLMProvider(ABC):
+    """模型服务接口，子类至少实现 complete"""
+
+    name = "base"
+
+    @abstractmethod
+    async def complete(self, request: LLMRequest) -> str:
+        """返回模型的完整输出"""
+
+    async def stream(self, request: LLMRequest) -> AsyncIterator[str]:
+        """逐段返回模型输出，默认一次返回完整结果"""
+        yield await self.complete(request)
+
+    async def aclose(self):
+        pass
+
+
+def _parse_retry_after(response: "httpx.Response") -> Optional[float]:
+    value = response.headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+class OpenAIProvider(LLMProvider):
+    """OpenAI 兼容的 Chat Completions 接口"""
+
+    name = "openai"
+
+    def __init__(self, api_key: str, base_url: str = OPENAI_BASE_URL, model: str = OPENAI_MODEL):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.model = model
+        self._client: Optional["httpx.AsyncClient"] = None
+
+    def _get_client(self) -> "httpx.AsyncClient":
+        """共享一个客户端，复用连接池；装有 h2 时启用 HTTP/2 多路复用"""
+        if self._client is None:
+            import httpx  # 导入较慢（约0.2秒），只在真正调用模型服务时加载，不拖慢冷启动
+
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                http2=LLM_HTTP2 and http2_available(),
+                limits=httpx.Limits(
+                    max_connections=LLM_MAX_CONNECTIONS,
+                    max_keepalive_connections=LLM_MAX_CONNECTIONS
+                ),
+                timeout=httpx.Timeout(LLM_TIMEOUT, connect=LLM_CONNECT_TIMEOUT)
+            )
+        return self._client
+
+    def _payload(self, request: LLMRequest, stream: bool = False) -> Dict[str, Any]:
+        payload = {
+            "model": self.model,
+            "messages": request.messages,
+            "temperature": request.temperature,
+            "max_tokens": request.max_tokens,
+        }
+        if request.json_mode:
+            payload["response_format"] = {"type": "json_object"}
+        if stream:
+            payload["stream"] = True
+        return payload
+
+    @staticmethod
+    def _check_status(response: "httpx.Response", body: str):
+        if response.status_code == 429 or response.status_code >= 500:
+            raise LLMError(
+                f"OpenAI returned {response.status_code}",
+                retryable=True,
+                retry_after=_parse_retry_after(response)
+            )
+        if response.status_code >= 400:
+            raise LLMError(f"OpenAI returned {response.status_code}: {body[:200]}")
+
+    async def complete(self, request: LLMRequest) -> str:
+        import httpx
+
+        try:
+            response = await self._get_client().post("/chat/completions", json=self._payload(request))
+        except httpx.TimeoutException as exc:
+            raise LLMError(f"OpenAI request timed out: {exc!r}", retryable=True) from exc
+        except httpx.TransportError as exc:
+            raise LLMError(f"OpenAI connection error: {exc!r}", retryable=True) from exc
+
+        self._check_status(response, response.text)
+        try:
+            return response.json()["choices"][0]["message"]["content"]
+        except (ValueError, KeyError, IndexError) as exc:
+            raise LLMError("Malformed OpenAI response") from exc
+
+    async def stream(self, request: LLMRequest) -> AsyncIterator[str]:
+        """按 SSE 读取增量输出（data: {...choices[0].delta.content...}）"""
+        import httpx
+
+        try:
+            async with self._get_client().stream(
+                "POST", "/chat/completions", json=self._payload(request, stream=True)
+            ) as response:
+                if response.status_code >= 400:
+                    body = (await response.aread()).decode("utf-8", "replace")
+                    self._check_status(response, body)
+
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == "[DONE]":
+                        break
+                    try:
+                        delta = json.loads(data)["choices"][0].get("delta", {}).get("content")
+                    except (ValueError, KeyError, IndexError) as exc:
+                        raise LLMError("Malformed OpenAI stream chunk") from exc
+                    if delta:
+                        yield delta
+        except httpx.TimeoutException as exc:
+            raise LLMError(f"OpenAI request timed out: {exc!r}", retryable=True) from exc
+        except httpx.TransportError as exc:
+            raise LLMError(f"OpenAI connection error: {exc!r}", retryable=True) from exc
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+# 关键词不足时补充的通用学习维度
+_STUB_ASPECTS = [
+    ("基础概念", "掌握{topic}涉及的核心术语和基本定义"),
+    ("核心原理", "理解{topic}背后的工作原理和关键机制"),
+    ("实践应用", "通过实例和练习把{topic}用到具体问题上"),
+    ("常见问题", "了解学习{topic}时容易出现的误区和难点"),
+]
+_STUB_RESOURCE_TYPES = ["article", "video", "course", "book", "documentation"]
+
+
+def build_stub_decomposition(problem_statement: str, max_nodes: int = 6) -> Dict[str, Any]:
+    """
+    基于关键词的确定性任务拆解
+    根节点为问题本身，关键词和通用学习维度作为下级节点，相邻子节点标记为并列
+    """
+    extractor = KeywordExtractor()
+    topic = problem_statement.strip()[:30] or "目标任务"
+    keywords = [k for k in extractor.extract_keywords(problem_statement, max_nodes) if k != topic]
+
+    nodes = [{"name": topic, "description": f"需要解决的目标问题：{problem_statement.strip()}"}]
+    for keyword in keywords[:max_nodes - 1]:
+        nodes.append({"name": keyword, "description": f"与“{topic}”相关的关键知识点：{keyword}"})
+    for aspect, template in _STUB_ASPECTS:
+        if len(nodes) >= 4:
+            break
+        nodes.append({"name": f"{topic}的{aspect}", "description": template.format(topic=topic)})
+
+    # 根节点居中，子节点在上下两行交错排开
+    count = len(nodes) - 1
+    nodes[0].update(x=400.0, y=300.0)
+    for i, node in enumerate(nodes[1:]):
+        node.update(x=400.0 + 220.0 * (i - (count - 1) / 2), y=120.0 if i % 2 == 0 else 480.0)
+
+    edges = [
+        {"source": 0, "target": i, "relationship_type": "下级"}
+        for i in range(1, len(nodes))
+    ]
+    edges += [
+        {"source": i, "target": i + 1, "relationship_type": "并列"}
+        for i in range(1, len(nodes) - 1)
+    ]
+    return {"nodes": nodes, "edges": edges}
+
+
+def build_stub_resources(query: str, task_context: Optional[str] = None, limit: int = 5) -> Dict[str, Any]:
+    """确定性的学习资源建议，结果只依赖查询和任务上下文"""
+    seed = hashlib.sha256(f"{query}\n{task_context or ''}".encode("utf-8")).hexdigest()
+    rng = random.Random(seed)
+    slug = re.sub(r"\s+", "-", query.strip().lower()) or "topic"
+
+    resources = []
+    for i in range(limit):
+        resource_type = _STUB_RESOURCE_TYPES[(int(seed[:8], 16) + i) % len(_STUB_RESOURCE_TYPES)]
+        resources.append({
+            "title": f"{query} {['入门', '进阶', '实战', '原理', '参考'][i % 5]}（{resource_type}）",
+            "url": f"https://example.org/{resource_type}/{slug}-{i + 1}",
+            "resource_type": resource_type,
+            "description": f"围绕“{task_context or query}”整理的{resource_type}资料",
+            "relevance": round(1.0 - i * 0.1 - rng.random() * 0.05, 3),
+        })
+    return {"resources": resources}
+
+
+def build_stub_subtasks(edges: List[Dict[str, Any]], problem_context: str = "") -> Dict[str, Any]:
+    """按连线批量生成确定性的子任务，格式与子任务生成提示词要求的输出一致"""
+    results = []
+    for index, edge in enumerate(edges):
+        source, target = edge.get("source", ""), edge.get("target", "")
+        relationship = edge.get("relationship_type", "相关")
+        results.append({
+            "index": index,
+            "subtasks": [
+                {
+                    "name": f"梳理 {source} 与 {target} 的前置知识",
+                    "description": f"列出从 {source} 过渡到 {target} 需要的概念，标出尚不熟悉的部分",
+                    "mastery_expectation": "建立表象的直觉理解",
+                },
+                {
+                    "name": f"解释 {source} 与 {target} 的{relationship}关系",
+                    "description": f"用一个{problem_context[:20] or '具体'}相关的例子说明两者的关系",
+                    "mastery_expectation": "语义级别的公式推导",
+                },
+                {
+                    "name": f"完成 {target} 的小练习",
+                    "description": f"做一道练习题，检验能否独立运用 {target}",
+                    "mastery_expectation": "语义级别的公式推导",
+                },
+            ],
+        })
+    return {"edges": results}
+
+
+class StubProvider(LLMProvider):
+    """不访问网络的确定性实现，相同输入总是得到相同输出"""
+
+    name = "stub"
+
+    def __init__(self, latency_ms: float = LLM_STUB_LATENCY_MS, chunk_size: int = LLM_STUB_CHUNK_SIZE):
+        self.latency_ms = latency_ms
+        self.chunk_size = chunk_size
+
+    async def complete(self, request: LLMRequest) -> str:
+        if self.latency_ms > 0:
+            await asyncio.sleep(self.latency_ms / 1000)
+        return self._render(request)
+
+    async def stream(self, request: LLMRequest) -> AsyncIterator[str]:
+        text = self._render(request)
+        chunks = [text[i:i + self.chunk_size] for i in range(0, len(text), self.chunk_size)]
+        for chunk in chunks:
+            if self.latency_ms > 0:
+                await asyncio.sleep(self.latency_ms / 1000 / len(chunks))
+            yield chunk
+
+    def _render(self, request: LLMRequest) -> str:
+        context = request.context
+        if request.task == "task_decomposition":
+            result = build_stub_decomposition(context.get("problem_statement", ""))
+        elif request.task == "resource_search":
+            result = build_stub_resources(context.get("query", ""), context.get("task_context"))
+        elif request.task == "subtask_generation":
+            result = build_stub_subtasks(context.get("edges", []), context.get("problem_context", ""))
+        else:
+            prompt = request.messages[-1]["content"] if request.messages else ""
+            result = {"text": prompt}
+        return json.dumps(result, ensure_ascii=False)
+
+
+def create_provider(name: Optional[str] = None) -> LLMProvider:
+    """按配置创建模型服务"""
+    name = (name or LLM_PROVIDER or ("openai" if OPENAI_API_KEY else "stub")).lower()
+    if name == "openai":
+        if not OPENAI_API_KEY:
+            raise ValueError("LLM_PROVIDER=openai requires OPENAI_API_KEY")
+        return OpenAIProvider(OPENAI_API_KEY)
+    if name == "stub":
+        return StubProvider()
+    raise ValueError(f"Unknown LLM provider: {name}")
+
+
+def _extract_json(text: str) -> Any:
+    """解析模型输出中的JSON，兼容 ```json 代码块和前后的说明文字"""
+    text = text.strip()
+    fenced = re.search(r"```(?:json)?\s*(.*?)```", text, re.S)
+    if fenced:
+        text = fenced.group(1).strip()
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        start, end = text.find("{"), text.rfind("}")
+        if start == -1 or end <= start:
+            raise
+        return json.loads(text[start:end + 1])
+
+
+class LLMGateway:
+    """带并发上限、超时和重试的模型调用入口"""
+
+    def __init__(
+        self,
+        provider: LLMProvider,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        timeout: float = LLM_TIMEOUT,
+        max_retries: int = LLM_MAX_RETRIES,
+        base_delay: float = LLM_RETRY_BASE_DELAY,
+        max_delay: float = LLM_RETRY_MAX_DELAY
+    ):
+        self.provider = provider
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+        # 指标
+        self.calls = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.retried = 0
+        self.in_flight = 0
+        self._latency_total = 0.0
+        self._calls_by_task: Counter = Counter()
+
+    def _backoff(self, attempt: int, retry_after: Optional[float]) -> float:
+        """full jitter：在 [0, base * 2^attempt] 内随机，避免大量请求同时重试"""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_delay))
+        return delay
+
+    async def complete(self, request: LLMRequest) -> str:
+        """调用模型并返回文本，可重试的错误按退避重试"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        self.calls += 1
+        self._calls_by_task[request.task] += 1
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self._semaphore:
+                    self.in_flight += 1
+                    started = time.perf_counter()
+                    try:
+                        text = await asyncio.wait_for(self.provider.complete(request), self.timeout)
+                    finally:
+                        self.in_flight -= 1
+                        self._latency_total += time.perf_counter() - started
+                self.succeeded += 1
+                return text
+            except asyncio.TimeoutError:
+                error = LLMError(f"{self.provider.name} call timed out after {self.timeout}s", retryable=True)
+            except LLMError as exc:
+                error = exc
+
+            if not error.retryable or attempt == self.max_retries:
+                self.failed += 1
+                raise error
+            self.retried += 1
+            await asyncio.sleep(self._backoff(attempt, error.retry_after))
+
+    async def stream(self, request: LLMRequest) -> AsyncIterator[str]:
+        """
+        流式调用模型，逐段返回输出
+        只在还没有输出任何内容时重试；timeout 为相邻两段输出之间的最长等待
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        self.calls += 1
+        self._calls_by_task[request.task] += 1
+
+        for attempt in range(self.max_retries + 1):
+            emitted = False
+            try:
+                async with self._semaphore:
+                    self.in_flight += 1
+                    started = time.perf_counter()
+                    chunks = self.provider.stream(request)
+                    try:
+                        while True:
+                            try:
+                                chunk = await asyncio.wait_for(chunks.__anext__(), self.timeout)
+                            except StopAsyncIteration:
+                                break
+                            emitted = True
+                            yield chunk
+                    finally:
+                        self.in_flight -= 1
+                        self._latency_total += time.perf_counter() - started
+                        await chunks.aclose()
+                self.succeeded += 1
+                return
+            except asyncio.TimeoutError:
+                error = LLMError(f"{self.provider.name} stream stalled for {self.timeout}s", retryable=True)
+            except LLMError as exc:
+                error = exc
+
+            if emitted or not error.retryable or attempt == self.max_retries:
+                self.failed += 1
+                raise error
+            self.retried += 1
+            await asyncio.sleep(self._backoff(attempt, error.retry_after))
+
+    async def complete_json(self, request: LLMRequest) -> Any:
+        """调用模型并把输出解析为JSON"""
+        text = await self.complete(request)
+        try:
+            return _extract_json(text)
+        except json.JSONDecodeError as exc:
+            raise LLMError(f"{self.provider.name} returned invalid JSON") from exc
+
+    def metrics(self) -> Dict[str, Any]:
+        attempts = self.succeeded + self.failed + self.retried
+        return {
+            "provider": self.provider.name,
+            "http2": isinstance(self.provider, OpenAIProvider) and LLM_HTTP2 and http2_available(),
+            "max_concurrency": self.max_concurrency,
+            "calls": self.calls,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "retried": self.retried,
+            "in_flight": self.in_flight,
+            "avg_latency_ms": round(self._latency_total / attempts * 1000, 3) if attempts else 0.0,
+            "calls_by_task": dict(self._calls_by_task),
+        }
+
+    async def aclose(self):
+        await self.provider.aclose()
+
+
+llm_gateway = LLMGateway(create_provider())
@@ -0,0 +1,55 @@
+"""
+会话通知服务
+进程内的发布/订阅中心，按学习会话分发服务端事件（如倒计时结束）
+多进程部署时订阅者可能连在其他进程上，发布的事件通过 listeners 转发给其他进程
+"""
+
+import asyncio
+from typing import Callable, Dict, List, Set, Any
+
+
+class NotificationHub:
+    """按会话ID分组的通知中心"""
+
+    # 每个订阅者最多缓存的未读事件数，超出后丢弃最新事件，避免慢客户端占用内存
+    QUEUE_SIZE = 100
+
+    def __init__(self):
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        # 发布事件后调用 listener(session_id, event)
+        self.listeners: List[Callable[[str, Dict[str, Any]], None]] = []
+
+    def subscribe(self, session_id: str) -> asyncio.Queue:
+        """订阅某个会话的事件，返回事件队列"""
+        queue = asyncio.Queue(maxsize=self.QUEUE_SIZE)
+        self._subscribers.setdefault(session_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, session_id: str, queue: asyncio.Queue):
+        """取消订阅"""
+        queues = self._subscribers.get(session_id)
+        if not queues:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._subscribers[session_id]
+
+    def publish(self, session_id: str, event: Dict[str, Any]) -> int:
+        """向会话的所有订阅者推送事件，返回本进程中成功投递的订阅者数量"""
+        for listener in self.listeners:
+            listener(session_id, event)
+        return self.deliver(session_id, event)
+
+    def deliver(self, session_id: str, event: Dict[str, Any]) -> int:
+        """只投递给本进程的订阅者（其他进程转发来的事件）"""
+        delivered = 0
+        for queue in self._subscribers.get(session_id, ()):
+            try:
+                queue.put_nowait(event)
+                delivered += 1
+            except asyncio.QueueFull:
+                pass
+        return delivered
+
+
+notification_hub = NotificationHub()
@@ -0,0 +1,487 @@
+"""
+请求级性能剖析（默认关闭，PROFILING_ENABLED=true 开启）
+
+- 按路由模板记录请求延迟直方图
+- 通过 SQLAlchemy 事件统计每个请求的查询次数和查询耗时
+- 统计 KeywordExtractor / SubTaskGenerator / FlowEngine 内部的耗时（只计最外层调用，嵌套调用不重复计算）
+- 按采样率对请求做 cProfile / pyinstrument 剖析，耗时超过阈值的写入磁盘
+- 指标以JSON和Prometheus文本格式输出（/debug/metrics）
+
+cProfile 作用于整个线程，剖析期间并发执行的其他请求也会被记录进去；
+同一时刻只剖析一个请求。pyinstrument 可按协程区分，安装后优先使用。
+"""
+
+import asyncio
+import bisect
+import contextvars
+import functools
+import inspect
+import os
+import random
+import re
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+try:
+    import pyinstrument
+    PYINSTRUMENT_AVAILABLE = True
+except ImportError:  # 可选依赖
+    pyinstrument = None
+    PYINSTRUMENT_AVAILABLE = False
+
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() in ("1", "true", "yes")
+# 被剖析的请求比例
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0.01"))
+# 被剖析的请求耗时超过该值（毫秒）时才写入磁盘
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", "500"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "./profiles")
+# cprofile / pyinstrument / auto（有 pyinstrument 时用它）
+PROFILER = os.getenv("PROFILER", "auto")
+# 目录中最多保留的剖析文件数，超出时删除最旧的
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "200"))
+
+# 直方图桶（秒）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250)
+
+
+class Histogram:
+    """累积桶直方图，格式与 Prometheus histogram 一致"""
+
+    __slots__ = ("bounds", "counts", "count", "sum")
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)  # 最后一个为 +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        total = 0
+        buckets = []
+        for bound, count in zip((*self.bounds, float("inf")), self.counts):
+            total += count
+            buckets.append(("+Inf" if bound == float("inf") else f"{bound:g}", total))
+        return buckets
+
+    def quantile(self, q: float) -> float:
+        """按桶内线性插值估算分位数"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for bound, count in zip((*self.bounds, float("inf")), self.counts):
+            if count and seen + count >= rank:
+                if bound == float("inf"):
+                    return lower
+                return lower + (bound - lower) * (rank - seen) / count
+            seen += count
+            lower = bound
+        return lower
+
+
+@dataclass
+class RequestStats:
+    """单个请求的统计，保存在 contextvar 中"""
+    db_queries: int = 0
+    db_time: float = 0.0
+    sections: Dict[str, float] = field(default_factory=dict)
+
+
+@dataclass
+class RouteStats:
+    latency: Histogram = field(default_factory=lambda: Histogram(LATENCY_BUCKETS))
+    db_queries: Histogram = field(default_factory=lambda: Histogram(QUERY_COUNT_BUCKETS))
+    db_time: Histogram = field(default_factory=lambda: Histogram(LATENCY_BUCKETS))
+    statuses: Dict[str, int] = field(default_factory=dict)
+    sections: Dict[str, float] = field(default_factory=dict)
+
+
+_request_stats: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar(
+    "profiling_request_stats", default=None
+)
+_active_sections: contextvars.ContextVar[FrozenSet[str]] = contextvars.ContextVar(
+    "profiling_active_sections", default=frozenset()
+)
+
+
+def current_request_stats() -> Optional[RequestStats]:
+    return _request_stats.get()
+
+
+class MetricsRegistry:
+    """进程内的性能指标"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.routes: Dict[Tuple[str, str], RouteStats] = {}
+        self.sections: Dict[str, Histogram] = {}
+        self.db_queries_total = 0
+        self.db_time_total = 0.0
+        self.profiles_captured = 0
+        self.started_at = time.time()
+
+    def observe_request(self, method: str, route: str, status: int, duration: float, stats: RequestStats):
+        route_stats = self.routes.get((method, route))
+        if route_stats is None:
+            route_stats = self.routes[(method, route)] = RouteStats()
+        route_stats.latency.observe(duration)
+        route_stats.db_queries.observe(stats.db_queries)
+        route_stats.db_time.observe(stats.db_time)
+        status_class = f"{status // 100}xx"
+        route_stats.statuses[status_class] = route_stats.statuses.get(status_class, 0) + 1
+        for name, seconds in stats.sections.items():
+            route_stats.sections[name] = route_stats.sections.get(name, 0.0) + seconds
+
+    def observe_query(self, duration: float):
+        self.db_queries_total += 1
+        self.db_time_total += duration
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.db_queries += 1
+            stats.db_time += duration
+
+    def observe_section(self, name: str, duration: float):
+        histogram = self.sections.get(name)
+        if histogram is None:
+            histogram = self.sections[name] = Histogram(LATENCY_BUCKETS)
+        histogram.observe(duration)
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.sections[name] = stats.sections.get(name, 0.0) + duration
+
+    def snapshot(self) -> Dict[str, Any]:
+        """JSON格式的汇总（分位数由直方图估算）"""
+        routes = {}
+        for (method, route), stats in sorted(self.routes.items(), key=lambda item: item[0][1]):
+            count = stats.latency.count
+            routes[f"{method} {route}"] = {
+                "requests": count,
+                "statuses": dict(stats.statuses),
+                "mean_ms": round(stats.latency.sum / count * 1000, 3),
+                "p50_ms": round(stats.latency.quantile(0.50) * 1000, 3),
+                "p95_ms": round(stats.latency.quantile(0.95) * 1000, 3),
+                "p99_ms": round(stats.latency.quantile(0.99) * 1000, 3),
+                "db_queries_per_request": round(stats.db_queries.sum / count, 2),
+                "db_ms_per_request": round(stats.db_time.sum / count * 1000, 3),
+                "section_ms_per_request": {
+                    name: round(seconds / count * 1000, 3) for name, seconds in sorted(stats.sections.items())
+                },
+            }
+        return {
+            "uptime_s": round(time.time() - self.started_at, 1),
+            "routes": routes,
+            "sections": {
+                name: {
+                    "calls": histogram.count,
+                    "total_ms": round(histogram.sum * 1000, 3),
+                    "p95_ms": round(histogram.quantile(0.95) * 1000, 3),
+                }
+                for name, histogram in sorted(self.sections.items())
+            },
+            "db": {"queries": self.db_queries_total, "time_ms": round(self.db_time_total * 1000, 3)},
+            "profiles_captured": self.profiles_captured,
+        }
+
+    def render_prometheus(self) -> str:
+        """Prometheus 文本格式（0.0.4）"""
+        lines: List[str] = []
+
+        def histogram(name: str, help_text: str, series: Iterable[Tuple[Dict[str, str], Histogram]]):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for labels, hist in series:
+                for le, count in hist.cumulative():
+                    lines.append(f"{name}_bucket{_labels({**labels, 'le': le})} {count}")
+                lines.append(f"{name}_sum{_labels(labels)} {hist.sum:.6f}")
+                lines.append(f"{name}_count{_labels(labels)} {hist.count}")
+
+        def counter(name: str, help_text: str, series: Iterable[Tuple[Dict[str, str], float]]):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for labels, value in series:
+                lines.append(f"{name}{_labels(labels)} {value:g}")
+
+        routes = sorted(self.routes.items())
+        histogram(
+            "metalearn_http_request_duration_seconds", "HTTP request latency by route.",
+            (({"method": m, "route": r}, s.latency) for (m, r), s in routes)
+        )
+        counter(
+            "metalearn_http_requests_total", "HTTP requests by route and status class.",
+            (({"method": m, "route": r, "status": status}, n)
+             for (m, r), s in routes for status, n in sorted(s.statuses.items()))
+        )
+        histogram(
+            "metalearn_db_queries_per_request", "Database queries issued per request.",
+            (({"method": m, "route": r}, s.db_queries) for (m, r), s in routes)
+        )
+        histogram(
+            "metalearn_db_time_per_request_seconds", "Time spent in database queries per request.",
+            (({"method": m, "route": r}, s.db_time) for (m, r), s in routes)
+        )
+        histogram(
+            "metalearn_section_duration_seconds", "Time spent in instrumented services.",
+            (({"section": name}, hist) for name, hist in sorted(self.sections.items()))
+        )
+        counter("metalearn_db_queries_total", "Database queries executed.", [({}, self.db_queries_total)])
+        counter("metalearn_db_query_seconds_total", "Time spent in database queries.", [({}, self.db_time_total)])
+        counter("metalearn_profiles_captured_total", "Slow-request profiles written to disk.",
+                [({}, self.profiles_captured)])
+        return "\n".join(lines) + "\n"
+
+
+def _escape_label(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape_label(value)}"' for key, value in labels.items()) + "}"
+
+
+metrics_registry = MetricsRegistry()
+
+
+# ---- 数据库查询统计 ----
+
+_QUERY_START_KEY = "profiling_query_start"
+_query_hooks_installed = False
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault(_QUERY_START_KEY, []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get(_QUERY_START_KEY)
+    if starts:
+        metrics_registry.observe_query(time.perf_counter() - starts.pop())
+
+
+def install_query_hooks():
+    """在所有引擎上统计查询次数和耗时（异步引擎的事件由其 sync_engine 触发）"""
+    global _query_hooks_installed
+    if _query_hooks_installed:
+        return
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    _query_hooks_installed = True
+
+
+# ---- 服务耗时统计 ----
+
+@contextmanager
+def timed_section(name: str):
+    """统计一段代码的耗时；同名区段嵌套时只统计最外层"""
+    active = _active_sections.get()
+    if name in active:
+        yield
+        return
+    token = _active_sections.set(active | {name})
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics_registry.observe_section(name, time.perf_counter() - started)
+        _active_sections.reset(token)
+
+
+def instrument(name: str) -> Callable:
+    """把函数（同步或异步）的执行时间计入区段 name"""
+    def decorator(func: Callable) -> Callable:
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with timed_section(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed_section(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def instrument_class(cls: type, name: str):
+    """给类的全部公有方法加上耗时统计（重复调用无副作用）"""
+    if getattr(cls, "__profiling_section__", None) == name:
+        return
+    for attr, value in list(vars(cls).items()):
+        if attr.startswith("_") or not inspect.isfunction(value):
+            continue
+        setattr(cls, attr, instrument(name)(value))
+    cls.__profiling_section__ = name
+
+
+def instrument_services():
+    from services.flow_engine import FlowEngine
+    from services.keyword_extractor import KeywordExtractor
+    from services.subtask_generator import SubTaskGenerator
+
+    instrument_class(KeywordExtractor, "keyword_extractor")
+    instrument_class(SubTaskGenerator, "subtask_generator")
+    instrument_class(FlowEngine, "flow_engine")
+
+
+# ---- 慢请求剖析 ----
+
+class RequestProfiler:
+    """按采样率剖析请求，慢请求的结果写入磁盘"""
+
+    def __init__(
+        self,
+        sample_rate: float = PROFILE_SAMPLE_RATE,
+        slow_ms: float = PROFILE_SLOW_MS,
+        directory: str = PROFILE_DIR,
+        profiler: str = PROFILER,
+        max_files: int = PROFILE_MAX_FILES,
+        registry: MetricsRegistry = metrics_registry
+    ):
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.directory = Path(directory)
+        if profiler == "auto":
+            profiler = "pyinstrument" if PYINSTRUMENT_AVAILABLE else "cprofile"
+        if profiler == "pyinstrument" and not PYINSTRUMENT_AVAILABLE:
+            profiler = "cprofile"
+        self.profiler = profiler
+        self.max_files = max_files
+        self.registry = registry
+        self._cprofile_busy = False
+
+    def start(self) -> Optional[Any]:
+        """按采样率决定是否剖析当前请求，返回剖析器或None"""
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return None
+        if self.profiler == "pyinstrument":
+            profiler = pyinstrument.Profiler(async_mode="enabled")
+            profiler.start()
+            return profiler
+
+        if self._cprofile_busy:
+            return None
+        import cProfile
+        self._cprofile_busy = True
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+
+    async def finish(self, profiler: Any, method: str, route: str, duration: float) -> Optional[Path]:
+        """停止剖析；请求足够慢时写入磁盘并返回文件路径"""
+        if self.profiler == "pyinstrument":
+            profiler.stop()
+        else:
+            profiler.disable()
+            self._cprofile_busy = False
+
+        duration_ms = duration * 1000
+        if duration_ms < self.slow_ms:
+            return None
+
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", route).strip("_") or "root"
+        suffix = "html" if self.profiler == "pyinstrument" else "prof"
+        path = self.directory / f"{datetime.now():%Y%m%d_%H%M%S_%f}_{method}_{slug}_{duration_ms:.0f}ms.{suffix}"
+        await asyncio.to_thread(self._write, profiler, path)
+        self.registry.profiles_captured += 1
+        return path
+
+    def _write(self, profiler: Any, path: Path):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        if self.profiler == "pyinstrument":
+            path.write_text(profiler.output_html(), encoding="utf-8")
+        else:
+            profiler.dump_stats(str(path))
+
+        files = sorted(self.directory.glob("*.*"), key=lambda p: p.stat().st_mtime)
+        for old in files[:max(0, len(files) - self.max_files)]:
+            try:
+                old.unlink()
+            except OSError:
+                pass
+
+    def list_profiles(self, limit: int = 50) -> List[Dict[str, Any]]:
+        if not self.directory.is_dir():
+            return []
+        files = sorted(self.directory.glob("*.*"), key=lambda p: p.stat().st_mtime, reverse=True)[:limit]
+        return [{"file": p.name, "bytes": p.stat().st_size} for p in files]
+
+
+request_profiler = RequestProfiler()
+
+
+# ---- 中间件 ----
+
+def _route_template(app, scope) -> str:
+    """把请求路径映射为路由模板（如 /api/cognitive-map/{map_id}），避免按具体ID产生无限多的指标"""
+    from starlette.routing import Match
+
+    for route in getattr(app, "routes", ()):
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "path", scope["path"])
+    return "unmatched"
+
+
+class ProfilingMiddleware:
+    """ASGI 中间件：统计请求延迟、数据库查询和服务耗时，并按采样率剖析慢请求"""
+
+    def __init__(self, app, registry: MetricsRegistry = metrics_registry, profiler: Optional[RequestProfiler] = None):
+        self.app = app
+        self.registry = registry
+        self.profiler = profiler if profiler is not None else request_profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        capture = self.profiler.start() if self.profiler else None
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - started
+            _request_stats.reset(token)
+            route = _route_template(scope.get("app"), scope)
+            self.registry.observe_request(scope["method"], route, status, duration, stats)
+            if capture is not None:
+                await self.profiler.finish(capture, scope["method"], route, duration)
+
+
+def enable_profiling(app, registry: MetricsRegistry = metrics_registry, profiler: Optional[RequestProfiler] = None):
+    """给应用加上剖析中间件，并开启查询和服务耗时统计"""
+    profiler = profiler if profiler is not None else request_profiler
+    install_query_hooks()
+    instrument_services()
+    app.add_middleware(ProfilingMiddleware, registry=registry, profiler=profiler)
+    app.state.metrics_registry = registry
+    app.state.request_profiler = profiler
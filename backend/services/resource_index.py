@@ -0,0 +1,340 @@
+"""
+学习资源搜索引擎
+进程内倒排索引 + BM25 打分，不依赖任何外部搜索API
+
+- 英文/数字按单词切分，中文按字符二元组切分，标题和关键词的词频加权
+- 按 resource_type 分面统计，可按类型过滤
+- 先按查询召回，再用学习任务上下文（会话的问题描述）对前若干条结果重排
+"""
+
+import asyncio
+import heapq
+import math
+import os
+import re
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.models import LearningResourceDB, LearningSessionDB
+from database.tenancy import DEFAULT_TENANT_ID
+from models.schemas import ResourceSearchRequest, ResourceSearchResponse
+from services.keyword_extractor import KeywordExtractor
+
+# 任务上下文在最终得分中的权重（0 表示不重排）
+RESOURCE_CONTEXT_WEIGHT = float(os.getenv("RESOURCE_CONTEXT_WEIGHT", "0.3"))
+# 参与上下文重排的候选数
+RESOURCE_RERANK_DEPTH = int(os.getenv("RESOURCE_RERANK_DEPTH", "50"))
+
+# 字段权重：标题和关键词命中比正文命中更能说明资源的主题
+FIELD_WEIGHTS = {"title": 3.0, "keywords": 2.0, "content": 1.0}
+BM25_K1 = 1.2
+BM25_B = 0.75
+SNIPPET_LENGTH = 160
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9][a-z0-9+#]*|[一-龥]+")
+
+# (id, title, url, content, resource_type, keywords)
+ResourceRecord = Tuple[str, str, Optional[str], Optional[str], str, Optional[list]]
+
+_extractor = KeywordExtractor()
+_STOPWORDS = _extractor.english_stopwords | _extractor.chinese_stopwords
+
+
+def tokenize(text: str) -> List[str]:
+    """英文/数字按单词、中文按二元组切分，去掉停用词"""
+    terms = []
+    for token in _TOKEN_PATTERN.findall((text or "").lower()):
+        if "一" <= token[0] <= "龥":
+            if len(token) == 1:
+                terms.append(token)
+            else:
+                terms.extend(token[i:i + 2] for i in range(len(token) - 1))
+        elif token not in _STOPWORDS and not token.isdigit():
+            terms.append(token)
+    return [term for term in terms if term not in _STOPWORDS]
+
+
+@dataclass
+class ResourceDocument:
+    title: str
+    url: Optional[str]
+    resource_type: str
+    keywords: List[str]
+    snippet: str
+    length: float  # 加权后的词数
+
+
+@dataclass
+class ResourceHit:
+    resource_id: str
+    score: float
+    query_score: float
+    context_score: float
+
+
+class ResourceSearchIndex:
+    """学习资源倒排索引"""
+
+    LOAD_CHUNK_SIZE = 1000
+
+    def __init__(self, context_weight: float = RESOURCE_CONTEXT_WEIGHT, rerank_depth: int = RESOURCE_RERANK_DEPTH):
+        self.context_weight = context_weight
+        self.rerank_depth = rerank_depth
+        self._postings: Dict[str, Dict[str, float]] = {}  # 词 -> {资源ID: 加权词频}
+        self._docs: Dict[str, ResourceDocument] = {}
+        self._doc_terms: Dict[str, Tuple[str, ...]] = {}
+        self._total_length = 0.0
+        self.loaded = False
+        self._loading = False
+        self._touched: Set[str] = set()  # 加载期间被写入或删除的资源，加载时跳过
+        self._load_lock: Optional[asyncio.Lock] = None
+        # 本进程写入或删除资源后调用，参数为变更的资源ID（多进程部署时据此通知其他进程）
+        self.listeners: List[Callable[[List[str]], None]] = []
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def _apply(self, resource_id: str, record: Optional[ResourceRecord]):
+        old = self._docs.pop(resource_id, None)
+        if old is not None:
+            self._total_length -= old.length
+            for term in self._doc_terms.pop(resource_id, ()):
+                postings = self._postings.get(term)
+                if postings is not None:
+                    postings.pop(resource_id, None)
+                    if not postings:
+                        del self._postings[term]
+        if record is None:
+            return
+
+        _, title, url, content, resource_type, keywords = record
+        keywords = list(keywords or [])
+        weighted: Dict[str, float] = {}
+        for field, text in (("title", title), ("keywords", " ".join(keywords)), ("content", content)):
+            for term, count in Counter(tokenize(text or "")).items():
+                weighted[term] = weighted.get(term, 0.0) + count * FIELD_WEIGHTS[field]
+
+        document = ResourceDocument(
+            title=title,
+            url=url,
+            resource_type=resource_type,
+            keywords=keywords,
+            snippet=re.sub(r"\s+", " ", content or "").strip()[:SNIPPET_LENGTH],
+            length=sum(weighted.values())
+        )
+        self._docs[resource_id] = document
+        self._doc_terms[resource_id] = tuple(weighted)
+        self._total_length += document.length
+        for term, tf in weighted.items():
+            self._postings.setdefault(term, {})[resource_id] = tf
+
+    def upsert_many(self, records: Iterable[ResourceRecord]):
+        """批量写入或更新资源，未加载时忽略（加载时会从数据库读取）"""
+        records = list(records)
+        self._upsert_records(records)
+        self._notify([record[0] for record in records])
+
+    def remove(self, resource_id: str):
+        self._remove_resource(resource_id)
+        self._notify([resource_id])
+
+    def _upsert_records(self, records: List[ResourceRecord]):
+        if not (self.loaded or self._loading):
+            return
+        for record in records:
+            if self._loading:
+                self._touched.add(record[0])
+            self._apply(record[0], record)
+
+    def _remove_resource(self, resource_id: str):
+        if not (self.loaded or self._loading):
+            return
+        if self._loading:
+            self._touched.add(resource_id)
+        self._apply(resource_id, None)
+
+    def _notify(self, resource_ids: List[str]):
+        if resource_ids:
+            for listener in self.listeners:
+                listener(resource_ids)
+
+    async def refresh(self, resource_ids: Iterable[str], db: AsyncSession):
+        """按数据库中的最新内容更新指定资源（其他进程写入后调用），不再通知监听者"""
+        resource_ids = list(resource_ids)
+        if not (self.loaded or self._loading) or not resource_ids:
+            return
+        result = await db.execute(
+            select(
+                LearningResourceDB.id,
+                LearningResourceDB.title,
+                LearningResourceDB.url,
+                LearningResourceDB.content,
+                LearningResourceDB.resource_type,
+                LearningResourceDB.keywords
+            ).where(LearningResourceDB.id.in_(resource_ids))
+        )
+        records = [tuple(row) for row in result.all()]
+        self._upsert_records(records)
+        for resource_id in set(resource_ids) - {record[0] for record in records}:
+            self._remove_resource(resource_id)
+
+    def _bm25(self, terms: Sequence[str], restrict: Optional[Set[str]] = None) -> Dict[str, float]:
+        """对包含任一查询词的资源打分；restrict 不为空时只给其中的资源打分"""
+        count = len(self._docs)
+        if not count:
+            return {}
+        avg_length = self._total_length / count or 1.0
+        scores: Dict[str, float] = {}
+        for term, query_tf in Counter(terms).items():
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            items = postings.items() if restrict is None else (
+                (rid, postings[rid]) for rid in restrict if rid in postings
+            )
+            for resource_id, tf in items:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self._docs[resource_id].length / avg_length)
+                scores[resource_id] = scores.get(resource_id, 0.0) + query_tf * idf * tf * (BM25_K1 + 1) / (tf + norm)
+        return scores
+
+    def search(
+        self,
+        query: str,
+        task_context: Optional[str] = None,
+        resource_types: Optional[Sequence[str]] = None,
+        limit: int = 10
+    ) -> Tuple[List[ResourceHit], Dict[str, int], int]:
+        """
+        返回 (结果, 分面统计, 命中总数)
+        分面统计在类型过滤之前计算，便于前端展示其他类型各有多少结果
+        """
+        scores = self._bm25(tokenize(query))
+        facets = Counter(self._docs[resource_id].resource_type for resource_id in scores)
+
+        if resource_types:
+            allowed = set(resource_types)
+            scores = {rid: s for rid, s in scores.items() if self._docs[rid].resource_type in allowed}
+
+        # 只取前若干条参与重排，不对全部命中排序
+        head = heapq.nsmallest(max(limit, self.rerank_depth), scores.items(), key=lambda item: (-item[1], item[0]))
+        max_query = head[0][1] if head else 1.0
+
+        context_scores: Dict[str, float] = {}
+        context_terms = tokenize(task_context or "")
+        if context_terms and self.context_weight > 0:
+            context_scores = self._bm25(context_terms, restrict={rid for rid, _ in head})
+        max_context = max(context_scores.values(), default=0.0) or 1.0
+
+        weight = self.context_weight if context_scores else 0.0
+        hits = [
+            ResourceHit(
+                resource_id=rid,
+                score=(1 - weight) * s / max_query + weight * context_scores.get(rid, 0.0) / max_context,
+                query_score=s,
+                context_score=context_scores.get(rid, 0.0)
+            )
+            for rid, s in head
+        ]
+        hits.sort(key=lambda hit: (-hit.score, hit.resource_id))
+        return hits[:limit], dict(facets), len(scores)
+
+    def document(self, resource_id: str) -> Optional[ResourceDocument]:
+        return self._docs.get(resource_id)
+
+    def facets(self) -> Dict[str, int]:
+        """全部资源按类型的数量"""
+        return dict(Counter(document.resource_type for document in self._docs.values()))
+
+    def to_result(self, hit: ResourceHit) -> Dict[str, Any]:
+        document = self._docs[hit.resource_id]
+        return {
+            "id": hit.resource_id,
+            "title": document.title,
+            "url": document.url,
+            "resource_type": document.resource_type,
+            "description": document.snippet,
+            "keywords": document.keywords,
+            "relevance": round(hit.score, 4),
+        }
+
+    async def ensure_loaded(self, db: AsyncSession):
+        """首次使用时从数据库流式加载全部资源"""
+        if self.loaded:
+            return
+        if self._load_lock is None:
+            self._load_lock = asyncio.Lock()
+
+        async with self._load_lock:
+            if self.loaded:
+                return
+
+            self._loading = True
+            try:
+                result = await db.stream(
+                    select(
+                        LearningResourceDB.id,
+                        LearningResourceDB.title,
+                        LearningResourceDB.url,
+                        LearningResourceDB.content,
+                        LearningResourceDB.resource_type,
+                        LearningResourceDB.keywords
+                    )
+                )
+                async for rows in result.partitions(self.LOAD_CHUNK_SIZE):
+                    for row in rows:
+                        if row[0] not in self._touched:
+                            self._apply(row[0], tuple(row))
+                self.loaded = True
+            except Exception:
+                self._postings.clear()
+                self._docs.clear()
+                self._doc_terms.clear()
+                self._total_length = 0.0
+                raise
+            finally:
+                self._loading = False
+                self._touched.clear()
+
+
+resource_index = ResourceSearchIndex()
+
+
+async def search_local_resources(
+    request: ResourceSearchRequest,
+    db: AsyncSession,
+    index: ResourceSearchIndex = resource_index,
+    tenant_id: str = DEFAULT_TENANT_ID
+) -> ResourceSearchResponse:
+    """
+    在本地资源库中检索，任务上下文为请求中的 task_context 加上会话的问题描述
+    资源库由所有租户共享，会话只读取当前租户自己的
+    """
+    await index.ensure_loaded(db)
+
+    context = [request.task_context or ""]
+    if request.session_id:
+        result = await db.execute(
+            select(LearningSessionDB.problem_statement).where(
+                LearningSessionDB.id == request.session_id,
+                LearningSessionDB.tenant_id == tenant_id
+            )
+        )
+        context.append(result.scalar_one_or_none() or "")
+
+    hits, facets, total = index.search(
+        request.query,
+        task_context=" ".join(context),
+        resource_types=request.resource_types,
+        limit=request.limit
+    )
+    return ResourceSearchResponse(
+        resources=[index.to_result(hit) for hit in hits],
+        facets=facets,
+        total=total,
+        source="local"
+    )
@@ -0,0 +1,253 @@
+"""
+本地学习资源库导入
+扫描资源目录下的文件和链接清单，写入 learning_resources 表并更新搜索索引
+
+- 文本类文件（.md/.txt/.rst/.html/.ipynb）读取正文
+- 视频、PDF等二进制文件只记录文件名作为标题
+- .url（Internet Shortcut）和 .links（每行一个链接，可在制表符后跟标题）导入为链接资源，不访问网络
+
+同一个 url（文件为 file:// 地址）重复导入时更新原记录，不会产生重复资源。
+"""
+
+import asyncio
+import html
+import json
+import os
+import re
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import unquote, urlparse
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.models import LearningResourceDB, generate_uuid
+from services.card_io import extract_keywords_parallel
+from services.resource_index import resource_index
+
+# 可导入的资源根目录，导入请求只能指定其中的子目录
+RESOURCE_LIBRARY_DIR = os.getenv("RESOURCE_LIBRARY_DIR", "./resources")
+# 超过该大小的文本文件不读取正文
+RESOURCE_MAX_FILE_BYTES = int(os.getenv("RESOURCE_MAX_FILE_BYTES", str(5 * 1024 * 1024)))
+# 每条资源保存的正文上限（字符）
+MAX_CONTENT_CHARS = 50000
+INGEST_CHUNK_SIZE = 200
+MAX_REPORTED_ERRORS = 100
+
+TEXT_TYPES = {".md": "article", ".markdown": "article", ".txt": "article", ".rst": "article",
+              ".html": "article", ".htm": "article", ".ipynb": "notebook"}
+BINARY_TYPES = {".pdf": "book", ".epub": "book", ".mp4": "video", ".mkv": "video",
+                ".webm": "video", ".mov": "video", ".mp3": "audio", ".m4a": "audio"}
+LINK_EXTENSIONS = {".url", ".links"}
+
+# 链接按域名推断资源类型
+_URL_TYPE_HINTS = {
+    "youtube.com": "video", "youtu.be": "video", "bilibili.com": "video", "vimeo.com": "video",
+    "coursera.org": "course", "edx.org": "course", "udemy.com": "course",
+    "github.com": "code", "arxiv.org": "paper",
+}
+
+
+@dataclass
+class ResourceItem:
+    title: str
+    url: str
+    resource_type: str
+    content: str = ""
+
+
+@dataclass
+class IngestReport:
+    scanned: int = 0
+    created: int = 0
+    updated: int = 0
+    skipped: int = 0
+    errors: List[Dict[str, str]] = field(default_factory=list)
+
+    def error(self, path: Path, message: str):
+        self.skipped += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"path": str(path), "error": message})
+
+
+def resolve_library_path(relative: str = "", root: Optional[str] = None) -> Path:
+    """把请求中的子目录解析到资源根目录下，越界时抛出 ValueError"""
+    base = Path(root or RESOURCE_LIBRARY_DIR).resolve()
+    target = (base / relative).resolve()
+    if target != base and base not in target.parents:
+        raise ValueError("Path is outside the resource library")
+    if not target.is_dir():
+        raise ValueError(f"Directory not found: {relative or '.'}")
+    return target
+
+
+def _title_from_url(url: str) -> str:
+    parsed = urlparse(url)
+    tail = unquote(parsed.path.rstrip("/").rsplit("/", 1)[-1])
+    tail = re.sub(r"\.[a-z0-9]+$", "", tail, flags=re.I)
+    return re.sub(r"[-_]+", " ", tail).strip() or parsed.netloc or url
+
+
+def _type_from_url(url: str) -> str:
+    host = urlparse(url).netloc.lower()
+    for domain, resource_type in _URL_TYPE_HINTS.items():
+        if host == domain or host.endswith("." + domain):
+            return resource_type
+    return "article"
+
+
+def _link_item(url: str, title: str = "") -> Optional[ResourceItem]:
+    url = url.strip()
+    if urlparse(url).scheme not in ("http", "https"):
+        return None
+    return ResourceItem(title=title.strip() or _title_from_url(url), url=url, resource_type=_type_from_url(url))
+
+
+def _html_text(raw: str) -> Tuple[str, str]:
+    """返回 (标题, 正文)"""
+    match = re.search(r"<title[^>]*>(.*?)</title>", raw, flags=re.I | re.S)
+    title = html.unescape(match.group(1)).strip() if match else ""
+    body = re.sub(r"<(script|style)[^>]*>.*?</\1>", " ", raw, flags=re.I | re.S)
+    body = html.unescape(re.sub(r"<[^>]+>", " ", body))
+    return title, re.sub(r"\s+", " ", body).strip()
+
+
+def _notebook_text(raw: str) -> str:
+    try:
+        cells = json.loads(raw).get("cells", [])
+    except ValueError:
+        raise ValueError("Invalid notebook")
+    return "\n".join(
+        "".join(cell.get("source", [])) if isinstance(cell.get("source"), list) else str(cell.get("source", ""))
+        for cell in cells
+    )
+
+
+def read_resource_file(path: Path) -> List[ResourceItem]:
+    """把一个文件解析成若干条资源，不支持的文件返回空列表"""
+    suffix = path.suffix.lower()
+
+    if suffix in LINK_EXTENSIONS:
+        text = path.read_text(encoding="utf-8", errors="replace")
+        if suffix == ".url":
+            match = re.search(r"^URL=(.+)$", text, flags=re.M)
+            item = _link_item(match.group(1), path.stem) if match else None
+            return [item] if item else []
+        items = []
+        for line in text.splitlines():
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            url, _, title = line.partition("\t")
+            item = _link_item(url, title)
+            if item:
+                items.append(item)
+        return items
+
+    if suffix in BINARY_TYPES:
+        return [ResourceItem(title=path.stem, url=path.as_uri(), resource_type=BINARY_TYPES[suffix])]
+
+    if suffix not in TEXT_TYPES:
+        return []
+    if path.stat().st_size > RESOURCE_MAX_FILE_BYTES:
+        raise ValueError("File too large")
+
+    raw = path.read_text(encoding="utf-8", errors="replace")
+    title = ""
+    if suffix in (".html", ".htm"):
+        title, content = _html_text(raw)
+    else:
+        content = _notebook_text(raw) if suffix == ".ipynb" else raw
+        # Markdown 和 Notebook 以第一个一级标题作为资源标题
+        heading = re.search(r"^#\s+(.+)$", content, flags=re.M) if suffix != ".txt" else None
+        title = heading.group(1).strip() if heading else ""
+
+    return [ResourceItem(
+        title=title or path.stem,
+        url=path.as_uri(),
+        resource_type=TEXT_TYPES[suffix],
+        content=content[:MAX_CONTENT_CHARS]
+    )]
+
+
+def scan_directory(directory: Path, recursive: bool = True) -> Tuple[List[ResourceItem], IngestReport]:
+    """扫描目录（在线程中执行，避免阻塞事件循环）"""
+    report = IngestReport()
+    items: List[ResourceItem] = []
+    paths = directory.rglob("*") if recursive else directory.glob("*")
+    for path in sorted(paths):
+        if not path.is_file() or path.name.startswith("."):
+            continue
+        report.scanned += 1
+        try:
+            parsed = read_resource_file(path)
+        except (OSError, ValueError) as exc:
+            report.error(path, str(exc))
+            continue
+        if not parsed:
+            report.skipped += 1
+        items.extend(parsed)
+    return items, report
+
+
+async def ingest_directory(directory: Path, db: AsyncSession, recursive: bool = True) -> Dict[str, Any]:
+    """导入目录中的资源，按 url 新增或更新"""
+    items, report = await asyncio.to_thread(scan_directory, directory, recursive)
+
+    # 同一次导入中重复的 url 只保留最后一条
+    unique = list({item.url: item for item in items}.values())
+    for start in range(0, len(unique), INGEST_CHUNK_SIZE):
+        created, updated = await _upsert_chunk(unique[start:start + INGEST_CHUNK_SIZE], db)
+        report.created += created
+        report.updated += updated
+
+    return {
+        "scanned": report.scanned,
+        "created": report.created,
+        "updated": report.updated,
+        "skipped": report.skipped,
+        "errors": report.errors,
+    }
+
+
+async def _upsert_chunk(items: List[ResourceItem], db: AsyncSession) -> Tuple[int, int]:
+    # 加载索引后再写入，保证本次写入的资源能进入索引
+    await resource_index.ensure_loaded(db)
+
+    result = await db.execute(
+        select(LearningResourceDB.url, LearningResourceDB.id)
+        .where(LearningResourceDB.url.in_([item.url for item in items]))
+    )
+    existing = dict(result.all())
+
+    keywords = await extract_keywords_parallel([f"{item.title} {item.content}" for item in items])
+
+    now = datetime.utcnow()
+    new_rows, changed_rows, records = [], [], []
+    for item, item_keywords in zip(items, keywords):
+        values = {
+            "title": item.title,
+            "url": item.url,
+            "content": item.content,
+            "resource_type": item.resource_type,
+            "keywords": item_keywords,
+        }
+        resource_id = existing.get(item.url)
+        if resource_id is None:
+            resource_id = generate_uuid()
+            new_rows.append({"id": resource_id, "created_at": now, **values})
+        else:
+            changed_rows.append({"id": resource_id, **values})
+        records.append((resource_id, item.title, item.url, item.content, item.resource_type, item_keywords))
+
+    if new_rows:
+        await db.execute(insert(LearningResourceDB), new_rows)
+    if changed_rows:
+        # 按主键批量更新（executemany），不逐行发语句
+        await db.execute(update(LearningResourceDB), changed_rows)
+    await db.commit()
+
+    resource_index.upsert_many(records)
+    return len(new_rows), len(changed_rows)
@@ -0,0 +1,331 @@
+"""
+间隔重复调度（SM-2）
+把 JOL/FOK 自评结果换算成回忆质量（0-5），按 SM-2 更新每张知识卡片或每个子任务的
+复习间隔和易度因子，并写入 review_items 表的下次复习时间 due_at。
+
+到期队列按 (tenant_id, due_at, id) 索引沿到期时间顺序读取，取一页到期项只需一次
+索引定位，不随复习项总数增长。调整间隔系数或最大间隔后，recompute_due_dates
+按主键分块批量重算全部 due_at；安装了 numpy 时分块内的计算向量化，否则逐行计算，结果一致。
+"""
+
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.dialects import dialect_name, insert_ignoring_conflicts
+from database.models import ReviewItemDB, SubTaskDB, generate_uuid
+
+try:
+    import numpy as np
+except ImportError:  # numpy 是可选依赖，没有时逐行计算
+    np = None
+
+# 全局间隔系数：<1 更频繁复习，>1 间隔更长
+REVIEW_INTERVAL_MODIFIER = float(os.getenv("REVIEW_INTERVAL_MODIFIER", "1.0"))
+# 复习间隔上限（天）
+REVIEW_MAX_INTERVAL_DAYS = float(os.getenv("REVIEW_MAX_INTERVAL_DAYS", "365"))
+
+INITIAL_EASE = 2.5
+MIN_EASE = 1.3
+# 质量不低于该值视为记住，否则重新开始
+PASS_QUALITY = 3
+MICROS_PER_DAY = 86400 * 1000000
+# 批量重算时每个分块的行数
+RECOMPUTE_CHUNK_SIZE = 5000
+# 小于该数量时逐行计算比构造数组更快
+NUMPY_MIN_BATCH = 64
+
+# FlowEngine 的 JOL/FOK 分数（1-4）到 SM-2 回忆质量（0-5）
+SCORE_TO_QUALITY = {4: 5, 3: 4, 2: 3, 1: 1}
+
+# (repetitions, lapses, ease, interval_days)
+ReviewState = Tuple[int, int, float, float]
+
+
+class ReviewOutcome(NamedTuple):
+    item_type: str
+    item_id: str
+    quality: int
+    session_id: Optional[str] = None
+
+
+def sm2_step(state: ReviewState, quality: int) -> ReviewState:
+    """按一次回忆质量推进单个复习项的 SM-2 状态"""
+    repetitions, lapses, ease, interval = state
+    if quality >= PASS_QUALITY:
+        if repetitions == 0:
+            interval = 1.0
+        elif repetitions == 1:
+            interval = 6.0
+        else:
+            interval = interval * ease
+        repetitions += 1
+    else:
+        repetitions = 0
+        interval = 1.0
+        lapses += 1
+    miss = 5 - quality
+    ease = max(MIN_EASE, ease + (0.1 - miss * (0.08 + miss * 0.02)))
+    return repetitions, lapses, ease, interval
+
+
+def next_states(states: Sequence[ReviewState], qualities: Sequence[int]) -> List[ReviewState]:
+    """批量推进 SM-2 状态，数量足够且安装了 numpy 时向量化"""
+    if np is None or len(states) < NUMPY_MIN_BATCH:
+        return [sm2_step(state, quality) for state, quality in zip(states, qualities)]
+
+    columns = np.array(states, dtype=np.float64).reshape(-1, 4)
+    repetitions, lapses, ease, interval = columns.T
+    quality = np.asarray(qualities, dtype=np.float64)
+
+    passed = quality >= PASS_QUALITY
+    grown = np.where(repetitions == 0, 1.0, np.where(repetitions == 1, 6.0, interval * ease))
+    new_interval = np.where(passed, grown, 1.0)
+    new_repetitions = np.where(passed, repetitions + 1, 0)
+    new_lapses = np.where(passed, lapses, lapses + 1)
+    miss = 5 - quality
+    new_ease = np.maximum(MIN_EASE, ease + (0.1 - miss * (0.08 + miss * 0.02)))
+
+    return [
+        (int(r), int(l), float(e), float(i))
+        for r, l, e, i in zip(new_repetitions, new_lapses, new_ease, new_interval)
+    ]
+
+
+class ReviewScheduler:
+    """计算并写入复习项的调度状态，不提交事务（recompute_due_dates 除外）"""
+
+    # 每次按 item_id IN (...) 查询已有复习项的数量
+    LOOKUP_CHUNK_SIZE = 500
+
+    def __init__(
+        self,
+        interval_modifier: float = REVIEW_INTERVAL_MODIFIER,
+        max_interval_days: float = REVIEW_MAX_INTERVAL_DAYS
+    ):
+        self.interval_modifier = interval_modifier
+        self.max_interval_days = max_interval_days
+
+    def _scheduled_micros(self, interval_days: float) -> int:
+        days = min(interval_days * self.interval_modifier, self.max_interval_days)
+        return round(days * MICROS_PER_DAY)
+
+    def due_at(self, reviewed_at: datetime, interval_days: float) -> datetime:
+        """复习时间加上（按系数缩放、不超过上限的）间隔"""
+        return reviewed_at + timedelta(microseconds=self._scheduled_micros(interval_days))
+
+    def due_dates(self, reviewed_at: Sequence[datetime], intervals: Sequence[float]) -> List[datetime]:
+        """批量计算到期时间，与逐个调用 due_at 的结果一致"""
+        if np is None or len(intervals) < NUMPY_MIN_BATCH:
+            return [self.due_at(at, interval) for at, interval in zip(reviewed_at, intervals)]
+
+        days = np.minimum(np.asarray(intervals, dtype=np.float64) * self.interval_modifier, self.max_interval_days)
+        micros = np.rint(days * MICROS_PER_DAY).astype("timedelta64[us]")
+        due = np.asarray(reviewed_at, dtype="datetime64[us]") + micros
+        return due.astype(datetime).tolist()
+
+    async def record(
+        self,
+        tenant_id: str,
+        outcomes: Iterable[ReviewOutcome],
+        db: AsyncSession,
+        now: Optional[datetime] = None
+    ) -> List[ReviewItemDB]:
+        """
+        记录一批复习结果并返回更新后的复习项（未加入会话的对象）
+
+        同一复习项出现多次时只取最后一次；已有复习项按主键批量更新，新复习项批量插入。
+        """
+        now = now or datetime.utcnow()
+        latest: Dict[Tuple[str, str], ReviewOutcome] = {}
+        for outcome in outcomes:
+            latest[(outcome.item_type, outcome.item_id)] = outcome
+
+        existing = await self._load_existing(tenant_id, list(latest), db)
+        return await self._write(tenant_id, list(latest.values()), existing, db, now)
+
+    async def _load_existing(
+        self,
+        tenant_id: str,
+        keys: List[Tuple[str, str]],
+        db: AsyncSession
+    ) -> Dict[Tuple[str, str], tuple]:
+        """按 (item_type, item_id) 分块查询已有复习项的调度状态"""
+        existing: Dict[Tuple[str, str], tuple] = {}
+        by_type: Dict[str, List[str]] = {}
+        for item_type, item_id in keys:
+            by_type.setdefault(item_type, []).append(item_id)
+        for item_type, item_ids in by_type.items():
+            for start in range(0, len(item_ids), self.LOOKUP_CHUNK_SIZE):
+                result = await db.execute(
+                    select(
+                        ReviewItemDB.item_id, ReviewItemDB.id, ReviewItemDB.created_at,
+                        ReviewItemDB.repetitions, ReviewItemDB.lapses,
+                        ReviewItemDB.ease, ReviewItemDB.interval_days
+                    ).where(
+                        ReviewItemDB.tenant_id == tenant_id,
+                        ReviewItemDB.item_type == item_type,
+                        ReviewItemDB.item_id.in_(item_ids[start:start + self.LOOKUP_CHUNK_SIZE])
+                    )
+                )
+                for row in result:
+                    existing[(item_type, row.item_id)] = tuple(row[1:])
+        return existing
+
+    async def record_session_subtasks(
+        self,
+        tenant_id: str,
+        qualities: Dict[str, int],
+        db: AsyncSession,
+        now: Optional[datetime] = None
+    ) -> List[ReviewItemDB]:
+        """
+        会话级别的 JOL/FOK 评估作用于会话下的全部子任务
+
+        一次外连接同时取出子任务和它们已有的复习项，qualities 为 {session_id: 回忆质量}。
+        """
+        if not qualities:
+            return []
+        now = now or datetime.utcnow()
+
+        result = await db.execute(
+            select(
+                SubTaskDB.id, SubTaskDB.session_id, ReviewItemDB.id, ReviewItemDB.created_at,
+                ReviewItemDB.repetitions, ReviewItemDB.lapses,
+                ReviewItemDB.ease, ReviewItemDB.interval_days
+            )
+            .outerjoin(ReviewItemDB, (
+                (ReviewItemDB.tenant_id == tenant_id)
+                & (ReviewItemDB.item_type == "subtask")
+                & (ReviewItemDB.item_id == SubTaskDB.id)
+            ))
+            .where(SubTaskDB.session_id.in_(list(qualities)))
+        )
+
+        outcomes = []
+        existing: Dict[Tuple[str, str], tuple] = {}
+        for subtask_id, session_id, *state in result:
+            outcomes.append(ReviewOutcome("subtask", subtask_id, qualities[session_id], session_id))
+            if state[0] is not None:
+                existing[("subtask", subtask_id)] = tuple(state)
+
+        return await self._write(tenant_id, outcomes, existing, db, now)
+
+    async def _write(
+        self,
+        tenant_id: str,
+        outcomes: List[ReviewOutcome],
+        existing: Dict[Tuple[str, str], tuple],
+        db: AsyncSession,
+        now: datetime,
+        retry_conflicts: bool = True
+    ) -> List[ReviewItemDB]:
+        """
+        existing 的值为 (id, created_at, repetitions, lapses, ease, interval_days)
+
+        新复习项用 ON CONFLICT DO NOTHING 插入：并发的首次复习已先插入同一复习项时，
+        跳过的行按对方写入的状态重新计算，再作为更新写入一次。
+        """
+        if not outcomes:
+            return []
+
+        states = []
+        for outcome in outcomes:
+            row = existing.get((outcome.item_type, outcome.item_id))
+            states.append(tuple(row[2:]) if row else (0, 0, INITIAL_EASE, 0.0))
+        new_states = next_states(states, [outcome.quality for outcome in outcomes])
+        due_dates = self.due_dates([now] * len(outcomes), [state[3] for state in new_states])
+
+        inserts, updates, items = [], [], []
+        for outcome, state, due_at in zip(outcomes, new_states, due_dates):
+            repetitions, lapses, ease, interval = state
+            row = existing.get((outcome.item_type, outcome.item_id))
+            values = {
+                "id": row[0] if row else generate_uuid(),
+                "repetitions": repetitions,
+                "lapses": lapses,
+                "ease": ease,
+                "interval_days": interval,
+                "last_quality": outcome.quality,
+                "last_reviewed_at": now,
+                "due_at": due_at,
+                "updated_at": now
+            }
+            if row:
+                updates.append(values)
+                created_at = row[1]
+            else:
+                inserts.append({
+                    **values,
+                    "tenant_id": tenant_id,
+                    "item_type": outcome.item_type,
+                    "item_id": outcome.item_id,
+                    "session_id": outcome.session_id,
+                    "created_at": now
+                })
+                created_at = now
+            items.append(ReviewItemDB(
+                **values, tenant_id=tenant_id, item_type=outcome.item_type, item_id=outcome.item_id,
+                session_id=outcome.session_id, created_at=created_at
+            ))
+
+        conflicts = set()
+        if inserts:
+            stmt = insert_ignoring_conflicts(
+                ReviewItemDB, ["tenant_id", "item_type", "item_id"], dialect_name(db)
+            ).returning(ReviewItemDB.item_type, ReviewItemDB.item_id)
+            inserted = set()
+            for start in range(0, len(inserts), self.LOOKUP_CHUNK_SIZE):
+                result = await db.execute(stmt, inserts[start:start + self.LOOKUP_CHUNK_SIZE])
+                inserted.update((row.item_type, row.item_id) for row in result)
+            conflicts = {(row["item_type"], row["item_id"]) for row in inserts} - inserted
+        for start in range(0, len(updates), self.LOOKUP_CHUNK_SIZE):
+            await db.execute(update(ReviewItemDB), updates[start:start + self.LOOKUP_CHUNK_SIZE])
+
+        if conflicts and retry_conflicts:
+            retried = [outcome for outcome in outcomes if (outcome.item_type, outcome.item_id) in conflicts]
+            current = await self._load_existing(tenant_id, list(conflicts), db)
+            rewritten = await self._write(tenant_id, retried, current, db, now, retry_conflicts=False)
+            by_key = {(item.item_type, item.item_id): item for item in rewritten}
+            items = [by_key.get((item.item_type, item.item_id), item) for item in items]
+
+        return items
+
+    async def recompute_due_dates(self, db: AsyncSession, tenant_id: Optional[str] = None) -> int:
+        """
+        按当前间隔系数和上限重算已复习项的到期时间，返回处理的行数
+
+        沿主键分块读取，每块批量计算后按主键 executemany 更新并提交，
+        不会长时间持有写锁，也不会把全部复习项载入内存。
+        """
+        last_id = ""
+        total = 0
+        while True:
+            stmt = (
+                select(ReviewItemDB.id, ReviewItemDB.last_reviewed_at, ReviewItemDB.interval_days)
+                .where(ReviewItemDB.id > last_id, ReviewItemDB.last_reviewed_at.is_not(None))
+                .order_by(ReviewItemDB.id)
+                .limit(RECOMPUTE_CHUNK_SIZE)
+            )
+            if tenant_id is not None:
+                stmt = stmt.where(ReviewItemDB.tenant_id == tenant_id)
+            rows = (await db.execute(stmt)).all()
+            if not rows:
+                return total
+
+            ids, reviewed_at, intervals = zip(*rows)
+            due_dates = self.due_dates(reviewed_at, intervals)
+            await db.execute(
+                update(ReviewItemDB),
+                [{"id": row_id, "due_at": due_at} for row_id, due_at in zip(ids, due_dates)]
+            )
+            await db.commit()
+
+            total += len(rows)
+            last_id = ids[-1]
+
+
+review_scheduler = ReviewScheduler()
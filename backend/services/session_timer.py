@@ -0,0 +1,239 @@
+"""
+学习倒计时调度服务
+时间分配后启动倒计时，到期时把会话推进到阻碍评估步骤并推送通知
+
+所有计时器由单个asyncio任务驱动，按截止时间放在最小堆中，
+调度/取消都是O(log n)，不会为每个会话创建一个休眠任务。
+
+多进程部署时每个进程都持有全部计时器（调度和取消通过 listeners 同步给其他进程），
+到期时用带条件的 UPDATE 认领会话，只有认领成功的进程推进会话并推送通知。
+"""
+
+import asyncio
+import heapq
+import itertools
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import select, update
+
+from database.database import AsyncSessionLocal
+from database.models import LearningSessionDB
+from services.notifications import notification_hub
+
+LEARNING_STEP = "learning_in_progress"
+EXPIRED_STEP = "obstacle_assessment"
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _to_timestamp(value: datetime) -> float:
+    """把naive UTC时间转换为时间戳"""
+    return (value - _EPOCH).total_seconds()
+
+
+def _from_timestamp(value: float) -> datetime:
+    return _EPOCH + timedelta(seconds=value)
+
+
+class SessionTimerScheduler:
+    """基于最小堆的会话倒计时调度器"""
+
+    # 每次到期处理的最大会话数，一批在一个事务里更新
+    EXPIRE_BATCH_SIZE = 500
+    # 启动恢复时每次从数据库读取的行数
+    RECOVER_CHUNK_SIZE = 1000
+
+    def __init__(self, session_factory=AsyncSessionLocal):
+        self._session_factory = session_factory
+        self._heap: List[Tuple[float, int, str]] = []  # (截止时间戳, 序号, 会话ID)
+        self._deadlines: Dict[str, float] = {}  # 每个会话当前有效的截止时间，堆中其余条目视为已取消
+        self._counter = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None  # 在调度循环所在的事件循环中创建
+        self._task: Optional[asyncio.Task] = None
+        # 本进程调度或取消计时器后调用 listener(session_id, deadline)，取消时 deadline 为 None
+        self.listeners: List[Callable[[str, Optional[datetime]], None]] = []
+
+    @property
+    def pending(self) -> int:
+        """待触发的计时器数量"""
+        return len(self._deadlines)
+
+    def get_deadline(self, session_id: str) -> Optional[datetime]:
+        deadline = self._deadlines.get(session_id)
+        return _from_timestamp(deadline) if deadline is not None else None
+
+    def schedule(self, session_id: str, deadline: datetime):
+        """为会话设置（或重设）到期时间，deadline为UTC时间"""
+        self._schedule(session_id, deadline)
+        for listener in self.listeners:
+            listener(session_id, deadline)
+
+    def cancel(self, session_id: str):
+        """取消会话的计时器（惰性删除，堆条目在弹出时丢弃）"""
+        self._cancel(session_id)
+        for listener in self.listeners:
+            listener(session_id, None)
+
+    def apply_remote(self, session_id: str, deadline: Optional[datetime]):
+        """应用其他进程的调度或取消，不再通知监听者"""
+        if deadline is None:
+            self._cancel(session_id)
+        else:
+            self._schedule(session_id, deadline)
+
+    def _schedule(self, session_id: str, deadline: datetime):
+        timestamp = _to_timestamp(deadline)
+        self._deadlines[session_id] = timestamp
+        heapq.heappush(self._heap, (timestamp, next(self._counter), session_id))
+
+        # 新的截止时间早于当前等待目标时唤醒调度循环
+        if self._wakeup is not None and self._heap[0][2] == session_id:
+            self._wakeup.set()
+
+        self._maybe_compact()
+
+    def _cancel(self, session_id: str):
+        self._deadlines.pop(session_id, None)
+        self._maybe_compact()
+
+    def _maybe_compact(self):
+        """被取消或重设的条目过多时重建堆，控制内存"""
+        if len(self._heap) > 2 * len(self._deadlines) + 1024:
+            self._heap = [
+                (deadline, next(self._counter), session_id)
+                for session_id, deadline in self._deadlines.items()
+            ]
+            heapq.heapify(self._heap)
+
+    async def start(self):
+        """从数据库恢复未到期的计时器并启动调度循环"""
+        if self._task is not None:
+            return
+        await self.recover()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._wakeup = None
+
+    async def recover(self) -> int:
+        """重启后恢复仍处于学习中的会话的计时器，返回恢复数量"""
+        recovered = 0
+        async with self._session_factory() as db:
+            result = await db.stream(
+                select(
+                    LearningSessionDB.id,
+                    LearningSessionDB.session_data,
+                    LearningSessionDB.updated_at
+                ).where(LearningSessionDB.current_step == LEARNING_STEP)
+            )
+            async for rows in result.partitions(self.RECOVER_CHUNK_SIZE):
+                for session_id, session_data, updated_at in rows:
+                    # 已在内存中调度的计时器以内存为准
+                    if session_id in self._deadlines:
+                        continue
+                    deadline = self._deadline_from_session_data(session_data or {}, updated_at)
+                    if deadline is not None:
+                        self._schedule(session_id, deadline)
+                        recovered += 1
+        return recovered
+
+    @staticmethod
+    def _deadline_from_session_data(session_data: dict, updated_at: Optional[datetime]) -> Optional[datetime]:
+        deadline = session_data.get('timer_deadline')
+        if deadline:
+            return datetime.fromisoformat(deadline)
+
+        # 兼容没有记录截止时间的旧会话：按进入学习状态的时间推算
+        allocated_minutes = session_data.get('allocated_minutes')
+        if allocated_minutes and updated_at:
+            return updated_at + timedelta(minutes=allocated_minutes)
+        return None
+
+    async def _run(self):
+        while True:
+            due = self._pop_due(_to_timestamp(datetime.utcnow()))
+            if due:
+                try:
+                    await self._expire(due)
+                except Exception as exc:
+                    # 数据库暂时不可用时稍后重试，不能让调度循环退出
+                    print(f"Session timer expiry failed: {exc}")
+                    for session_id, deadline in due:
+                        self._deadlines.setdefault(session_id, deadline)
+                        heapq.heappush(self._heap, (deadline, next(self._counter), session_id))
+                    await asyncio.sleep(1)
+                continue
+
+            timeout = None
+            if self._heap:
+                timeout = max(0.0, self._heap[0][0] - _to_timestamp(datetime.utcnow()))
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def _pop_due(self, now: float) -> List[Tuple[str, float]]:
+        """弹出所有已到期且仍有效的计时器"""
+        due = []
+        while self._heap and self._heap[0][0] <= now and len(due) < self.EXPIRE_BATCH_SIZE:
+            deadline, _, session_id = heapq.heappop(self._heap)
+            if self._deadlines.get(session_id) == deadline:
+                del self._deadlines[session_id]
+                due.append((session_id, deadline))
+        return due
+
+    async def _expire(self, due: List[Tuple[str, float]]):
+        """把到期的会话推进到阻碍评估步骤，并推送通知
+
+        先用带条件的 UPDATE ... RETURNING 认领仍在学习中的会话：多个进程同时到期时
+        只有一个进程能认领到某个会话，只有它写入到期时间并推送通知
+        """
+        expired_at = datetime.utcnow()
+
+        async with self._session_factory() as db:
+            result = await db.execute(
+                update(LearningSessionDB)
+                .where(
+                    LearningSessionDB.id.in_([session_id for session_id, _ in due]),
+                    LearningSessionDB.current_step == LEARNING_STEP
+                )
+                .values(current_step=EXPIRED_STEP)
+                .returning(LearningSessionDB.id, LearningSessionDB.session_data)
+                .execution_options(synchronize_session=False)
+            )
+
+            updates = []
+            for session_id, session_data in result.all():
+                session_data = dict(session_data or {})
+                session_data['timer_expired_at'] = expired_at.isoformat()
+                updates.append({"id": session_id, "session_data": session_data})
+
+            if not updates:
+                await db.rollback()
+                return
+
+            await db.execute(update(LearningSessionDB), updates)
+            await db.commit()
+
+        for item in updates:
+            notification_hub.publish(item["id"], {
+                "type": "timer_expired",
+                "session_id": item["id"],
+                "next_step": EXPIRED_STEP,
+                "expired_at": expired_at.isoformat()
+            })
+
+
+session_timer = SessionTimerScheduler()
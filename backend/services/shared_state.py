@@ -0,0 +1,228 @@
+"""
+多进程共享状态
+多个工作进程部署时，每个进程各自持有搜索索引、模型结果缓存和 SSE 订阅者，
+本进程的写入需要通知其他进程，否则各进程的状态会逐渐不一致。
+
+SHARED_STATE_BACKEND：
+- memory：单进程部署（默认），不广播
+- database：通过应用数据库的 shared_events 表广播（SQLite 同机多进程或 PostgreSQL 多机），
+  发布时先写入本地发件箱，由后台任务批量插入；同一个后台任务按编号增量读取其他进程发布的事件并分发
+
+事件只保留 SHARED_STATE_RETENTION 秒，只用于传播变更，不作为持久状态；
+进程启动时从当前最大编号开始读取，不回放历史事件（索引和缓存在启动时本来就是从数据库或空状态开始的）。
+"""
+
+import asyncio
+import inspect
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Union
+
+from sqlalchemy import delete, func, insert, select
+
+from database.models import SharedEventDB
+
+SHARED_STATE_BACKEND = os.getenv("SHARED_STATE_BACKEND", "memory")
+# 读取其他进程事件的间隔，决定跨进程失效的延迟上限
+SHARED_STATE_POLL_MS = float(os.getenv("SHARED_STATE_POLL_MS", "200"))
+SHARED_STATE_RETENTION = float(os.getenv("SHARED_STATE_RETENTION", "300"))
+
+Handler = Callable[[Dict[str, Any]], Union[None, Awaitable[None]]]
+
+
+class SharedStateBus:
+    """进程间事件广播"""
+
+    # PostgreSQL 上编号按插入顺序分配但提交顺序可能不同，每次回看最近这么多个编号，补上晚提交的事件；
+    # SQLite 的写入是串行的，编号顺序就是提交顺序，不需要回看
+    LOOKBACK = 100
+    BATCH_SIZE = 500
+    PRUNE_INTERVAL = 60.0
+
+    def __init__(
+        self,
+        backend: str = SHARED_STATE_BACKEND,
+        engine=None,
+        poll_interval: float = SHARED_STATE_POLL_MS / 1000,
+        retention: float = SHARED_STATE_RETENTION
+    ):
+        self.backend = backend
+        self.worker_id = uuid.uuid4().hex
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self._engine = engine
+        self._handlers: Dict[str, List[Handler]] = {}
+        self._outbox: List[Dict[str, Any]] = []
+        self._cursor = 0
+        self._lookback = 0
+        self._seen: Set[int] = set()
+        self._wakeup: Optional[asyncio.Event] = None  # 在后台任务所在的事件循环中创建
+        self._task: Optional[asyncio.Task] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._last_prune = 0.0
+
+        # 指标
+        self.published = 0
+        self.received = 0
+        self.errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend != "memory"
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            from database.database import async_engine
+            self._engine = async_engine
+        return self._engine
+
+    def subscribe(self, channel: str, handler: Handler):
+        """注册其他进程发布到 channel 的事件的处理函数（可以是协程函数）"""
+        self._handlers.setdefault(channel, []).append(handler)
+
+    def publish(self, channel: str, payload: Dict[str, Any]):
+        """广播事件给其他进程（本进程的处理由调用方自己完成），不等待写入"""
+        if not self.enabled:
+            return
+        self._outbox.append({
+            "channel": channel,
+            "payload": payload,
+            "origin": self.worker_id,
+            "created_at": datetime.utcnow(),
+        })
+        self.published += 1
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def start(self):
+        """从当前最大编号开始读取事件并启动后台任务"""
+        if not self.enabled or self._task is not None:
+            return
+        async with self.engine.connect() as conn:
+            self._cursor = (await conn.execute(select(func.max(SharedEventDB.id)))).scalar() or 0
+        self._lookback = self.LOOKBACK if self.engine.dialect.name == "postgresql" else 0
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._wakeup = None
+        self._lock = None
+        # 退出前把未发出的事件写完
+        await self.flush()
+
+    async def flush(self) -> int:
+        """把发件箱中的事件写入数据库，返回写入条数；返回时此前发布的事件都已写入"""
+        # 和后台任务的写入串行，避免另一批事件还在写入时就返回
+        async with self._get_lock():
+            if not self._outbox:
+                return 0
+            rows, self._outbox = self._outbox, []
+            try:
+                async with self.engine.begin() as conn:
+                    await conn.execute(insert(SharedEventDB), rows)
+            except Exception:
+                self._outbox[:0] = rows
+                raise
+            return len(rows)
+
+    async def poll(self) -> int:
+        """读取并分发其他进程发布的新事件，返回分发条数"""
+        # 并发读取会互相改动游标和已读集合，和写入共用一把锁串行执行
+        async with self._get_lock():
+            return await self._poll()
+
+    def _get_lock(self) -> asyncio.Lock:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    async def _poll(self) -> int:
+        dispatched = 0
+        while True:
+            async with self.engine.connect() as conn:
+                result = await conn.execute(
+                    select(SharedEventDB.id, SharedEventDB.channel, SharedEventDB.payload, SharedEventDB.origin)
+                    .where(SharedEventDB.id > self._cursor - self._lookback)
+                    .order_by(SharedEventDB.id)
+                    .limit(self.BATCH_SIZE + self._lookback)
+                )
+                rows = result.all()
+
+            fresh = 0
+            for event_id, channel, payload, origin in rows:
+                if event_id in self._seen:
+                    continue
+                self._seen.add(event_id)
+                self._cursor = max(self._cursor, event_id)
+                fresh += 1
+                if origin != self.worker_id:
+                    await self._dispatch(channel, payload)
+                    dispatched += 1
+
+            floor = self._cursor - self._lookback
+            self._seen = {event_id for event_id in self._seen if event_id > floor}
+            if fresh < self.BATCH_SIZE:
+                return dispatched
+
+    async def _dispatch(self, channel: str, payload: Dict[str, Any]):
+        self.received += 1
+        for handler in self._handlers.get(channel, ()):
+            try:
+                result = handler(payload)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as exc:
+                self.errors += 1
+                print(f"Shared state handler for {channel} failed: {exc!r}")
+
+    async def prune(self) -> int:
+        """删除超过保留时间的事件"""
+        cutoff = datetime.utcnow() - timedelta(seconds=self.retention)
+        async with self.engine.begin() as conn:
+            result = await conn.execute(delete(SharedEventDB).where(SharedEventDB.created_at < cutoff))
+        return result.rowcount or 0
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                await self.flush()
+                await self.poll()
+                if loop.time() - self._last_prune > self.PRUNE_INTERVAL:
+                    self._last_prune = loop.time()
+                    await self.prune()
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                # 数据库暂时不可用时稍后重试，不能让后台任务退出
+                self.errors += 1
+                print(f"Shared state sync failed: {exc!r}")
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend,
+            "worker_id": self.worker_id,
+            "published": self.published,
+            "received": self.received,
+            "pending": len(self._outbox),
+            "errors": self.errors,
+        }
+
+
+shared_state = SharedStateBus()
@@ -0,0 +1,109 @@
+"""
+相同请求合并（single-flight）
+同一时刻对同一个键的多次调用只真正执行一次，其余调用方等待同一个结果。
+适用于一个班的学生同时提交同一道题这类突发的重复模型调用。
+
+底层调用在独立的任务中执行：某个调用方被取消不会影响其他调用方，
+只有全部调用方都取消时才取消底层调用。
+"""
+
+import asyncio
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class _Call:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Future):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """按键合并并发调用"""
+
+    def __init__(self, max_tracked_keys: int = 1000):
+        self.max_tracked_keys = max_tracked_keys
+        self._calls: Dict[Hashable, _Call] = {}
+        # 每个键的统计（只保留最近的 max_tracked_keys 个键）
+        self._key_stats: "OrderedDict[Hashable, Dict[str, int]]" = OrderedDict()
+
+        # 指标
+        self.executions = 0
+        self.coalesced = 0
+        self.cancelled = 0
+        self.max_waiters = 0
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    def _record(self, key: Hashable, field: str):
+        stats = self._key_stats.get(key)
+        if stats is None:
+            stats = self._key_stats[key] = {"executions": 0, "coalesced": 0}
+            while len(self._key_stats) > self.max_tracked_keys:
+                self._key_stats.popitem(last=False)
+        else:
+            self._key_stats.move_to_end(key)
+        stats[field] += 1
+
+    def _forget(self, key: Hashable, call: _Call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def _on_done(self, key: Hashable, call: _Call, task: asyncio.Future):
+        self._forget(key, call)
+        # 所有调用方都已离开时，避免“异常未被获取”的警告
+        if not task.cancelled():
+            task.exception()
+
+    async def do(self, key: Hashable, factory: Callable[[], Awaitable[T]]) -> T:
+        """执行 factory()，相同键已有进行中的调用时直接等待它的结果"""
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(factory()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda task, key=key, call=call: self._on_done(key, call, task))
+            self.executions += 1
+            self._record(key, "executions")
+        else:
+            self.coalesced += 1
+            self._record(key, "coalesced")
+
+        call.waiters += 1
+        self.max_waiters = max(self.max_waiters, call.waiters)
+        try:
+            return await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            if call.waiters == 1 and not call.task.done():
+                # 最后一个调用方也离开了，底层调用已无人需要
+                self._forget(key, call)
+                call.task.cancel()
+                self.cancelled += 1
+            raise
+        finally:
+            call.waiters -= 1
+
+    def key_metrics(self, limit: int = 20) -> Dict[str, Dict[str, int]]:
+        """合并次数最多的键"""
+        top = sorted(self._key_stats.items(), key=lambda item: item[1]["coalesced"], reverse=True)[:limit]
+        return {str(key): dict(stats) for key, stats in top}
+
+    def metrics(self) -> Dict[str, Any]:
+        calls = self.executions + self.coalesced
+        return {
+            "in_flight": self.in_flight,
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "coalesce_rate": round(self.coalesced / calls, 4) if calls else 0.0,
+            "cancelled": self.cancelled,
+            "max_waiters": self.max_waiters,
+            "top_keys": self.key_metrics(),
+        }
+
+
+llm_flight = SingleFlight()
@@ -1,15 +1,286 @@
 """
 子任务生成服务
 根据选择的认知地图连线生成具体的学习子任务
+
+异步接口优先调用大模型：多条连线合并为一次调用，输出校验为 SubTaskCreate，
+按连线签名缓存；某一批超出延迟预算或失败时，只有这一批退回模板生成。
 """
 
-from typing import List, Dict, Any
+import asyncio
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, List, Dict, Any, NamedTuple, Optional, Sequence, Tuple
+
+from pydantic import ValidationError
+
 from models.schemas import SubTaskCreate, MasteryLevel
+from services.decomposition_cache import normalize_problem
+from services.llm_gateway import LLMError, LLMGateway, LLMRequest, llm_gateway
+from services.single_flight import SingleFlight, llm_flight
+
+# auto：接入真实模型时优先调用模型，Stub 时只用模板；llm：总是优先调用模型；template：只用模板
+SUBTASK_GENERATION_MODE = os.getenv("SUBTASK_GENERATION_MODE", "auto")
+# 模型生成的硬性延迟上限（秒），超出即使用模板结果
+SUBTASK_LATENCY_BUDGET = float(os.getenv("SUBTASK_LATENCY_BUDGET", "3"))
+SUBTASK_CACHE_SIZE = int(os.getenv("SUBTASK_CACHE_SIZE", "2000"))
+SUBTASK_CACHE_TTL = float(os.getenv("SUBTASK_CACHE_TTL", str(24 * 3600)))
+# 单次调用最多合并的连线数，过长的提示词反而更慢
+SUBTASK_BATCH_SIZE = int(os.getenv("SUBTASK_BATCH_SIZE", "8"))
+
+SUBTASK_SYSTEM_PROMPT = (
+    "你是元认知学习导航助手。针对认知地图中的每条连线（源概念 -> 目标概念，以及关系类型），"
+    "设计 2 到 5 个循序渐进的学习子任务。只输出JSON，格式为："
+    '{"edges": [{"index": 连线编号, "subtasks": [{"name": "...", "description": "...", '
+    '"mastery_expectation": "语义级别的公式推导|建立表象的直觉理解"}]}]}'
+)
+
+MAX_SUBTASKS_PER_EDGE = 5
+
+
+class SubTaskEdge(NamedTuple):
+    source: str
+    target: str
+    relationship_type: str
+
+
+@dataclass
+class GeneratedSubTasks:
+    sub_tasks: List[SubTaskCreate]
+    source: str  # llm / cache / template
+
+
+def edge_signature(edge: SubTaskEdge, problem_context: str = "") -> str:
+    """连线签名：端点、关系类型和规范化后的问题上下文"""
+    raw = "\x1f".join([
+        edge.source.strip(), edge.target.strip(), edge.relationship_type, normalize_problem(problem_context)
+    ])
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class SubTaskCache:
+    """按连线签名缓存模型生成的子任务（LRU + TTL）"""
+
+    def __init__(self, max_size: int = SUBTASK_CACHE_SIZE, ttl: float = SUBTASK_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, List[SubTaskCreate]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        # 本进程写入或失效条目后调用 listener(op, signature, sub_tasks)，op 为 put/invalidate/clear
+        self.listeners: List[Callable[[str, Optional[str], Optional[List[SubTaskCreate]]], None]] = []
+
+    def get(self, signature: str) -> Optional[List[SubTaskCreate]]:
+        entry = self._entries.get(signature)
+        if entry is None or time.monotonic() - entry[0] > self.ttl:
+            if entry is not None:
+                del self._entries[signature]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(signature)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, signature: str, sub_tasks: List[SubTaskCreate]):
+        self._store(signature, sub_tasks)
+        self._notify("put", signature, sub_tasks)
+
+    def invalidate(self, signature: str) -> bool:
+        found = self._entries.pop(signature, None) is not None
+        self._notify("invalidate", signature, None)
+        return found
+
+    def clear(self):
+        self._entries.clear()
+        self._notify("clear", None, None)
+
+    def _store(self, signature: str, sub_tasks: List[SubTaskCreate]):
+        self._entries[signature] = (time.monotonic(), sub_tasks)
+        self._entries.move_to_end(signature)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def _notify(self, op: str, signature: Optional[str], sub_tasks: Optional[List[SubTaskCreate]]):
+        for listener in self.listeners:
+            listener(op, signature, sub_tasks)
+
+    def apply_remote(self, op: str, signature: Optional[str], sub_tasks: Optional[List[SubTaskCreate]]):
+        """应用其他进程的写入或失效，不再通知监听者"""
+        if op == "put" and signature is not None and sub_tasks is not None:
+            self._store(signature, sub_tasks)
+        elif op == "invalidate" and signature is not None:
+            self._entries.pop(signature, None)
+        elif op == "clear":
+            self._entries.clear()
+
+    def metrics(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+subtask_cache = SubTaskCache()
+
+
+def _parse_mastery(value: Any) -> Optional[MasteryLevel]:
+    try:
+        return MasteryLevel(value)
+    except ValueError:
+        return None
+
+
+def parse_subtasks(raw_subtasks: Any) -> List[SubTaskCreate]:
+    """校验单条连线的子任务，丢弃无效项并按输出顺序重新编号"""
+    if not isinstance(raw_subtasks, list):
+        return []
+    sub_tasks = []
+    for raw in raw_subtasks:
+        if len(sub_tasks) >= MAX_SUBTASKS_PER_EDGE:
+            break
+        if not isinstance(raw, dict) or not str(raw.get("name", "")).strip():
+            continue
+        try:
+            sub_tasks.append(SubTaskCreate(
+                name=str(raw["name"]).strip(),
+                description=raw.get("description"),
+                order=len(sub_tasks) + 1,
+                mastery_expectation=_parse_mastery(raw.get("mastery_expectation"))
+            ))
+        except ValidationError:
+            continue
+    return sub_tasks
 
 
 class SubTaskGenerator:
     """子任务生成器"""
     
+    def __init__(
+        self,
+        gateway: LLMGateway = llm_gateway,
+        cache: Optional[SubTaskCache] = subtask_cache,
+        flight: Optional[SingleFlight] = llm_flight,
+        mode: str = SUBTASK_GENERATION_MODE,
+        latency_budget: float = SUBTASK_LATENCY_BUDGET
+    ):
+        self.gateway = gateway
+        self.cache = cache
+        self.flight = flight
+        self.mode = mode
+        self.latency_budget = latency_budget
+    
+    def uses_llm(self) -> bool:
+        """是否调用模型生成子任务：auto 模式下 Stub 的通用输出不如按关系类型的模板，直接用模板"""
+        if self.mode == "auto":
+            return self.gateway.provider.name != "stub"
+        return self.mode == "llm"
+
+    async def generate_subtasks_async(
+        self,
+        source_node_name: str,
+        target_node_name: str,
+        relationship_type: str,
+        problem_context: str = ""
+    ) -> List[SubTaskCreate]:
+        """为单条连线生成子任务（优先调用模型）"""
+        edge = SubTaskEdge(source_node_name, target_node_name, relationship_type)
+        results = await self.generate_subtasks_batch([edge], problem_context)
+        return results[0].sub_tasks
+    
+    async def generate_subtasks_batch(
+        self,
+        edges: Sequence[SubTaskEdge],
+        problem_context: str = ""
+    ) -> List[GeneratedSubTasks]:
+        """
+        为多条连线生成子任务，结果与输入顺序一致
+        缓存未命中的连线合并为一次模型调用，整体耗时不超过延迟预算
+        """
+        results: List[Optional[GeneratedSubTasks]] = [None] * len(edges)
+        signatures = [edge_signature(edge, problem_context) for edge in edges]
+        
+        missing = []
+        for i, signature in enumerate(signatures):
+            cached = self.cache.get(signature) if self.cache is not None else None
+            if cached is not None:
+                results[i] = GeneratedSubTasks(cached, "cache")
+            else:
+                missing.append(i)
+        
+        if missing and self.uses_llm():
+            batches = [missing[i:i + SUBTASK_BATCH_SIZE] for i in range(0, len(missing), SUBTASK_BATCH_SIZE)]
+            # 各批并发执行、各自受延迟预算约束，失败或超时的一批单独退回模板
+            generated = await asyncio.gather(*[
+                asyncio.wait_for(
+                    self._generate_with_llm([edges[i] for i in batch], [signatures[i] for i in batch], problem_context),
+                    self.latency_budget
+                )
+                for batch in batches
+            ], return_exceptions=True)
+            for batch, batch_results in zip(batches, generated):
+                if isinstance(batch_results, (asyncio.TimeoutError, LLMError)):
+                    continue
+                if isinstance(batch_results, BaseException):
+                    raise batch_results
+                for i, sub_tasks in zip(batch, batch_results):
+                    if sub_tasks:
+                        results[i] = GeneratedSubTasks(sub_tasks, "llm")
+        
+        for i, result in enumerate(results):
+            if result is None:
+                edge = edges[i]
+                results[i] = GeneratedSubTasks(
+                    self.generate_subtasks(edge.source, edge.target, edge.relationship_type, problem_context),
+                    "template"
+                )
+        return results
+    
+    async def _generate_with_llm(
+        self,
+        edges: List[SubTaskEdge],
+        signatures: List[str],
+        problem_context: str
+    ) -> List[List[SubTaskCreate]]:
+        """一次调用生成多条连线的子任务，相同的一批连线同时只调用一次"""
+        async def call_model() -> List[List[SubTaskCreate]]:
+            lines = [
+                f"{i}. {edge.source} -> {edge.target}（{edge.relationship_type}）"
+                for i, edge in enumerate(edges)
+            ]
+            request = LLMRequest(
+                task="subtask_generation",
+                messages=[
+                    {"role": "system", "content": SUBTASK_SYSTEM_PROMPT},
+                    {"role": "user", "content": f"学习问题：{problem_context}\n连线：\n" + "\n".join(lines)},
+                ],
+                context={"edges": [edge._asdict() for edge in edges], "problem_context": problem_context}
+            )
+            data = await self.gateway.complete_json(request)
+            
+            by_index: List[List[SubTaskCreate]] = [[] for _ in edges]
+            raw_edges = data.get("edges") if isinstance(data, dict) else None
+            for position, raw in enumerate(raw_edges if isinstance(raw_edges, list) else []):
+                if not isinstance(raw, dict):
+                    continue
+                index = raw.get("index", position)
+                if isinstance(index, int) and 0 <= index < len(edges) and not by_index[index]:
+                    by_index[index] = parse_subtasks(raw.get("subtasks"))
+            
+            if self.cache is not None:
+                for signature, sub_tasks in zip(signatures, by_index):
+                    if sub_tasks:
+                        self.cache.put(signature, sub_tasks)
+            return by_index
+        
+        if self.flight is None:
+            return await call_model()
+        return await self.flight.do(("subtask_generation", tuple(signatures)), call_model)
+    
     def generate_subtasks(
         self, 
         source_node_name: str, 
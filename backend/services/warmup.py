@@ -0,0 +1,151 @@
+"""
+快速启动与预热
+缩容到零后第一个请求要等进程冷启动完成。STARTUP_MODE=fast 时：
+
+- 数据库表和迁移版本已是最新时跳过 create_all 和迁移
+- 开始接收请求后在后台预热：热点查询的编译缓存和连接池、关键词词典和正则、按需导入的模块、
+  Pydantic 模型和 OpenAPI 文档，以及关键词进程池（可选）
+
+预热不放在启动阶段：第一个请求本来就要承担它用到的那部分开销，提前做只会推迟端口就绪。
+后台预热和请求争用 GIL，所以启动后先等待 WARMUP_DELAY_MS，让唤醒实例的那批请求先完成；
+预热完成前到达的请求照常处理，只是自己承担首次开销。
+httpx、PostgreSQL 方言等只在特定部署下才需要的模块已改为按需导入，两种模式都不会在启动时加载。
+"""
+
+import asyncio
+import importlib
+import os
+import time
+from typing import Callable, Dict, Optional
+
+# standard：启动时执行 create_all 和迁移，不预热；fast：跳过已是最新的建表并在后台预热
+STARTUP_MODE = os.getenv("STARTUP_MODE", "standard")
+FAST_STARTUP = STARTUP_MODE == "fast"
+# 预热时是否提前启动关键词提取进程池（每个工作进程都会占用内存）
+WARM_KEYWORD_POOL = os.getenv("WARM_KEYWORD_POOL", "false").lower() == "true"
+# 启动后等待多久再开始后台预热
+WARMUP_DELAY_MS = float(os.getenv("WARMUP_DELAY_MS", "200"))
+
+_WARMUP_TEXT = "学习 Transformer 注意力机制和 pandas 数据分析 (Machine Learning)"
+
+
+def warm_models(app) -> int:
+    """补全未完成的Pydantic模型并生成OpenAPI文档，返回检查的模型数"""
+    from pydantic import BaseModel
+
+    from models import schemas
+
+    models = [
+        value for value in vars(schemas).values()
+        if isinstance(value, type) and issubclass(value, BaseModel) and value is not BaseModel
+    ]
+    for model in models:
+        if not model.__pydantic_complete__:
+            model.model_rebuild()
+    # /docs 和 /openapi.json 第一次访问时才生成，涉及所有模型的 JSON Schema
+    app.openapi()
+    return len(models)
+
+
+def warm_keywords() -> int:
+    """执行一次关键词提取和资源分词，加载词典并编译正则"""
+    from services.keyword_extractor import KeywordExtractor
+    from services.resource_index import tokenize
+
+    extractor = KeywordExtractor()
+    keywords = extractor.extract_keywords(_WARMUP_TEXT)
+    extractor.extract_phrases(_WARMUP_TEXT)
+    tokenize(_WARMUP_TEXT)
+    return len(keywords)
+
+
+def warm_imports() -> int:
+    """导入按需加载的模块：配置了真实模型服务时提前加载 httpx"""
+    from services.llm_gateway import llm_gateway
+
+    modules = ["httpx"] if llm_gateway.provider.name != "stub" else []
+    for name in modules:
+        importlib.import_module(name)
+    return len(modules)
+
+
+async def warm_keyword_pool() -> int:
+    """让关键词进程池的每个工作进程都启动并导入关键词提取模块"""
+    from services.card_io import _get_keyword_pool, _keyword_workers
+    from services.keyword_extractor import extract_keywords_batch
+
+    if _keyword_workers <= 1:
+        return 0
+    loop = asyncio.get_running_loop()
+    pool = _get_keyword_pool()
+    await asyncio.gather(*[
+        loop.run_in_executor(pool, extract_keywords_batch, [_WARMUP_TEXT]) for _ in range(_keyword_workers)
+    ])
+    return _keyword_workers
+
+
+async def warm_queries() -> int:
+    """配置ORM映射，在主库和只读库上执行一遍热点查询，建立连接并填充语句编译缓存"""
+    from sqlalchemy.orm import configure_mappers
+
+    from database.database import async_engine, read_engine
+    from database.query_plans import HOT_QUERIES
+
+    configure_mappers()
+    engines = [async_engine] if read_engine is async_engine else [async_engine, read_engine]
+    executed = 0
+    for engine in engines:
+        async with engine.connect() as conn:
+            for query in HOT_QUERIES:
+                await conn.execute(query.build())
+                executed += 1
+    return executed
+
+
+async def _run_steps(steps: Dict[str, Callable]) -> Dict[str, float]:
+    """依次执行各项预热，返回每项耗时（毫秒）；单项失败只打印警告，不影响服务"""
+    timings = {}
+    for name, step in steps.items():
+        started = time.perf_counter()
+        try:
+            await step()
+        except Exception as exc:  # 预热只是优化，失败时由第一个请求自己承担开销
+            print(f"⚠️  Warmup step {name} failed: {exc!r}")
+            continue
+        timings[name] = (time.perf_counter() - started) * 1000
+    return timings
+
+
+async def prewarm(app) -> Dict[str, float]:
+    """执行全部预热，耗时短、命中频繁的在前"""
+    steps: Dict[str, Callable] = {
+        "queries": warm_queries,
+        "keywords": lambda: asyncio.to_thread(warm_keywords),
+        "imports": lambda: asyncio.to_thread(warm_imports),
+        "models": lambda: asyncio.to_thread(warm_models, app),
+    }
+    if WARM_KEYWORD_POOL:
+        steps["keyword_pool"] = warm_keyword_pool
+    return await _run_steps(steps)
+
+
+def start_prewarm(app, delay_ms: float = WARMUP_DELAY_MS) -> asyncio.Task:
+    """在后台启动预热，结果保存在 app.state.warmup_timings"""
+    async def run():
+        await asyncio.sleep(delay_ms / 1000)
+        started = time.perf_counter()
+        timings = await prewarm(app)
+        app.state.warmup_timings = timings
+        print(f"Warmup finished in {(time.perf_counter() - started) * 1000:.0f}ms: "
+              + ", ".join(f"{name}={ms:.0f}ms" for name, ms in timings.items()))
+
+    return asyncio.create_task(run())
+
+
+async def stop_prewarm(task: Optional[asyncio.Task]):
+    if task is not None and not task.done():
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
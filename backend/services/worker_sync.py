@@ -0,0 +1,88 @@
+"""
+多进程状态同步
+把本进程的搜索索引、模型结果缓存、会话通知和学习倒计时的变更通过共享状态总线广播给其他工作进程，
+并把其他进程的变更应用到本进程（应用时不再广播，避免回环）。
+
+- 搜索索引：只广播变更的ID，其他进程从数据库读取最新内容
+- 任务拆解缓存、子任务缓存：广播写入和失效（写入带上结果，其他进程不用重复调用模型）
+- 会话通知：SSE 连接可能在任何一个进程上，事件在所有进程投递
+- 学习倒计时：所有进程都持有计时器，到期时由 session_timer 通过数据库认领保证只触发一次
+"""
+
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from pydantic import TypeAdapter
+
+from database.database import AsyncSessionLocal
+from models.schemas import SubTaskCreate, TaskDecompositionResponse
+from services.card_index import card_index
+from services.decomposition_cache import decomposition_cache
+from services.notifications import notification_hub
+from services.resource_index import resource_index
+from services.session_timer import session_timer
+from services.shared_state import SharedStateBus, shared_state
+from services.subtask_generator import subtask_cache
+
+_subtask_list = TypeAdapter(List[SubTaskCreate])
+
+
+def _sync_index(bus: SharedStateBus, channel: str, index):
+    def on_change(ids: List[str]):
+        bus.publish(channel, {"ids": ids})
+
+    async def on_remote(payload: Dict[str, Any]):
+        async with AsyncSessionLocal() as db:
+            await index.refresh(payload["ids"], db)
+
+    index.listeners.append(on_change)
+    bus.subscribe(channel, on_remote)
+
+
+def _sync_cache(bus: SharedStateBus, channel: str, cache, dump, load):
+    def on_change(op: str, key: Optional[str], value):
+        bus.publish(channel, {"op": op, "key": key, "value": dump(value) if value is not None else None})
+
+    def on_remote(payload: Dict[str, Any]):
+        value = payload.get("value")
+        cache.apply_remote(payload["op"], payload.get("key"), load(value) if value is not None else None)
+
+    cache.listeners.append(on_change)
+    bus.subscribe(channel, on_remote)
+
+
+def install_worker_sync(bus: SharedStateBus = shared_state) -> bool:
+    """注册各组件的监听和处理函数，总线未启用（单进程部署）时不做任何事，返回是否已注册"""
+    if not bus.enabled:
+        return False
+
+    _sync_index(bus, "card_index", card_index)
+    _sync_index(bus, "resource_index", resource_index)
+
+    _sync_cache(
+        bus, "decomposition_cache", decomposition_cache,
+        dump=lambda response: response.model_dump(mode="json"),
+        load=TaskDecompositionResponse.model_validate
+    )
+    _sync_cache(
+        bus, "subtask_cache", subtask_cache,
+        dump=lambda sub_tasks: _subtask_list.dump_python(sub_tasks, mode="json"),
+        load=_subtask_list.validate_python
+    )
+
+    notification_hub.listeners.append(
+        lambda session_id, event: bus.publish("notifications", {"session_id": session_id, "event": event})
+    )
+    bus.subscribe("notifications", lambda payload: notification_hub.deliver(payload["session_id"], payload["event"]))
+
+    session_timer.listeners.append(
+        lambda session_id, deadline: bus.publish("session_timer", {
+            "session_id": session_id,
+            "deadline": deadline.isoformat() if deadline is not None else None,
+        })
+    )
+    bus.subscribe("session_timer", lambda payload: session_timer.apply_remote(
+        payload["session_id"],
+        datetime.fromisoformat(payload["deadline"]) if payload["deadline"] else None
+    ))
+    return True
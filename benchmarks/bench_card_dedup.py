@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+近似重复检测基准测试
+写入一批卡片（其中一部分是改动了个别词的副本），测量：
+- 全量检测的耗时和吞吐，以及找出的重复对占植入副本的比例
+- 再写入少量卡片后增量检测的耗时（只为新卡片签名并查已有分桶）
+
+用法:
+    python benchmarks/bench_card_dedup.py --cards 50000 --duplicates 0.05 --new 100
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+# 使用临时数据库，避免污染开发数据
+_tmp_dir = tempfile.mkdtemp(prefix="metalearn_bench_")
+os.environ["ASYNC_DATABASE_URL"] = f"sqlite+aiosqlite:///{_tmp_dir}/bench.db"
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp_dir}/bench.db"
+
+from sqlalchemy import insert  # noqa: E402
+
+from database.database import AsyncSessionLocal, init_db, close_db  # noqa: E402
+from database.models import KnowledgeCardDB, generate_uuid  # noqa: E402
+from services.card_dedup import CardDedupJob, np  # noqa: E402
+
+TENANT = "bench"
+VOCABULARY = [f"term{i}" for i in range(20000)]
+
+
+def _mutate(words, rng):
+    """替换其中一个词，模拟用户重复保存时的小改动"""
+    words = list(words)
+    words[rng.randrange(len(words))] = rng.choice(VOCABULARY)
+    return words
+
+
+async def seed_cards(total: int, duplicate_ratio: float, rng: random.Random, start_time: datetime) -> int:
+    """写入卡片，返回植入的副本数"""
+    planted = 0
+    originals = []
+    async with AsyncSessionLocal() as db:
+        for start in range(0, total, 5000):
+            rows = []
+            for i in range(start, min(start + 5000, total)):
+                if originals and rng.random() < duplicate_ratio:
+                    words = _mutate(rng.choice(originals), rng)
+                    planted += 1
+                else:
+                    words = rng.sample(VOCABULARY, 40)
+                    originals.append(words)
+                timestamp = start_time + timedelta(milliseconds=i)
+                rows.append({
+                    "id": generate_uuid(),
+                    "tenant_id": TENANT,
+                    "title": f"卡片 {i}",
+                    "content": " ".join(words),
+                    "keywords": [],
+                    "created_at": timestamp,
+                    "updated_at": timestamp
+                })
+            await db.execute(insert(KnowledgeCardDB), rows)
+            await db.commit()
+    return planted
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="近似重复检测基准")
+    parser.add_argument("--cards", type=int, default=20000)
+    parser.add_argument("--duplicates", type=float, default=0.05, help="副本占比")
+    parser.add_argument("--new", type=int, default=100, help="增量检测前新写入的卡片数")
+    args = parser.parse_args()
+
+    rng = random.Random(11)
+    print(f"numpy: {'已安装' if np is not None else '未安装（逐个排列计算）'}")
+    await init_db()
+    print(f"📦 写入 {args.cards} 张卡片...")
+    planted = await seed_cards(args.cards, args.duplicates, rng, datetime.utcnow() - timedelta(hours=1))
+
+    job = CardDedupJob()
+    async with AsyncSessionLocal() as db:
+        started = time.perf_counter()
+        full = await job.run(TENANT, db, full=True)
+        elapsed = time.perf_counter() - started
+    print(f"\n全量检测: {full['signed']} 张，{elapsed:.1f}s（{full['signed'] / elapsed:,.0f} 张/秒）")
+    print(f"找出重复对 {full['pairs']}，植入副本 {planted}")
+
+    await seed_cards(args.new, args.duplicates, rng, datetime.utcnow())
+    async with AsyncSessionLocal() as db:
+        started = time.perf_counter()
+        incremental = await job.run(TENANT, db)
+        elapsed = time.perf_counter() - started
+    print(f"增量检测: {incremental['signed']} 张新卡片，{elapsed * 1000:.1f} ms")
+
+    await close_db()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
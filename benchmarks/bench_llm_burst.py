@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+突发重复请求基准测试
+模拟一个班的学生同时提交同一道题：N 个并发的任务拆解请求，
+对比开启/关闭请求合并（single-flight）时的模型调用次数和延迟分布
+
+用法:
+    python benchmarks/bench_llm_burst.py --burst 500 --distinct 3 --latency-ms 800
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+os.environ.setdefault("DECOMPOSITION_CACHE_PATH", "")
+
+from services.external_api import decompose_task  # noqa: E402
+from services.llm_gateway import LLMGateway, StubProvider  # noqa: E402
+from services.single_flight import SingleFlight  # noqa: E402
+
+PROBLEMS = ["学习Python数据分析", "深度学习神经网络原理", "学习React前端开发", "如何用内存管理大模型记忆"]
+
+
+def percentile(samples, pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+async def run_burst(burst: int, distinct: int, latency_ms: float, concurrency: int, coalesce: bool) -> dict:
+    gateway = LLMGateway(StubProvider(latency_ms=latency_ms), max_concurrency=concurrency)
+    flight = SingleFlight() if coalesce else None
+
+    async def one(i: int) -> float:
+        # 同一道题的不同写法，规范化后是同一个键
+        problem = PROBLEMS[i % distinct]
+        if i % 2:
+            problem = f"请问{problem}？"
+        started = time.perf_counter()
+        await decompose_task(problem, gateway, cache=None, flight=flight)
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    latencies = await asyncio.gather(*[one(i) for i in range(burst)])
+    wall = time.perf_counter() - started
+
+    return {
+        "provider_calls": gateway.calls,
+        "coalesced": flight.coalesced if flight else 0,
+        "wall_s": wall,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="single-flight 突发请求基准")
+    parser.add_argument("--burst", type=int, default=500)
+    parser.add_argument("--distinct", type=int, default=3, help="不同题目的数量")
+    parser.add_argument("--latency-ms", type=float, default=800)
+    parser.add_argument("--concurrency", type=int, default=8, help="网关并发上限")
+    args = parser.parse_args()
+    args.distinct = max(1, min(args.distinct, len(PROBLEMS)))
+
+    print(f"🚀 {args.burst} 个并发请求，{args.distinct} 道不同的题，模型延迟 {args.latency_ms}ms")
+    print(f"\n{'mode':>10} {'calls':>7} {'coalesced':>10} {'wall (s)':>9} {'p50 (ms)':>10} {'p99 (ms)':>10}")
+    print("-" * 62)
+    for coalesce in (False, True):
+        result = await run_burst(args.burst, args.distinct, args.latency_ms, args.concurrency, coalesce)
+        mode = "coalesced" if coalesce else "direct"
+        print(
+            f"{mode:>10} {result['provider_calls']:>7} {result['coalesced']:>10} {result['wall_s']:>9.2f} "
+            f"{result['p50_ms']:>10.1f} {result['p99_ms']:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
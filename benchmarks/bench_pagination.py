@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+分页性能基准测试
+对比知识卡片列表 offset 分页与键集（游标）分页在不同页码下的延迟
+
+用法:
+    python benchmarks/bench_pagination.py --cards 200000 --page-size 20
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+# 使用临时数据库，避免污染开发数据
+_tmp_dir = tempfile.mkdtemp(prefix="metalearn_bench_")
+os.environ["ASYNC_DATABASE_URL"] = f"sqlite+aiosqlite:///{_tmp_dir}/bench.db"
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp_dir}/bench.db"
+
+from sqlalchemy import select, insert  # noqa: E402
+
+from database.database import AsyncSessionLocal, init_db, close_db  # noqa: E402
+from database.models import KnowledgeCardDB, generate_uuid  # noqa: E402
+from database.pagination import apply_keyset, build_page  # noqa: E402
+from database.tenancy import DEFAULT_TENANT_ID  # noqa: E402
+
+# 路由中的卡片查询都按租户过滤，走 (tenant_id, updated_at, id) 索引
+TENANT_CARDS = KnowledgeCardDB.tenant_id == DEFAULT_TENANT_ID
+
+
+async def seed_cards(total: int):
+    """批量写入测试卡片，updated_at 有重复值以覆盖游标的 id 决胜逻辑"""
+    base_time = datetime(2024, 1, 1)
+    async with AsyncSessionLocal() as db:
+        for start in range(0, total, 5000):
+            rows = []
+            for i in range(start, min(start + 5000, total)):
+                timestamp = base_time + timedelta(seconds=i // 3)
+                rows.append({
+                    "id": generate_uuid(),
+                    "title": f"卡片 {i}",
+                    "content": f"第 {i} 张测试卡片的内容",
+                    "keywords": ["测试", f"k{i % 100}"],
+                    "created_at": timestamp,
+                    "updated_at": timestamp
+                })
+            await db.execute(insert(KnowledgeCardDB), rows)
+        await db.commit()
+
+
+async def time_offset_page(page: int, page_size: int, repeat: int) -> float:
+    samples = []
+    async with AsyncSessionLocal() as db:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = await db.execute(
+                select(KnowledgeCardDB)
+                .where(TENANT_CARDS)
+                .order_by(KnowledgeCardDB.updated_at.desc())
+                .offset(page * page_size)
+                .limit(page_size)
+            )
+            result.scalars().all()
+            samples.append(time.perf_counter() - started)
+            db.expunge_all()
+    return statistics.median(samples)
+
+
+async def find_cursor(page: int, page_size: int):
+    """沿游标翻到第 page 页，返回该页的游标（不计入计时）"""
+    cursor = None
+    async with AsyncSessionLocal() as db:
+        for _ in range(page):
+            result = await db.execute(
+                apply_keyset(
+                    select(KnowledgeCardDB.id, KnowledgeCardDB.updated_at).where(TENANT_CARDS),
+                    KnowledgeCardDB.updated_at,
+                    KnowledgeCardDB.id,
+                    cursor,
+                    page_size
+                )
+            )
+            _, cursor = build_page(result.all(), page_size)
+    return cursor
+
+
+async def time_keyset_page(cursor, page_size: int, repeat: int) -> float:
+    samples = []
+    async with AsyncSessionLocal() as db:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = await db.execute(
+                apply_keyset(
+                    select(KnowledgeCardDB).where(TENANT_CARDS),
+                    KnowledgeCardDB.updated_at,
+                    KnowledgeCardDB.id,
+                    cursor,
+                    page_size
+                )
+            )
+            build_page(result.scalars().all(), page_size)
+            samples.append(time.perf_counter() - started)
+            db.expunge_all()
+    return statistics.median(samples)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="offset vs keyset 分页基准")
+    parser.add_argument("--cards", type=int, default=100000)
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    await init_db()
+    print(f"📦 写入 {args.cards} 张卡片...")
+    await seed_cards(args.cards)
+
+    max_page = args.cards // args.page_size - 1
+    pages = sorted({p for p in (0, 10, 100, 1000, max_page // 2, max_page) if 0 <= p <= max_page})
+
+    print(f"\n{'page':>8} {'offset (ms)':>12} {'keyset (ms)':>12} {'speedup':>8}")
+    print("-" * 44)
+    for page in pages:
+        offset_latency = await time_offset_page(page, args.page_size, args.repeat)
+        cursor = await find_cursor(page, args.page_size)
+        keyset_latency = await time_keyset_page(cursor, args.page_size, args.repeat)
+        speedup = offset_latency / keyset_latency if keyset_latency else float("inf")
+        print(f"{page:>8} {offset_latency * 1000:>12.2f} {keyset_latency * 1000:>12.2f} {speedup:>7.1f}x")
+
+    await close_db()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+间隔重复调度基准测试
+写入大量复习项（分布在多个租户），测量：
+- 取一页到期复习项的延迟（应与复习项总数无关）
+- 批量重算全部到期时间的吞吐
+- SM-2 状态批量推进的吞吐（安装了 numpy 时为向量化路径）
+
+用法:
+    python benchmarks/bench_review_scheduler.py --items 1000000 --tenants 100
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+# 使用临时数据库，避免污染开发数据
+_tmp_dir = tempfile.mkdtemp(prefix="metalearn_bench_")
+os.environ["ASYNC_DATABASE_URL"] = f"sqlite+aiosqlite:///{_tmp_dir}/bench.db"
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp_dir}/bench.db"
+
+from sqlalchemy import select, insert  # noqa: E402
+
+from database.database import AsyncSessionLocal, init_db, close_db  # noqa: E402
+from database.models import ReviewItemDB, generate_uuid  # noqa: E402
+from database.pagination import apply_keyset, build_page  # noqa: E402
+from services.review_scheduler import INITIAL_EASE, ReviewScheduler, next_states, np  # noqa: E402
+
+NOW = datetime(2024, 6, 1)
+
+
+async def seed_items(total: int, tenants: int):
+    """批量写入复习项，上次复习时间分布在过去 90 天内，约一半已到期"""
+    rng = random.Random(42)
+    async with AsyncSessionLocal() as db:
+        for start in range(0, total, 5000):
+            rows = []
+            for i in range(start, min(start + 5000, total)):
+                reviewed_at = NOW - timedelta(minutes=rng.randint(0, 90 * 24 * 60))
+                interval = rng.choice((1.0, 6.0, 15.0, 40.0, 100.0))
+                rows.append({
+                    "id": generate_uuid(),
+                    "tenant_id": f"t{i % tenants}",
+                    "item_type": "card",
+                    "item_id": f"card-{i}",
+                    "repetitions": 2,
+                    "lapses": 0,
+                    "ease": INITIAL_EASE,
+                    "interval_days": interval,
+                    "last_quality": 4,
+                    "last_reviewed_at": reviewed_at,
+                    "due_at": reviewed_at + timedelta(days=interval),
+                    "created_at": reviewed_at,
+                    "updated_at": reviewed_at
+                })
+            await db.execute(insert(ReviewItemDB), rows)
+            await db.commit()
+
+
+async def time_due_pages(tenant_id: str, pages: int, page_size: int, repeat: int) -> float:
+    """沿游标翻 pages 页，返回每页延迟的中位数"""
+    samples = []
+    async with AsyncSessionLocal() as db:
+        for _ in range(repeat):
+            cursor = None
+            for _ in range(pages):
+                started = time.perf_counter()
+                result = await db.execute(apply_keyset(
+                    select(ReviewItemDB).where(ReviewItemDB.tenant_id == tenant_id, ReviewItemDB.due_at <= NOW),
+                    ReviewItemDB.due_at,
+                    ReviewItemDB.id,
+                    cursor,
+                    page_size,
+                    descending=False
+                ))
+                _, cursor = build_page(result.scalars().all(), page_size, sort_attr="due_at")
+                samples.append(time.perf_counter() - started)
+                db.expunge_all()
+                if cursor is None:
+                    break
+    return statistics.median(samples)
+
+
+def time_next_states(count: int) -> float:
+    """SM-2 批量推进吞吐（项/秒）"""
+    rng = random.Random(7)
+    states = [(rng.randint(0, 5), 0, rng.uniform(1.3, 3.0), rng.uniform(0, 100)) for _ in range(count)]
+    qualities = [rng.choice((1, 3, 4, 5)) for _ in range(count)]
+    started = time.perf_counter()
+    next_states(states, qualities)
+    return count / (time.perf_counter() - started)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="间隔重复调度基准")
+    parser.add_argument("--items", type=int, default=200000)
+    parser.add_argument("--tenants", type=int, default=100)
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"numpy: {'已安装' if np is not None else '未安装（逐行计算）'}")
+    await init_db()
+    print(f"📦 写入 {args.items} 个复习项（{args.tenants} 个租户）...")
+    started = time.perf_counter()
+    await seed_items(args.items, args.tenants)
+    print(f"   写入耗时 {time.perf_counter() - started:.1f}s")
+
+    first_page = await time_due_pages("t0", 1, args.page_size, args.repeat)
+    deep_page = await time_due_pages("t0", 50, args.page_size, 1)
+    print(f"\n到期队列首页延迟: {first_page * 1000:.2f} ms")
+    print(f"到期队列翻页延迟（前 50 页中位数）: {deep_page * 1000:.2f} ms")
+
+    print(f"SM-2 批量推进: {time_next_states(min(args.items, 1000000)):,.0f} 项/秒")
+
+    scheduler = ReviewScheduler(interval_modifier=0.8)
+    async with AsyncSessionLocal() as db:
+        started = time.perf_counter()
+        updated = await scheduler.recompute_due_dates(db)
+        elapsed = time.perf_counter() - started
+    print(f"批量重算到期时间: {updated} 行，{elapsed:.1f}s（{updated / elapsed:,.0f} 行/秒）")
+
+    await close_db()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
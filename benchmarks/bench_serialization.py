@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+响应序列化基准测试
+对比大卡片列表和大认知地图从数据库行到响应体的几条路径：
+- baseline：逐字段构造 Pydantic 模型（校验），再由 FastAPI 按 response_model 校验、序列化，JSONResponse 输出
+- construct：model_construct 构造（不校验），model_dump 后 orjson 输出
+- fast：按响应模型字段把行映射为字典，orjson 直接输出（models.responses.render）
+
+只测序列化，不查数据库：行对象是内存中的 ORM 实例。
+
+用法:
+    python benchmarks/bench_serialization.py --cards 1000 --nodes 300 --edges 600
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+from fastapi.responses import JSONResponse  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+from fastapi.utils import create_response_field  # noqa: E402
+
+from database.models import CognitiveEdgeDB, CognitiveMapDB, CognitiveNodeDB, KnowledgeCardDB, generate_uuid  # noqa: E402
+from models.responses import FastJSONResponse, card_payload, map_payload, render  # noqa: E402
+from models.schemas import CognitiveEdge, CognitiveMap, CognitiveNode, KnowledgeCard, RelationshipType  # noqa: E402
+
+RELATIONSHIPS = [relationship.value for relationship in RelationshipType]
+
+
+def make_cards(count: int) -> List[KnowledgeCardDB]:
+    base_time = datetime(2024, 1, 1)
+    return [
+        KnowledgeCardDB(
+            id=generate_uuid(),
+            title=f"卡片 {i}：梯度下降与学习率",
+            content=f"第 {i} 张卡片。" + "反向传播通过链式法则计算每一层的梯度。" * 8,
+            keywords=["梯度下降", "学习率", f"k{i % 50}"],
+            created_at=base_time + timedelta(seconds=i),
+            updated_at=base_time + timedelta(seconds=i * 2)
+        ) for i in range(count)
+    ]
+
+
+def make_map(node_count: int, edge_count: int):
+    created_at = datetime(2024, 1, 1)
+    db_map = CognitiveMapDB(id=generate_uuid(), session_id=generate_uuid(), created_at=created_at, updated_at=created_at)
+    nodes = [
+        CognitiveNodeDB(
+            id=generate_uuid(), cognitive_map_id=db_map.id, name=f"概念 {i}",
+            description=f"第 {i} 个概念的说明", x=float(i % 40) * 30, y=float(i // 40) * 30, created_at=created_at
+        ) for i in range(node_count)
+    ]
+    edges = [
+        CognitiveEdgeDB(
+            id=generate_uuid(), cognitive_map_id=db_map.id,
+            source_id=nodes[i % node_count].id, target_id=nodes[(i * 7 + 1) % node_count].id,
+            relationship_type=RELATIONSHIPS[i % len(RELATIONSHIPS)],
+            custom_name="依赖" if RELATIONSHIPS[i % len(RELATIONSHIPS)] == RelationshipType.RELATED.value else None,
+            created_at=created_at
+        ) for i in range(edge_count)
+    ]
+    return db_map, nodes, edges
+
+
+def baseline_card(card) -> KnowledgeCard:
+    """改造前路由里手写的构造方式"""
+    return KnowledgeCard(
+        id=card.id, title=card.title, content=card.content, keywords=card.keywords,
+        created_at=card.created_at, updated_at=card.updated_at
+    )
+
+
+def baseline_map(db_map, nodes, edges) -> CognitiveMap:
+    return CognitiveMap(
+        id=db_map.id,
+        session_id=db_map.session_id,
+        nodes=[
+            CognitiveNode(
+                id=node.id, name=node.name, description=node.description, x=node.x, y=node.y,
+                created_at=node.created_at
+            ) for node in nodes
+        ],
+        edges=[
+            CognitiveEdge(
+                id=edge.id, source_id=edge.source_id, target_id=edge.target_id,
+                relationship_type=RelationshipType(edge.relationship_type), custom_name=edge.custom_name,
+                created_at=edge.created_at
+            ) for edge in edges
+        ],
+        created_at=db_map.created_at,
+        updated_at=db_map.updated_at
+    )
+
+
+async def baseline_body(field, content) -> bytes:
+    """FastAPI 默认处理：按 response_model 校验并序列化，再用标准库 json 输出"""
+    serialized = await serialize_response(field=field, response_content=content)
+    return JSONResponse(serialized).body
+
+
+def construct_card(card) -> KnowledgeCard:
+    return KnowledgeCard.model_construct(
+        id=card.id, title=card.title, content=card.content, keywords=card.keywords,
+        created_at=card.created_at, updated_at=card.updated_at
+    )
+
+
+def construct_map(db_map, nodes, edges) -> CognitiveMap:
+    return CognitiveMap.model_construct(
+        id=db_map.id,
+        session_id=db_map.session_id,
+        nodes=[
+            CognitiveNode.model_construct(
+                id=node.id, name=node.name, description=node.description, x=node.x, y=node.y,
+                created_at=node.created_at
+            ) for node in nodes
+        ],
+        edges=[
+            CognitiveEdge.model_construct(
+                id=edge.id, source_id=edge.source_id, target_id=edge.target_id,
+                relationship_type=RelationshipType(edge.relationship_type), custom_name=edge.custom_name,
+                created_at=edge.created_at
+            ) for edge in edges
+        ],
+        created_at=db_map.created_at,
+        updated_at=db_map.updated_at
+    )
+
+
+async def measure(run, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await run()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="响应序列化基准")
+    parser.add_argument("--cards", type=int, default=1000)
+    parser.add_argument("--nodes", type=int, default=300)
+    parser.add_argument("--edges", type=int, default=600)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    cards = make_cards(args.cards)
+    db_map, nodes, edges = make_map(args.nodes, args.edges)
+    card_field = create_response_field("cards", type_=List[KnowledgeCard])
+    map_field = create_response_field("map", type_=CognitiveMap)
+
+    async def cards_baseline():
+        return await baseline_body(card_field, [baseline_card(card) for card in cards])
+
+    async def cards_construct():
+        return render([construct_card(card).model_dump() for card in cards]).body
+
+    async def cards_fast():
+        return render([card_payload(card) for card in cards]).body
+
+    async def map_baseline():
+        return await baseline_body(map_field, baseline_map(db_map, nodes, edges))
+
+    async def map_construct():
+        return render(construct_map(db_map, nodes, edges).model_dump()).body
+
+    async def map_fast():
+        return render(map_payload(db_map, nodes, edges)).body
+
+    cases = [
+        (f"{args.cards} cards", cards_baseline, cards_construct, cards_fast),
+        (f"map {args.nodes} nodes / {args.edges} edges", map_baseline, map_construct, map_fast),
+    ]
+
+    encoder = FastJSONResponse.__name__ if FastJSONResponse else "JSONResponse"
+    print(f"序列化（{args.repeat} 次取中位数，construct / fast 路径使用 {encoder}）")
+    print(f"{'payload':<34} {'size':>9} {'baseline':>11} {'construct':>11} {'fast':>9} {'speedup':>8}")
+    for name, baseline, construct, fast in cases:
+        size = len(await fast())
+        # 先各跑一遍，排除首次调用的开销
+        for run in (baseline, construct, fast):
+            await run()
+        baseline_ms = await measure(baseline, args.repeat)
+        construct_ms = await measure(construct, args.repeat)
+        fast_ms = await measure(fast, args.repeat)
+        print(f"{name:<34} {size / 1024:>7.0f}KB {baseline_ms:>9.2f}ms {construct_ms:>9.2f}ms "
+              f"{fast_ms:>7.2f}ms {baseline_ms / fast_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
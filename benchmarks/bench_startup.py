@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+冷启动基准测试
+模拟缩容到零之后的冷启动：每轮启动一个新的 uvicorn 进程，从启动进程开始不断请求一个需要查库的接口，
+记录第一次成功响应的时间（time-to-first-request），以及第一个和第二个请求各自的耗时；
+等待 --settle-ms 之后再首次访问其他几个接口，记录它们的总耗时（快速启动模式的后台预热针对的就是这部分）。
+数据库事先建好，对比 STARTUP_MODE=standard 和 fast。
+
+用法:
+    python benchmarks/bench_startup.py --runs 5
+"""
+
+import argparse
+import http.client
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+PROBE_PATH = "/api/learning-flow/sessions?limit=1"
+# 唤醒之后陆续访问的其他接口
+LATER_PATHS = [
+    "/api/knowledge-cards/page/?limit=5",
+    "/api/cognitive-map/00000000-0000-0000-0000-000000000000",
+    "/api/learning-flow/sessions/00000000-0000-0000-0000-000000000000",
+    "/openapi.json",
+]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def get(port: int, path: str, timeout: float = 5.0) -> int:
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=timeout)
+    try:
+        conn.request("GET", path)
+        response = conn.getresponse()
+        response.read()
+        return response.status
+    finally:
+        conn.close()
+
+
+def server_env(mode: str, database_url: str) -> dict:
+    env = dict(os.environ)
+    env.update({
+        "STARTUP_MODE": mode,
+        "ASYNC_DATABASE_URL": database_url,
+        "LLM_PROVIDER": "stub",
+        "DECOMPOSITION_CACHE_PATH": "",
+    })
+    return env
+
+
+def cold_start(mode: str, database_url: str, settle_ms: float = 1000, timeout: float = 30.0) -> dict:
+    """启动一个服务进程并测量到第一个成功请求的时间"""
+    port = free_port()
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=server_env(mode, database_url),
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+    )
+    try:
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError(f"Server exited: {process.stderr.read().decode()[-2000:]}")
+            if time.perf_counter() - started > timeout:
+                raise RuntimeError("Server did not start in time")
+            request_started = time.perf_counter()
+            try:
+                status = get(port, PROBE_PATH)
+            except OSError:
+                time.sleep(0.005)
+                continue
+            ready = time.perf_counter()
+            if status != 200:
+                raise RuntimeError(f"{PROBE_PATH} returned {status}")
+            break
+
+        second_started = time.perf_counter()
+        get(port, PROBE_PATH)
+        second = time.perf_counter() - second_started
+
+        time.sleep(settle_ms / 1000)
+        later_started = time.perf_counter()
+        for path in LATER_PATHS:
+            get(port, path)
+        later = time.perf_counter() - later_started
+        return {
+            "ttfr_ms": (ready - started) * 1000,
+            "first_request_ms": (ready - request_started) * 1000,
+            "second_request_ms": second * 1000,
+            "later_first_hits_ms": later * 1000,
+        }
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def summarize(samples: list) -> dict:
+    return {key: statistics.median(sample[key] for sample in samples) for key in samples[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="冷启动基准测试")
+    parser.add_argument("--runs", type=int, default=5, help="每种模式启动的次数")
+    parser.add_argument("--modes", default="standard,fast", help="要对比的启动模式")
+    parser.add_argument("--database-url", default="", help="默认使用临时SQLite数据库")
+    parser.add_argument("--settle-ms", type=float, default=1000, help="访问其他接口前等待的时间")
+    args = parser.parse_args()
+
+    database_url = args.database_url or (
+        f"sqlite+aiosqlite:///{tempfile.mkdtemp(prefix='metalearn_startup_')}/startup.db"
+    )
+    modes = [mode.strip() for mode in args.modes.split(",") if mode.strip()]
+
+    # 先启动一次建好表和迁移，之后每轮都是“已有数据库”的冷启动
+    cold_start("standard", database_url)
+
+    samples = {mode: [] for mode in modes}
+    for _ in range(args.runs):
+        # 交替执行，减少系统缓存等因素对某一种模式的偏向
+        for mode in modes:
+            samples[mode].append(cold_start(mode, database_url, args.settle_ms))
+
+    print(f"冷启动（{args.runs} 次取中位数，探测接口 {PROBE_PATH}）")
+    print(f"{'mode':<10} {'time-to-first-request':>22} {'first request':>14} {'second request':>15} "
+          f"{'later first hits':>17}")
+    for mode in modes:
+        summary = summarize(samples[mode])
+        print(f"{mode:<10} {summary['ttfr_ms']:>20.0f}ms {summary['first_request_ms']:>12.1f}ms "
+              f"{summary['second_request_ms']:>13.1f}ms {summary['later_first_hits_ms']:>15.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
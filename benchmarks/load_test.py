@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+完整学习流程的进程内压测
+用 httpx.AsyncClient 直接驱动 ASGI 应用（不需要启动服务），模拟 N 个学习者并发走完整个流程：
+
+    问题输入 → 任务拆解 → 创建认知地图 → 选择连线 → 生成/保存子任务
+    → JOL/FOK 评估 → 信心评估 → 时间分配 → 查看会话
+
+按接口统计吞吐量和 p50/p95/p99 延迟，结果保存为JSON，可与基线结果对比发现性能回退。
+
+用法:
+    python benchmarks/load_test.py --learners 200 --concurrency 50
+    python benchmarks/load_test.py --learners 200 --compare benchmarks/results/baseline.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+BACKEND_DIR = ROOT_DIR / "backend"
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+PROBLEMS = [
+    "学习Python数据分析", "深度学习神经网络原理", "学习React前端开发",
+    "如何用内存管理大模型记忆", "理解Transformer注意力机制", "掌握SQL查询优化",
+]
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """最近秩法百分位"""
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, int(round(len(ordered) * pct)) - 1))]
+
+
+class LatencyRecorder:
+    """按接口（方法 + 路由模板）记录每次请求的耗时"""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.windows: Dict[str, List[float]] = {}  # 接口 -> [首个请求开始, 最后一个请求结束]
+
+    async def request(self, client, name: str, method: str, url: str, **kwargs):
+        started = time.perf_counter()
+        response = await client.request(method, url, **kwargs)
+        finished = time.perf_counter()
+
+        self.samples[name].append(finished - started)
+        window = self.windows.setdefault(name, [started, finished])
+        window[0] = min(window[0], started)
+        window[1] = max(window[1], finished)
+        if response.status_code >= 400:
+            self.errors[name] += 1
+            raise RuntimeError(f"{name} -> {response.status_code}: {response.text[:200]}")
+        return response.json()
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        endpoints = {}
+        for name, samples in sorted(self.samples.items()):
+            window = self.windows[name][1] - self.windows[name][0]
+            endpoints[name] = {
+                "requests": len(samples),
+                "errors": self.errors.get(name, 0),
+                "throughput_rps": round(len(samples) / window, 2) if window > 0 else None,
+                "mean_ms": round(sum(samples) / len(samples) * 1000, 3),
+                "p50_ms": round(percentile(samples, 0.50) * 1000, 3),
+                "p95_ms": round(percentile(samples, 0.95) * 1000, 3),
+                "p99_ms": round(percentile(samples, 0.99) * 1000, 3),
+                "max_ms": round(max(samples) * 1000, 3),
+            }
+        return endpoints
+
+
+async def learner_flow(client, recorder: LatencyRecorder, rng: random.Random, think_time: float = 0.0):
+    """一个学习者走完整个流程"""
+    from models.schemas import JOLLevel, FOKLevel, ConfidenceLevel, TimeAllocation
+
+    async def think():
+        if think_time > 0:
+            await asyncio.sleep(rng.uniform(0, think_time))
+
+    problem = rng.choice(PROBLEMS)
+    session = await recorder.request(
+        client, "POST /learning-flow/sessions", "POST", "/api/learning-flow/sessions",
+        json={"problem_statement": problem}
+    )
+    session_id = session["id"]
+    await think()
+
+    decomposition = await recorder.request(
+        client, "POST /external/task-decomposition", "POST", "/api/external/task-decomposition",
+        json={"problem_statement": problem}
+    )
+    await think()
+
+    cognitive_map = await recorder.request(
+        client, "POST /cognitive-map", "POST", "/api/cognitive-map/",
+        json={"session_id": session_id, "nodes": decomposition["nodes"], "edges": decomposition["edges"]}
+    )
+    map_id = cognitive_map["id"]
+    await recorder.request(client, "GET /cognitive-map/{id}", "GET", f"/api/cognitive-map/{map_id}")
+    await think()
+
+    nodes = {node["id"]: node["name"] for node in cognitive_map["nodes"]}
+    edges = cognitive_map["edges"]
+    if edges:
+        edge = rng.choice(edges)
+        await recorder.request(
+            client, "POST /cognitive-map/{id}/select-edge", "POST", f"/api/cognitive-map/{map_id}/select-edge",
+            params={"edge_id": edge["id"]}
+        )
+        suggestions = await recorder.request(
+            client, "POST /learning-flow/sessions/{id}/sub-tasks/suggestions", "POST",
+            f"/api/learning-flow/sessions/{session_id}/sub-tasks/suggestions",
+            json={"edges": [{
+                # 认知地图的连线引用的是拆解结果中的节点编号，找不到时直接用编号
+                "source_node_name": nodes.get(edge["source_id"], edge["source_id"]),
+                "target_node_name": nodes.get(edge["target_id"], edge["target_id"]),
+                "relationship_type": edge["relationship_type"],
+            }]}
+        )
+        await recorder.request(
+            client, "POST /learning-flow/sessions/{id}/sub-tasks", "POST",
+            f"/api/learning-flow/sessions/{session_id}/sub-tasks",
+            json=suggestions[0]["sub_tasks"]
+        )
+    await think()
+
+    for name, body in (
+        ("jol-assessment", {"assessment": rng.choice(list(JOLLevel)).value}),
+        ("fok-assessment", {"assessment": rng.choice(list(FOKLevel)).value}),
+        ("confidence-assessment", {"confidence": rng.choice(list(ConfidenceLevel)).value}),
+        ("time-allocation", {"time_allocation": rng.choice(list(TimeAllocation)).value}),
+    ):
+        await recorder.request(
+            client, f"POST /learning-flow/sessions/{{id}}/{name}", "POST",
+            f"/api/learning-flow/sessions/{session_id}/{name}",
+            json={"session_id": session_id, **body}
+        )
+        await think()
+
+    await recorder.request(
+        client, "GET /learning-flow/sessions/{id}", "GET", f"/api/learning-flow/sessions/{session_id}"
+    )
+
+
+async def run_load_test(
+    learners: int,
+    concurrency: int,
+    seed: int = 42,
+    think_time: float = 0.0,
+    app=None
+) -> Dict[str, Any]:
+    """运行一次压测并返回结果（调用方需先设置好数据库等环境变量）"""
+    import httpx
+
+    if app is None:
+        from main import app
+
+    recorder = LatencyRecorder()
+    failures: List[str] = []
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    transport = httpx.ASGITransport(app=app)
+
+    async def one(index: int):
+        async with semaphore:
+            try:
+                await learner_flow(client, recorder, random.Random(seed + index), think_time)
+            except Exception as exc:  # 单个学习者失败不中断压测，计入失败数
+                failures.append(f"learner {index}: {exc}")
+
+    # 手动执行应用的 lifespan（初始化数据库、后台任务等），与真实部署一致
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=None) as client:
+            started = time.perf_counter()
+            await asyncio.gather(*[one(i) for i in range(learners)])
+            wall = time.perf_counter() - started
+
+    endpoints = recorder.summary()
+    total_requests = sum(item["requests"] for item in endpoints.values())
+    return {
+        "config": {
+            "learners": learners,
+            "concurrency": concurrency,
+            "seed": seed,
+            "think_time_s": think_time,
+        },
+        "summary": {
+            "wall_s": round(wall, 3),
+            "completed_learners": learners - len(failures),
+            "failed_learners": len(failures),
+            "requests": total_requests,
+            "throughput_rps": round(total_requests / wall, 2) if wall > 0 else None,
+            "learners_per_s": round((learners - len(failures)) / wall, 2) if wall > 0 else None,
+        },
+        "endpoints": endpoints,
+        "failures": failures[:20],
+    }
+
+
+def _environment() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "timestamp": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "database": os.environ.get("ASYNC_DATABASE_URL", "").split("://", 1)[0],
+        "llm_provider": os.environ.get("LLM_PROVIDER"),
+        "llm_stub_latency_ms": os.environ.get("LLM_STUB_LATENCY_MS"),
+    }
+
+
+def compare_results(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """返回 p95 比基线慢超过 threshold（比例）的接口"""
+    regressions = []
+    for name, stats in current["endpoints"].items():
+        base = baseline.get("endpoints", {}).get(name)
+        if not base or not base.get("p95_ms"):
+            continue
+        change = stats["p95_ms"] / base["p95_ms"] - 1
+        if change > threshold:
+            regressions.append(f"{name}: p95 {base['p95_ms']:.2f}ms -> {stats['p95_ms']:.2f}ms (+{change:.0%})")
+    return regressions
+
+
+def print_report(result: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None):
+    summary = result["summary"]
+    print(
+        f"\n🏁 {summary['completed_learners']}/{result['config']['learners']} 个学习者完成，"
+        f"{summary['requests']} 个请求，耗时 {summary['wall_s']:.2f}s，{summary['throughput_rps']} req/s"
+    )
+    header = f"{'endpoint':<56} {'req':>6} {'err':>4} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8}"
+    if baseline:
+        header += f" {'Δp95':>7}"
+    print(header)
+    print("-" * len(header))
+    for name, stats in result["endpoints"].items():
+        line = (
+            f"{name:<56} {stats['requests']:>6} {stats['errors']:>4} {stats['throughput_rps'] or 0:>8.1f} "
+            f"{stats['p50_ms']:>8.2f} {stats['p95_ms']:>8.2f} {stats['p99_ms']:>8.2f}"
+        )
+        base = (baseline or {}).get("endpoints", {}).get(name)
+        if base and base.get("p95_ms"):
+            line += f" {stats['p95_ms'] / base['p95_ms'] - 1:>+7.0%}"
+        print(line)
+    for failure in result["failures"]:
+        print(f"❌ {failure}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="完整学习流程的进程内压测")
+    parser.add_argument("--learners", type=int, default=100, help="模拟的学习者数量")
+    parser.add_argument("--concurrency", type=int, default=0, help="同时进行的学习者上限，0 表示全部同时开始")
+    parser.add_argument("--think-time-ms", type=float, default=0, help="每一步之间的随机停顿上限")
+    parser.add_argument("--llm-latency-ms", type=float, default=0, help="Stub模型的模拟延迟")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--database-url", help="默认使用临时SQLite数据库")
+    parser.add_argument("--output", help="结果JSON路径，默认写入 benchmarks/results/")
+    parser.add_argument("--compare", help="基线结果JSON，对比各接口的p95")
+    parser.add_argument("--threshold", type=float, default=0.2, help="p95 变慢超过该比例视为回退")
+    args = parser.parse_args()
+
+    # 在导入应用之前配置环境，避免污染开发数据、避免访问外部模型
+    tmp_dir = tempfile.mkdtemp(prefix="metalearn_load_")
+    os.environ["ASYNC_DATABASE_URL"] = args.database_url or f"sqlite+aiosqlite:///{tmp_dir}/load.db"
+    os.environ.setdefault("LLM_PROVIDER", "stub")
+    os.environ["LLM_STUB_LATENCY_MS"] = str(args.llm_latency_ms)
+    os.environ.setdefault("DECOMPOSITION_CACHE_PATH", "")
+    sys.path.insert(0, str(BACKEND_DIR))
+
+    concurrency = args.concurrency or args.learners
+    print(f"🚀 {args.learners} 个学习者，并发 {concurrency}，Stub模型延迟 {args.llm_latency_ms}ms")
+    result = await run_load_test(args.learners, concurrency, args.seed, args.think_time_ms / 1000)
+    result["environment"] = _environment()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(result, baseline)
+
+    output = Path(args.output) if args.output else RESULTS_DIR / f"load_test_{datetime.now():%Y%m%d_%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"\n💾 结果已保存到 {output}")
+
+    if baseline:
+        regressions = compare_results(result, baseline, args.threshold)
+        for regression in regressions:
+            print(f"⚠️  {regression}")
+        if regressions:
+            sys.exit(1)
+    if result["summary"]["failed_learners"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,26 @@
+"""
+pytest 公共夹具
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+
+@pytest.fixture(autouse=True)
+def query_budget_guard():
+    """
+    每个测试期间严格检查路由声明的查询预算：超出预算的请求直接抛出 QueryBudgetExceeded，
+    测试结束时如仍有记录的超预算调用（例如被捕获的异常）则判定失败
+    """
+    from database.query_counter import strict_query_budgets
+
+    with strict_query_budgets() as checker:
+        yield checker
+        violations = list(checker.violations)
+    assert not violations, "\n".join(
+        f"{v.endpoint}: {v.count} queries (budget {v.budget})" for v in violations
+    )
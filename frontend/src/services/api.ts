@@ -154,16 +154,70 @@ export const knowledgeCardsAPI = {
     apiClient.post('/knowledge-cards/search/by-keywords', keywords, { params: { limit } }),
 };
 
+// 本地学习资源库
+export const resourcesAPI = {
+  ingest: (path: string = '', recursive: boolean = true) =>
+    apiClient.post('/resources/ingest', { path, recursive }),
+
+  search: (data: {
+    query: string;
+    task_context?: string;
+    session_id?: string;
+    resource_types?: string[];
+    limit?: number;
+  }) =>
+    apiClient.post('/resources/search', data),
+
+  getFacets: () =>
+    apiClient.get('/resources/facets'),
+};
+
 // 外部API集成
 export const externalAPI = {
   decomposeTask: (data: { problem_statement: string }) =>
     apiClient.post('/external/task-decomposition', data),
   
-  searchResources: (data: { query: string; task_context?: string }) =>
+  searchResources: (data: {
+    query: string;
+    task_context?: string;
+    session_id?: string;
+    resource_types?: string[];
+    limit?: number;
+  }) =>
     apiClient.post('/external/resource-search', data),
   
   openaiTaskDecomposition: (data: { problem_statement: string }) =>
     apiClient.post('/external/openai-task-decomposition', data),
+
+  // 流式任务拆解：每收到一个节点/连线就回调一次（NDJSON）
+  decomposeTaskStream: async (
+    data: { problem_statement: string },
+    onEvent: (event: any) => void
+  ) => {
+    const response = await fetch(`${API_BASE_URL}/external/task-decomposition/stream`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify(data),
+    });
+    if (!response.ok || !response.body) {
+      throw new Error(`任务拆解失败: ${response.status}`);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      const lines = buffer.split('\n');
+      buffer = lines.pop() || '';
+      lines.filter((line) => line.trim()).forEach((line) => onEvent(JSON.parse(line)));
+    }
+    if (buffer.trim()) {
+      onEvent(JSON.parse(buffer));
+    }
+  },
 };
 
 export default apiClient;
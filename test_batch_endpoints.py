@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+批量接口测试
+验证批量创建会话、批量提交JOL/FOK评估：结果与请求逐条对应，未知或其他租户的会话按
+"Session not found" 报告而不影响其他条目，超出上限时返回 413，以及多个分块在同一个事务中提交
+可直接运行，也可以用 pytest 执行
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+os.environ["ASYNC_DATABASE_URL"] = f"sqlite+aiosqlite:///{tempfile.mkdtemp(prefix='metalearn_batch_')}/test.db"
+os.environ["LLM_PROVIDER"] = "stub"
+os.environ["DECOMPOSITION_CACHE_PATH"] = ""
+
+IVAN = {"X-User-Id": "ivan"}
+JUDY = {"X-User-Id": "judy"}
+
+
+def _client(app):
+    import httpx
+
+    transport = httpx.ASGITransport(app=app)
+    return httpx.AsyncClient(transport=transport, base_url="http://test")
+
+
+def test_batch_create_sessions():
+    """批量创建会话：空问题逐条报错，其余会话写入当前租户"""
+    from main import app
+    from database.database import init_db, close_db
+
+    async def run():
+        await init_db()
+        try:
+            async with _client(app) as client:
+                created = (await client.post("/api/learning-flow/batch/sessions", headers=IVAN, json=[
+                    {"problem_statement": "学习线性代数"},
+                    {"problem_statement": "  "},
+                    {"problem_statement": "学习概率论"},
+                ])).json()
+                statuses = {
+                    "own": (await client.get(
+                        f"/api/learning-flow/sessions/{created['results'][0]['id']}", headers=IVAN
+                    )).status_code,
+                    "foreign": (await client.get(
+                        f"/api/learning-flow/sessions/{created['results'][0]['id']}", headers=JUDY
+                    )).status_code,
+                }
+                return created, statuses
+        finally:
+            await close_db()
+
+    created, statuses = asyncio.run(run())
+    assert (created["total"], created["succeeded"], created["failed"]) == (3, 2, 1)
+    assert [item["index"] for item in created["results"]] == [0, 1, 2]
+    assert [item["success"] for item in created["results"]] == [True, False, True]
+    assert created["results"][1]["error"] == "Problem statement is empty" and created["results"][1]["id"] is None
+    assert created["results"][2]["next_step"] == "problem_input"
+    assert statuses == {"own": 200, "foreign": 404}
+
+
+def test_batch_assessments_report_missing_sessions():
+    """批量JOL/FOK评估：已知会话更新，未知ID和其他租户的会话报告 Session not found"""
+    from main import app
+    from database.database import init_db, close_db
+
+    async def run():
+        await init_db()
+        try:
+            async with _client(app) as client:
+                ids = [item["id"] for item in (await client.post(
+                    "/api/learning-flow/batch/sessions", headers=IVAN,
+                    json=[{"problem_statement": f"批量评估 {i}"} for i in range(2)]
+                )).json()["results"]]
+                judy_session = (await client.post(
+                    "/api/learning-flow/sessions", headers=JUDY, json={"problem_statement": "学习统计"}
+                )).json()["id"]
+
+                jol = (await client.post("/api/learning-flow/batch/jol-assessment", headers=IVAN, json=[
+                    {"session_id": ids[0], "assessment": "完全记得住"},
+                    {"session_id": "missing-session", "assessment": "记不太住"},
+                    {"session_id": judy_session, "assessment": "完全记得住"},
+                    {"session_id": ids[1], "assessment": "完全不记得"},
+                ])).json()
+                fok = (await client.post("/api/learning-flow/batch/fok-assessment", headers=IVAN, json=[
+                    {"session_id": "missing-session", "assessment": "吃透"},
+                    {"session_id": ids[1], "assessment": "能了解"},
+                ])).json()
+                sessions = [
+                    (await client.get(f"/api/learning-flow/sessions/{session_id}", headers=IVAN)).json()
+                    for session_id in ids
+                ]
+                judy_view = (await client.get(f"/api/learning-flow/sessions/{judy_session}", headers=JUDY)).json()
+                return jol, fok, sessions, judy_view
+        finally:
+            await close_db()
+
+    jol, fok, sessions, judy_view = asyncio.run(run())
+    assert (jol["total"], jol["succeeded"], jol["failed"]) == (4, 2, 2)
+    assert [(item["index"], item["success"]) for item in jol["results"]] == [(0, True), (1, False), (2, False), (3, True)]
+    assert {item["error"] for item in jol["results"] if not item["success"]} == {"Session not found"}
+    assert jol["results"][1]["id"] == "missing-session"
+    assert [jol["results"][0]["next_step"], jol["results"][3]["next_step"]] == [
+        "learning_completed", "eol_difficulty_assessment"
+    ]
+    assert (fok["succeeded"], fok["failed"]) == (1, 1) and fok["results"][0]["error"] == "Session not found"
+
+    assert sessions[0]["session_data"]["jol_score"] == 4 and sessions[0]["current_step"] == "learning_completed"
+    assert sessions[1]["session_data"]["fok_assessment"] == "能了解"
+    assert "jol_score" not in judy_view["session_data"], "其他租户的会话不应被修改"
+
+
+def test_batch_size_limit():
+    """超出单次批量上限时整批拒绝"""
+    from main import app
+    from database.database import init_db, close_db
+    from routers import learning_flow
+
+    async def run():
+        await init_db()
+        original = learning_flow.MAX_BATCH_SIZE
+        learning_flow.MAX_BATCH_SIZE = 2
+        try:
+            async with _client(app) as client:
+                return (await client.post(
+                    "/api/learning-flow/batch/sessions", headers=IVAN,
+                    json=[{"problem_statement": f"超限 {i}"} for i in range(3)]
+                )).status_code
+        finally:
+            learning_flow.MAX_BATCH_SIZE = original
+            await close_db()
+
+    assert asyncio.run(run()) == 413
+
+
+def test_scores_batch_commits_once():
+    """多个分块在同一个事务中提交，中途失败时已处理的分块一起回滚"""
+    from database.database import AsyncSessionLocal, init_db, close_db
+    from database.models import LearningSessionDB
+    from services.flow_engine import FlowEngine
+    from services.review_scheduler import review_scheduler
+
+    async def run():
+        await init_db()
+        try:
+            engine = FlowEngine("ivan")
+            engine.BATCH_CHUNK_SIZE = 2
+            async with AsyncSessionLocal() as db:
+                created = await engine.create_sessions_batch([f"分块 {i}" for i in range(5)], db)
+            ids = [item.id for item in created]
+
+            async with AsyncSessionLocal() as db:
+                commits = []
+                commit = db.commit
+
+                async def counting_commit():
+                    commits.append(True)
+                    await commit()
+
+                db.commit = counting_commit
+                results = await engine._process_scores_batch(
+                    [(session_id, "吃透", 4) for session_id in ids] + [("missing-session", "吃透", 4)], "fok", db
+                )
+
+            calls = []
+
+            async def fail_on_second_chunk(*args, **kwargs):
+                calls.append(True)
+                if len(calls) == 2:
+                    raise RuntimeError("chunk failed")
+
+            review_scheduler.record_session_subtasks = fail_on_second_chunk
+            try:
+                async with AsyncSessionLocal() as db:
+                    try:
+                        await engine._process_scores_batch([(session_id, "完全记得住", 4) for session_id in ids], "jol", db)
+                        raised = False
+                    except RuntimeError:
+                        raised = True
+            finally:
+                del review_scheduler.record_session_subtasks
+
+            async with AsyncSessionLocal() as db:
+                stored = [await db.get(LearningSessionDB, session_id) for session_id in ids]
+            return commits, results, raised, stored
+        finally:
+            await close_db()
+
+    commits, results, raised, stored = asyncio.run(run())
+    assert len(commits) == 1, "三个分块应只提交一次"
+    assert [item.success for item in results] == [True] * 5 + [False]
+    assert all(session.session_data.get("fok_score") == 4 for session in stored)
+    assert raised
+    assert all("jol_score" not in session.session_data for session in stored), "失败前的分块不应单独提交"
+
+
+def main():
+    print("📦 测试批量接口")
+    print("=" * 50)
+
+    failed = False
+    for test in (
+        test_batch_create_sessions,
+        test_batch_assessments_report_missing_sessions,
+        test_batch_size_limit,
+        test_scores_batch_commits_once,
+    ):
+        try:
+            test()
+            print(f"✅ {test.__doc__}")
+        except AssertionError as exc:
+            failed = True
+            print(f"❌ {test.__doc__}\n{exc}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+近似重复卡片检测测试
+验证 MinHash 签名对近似文本给出高相似度、全量检测按租户找出重复卡片并分簇、
+增量检测只为新写入的卡片签名并在已有分桶中找到重复、合并与忽略，以及 LSH 只比较同桶候选
+可直接运行，也可以用 pytest 执行
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+os.environ["ASYNC_DATABASE_URL"] = f"sqlite+aiosqlite:///{tempfile.mkdtemp(prefix='metalearn_dedup_')}/test.db"
+os.environ["LLM_PROVIDER"] = "stub"
+os.environ["DECOMPOSITION_CACHE_PATH"] = ""
+
+FRANK = {"X-User-Id": "frank"}
+GRACE = {"X-User-Id": "grace"}
+
+GRADIENT = "梯度下降通过沿负梯度方向迭代更新参数来最小化损失函数，学习率决定每一步的步长大小"
+GRADIENT_EDITED = "梯度下降通过沿着负梯度方向迭代更新参数来最小化损失函数，学习率决定每一步的步长大小"
+ATTENTION = "Attention lets each token weigh every other token in the sequence when building its representation"
+ATTENTION_EDITED = "Attention lets each token weigh every other token in the sequence while building its representation"
+UNRELATED = "贝叶斯定理描述了在已知先验概率和似然的情况下如何计算后验概率"
+
+
+def _client(app):
+    import httpx
+
+    transport = httpx.ASGITransport(app=app)
+    return httpx.AsyncClient(transport=transport, base_url="http://test")
+
+
+def test_minhash_similarity():
+    """近似文本的签名估计相似度高，无关文本接近 0，空文本没有签名"""
+    from services.card_dedup import band_keys, signature_batch, similarity, unpack_signature
+
+    packed = signature_batch([GRADIENT, GRADIENT_EDITED, ATTENTION, ATTENTION_EDITED, UNRELATED, "！？"])
+    gradient, gradient_edited, attention, attention_edited, unrelated, empty = map(unpack_signature, packed)
+
+    assert similarity(gradient, gradient_edited) >= 0.7
+    assert similarity(attention, attention_edited) >= 0.7
+    assert similarity(gradient, unrelated) < 0.3
+    assert similarity(gradient, attention) < 0.1
+    assert empty is None
+    assert set(band_keys(gradient)) & set(band_keys(gradient_edited)), "近似文本至少共享一个分桶"
+    assert signature_batch([GRADIENT]) == packed[:1], "签名是确定的"
+
+
+def test_scan_merge_and_dismiss():
+    """全量检测只在租户内找出重复并分簇；合并后重复卡片被删除、关键词并入，忽略的卡片对不再提出"""
+    from main import app
+    from database.database import init_db, close_db
+
+    async def run():
+        await init_db()
+        try:
+            async with _client(app) as client:
+                async def create(headers, title, content, keywords):
+                    return (await client.post("/api/knowledge-cards/", headers=headers, json={
+                        "title": title, "content": content, "keywords": keywords
+                    })).json()["id"]
+
+                gradient = await create(FRANK, "梯度下降", GRADIENT, ["梯度"])
+                gradient_copy = await create(FRANK, "梯度下降", GRADIENT_EDITED, ["学习率"])
+                attention = await create(FRANK, "Attention", ATTENTION, ["attention"])
+                attention_copy = await create(FRANK, "Attention", ATTENTION_EDITED, ["token"])
+                await create(FRANK, "贝叶斯", UNRELATED, ["贝叶斯"])
+                grace_copy = await create(GRACE, "梯度下降", GRADIENT, ["梯度"])
+
+                scan = (await client.post("/api/knowledge-cards/duplicates/scan?full=true", headers=FRANK)).json()
+                clusters = (await client.get("/api/knowledge-cards/duplicates/", headers=FRANK)).json()
+                grace_clusters = (await client.get("/api/knowledge-cards/duplicates/", headers=GRACE)).json()
+
+                merged = await client.post("/api/knowledge-cards/duplicates/merge", headers=FRANK, json={
+                    "keep_id": gradient, "merge_ids": [gradient_copy]
+                })
+                copy_status = (await client.get(f"/api/knowledge-cards/{gradient_copy}", headers=FRANK)).status_code
+                foreign_merge = await client.post("/api/knowledge-cards/duplicates/merge", headers=FRANK, json={
+                    "keep_id": gradient, "merge_ids": [grace_copy]
+                })
+
+                dismissed = await client.post("/api/knowledge-cards/duplicates/dismiss", headers=FRANK, json={
+                    "card_id": attention_copy, "other_card_id": attention
+                })
+                rescan = (await client.post("/api/knowledge-cards/duplicates/scan?full=true", headers=FRANK)).json()
+                after = (await client.get("/api/knowledge-cards/duplicates/", headers=FRANK)).json()
+                return (scan, clusters, grace_clusters, merged, copy_status, foreign_merge.status_code,
+                        dismissed.status_code, rescan, after,
+                        {"gradient": gradient, "gradient_copy": gradient_copy,
+                         "attention": attention, "attention_copy": attention_copy})
+        finally:
+            await close_db()
+
+    (scan, clusters, grace_clusters, merged, copy_status, foreign_status,
+     dismissed_status, rescan, after, ids) = asyncio.run(run())
+    assert scan == {"signed": 5, "pairs": 2}, scan
+    clustered = sorted(sorted(card["id"] for card in cluster["cards"]) for cluster in clusters)
+    assert clustered == sorted([
+        sorted([ids["gradient"], ids["gradient_copy"]]), sorted([ids["attention"], ids["attention_copy"]])
+    ])
+    assert all(pair["similarity"] >= 0.7 for cluster in clusters for pair in cluster["pairs"])
+    assert grace_clusters == []
+    assert merged.status_code == 200 and merged.json()["keywords"] == ["梯度", "学习率"]
+    assert copy_status == 404 and foreign_status == 404
+    assert dismissed_status == 200
+    assert rescan["signed"] == 4 and rescan["pairs"] == 0, rescan
+    assert after == []
+
+
+def test_incremental_checks_new_cards_against_buckets():
+    """增量检测只为新写入或修改过的卡片签名，并与已有分桶中的卡片比较"""
+    from database.database import AsyncSessionLocal, init_db, close_db
+    from database.models import KnowledgeCardDB
+    from services.card_dedup import CardDedupJob
+
+    async def run():
+        await init_db()
+        try:
+            job = CardDedupJob()
+            async with AsyncSessionLocal() as db:
+                db.add_all([
+                    KnowledgeCardDB(id=f"heidi-{i}", tenant_id="heidi", title=f"卡片 {i}", content=content, keywords=[])
+                    for i, content in enumerate((GRADIENT, ATTENTION, UNRELATED))
+                ])
+                await db.commit()
+                initial = await job.run("heidi", db, full=True)
+                unchanged = await job.run("heidi", db)
+
+                db.add(KnowledgeCardDB(id="heidi-new", tenant_id="heidi", title="卡片 0", content=GRADIENT_EDITED, keywords=[]))
+                await db.commit()
+                incremental = await job.run("heidi", db)
+                clusters = await job.clusters("heidi", db)
+
+                await job.forget("heidi", ["heidi-new"], db)
+                await db.commit()
+                after_forget = await job.clusters("heidi", db)
+                return initial, unchanged, incremental, clusters, after_forget
+        finally:
+            await close_db()
+
+    initial, unchanged, incremental, clusters, after_forget = asyncio.run(run())
+    assert initial == {"signed": 3, "pairs": 0}
+    assert unchanged == {"signed": 0, "pairs": 0}
+    assert incremental == {"signed": 1, "pairs": 1}, incremental
+    assert {card["id"] for card in clusters[0]["cards"]} == {"heidi-0", "heidi-new"}
+    assert after_forget == []
+
+
+def test_lsh_compares_only_bucket_mates():
+    """互不相似的卡片几乎不会落入同一分桶，候选对数量远小于全部卡片对"""
+    import random
+    from services.card_dedup import band_keys, signature_batch, unpack_signature
+
+    rng = random.Random(3)
+    vocabulary = [f"term{i}" for i in range(5000)]
+    texts = [" ".join(rng.sample(vocabulary, 30)) for _ in range(400)]
+    buckets = {}
+    for index, packed in enumerate(signature_batch(texts)):
+        for key in band_keys(unpack_signature(packed)):
+            buckets.setdefault(key, []).append(index)
+
+    candidate_pairs = {
+        (a, b) for members in buckets.values() for a in members for b in members if a < b
+    }
+    all_pairs = len(texts) * (len(texts) - 1) // 2
+    assert len(candidate_pairs) < all_pairs * 0.01, (len(candidate_pairs), all_pairs)
+
+
+def main():
+    print("🧬 测试近似重复卡片检测")
+    print("=" * 50)
+
+    failed = False
+    for test in (
+        test_minhash_similarity,
+        test_scan_merge_and_dismiss,
+        test_incremental_checks_new_cards_against_buckets,
+        test_lsh_compares_only_bucket_mates,
+    ):
+        try:
+            test()
+            print(f"✅ {test.__doc__}")
+        except AssertionError as exc:
+            failed = True
+            print(f"❌ {test.__doc__}\n{exc}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
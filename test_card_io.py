@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+知识卡片导入导出与搜索索引测试
+验证NDJSON导入逐行报告无效行、按块分事务提交、缺失的关键词在进程池中提取，
+导出按游标分批流式输出，以及二元组索引给出的候选集是真实匹配的超集
+可直接运行，也可以用 pytest 执行
+"""
+
+import asyncio
+import json
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+os.environ["ASYNC_DATABASE_URL"] = f"sqlite+aiosqlite:///{tempfile.mkdtemp(prefix='metalearn_card_io_')}/test.db"
+os.environ["LLM_PROVIDER"] = "stub"
+os.environ["DECOMPOSITION_CACHE_PATH"] = ""
+
+KATE = {"X-User-Id": "kate"}
+
+NDJSON_LINES = [
+    '{"title": "梯度下降", "content": "沿负梯度方向更新参数", "keywords": ["梯度"]}',
+    '{"title": "坏行", "content": ',
+    '',
+    '{"title": "注意力机制", "content": "Transformer 中的 Attention 计算"}',
+    '{"title": "缺少内容"}',
+    '{"title": "反向传播", "content": "链式法则逐层计算梯度", "keywords": []}',
+]
+
+
+def _client(app):
+    import httpx
+
+    transport = httpx.ASGITransport(app=app)
+    return httpx.AsyncClient(transport=transport, base_url="http://test")
+
+
+async def _chunked(data: bytes, size: int):
+    """按固定字节数切分请求体，行和多字节字符都可能跨块"""
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+class _patched:
+    """临时修改模块属性"""
+
+    def __init__(self, module, **values):
+        self.module = module
+        self.values = values
+        self.original = {}
+
+    def __enter__(self):
+        for name, value in self.values.items():
+            self.original[name] = getattr(self.module, name)
+            setattr(self.module, name, value)
+
+    def __exit__(self, *exc):
+        for name, value in self.original.items():
+            setattr(self.module, name, value)
+
+
+def test_import_reports_lines_and_commits_in_chunks():
+    """无效行按行号报告，有效行按块分事务写入，缺失的关键词在进程池中提取"""
+    from sqlalchemy import select
+    from database.database import AsyncSessionLocal, init_db, close_db
+    from database.models import KnowledgeCardDB
+    from services import card_io
+    from services.keyword_extractor import extract_keywords_batch
+
+    async def run():
+        await init_db()
+        try:
+            with _patched(card_io, IMPORT_CHUNK_SIZE=2, PARALLEL_THRESHOLD=1, _keyword_workers=2):
+                async with AsyncSessionLocal() as db:
+                    commits = []
+                    commit = db.commit
+
+                    async def counting_commit():
+                        commits.append(True)
+                        await commit()
+
+                    db.commit = counting_commit
+                    result = await card_io.import_cards(
+                        _chunked("\n".join(NDJSON_LINES).encode("utf-8"), 7), db, "kate-import"
+                    )
+                pool_used = card_io._keyword_pool is not None
+                card_io.shutdown_keyword_pool()
+
+            async with AsyncSessionLocal() as db:
+                rows = (await db.execute(
+                    select(KnowledgeCardDB.title, KnowledgeCardDB.keywords)
+                    .where(KnowledgeCardDB.tenant_id == "kate-import")
+                )).all()
+            return result, len(commits), pool_used, dict(rows)
+        finally:
+            await close_db()
+
+    result, commits, pool_used, keywords = asyncio.run(run())
+    assert result["imported"] == 3 and result["failed"] == 2, result
+    assert [error["line"] for error in result["errors"]] == [2, 5]
+    assert set(result["errors"][0]) == {"line", "error"} and result["errors"][0]["error"].startswith("Invalid JSON")
+    assert commits == 2, "三张卡片按每块两张分两个事务提交"
+    assert pool_used, "达到并行阈值时应在进程池中提取关键词"
+    assert keywords["梯度下降"] == ["梯度"] and keywords["反向传播"] == []
+    assert keywords["注意力机制"] == extract_keywords_batch(["注意力机制 Transformer 中的 Attention 计算"])[0]
+
+
+def test_import_stops_at_oversized_line():
+    """没有换行的超大行中断导入，之前已提交的块保留"""
+    from sqlalchemy import func, select
+    from database.database import AsyncSessionLocal, init_db, close_db
+    from database.models import KnowledgeCardDB
+    from services import card_io
+
+    async def run():
+        await init_db()
+        try:
+            body = (NDJSON_LINES[0] + "\n" + NDJSON_LINES[5] + "\n").encode("utf-8") + b"x" * 400
+            with _patched(card_io, IMPORT_CHUNK_SIZE=1, MAX_LINE_BYTES=200):
+                async with AsyncSessionLocal() as db:
+                    result = await card_io.import_cards(_chunked(body, 16), db, "kate-oversized")
+            async with AsyncSessionLocal() as db:
+                stored = (await db.execute(
+                    select(func.count()).select_from(KnowledgeCardDB).where(KnowledgeCardDB.tenant_id == "kate-oversized")
+                )).scalar_one()
+            return result, stored
+        finally:
+            await close_db()
+
+    result, stored = asyncio.run(run())
+    assert result["imported"] == 2 and stored == 2
+    assert result["errors"][-1]["line"] == -1 and "exceeds" in result["errors"][-1]["error"]
+
+
+def test_export_streams_in_batches():
+    """导出按游标分批输出租户的卡片（最近修改的在前），导出的内容可以原样再导入"""
+    from main import app
+    from database.database import init_db, close_db
+    from services import card_io
+
+    async def run():
+        await init_db()
+        try:
+            async with _client(app) as client:
+                imported = (await client.post(
+                    "/api/knowledge-cards/import", headers=KATE,
+                    content="\n".join(
+                        json.dumps({"title": f"导出 {i}", "content": f"内容 {i}", "keywords": [f"k{i}"]}, ensure_ascii=False)
+                        for i in range(5)
+                    ).encode("utf-8")
+                )).json()
+                with _patched(card_io, EXPORT_CHUNK_SIZE=2):
+                    batches = [batch async for batch in card_io.export_cards("kate")]
+                exported = await client.get("/api/knowledge-cards/export", headers=KATE)
+                reimported = (await client.post(
+                    "/api/knowledge-cards/import", headers={"X-User-Id": "kate-copy"}, content=exported.content
+                )).json()
+                return imported, batches, exported, reimported
+        finally:
+            await close_db()
+
+    imported, batches, exported, reimported = asyncio.run(run())
+    assert imported["imported"] == 5
+    assert [batch.count("\n") for batch in batches] == [2, 2, 1]
+    lines = [json.loads(line) for line in exported.text.splitlines()]
+    assert exported.headers["content-type"].startswith("application/x-ndjson")
+    assert "".join(batches) == exported.text
+    assert len(lines) == 5 and {line["title"] for line in lines} == {f"导出 {i}" for i in range(5)}
+    assert [line["updated_at"] for line in lines] == sorted((line["updated_at"] for line in lines), reverse=True)
+    assert reimported == {"imported": 5, "failed": 0, "errors": []}
+
+
+def test_card_index_candidates():
+    """候选集包含所有真实匹配，索引无法缩小范围时返回 None，写入和删除立即生效"""
+    from database.database import AsyncSessionLocal, init_db, close_db
+    from database.models import KnowledgeCardDB
+    from services.card_index import CardSearchIndex
+
+    cards = {
+        "idx-1": ("梯度下降", "沿负梯度方向更新参数", ["优化"]),
+        "idx-2": ("随机梯度", "每次只用一个样本", ["SGD"]),
+        "idx-3": ("注意力", "Attention 权重", []),
+    }
+
+    async def run():
+        await init_db()
+        try:
+            async with AsyncSessionLocal() as db:
+                db.add_all([
+                    KnowledgeCardDB(id=card_id, tenant_id="kate-index", title=title, content=content, keywords=keywords)
+                    for card_id, (title, content, keywords) in cards.items()
+                ])
+                await db.commit()
+
+                index = CardSearchIndex("kate-index")
+                unloaded = index.candidates("梯度")
+                await index.ensure_loaded(db)
+                snapshot = {
+                    "梯度": index.candidates("梯度"),
+                    "attention": index.candidates("ATTENTION"),
+                    "sgd": index.candidates("sgd"),
+                    "miss": index.candidates("贝叶斯"),
+                    "short": index.candidates("梯"),
+                    "wildcard": index.candidates("梯%"),
+                }
+                index.upsert("idx-4", "梯度裁剪", "限制梯度范数", [])
+                index.remove("idx-1")
+                after = index.candidates("梯度")
+
+                index.MAX_CANDIDATES = 1
+                too_many = index.candidates("梯度")
+                return unloaded, snapshot, after, too_many, len(index)
+        finally:
+            await close_db()
+
+    unloaded, snapshot, after, too_many, size = asyncio.run(run())
+    assert unloaded is None
+    assert snapshot["梯度"] == {"idx-1", "idx-2"}
+    assert snapshot["attention"] == {"idx-3"} and snapshot["sgd"] == {"idx-2"}
+    assert snapshot["miss"] == set()
+    assert snapshot["short"] is None and snapshot["wildcard"] is None
+    assert after == {"idx-2", "idx-4"} and size == 3
+    assert too_many is None
+
+
+def main():
+    print("📇 测试知识卡片导入导出与搜索索引")
+    print("=" * 50)
+
+    failed = False
+    for test in (
+        test_import_reports_lines_and_commits_in_chunks,
+        test_import_stops_at_oversized_line,
+        test_export_streams_in_batches,
+        test_card_index_candidates,
+    ):
+        try:
+            test()
+            print(f"✅ {test.__doc__}")
+        except AssertionError as exc:
+            failed = True
+            print(f"❌ {test.__doc__}\n{exc}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
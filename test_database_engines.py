@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+数据库引擎配置测试
+验证 SQLite 的 WAL、synchronous、busy_timeout 等 PRAGMA 在新连接上生效，异步主库使用固定大小的连接池，
+读引擎以 mode=ro 打开且禁止写入，以及同步引擎在导入后仍未创建、首次使用时才建立
+可直接运行，也可以用 pytest 执行
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend")
+sys.path.insert(0, BACKEND_DIR)
+
+os.environ["ASYNC_DATABASE_URL"] = f"sqlite+aiosqlite:///{tempfile.mkdtemp(prefix='metalearn_engines_')}/test.db"
+os.environ["LLM_PROVIDER"] = "stub"
+os.environ["DECOMPOSITION_CACHE_PATH"] = ""
+
+PRAGMA_NAMES = ("journal_mode", "synchronous", "busy_timeout", "cache_size", "mmap_size", "temp_store", "query_only")
+
+_ENGINES_SCRIPT = """
+import asyncio
+import json
+from sqlalchemy import text
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+import database.database as database
+
+PRAGMA_NAMES = %r
+
+
+def read_pragmas(conn):
+    return {name: conn.exec_driver_sql(f"PRAGMA {name}").scalar() for name in PRAGMA_NAMES}
+
+
+async def run():
+    sync_engine_at_import = database._sync_engine
+    try:
+        await database.init_db()
+        async with database.async_engine.connect() as conn:
+            write_pragmas = await conn.run_sync(read_pragmas)
+        async with database.read_engine.connect() as conn:
+            read_pragmas_ = await conn.run_sync(read_pragmas)
+        try:
+            async with database.ReadSessionLocal() as db:
+                await db.execute(text("CREATE TABLE read_only_probe (id INTEGER)"))
+            read_write_error = None
+        except Exception as exc:
+            read_write_error = type(exc).__name__
+
+        sync_engine = database.get_sync_engine()
+        with sync_engine.connect() as conn:
+            sync_pragmas = read_pragmas(conn)
+        return {
+            "sync_engine_at_import": sync_engine_at_import is not None,
+            "sync_engine_reused": database.get_sync_engine() is sync_engine,
+            "write_pragmas": write_pragmas,
+            "read_pragmas": read_pragmas_,
+            "sync_pragmas": sync_pragmas,
+            "write_pool": [isinstance(database.async_engine.pool, AsyncAdaptedQueuePool),
+                           database.async_engine.pool.size()],
+            "read_pool": [isinstance(database.read_engine.pool, AsyncAdaptedQueuePool),
+                          database.read_engine.pool.size()],
+            "read_url": str(database.read_engine.url),
+            "read_is_write_engine": database.read_engine is database.async_engine,
+            "read_write_error": read_write_error,
+        }
+    finally:
+        await database.close_db()
+
+print(json.dumps(asyncio.run(run())))
+""" % (PRAGMA_NAMES,)
+
+
+def _run_engines_script(**env) -> dict:
+    """在子进程中使用全新的数据库，引擎和同步引擎的状态不受同一次 pytest 中其他测试模块影响"""
+    directory = tempfile.mkdtemp(prefix="metalearn_engines_")
+    result = subprocess.run(
+        [sys.executable, "-c", _ENGINES_SCRIPT], cwd=BACKEND_DIR,
+        env={
+            **os.environ,
+            "ASYNC_DATABASE_URL": f"sqlite+aiosqlite:///{directory}/engines.db",
+            "DATABASE_URL": f"sqlite:///{directory}/engines.db",
+            **env,
+        },
+        capture_output=True, text=True, timeout=60
+    )
+    assert result.returncode == 0, result.stderr[-2000:]
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_sqlite_pragmas_and_pools():
+    """主库、只读库和同步引擎的新连接都应用了 PRAGMA，异步连接池大小按配置，读引擎只读"""
+    result = _run_engines_script(DB_POOL_SIZE="3", DB_READ_POOL_SIZE="7", SQLITE_BUSY_TIMEOUT_MS="4321")
+
+    expected = {
+        "journal_mode": "wal",
+        "synchronous": 1,  # NORMAL
+        "busy_timeout": 4321,
+        "cache_size": -65536,
+        "mmap_size": 256 * 1024 * 1024,
+        "temp_store": 2,  # MEMORY
+    }
+    for name in ("write_pragmas", "sync_pragmas"):
+        assert result[name] == {**expected, "query_only": 0}, (name, result[name])
+    assert result["read_pragmas"] == {**expected, "query_only": 1}, result["read_pragmas"]
+
+    assert result["write_pool"] == [True, 3]
+    assert result["read_pool"] == [True, 7]
+    assert not result["read_is_write_engine"] and result["read_url"].endswith("?mode=ro&uri=true")
+    assert result["read_write_error"] == "OperationalError"
+
+
+def test_sync_engine_is_lazy():
+    """导入数据库模块时不创建同步引擎，首次调用 get_sync_engine 时创建并复用"""
+    result = _run_engines_script()
+    assert result["sync_engine_at_import"] is False
+    assert result["sync_engine_reused"] is True
+
+
+def main():
+    print("🗄️ 测试数据库引擎配置")
+    print("=" * 50)
+
+    failed = False
+    for test in (
+        test_sqlite_pragmas_and_pools,
+        test_sync_engine_is_lazy,
+    ):
+        try:
+            test()
+            print(f"✅ {test.__doc__}")
+        except AssertionError as exc:
+            failed = True
+            print(f"❌ {test.__doc__}\n{exc}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+条件请求与响应压缩测试
+验证认知地图和卡片接口的 ETag / 304、版本号在更新和关键词回写时递增、大响应 gzip 压缩，
+以及已有数据库通过迁移补齐版本列
+可直接运行，也可以用 pytest 执行
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+os.environ["ASYNC_DATABASE_URL"] = f"sqlite+aiosqlite:///{tempfile.mkdtemp(prefix='metalearn_http_cache_')}/test.db"
+os.environ["LLM_PROVIDER"] = "stub"
+os.environ["DECOMPOSITION_CACHE_PATH"] = ""
+
+from sqlalchemy import text  # noqa: E402
+
+
+def _client(app):
+    import httpx
+
+    transport = httpx.ASGITransport(app=app)
+    # 默认不带 Accept-Encoding，需要压缩的请求单独指定
+    return httpx.AsyncClient(transport=transport, base_url="http://test", headers={"Accept-Encoding": "identity"})
+
+
+def test_etag_helpers():
+    """If-None-Match 弱比较、忽略编码后缀，Accept-Encoding 按 q 值选择"""
+    from services.http_cache import choose_encoding, digest_etag, etag_matches, make_etag
+
+    etag = make_etag("map", "m1", 3)
+    assert etag == '"map-m1-3"'
+    assert etag_matches('"map-m1-3"', etag)
+    assert etag_matches('W/"map-m1-3-gzip"', etag)
+    assert etag_matches('"other", "map-m1-3-br"', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches('"map-m1-2"', etag)
+    assert not etag_matches(None, etag)
+    assert digest_etag("cards", [("a", 1)]) != digest_etag("cards", [("a", 2)])
+    assert choose_encoding("gzip, deflate") == "gzip"
+    assert choose_encoding("gzip;q=0, deflate") is None
+    assert choose_encoding("identity") is None
+
+
+def test_map_conditional_get():
+    """地图未变化时返回 304，更新后版本号递增、旧 ETag 失效"""
+    from main import app
+    from database.database import init_db, close_db
+
+    async def run():
+        await init_db()
+        try:
+            async with _client(app) as client:
+                session = (await client.post("/api/learning-flow/sessions", json={"problem_statement": "学习缓存"})).json()
+                created = await client.post("/api/cognitive-map/", json={
+                    "session_id": session["id"], "nodes": [{"name": "A", "x": 0, "y": 0}], "edges": []
+                })
+                map_id = created.json()["id"]
+                fetched = await client.get(f"/api/cognitive-map/{map_id}")
+                etag = fetched.headers["etag"]
+                unchanged = await client.get(f"/api/cognitive-map/{map_id}", headers={"If-None-Match": etag})
+                updated = await client.put(f"/api/cognitive-map/{map_id}", json={
+                    "session_id": session["id"], "nodes": [{"name": "B", "x": 1, "y": 1}], "edges": []
+                })
+                stale = await client.get(f"/api/cognitive-map/{map_id}", headers={"If-None-Match": etag})
+                return created, fetched, unchanged, updated, stale
+        finally:
+            await close_db()
+
+    created, fetched, unchanged, updated, stale = asyncio.run(run())
+    assert created.headers["etag"] == fetched.headers["etag"]
+    assert fetched.headers["cache-control"] == "no-cache"
+    assert unchanged.status_code == 304 and unchanged.content == b""
+    assert unchanged.headers["etag"] == fetched.headers["etag"]
+    assert updated.status_code == 200 and updated.headers["etag"] != fetched.headers["etag"]
+    assert stale.status_code == 200
+    assert stale.headers["etag"] == updated.headers["etag"]
+    assert [node["name"] for node in stale.json()["nodes"]] == ["B"]
+
+
+def test_card_conditional_get():
+    """卡片列表、分页和单卡未变化时返回 304，新增、更新和关键词回写都会让 ETag 变化"""
+    from main import app
+    from database.database import AsyncSessionLocal, init_db, close_db
+    from database.models import KnowledgeCardDB
+    from sqlalchemy import update
+
+    async def run():
+        await init_db()
+        try:
+            async with _client(app) as client:
+                card = (await client.post("/api/knowledge-cards/", json={
+                    "title": "缓存", "content": "协商缓存", "keywords": ["http"]
+                })).json()
+                listed = await client.get("/api/knowledge-cards/")
+                page = await client.get("/api/knowledge-cards/page/?limit=5")
+                single = await client.get(f"/api/knowledge-cards/{card['id']}")
+                etags = {
+                    "list": listed.headers["etag"], "page": page.headers["etag"], "single": single.headers["etag"]
+                }
+                paths = {
+                    "list": "/api/knowledge-cards/", "page": "/api/knowledge-cards/page/?limit=5",
+                    "single": f"/api/knowledge-cards/{card['id']}"
+                }
+
+                async def statuses():
+                    return {
+                        name: (await client.get(path, headers={"If-None-Match": etags[name]})).status_code
+                        for name, path in paths.items()
+                    }
+
+                unchanged = await statuses()
+                # 关键词回写只递增版本号，不改 updated_at
+                async with AsyncSessionLocal() as db:
+                    await db.execute(
+                        update(KnowledgeCardDB).where(KnowledgeCardDB.id == card["id"])
+                        .values(keywords=["http", "etag"], version=KnowledgeCardDB.version + 1)
+                    )
+                    await db.commit()
+                after_writeback = await statuses()
+
+                single = await client.get(f"/api/knowledge-cards/{card['id']}")
+                etags["single"] = single.headers["etag"]
+                updated = await client.put(f"/api/knowledge-cards/{card['id']}", json={
+                    "title": "缓存", "content": "强 ETag", "keywords": ["http"]
+                })
+                after_update = await client.get(paths["single"], headers={"If-None-Match": etags["single"]})
+                return unchanged, after_writeback, single, updated, after_update
+        finally:
+            await close_db()
+
+    unchanged, after_writeback, single, updated, after_update = asyncio.run(run())
+    assert unchanged == {"list": 304, "page": 304, "single": 304}, unchanged
+    assert after_writeback == {"list": 200, "page": 200, "single": 200}, after_writeback
+    assert single.json()["keywords"] == ["http", "etag"]
+    assert updated.headers["etag"] != single.headers["etag"]
+    assert after_update.status_code == 200 and after_update.json()["content"] == "强 ETag"
+
+
+def test_compression():
+    """大响应按 Accept-Encoding 用 gzip 压缩，ETag 加编码后缀且仍可用于条件请求；小响应不压缩"""
+    from main import app
+    from database.database import init_db, close_db
+
+    async def run():
+        await init_db()
+        try:
+            async with _client(app) as client:
+                for i in range(12):
+                    await client.post("/api/knowledge-cards/", json={
+                        "title": f"压缩 {i}", "content": "重复的内容。" * 40, "keywords": ["gzip"]
+                    })
+                plain = await client.get("/api/knowledge-cards/?limit=12")
+                compressed = await client.get("/api/knowledge-cards/?limit=12", headers={"Accept-Encoding": "gzip"})
+                revalidated = await client.get("/api/knowledge-cards/?limit=12", headers={
+                    "Accept-Encoding": "gzip", "If-None-Match": compressed.headers["etag"]
+                })
+                small = await client.get("/api/knowledge-cards/?limit=1", headers={"Accept-Encoding": "gzip"})
+                return plain, compressed, revalidated, small
+        finally:
+            await close_db()
+
+    plain, compressed, revalidated, small = asyncio.run(run())
+    assert "content-encoding" not in plain.headers
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in compressed.headers["vary"]
+    assert int(compressed.headers["content-length"]) < len(plain.content)
+    # httpx 会自动解压
+    assert compressed.json() == plain.json()
+    assert compressed.headers["etag"] == plain.headers["etag"][:-1] + '-gzip"'
+    assert revalidated.status_code == 304
+    assert "content-encoding" not in small.headers
+
+
+def test_compression_skips_streaming():
+    """流式响应原样发送，不做缓冲压缩"""
+    from starlette.applications import Starlette
+    from starlette.responses import StreamingResponse
+    from starlette.routing import Route
+    from services.http_cache import CompressionMiddleware
+
+    async def stream(request):
+        async def chunks():
+            for _ in range(4):
+                yield b"x" * 2048
+        return StreamingResponse(chunks(), media_type="text/plain")
+
+    inner = Starlette(routes=[Route("/stream", stream)])
+    app = CompressionMiddleware(inner, minimum_size=16)
+
+    async def run():
+        async with _client(app) as client:
+            return await client.get("/stream", headers={"Accept-Encoding": "gzip"})
+
+    response = asyncio.run(run())
+    assert "content-encoding" not in response.headers
+    assert response.content == b"x" * 8192
+
+
+def test_version_columns_migration():
+    """已有数据库缺少版本列时由迁移 4 补齐，已有行版本为 1"""
+    from database.database import async_engine, init_db, close_db
+
+    async def run():
+        try:
+            await init_db()
+            async with async_engine.begin() as conn:
+                await conn.execute(text("DROP TABLE knowledge_cards"))
+                await conn.execute(text(
+                    "CREATE TABLE knowledge_cards (id VARCHAR PRIMARY KEY, title VARCHAR NOT NULL, content TEXT NOT NULL, "
+                    "keywords JSON, created_at DATETIME, updated_at DATETIME)"
+                ))
+                await conn.execute(text(
+                    "INSERT INTO knowledge_cards (id, title, content, keywords) VALUES ('old', '旧卡片', '内容', '[]')"
+                ))
+                # 该表结构也早于之后的迁移
+                await conn.execute(text("DELETE FROM schema_migrations WHERE version >= 4"))
+            await init_db()
+            async with async_engine.connect() as conn:
+                return (await conn.execute(text("SELECT version FROM knowledge_cards WHERE id = 'old'"))).scalar()
+        finally:
+            await close_db()
+
+    assert asyncio.run(run()) == 1
+
+
+def main():
+    print("🗂️ 测试条件请求与响应压缩")
+    print("=" * 50)
+
+    failed = False
+    for test in (
+        test_etag_helpers,
+        test_map_conditional_get,
+        test_card_conditional_get,
+        test_compression,
+        test_compression_skips_streaming,
+        test_version_columns_migration,
+    ):
+        try:
+            test()
+            print(f"✅ {test.__doc__}")
+        except AssertionError as exc:
+            failed = True
+            print(f"❌ {test.__doc__}\n{exc}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+关键词索引队列测试
+验证卡片在提取期间被修改时放弃回写（新的编辑优先）、提取失败时按退避间隔重试、
+队列满时在请求中直接处理，以及 wait_for_index=true 时等待回写完成后返回
+可直接运行，也可以用 pytest 执行
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+os.environ["ASYNC_DATABASE_URL"] = f"sqlite+aiosqlite:///{tempfile.mkdtemp(prefix='metalearn_indexing_')}/test.db"
+os.environ["LLM_PROVIDER"] = "stub"
+os.environ["DECOMPOSITION_CACHE_PATH"] = ""
+
+LEO = {"X-User-Id": "leo"}
+
+
+def _client(app):
+    import httpx
+
+    transport = httpx.ASGITransport(app=app)
+    return httpx.AsyncClient(transport=transport, base_url="http://test")
+
+
+def _failing_queue(failures: int, **kwargs):
+    """前 failures 次提取抛出异常的队列"""
+    from services.indexing_queue import KeywordIndexingQueue
+
+    class FailingQueue(KeywordIndexingQueue):
+        calls = 0
+
+        def extract(self, title, content):
+            FailingQueue.calls += 1
+            if FailingQueue.calls <= failures:
+                raise RuntimeError("extractor unavailable")
+            return super().extract(title, content)
+
+    return FailingQueue(**kwargs)
+
+
+async def _add_card(card_id: str, title: str, content: str) -> datetime:
+    from database.database import AsyncSessionLocal
+    from database.models import KnowledgeCardDB
+
+    async with AsyncSessionLocal() as db:
+        card = KnowledgeCardDB(id=card_id, tenant_id="leo", title=title, content=content, keywords=[])
+        db.add(card)
+        await db.commit()
+        return card.updated_at
+
+
+async def _stored_keywords(card_id: str):
+    from database.database import AsyncSessionLocal
+    from database.models import KnowledgeCardDB
+
+    async with AsyncSessionLocal() as db:
+        return (await db.get(KnowledgeCardDB, card_id)).keywords
+
+
+def test_newer_edit_wins():
+    """提交时的版本已被新的编辑覆盖时放弃回写，版本一致时写入关键词"""
+    from database.database import init_db, close_db
+    from services.indexing_queue import KeywordIndexingQueue
+
+    async def run():
+        await init_db()
+        try:
+            queue = KeywordIndexingQueue(workers=1)
+            updated_at = await _add_card("leo-edit", "注意力机制", "Transformer 中的 Attention 计算")
+            stale = await (await queue.submit(
+                "leo-edit", "旧标题", "旧内容", updated_at - timedelta(seconds=1), "leo"
+            ))
+            after_stale = await _stored_keywords("leo-edit")
+            fresh = await (await queue.submit(
+                "leo-edit", "注意力机制", "Transformer 中的 Attention 计算", updated_at, "leo"
+            ))
+            return stale, after_stale, fresh, await _stored_keywords("leo-edit"), queue.metrics()
+        finally:
+            await close_db()
+
+    stale, after_stale, fresh, stored, metrics = asyncio.run(run())
+    assert stale is None and after_stale == []
+    assert fresh and stored == fresh and "注意力机制" in fresh
+    assert (metrics["skipped"], metrics["processed"], metrics["inline"]) == (1, 1, 2)
+
+
+def test_retry_with_backoff():
+    """提取失败时按指数退避重试，超过重试次数后放弃并计入失败"""
+    from database.database import init_db, close_db
+
+    delays = []
+    original_sleep = asyncio.sleep
+
+    async def recording_sleep(delay, *args, **kwargs):
+        delays.append(delay)
+        await original_sleep(0)
+
+    async def run():
+        await init_db()
+        asyncio.sleep = recording_sleep
+        try:
+            updated_at = await _add_card("leo-retry", "反向传播", "链式法则逐层计算梯度")
+            recovering = _failing_queue(2, workers=1, max_retries=3)
+            recovered = await (await recovering.submit("leo-retry", "反向传播", "链式法则逐层计算梯度", updated_at, "leo"))
+            recovered_delays = list(delays)
+
+            delays.clear()
+            broken = _failing_queue(100, workers=1, max_retries=2)
+            gave_up = await (await broken.submit("leo-retry", "反向传播", "链式法则逐层计算梯度", updated_at, "leo"))
+            return recovered, recovered_delays, recovering.metrics(), gave_up, list(delays), broken.metrics()
+        finally:
+            asyncio.sleep = original_sleep
+            await close_db()
+
+    recovered, recovered_delays, recovering, gave_up, gave_up_delays, broken = asyncio.run(run())
+    assert recovered and recovered_delays == [0.2, 0.4]
+    assert (recovering["retried"], recovering["processed"], recovering["failed"]) == (2, 1, 0)
+    assert gave_up is None and gave_up_delays == [0.2, 0.4]
+    assert (broken["retried"], broken["failed"], broken["processed"]) == (2, 1, 0)
+
+
+def test_inline_fallback_when_queue_is_full():
+    """后台工作协程忙且队列已满时，新任务在提交时直接处理"""
+    from database.database import init_db, close_db
+    from services.indexing_queue import KeywordIndexingQueue
+
+    started = threading.Event()
+    release = threading.Event()
+
+    class BlockingQueue(KeywordIndexingQueue):
+        def extract(self, title, content):
+            if title == "阻塞":
+                started.set()
+                release.wait(5)
+            return super().extract(title, content)
+
+    async def run():
+        await init_db()
+        queue = BlockingQueue(workers=1, maxsize=1)
+        await queue.start()
+        try:
+            ids = [f"leo-full-{i}" for i in range(3)]
+            versions = [await _add_card(card_id, "阻塞" if i == 0 else f"卡片 {i}", "梯度下降") for i, card_id in enumerate(ids)]
+
+            blocked = await queue.submit(ids[0], "阻塞", "梯度下降", versions[0], "leo")
+            while not started.is_set():
+                await asyncio.sleep(0.01)
+            queued = await queue.submit(ids[1], "卡片 1", "梯度下降", versions[1], "leo")
+            inline = await queue.submit(ids[2], "卡片 2", "梯度下降", versions[2], "leo")
+            snapshot = (inline.done(), queued.done(), queue.metrics())
+
+            release.set()
+            await asyncio.wait_for(asyncio.gather(blocked, queued), 5)
+            return snapshot, queue.metrics()
+        finally:
+            release.set()
+            await queue.stop()
+            await close_db()
+
+    (inline_done, queued_done, during), after = asyncio.run(run())
+    assert inline_done and not queued_done
+    assert during["inline"] == 1 and during["queue_capacity"] == 1 and during["queue_size"] == 1
+    assert during["pending"] == 2, "处理中和排队中的任务都计入 pending"
+    assert after["processed"] == 3 and after["pending"] == 0
+
+
+def test_wait_for_index():
+    """wait_for_index=true 时返回的卡片已包含提取的关键词，否则先返回、稍后回写"""
+    from main import app
+    from database.database import init_db, close_db
+    from services.indexing_queue import indexing_queue
+
+    async def run():
+        await init_db()
+        await indexing_queue.start()
+        try:
+            async with _client(app) as client:
+                card = {"title": "深度学习", "content": "神经网络通过反向传播训练"}
+                waited = (await client.post("/api/knowledge-cards/?wait_for_index=true", headers=LEO, json=card)).json()
+                immediate = (await client.post("/api/knowledge-cards/", headers=LEO, json=card)).json()
+                for _ in range(100):
+                    if indexing_queue.metrics()["pending"] == 0:
+                        break
+                    await asyncio.sleep(0.01)
+                later = (await client.get(f"/api/knowledge-cards/{immediate['id']}", headers=LEO)).json()
+                return waited, immediate, later
+        finally:
+            await indexing_queue.stop()
+            await close_db()
+
+    waited, immediate, later = asyncio.run(run())
+    assert "深度学习" in waited["keywords"]
+    assert immediate["keywords"] == []
+    assert later["keywords"] == waited["keywords"]
+
+
+def main():
+    print("🗂️ 测试关键词索引队列")
+    print("=" * 50)
+
+    failed = False
+    for test in (
+        test_newer_edit_wins,
+        test_retry_with_backoff,
+        test_inline_fallback_when_queue_is_full,
+        test_wait_for_index,
+    ):
+        try:
+            test()
+            print(f"✅ {test.__doc__}")
+        except AssertionError as exc:
+            failed = True
+            print(f"❌ {test.__doc__}\n{exc}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
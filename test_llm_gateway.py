@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""
+大模型网关测试（离线）
+验证Stub的确定性、重试与超时、任务拆解缓存、流式拆解、请求合并、子任务批量生成，以及外部API路由在无网络时可用
+可直接运行，也可以用 pytest 执行
+"""
+
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+os.environ["ASYNC_DATABASE_URL"] = f"sqlite+aiosqlite:///{tempfile.mkdtemp(prefix='metalearn_llm_')}/test.db"
+os.environ["LLM_PROVIDER"] = "stub"
+os.environ["DECOMPOSITION_CACHE_PATH"] = ""
+
+import httpx  # noqa: E402
+
+from services.decomposition_cache import DecompositionCache  # noqa: E402
+from services.external_api import (  # noqa: E402
+    decompose_task, local_decomposition, parse_decomposition, stream_decomposition
+)
+from services.json_stream import ArrayItemScanner  # noqa: E402
+from services.single_flight import SingleFlight  # noqa: E402
+from services.llm_gateway import (  # noqa: E402
+    LLMError, LLMGateway, LLMProvider, LLMRequest, OpenAIProvider, StubProvider, http2_available
+)
+from services.subtask_generator import SubTaskCache, SubTaskEdge, SubTaskGenerator, parse_subtasks  # noqa: E402
+
+PROBLEM = "如何用内存管理大模型记忆"
+
+
+class FlakyProvider(LLMProvider):
+    """前 failures 次调用返回可重试错误"""
+
+    name = "flaky"
+
+    def __init__(self, failures: int):
+        self.failures = failures
+        self.calls = 0
+
+    async def complete(self, request: LLMRequest) -> str:
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise LLMError("service unavailable", retryable=True)
+        return '```json\n{"nodes": [{"name": "A"}, {"name": "B"}], "edges": [{"source": "A", "target": 1, "relationship_type": "下级"}]}\n```'
+
+
+class HangingProvider(LLMProvider):
+    name = "hanging"
+
+    async def complete(self, request: LLMRequest) -> str:
+        await asyncio.sleep(10)
+        return "{}"
+
+
+class PartialFailureProvider(StubProvider):
+    """包含“坏连线”的一批返回不可重试错误，其余正常"""
+
+    name = "partial"
+
+    async def complete(self, request: LLMRequest) -> str:
+        if "坏连线" in request.messages[-1]["content"]:
+            raise LLMError("bad request")
+        return await super().complete(request)
+
+
+def test_stub_decomposition_is_deterministic():
+    """Stub相同输入得到相同的拆解结果，未实现 complete 的模型服务不能实例化"""
+    try:
+        type("IncompleteProvider", (LLMProvider,), {"name": "incomplete"})()
+        raise AssertionError("未实现 complete 的子类应当无法实例化")
+    except TypeError:
+        pass
+
+    gateway = LLMGateway(StubProvider())
+    first = asyncio.run(decompose_task(PROBLEM, gateway, cache=None))
+    second = asyncio.run(decompose_task(PROBLEM, gateway, cache=None))
+
+    assert first == second
+    assert len(first.nodes) >= 4
+    assert first.nodes[0].name == PROBLEM
+    assert all(edge.source_id.startswith("node_") for edge in first.edges)
+
+
+def test_gateway_retries_and_times_out():
+    """可重试错误按退避重试，超时后报错"""
+    provider = FlakyProvider(failures=2)
+    gateway = LLMGateway(provider, max_retries=3, base_delay=0.001)
+    result = parse_decomposition(asyncio.run(gateway.complete_json(LLMRequest("test", []))))
+    assert provider.calls == 3 and gateway.retried == 2
+    assert result.edges[0].source_id == "node_0" and result.edges[0].target_id == "node_1"
+
+    gateway = LLMGateway(FlakyProvider(failures=5), max_retries=1, base_delay=0.001)
+    try:
+        asyncio.run(gateway.complete(LLMRequest("test", [])))
+        raise AssertionError("重试次数用尽后应当报错")
+    except LLMError:
+        assert gateway.failed == 1
+
+    gateway = LLMGateway(HangingProvider(), timeout=0.05, max_retries=0)
+    try:
+        asyncio.run(gateway.complete(LLMRequest("test", [])))
+        raise AssertionError("超时应当报错")
+    except LLMError as exc:
+        assert exc.retryable
+
+
+def test_metrics_with_openai_provider():
+    """OpenAI 模型服务的指标按 h2 是否安装报告 HTTP/2，且不建立连接"""
+    import services.llm_gateway as llm_gateway_module
+
+    provider = OpenAIProvider("test-key", base_url="http://llm.invalid")
+    metrics = LLMGateway(provider).metrics()
+    assert metrics["provider"] == "openai" and metrics["calls"] == 0
+    assert metrics["http2"] == (llm_gateway_module.LLM_HTTP2 and http2_available())
+    assert provider._client is None
+    assert LLMGateway(StubProvider()).metrics()["http2"] is False
+
+
+def test_decomposition_cache():
+    """缓存命中同一租户的相近问题、不跨租户命中、按TTL过期，并能写入磁盘后恢复"""
+    path = os.path.join(tempfile.mkdtemp(prefix="metalearn_cache_"), "cache.json")
+    cache = DecompositionCache(max_size=2, ttl=3600, similarity=0.8, path=path)
+    response = local_decomposition("学习Python数据分析")
+    cache.put("学习Python数据分析", response)
+
+    assert cache.get("学习 python 数据分析") is response
+    assert cache.get("如何学习Python数据分析？") is response
+    assert cache.get("学习Python数据分析基础") is response  # 近似命中
+    assert cache.get("学习Python数据可视化") is None
+    assert cache.metrics()["exact_hits"] == 2 and cache.metrics()["near_hits"] == 1
+    assert cache.get("学习Python数据分析", "mallory") is None, "其他租户不能命中精确匹配的条目"
+    assert cache.get("学习Python数据分析基础", "mallory") is None, "其他租户不能命中近似条目"
+    cache.put("学习Python数据分析", local_decomposition("学习Python数据分析"), "mallory")
+    assert cache.get("学习Python数据分析", "mallory") is not response
+    assert cache.invalidate("学习Python数据分析", "mallory") and cache.get("学习Python数据分析") is response
+
+    cache.put("学习Java并发编程", local_decomposition("学习Java并发编程"))
+    cache.put("深度学习神经网络原理", local_decomposition("深度学习神经网络原理"))
+    assert len(cache) == 2 and cache.metrics()["evictions"] == 1
+    assert cache.get("学习Python数据分析") is None, "最久未使用的条目应被淘汰"
+
+    assert cache.save() == 2
+    restored = DecompositionCache(path=path)
+    assert restored.load() == 2
+    assert restored.get("深度学习神经网络的原理") == cache.get("深度学习神经网络原理")
+
+    expired = DecompositionCache(ttl=0, path=path)
+    assert expired.load() == 0
+
+
+def test_gateway_calls_skipped_on_cache_hit():
+    """命中缓存时不再调用模型"""
+    gateway = LLMGateway(StubProvider())
+    cache = DecompositionCache(path=None)
+    asyncio.run(decompose_task(PROBLEM, gateway, cache))
+    asyncio.run(decompose_task(f"请问{PROBLEM}？", gateway, cache))
+    assert gateway.calls == 1
+
+
+def test_streaming_decomposition():
+    """流式拆解逐个输出节点和连线，结果与一次性拆解一致"""
+    data = {
+        "nodes": [{"name": 'a"}{', "x": 1, "y": 2}, {"name": "b"}],
+        "edges": [{"source": "b", "target": 0, "relationship_type": "上级"}],
+    }
+    text = "```json\n" + json.dumps(data, ensure_ascii=False) + "\n```"
+    scanner = ArrayItemScanner()
+    items = [item for ch in text for item in scanner.feed(ch)]
+    assert items == [("nodes", data["nodes"][0]), ("nodes", data["nodes"][1]), ("edges", data["edges"][0])]
+
+    async def consume():
+        gateway = LLMGateway(StubProvider(latency_ms=400, chunk_size=16))
+        started = time.perf_counter()
+        arrivals, results = [], []
+        async for item in stream_decomposition(PROBLEM, gateway, cache=None):
+            arrivals.append(time.perf_counter() - started)
+            results.append(item)
+        return arrivals, results
+
+    arrivals, results = asyncio.run(consume())
+    expected = local_decomposition(PROBLEM)
+    assert results == [*expected.nodes, *expected.edges]
+    assert arrivals[0] < arrivals[-1] / 2, f"首个节点应当在输出结束前到达: {arrivals}"
+
+
+def test_single_flight_burst():
+    """500个同时到达的相同请求只调用一次模型"""
+    async def burst():
+        gateway = LLMGateway(StubProvider(latency_ms=50))
+        flight = SingleFlight()
+        problems = [PROBLEM if i % 2 else f"请问{PROBLEM}？" for i in range(500)]
+        results = await asyncio.gather(*[
+            decompose_task(problem, gateway, cache=None, flight=flight) for problem in problems
+        ])
+        return gateway, flight, results
+
+    gateway, flight, results = asyncio.run(burst())
+    assert gateway.calls == 1
+    assert flight.executions == 1 and flight.coalesced == 499 and flight.in_flight == 0
+    assert all(result is results[0] for result in results)
+
+
+def test_single_flight_cancellation():
+    """单个调用方取消不影响其他调用方，全部取消时取消底层调用"""
+    async def scenario():
+        flight = SingleFlight()
+        started = asyncio.Event()
+        finished = []
+
+        async def work():
+            started.set()
+            await asyncio.sleep(0.05)
+            finished.append(True)
+            return "done"
+
+        first = asyncio.ensure_future(flight.do("k", work))
+        second = asyncio.ensure_future(flight.do("k", work))
+        await started.wait()
+        first.cancel()
+        assert await second == "done"
+        assert first.cancelled() and finished == [True]
+
+        third = asyncio.ensure_future(flight.do("k2", work))
+        fourth = asyncio.ensure_future(flight.do("k2", work))
+        await asyncio.sleep(0.01)
+        third.cancel()
+        fourth.cancel()
+        await asyncio.sleep(0.1)
+        return flight, finished
+
+    flight, finished = asyncio.run(scenario())
+    assert finished == [True], "全部调用方取消后底层调用不应继续执行"
+    assert flight.cancelled == 1 and flight.in_flight == 0
+
+
+def test_subtask_generation_batches_and_falls_back():
+    """多条连线合并为一次模型调用，结果按连线缓存，超出延迟预算或失败的一批退回模板，Stub 默认直接用模板"""
+    edges = [
+        SubTaskEdge("Python基础", "NumPy", "下级"),
+        SubTaskEdge("NumPy", "Pandas", "并列"),
+        SubTaskEdge("Pandas", "数据可视化", "相关"),
+    ]
+    gateway = LLMGateway(StubProvider())
+    generator = SubTaskGenerator(gateway, cache=SubTaskCache(), flight=SingleFlight(), mode="llm")
+
+    first = asyncio.run(generator.generate_subtasks_batch(edges, "学习Python数据分析"))
+    assert gateway.calls == 1
+    assert [item.source for item in first] == ["llm"] * 3
+    assert "NumPy" in first[0].sub_tasks[0].name and "Pandas" in first[1].sub_tasks[0].name
+    assert [task.order for task in first[2].sub_tasks] == [1, 2, 3]
+
+    second = asyncio.run(generator.generate_subtasks_batch(edges[1:], "学习 Python 数据分析"))
+    assert gateway.calls == 1 and [item.source for item in second] == ["cache"] * 2
+
+    invalid = parse_subtasks([{"name": "A", "mastery_expectation": "随便"}, {"description": "无名"}, "x"])
+    assert len(invalid) == 1 and invalid[0].mastery_expectation is None
+
+    slow = SubTaskGenerator(LLMGateway(HangingProvider(), max_retries=0), cache=None, flight=None, latency_budget=0.05)
+    started = time.perf_counter()
+    fallback = asyncio.run(slow.generate_subtasks_batch(edges[:1], "学习Python数据分析"))
+    assert time.perf_counter() - started < 1
+    assert fallback[0].source == "template"
+    assert fallback[0].sub_tasks == slow.generate_subtasks("Python基础", "NumPy", "下级", "学习Python数据分析")
+
+    stub_gateway = LLMGateway(StubProvider())
+    default = SubTaskGenerator(stub_gateway, cache=None, flight=None, mode="auto")
+    templated = asyncio.run(default.generate_subtasks_batch(edges[:1], "学习Python数据分析"))
+    assert stub_gateway.calls == 0 and templated[0].source == "template"
+    assert templated[0].sub_tasks[0].name == "理解 NumPy 的整体框架"
+
+    import services.subtask_generator as subtask_generator
+    batch_size = subtask_generator.SUBTASK_BATCH_SIZE
+    subtask_generator.SUBTASK_BATCH_SIZE = 2
+    try:
+        partial = SubTaskGenerator(LLMGateway(PartialFailureProvider(), max_retries=0), cache=None, flight=None, mode="llm")
+        mixed = asyncio.run(partial.generate_subtasks_batch(edges + [SubTaskEdge("坏连线", "Matplotlib", "相关")], "学习Python数据分析"))
+    finally:
+        subtask_generator.SUBTASK_BATCH_SIZE = batch_size
+    assert [item.source for item in mixed] == ["llm", "llm", "template", "template"]
+
+
+def test_external_routes_offline():
+    """外部API路由在Stub下正常返回，缓存失效接口只作用于当前租户，清空整个缓存不对外开放"""
+    from main import app
+    from database.database import init_db, close_db
+
+    async def run():
+        await init_db()
+        async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+            decomposition = await client.post(
+                "/api/external/task-decomposition", json={"problem_statement": PROBLEM}
+            )
+            resources = await client.post(
+                "/api/external/resource-search", json={"query": "React", "task_context": "学习React前端开发"}
+            )
+            stream = await client.post(
+                "/api/external/task-decomposition/stream", json={"problem_statement": PROBLEM}
+            )
+            status = await client.get("/api/external/llm/status")
+            invalidations = [
+                (await client.delete("/api/external/cache", params={"key": PROBLEM}, headers=headers)).json()
+                for headers in ({"X-User-Id": "mallory"}, {})
+            ]
+            flush_statuses = [
+                (await client.delete("/api/external/cache")).status_code,
+                (await client.delete("/debug/cache")).status_code,
+            ]
+        await close_db()
+        return decomposition, resources, stream, status, invalidations, flush_statuses
+
+    decomposition, resources, stream, status, invalidations, flush_statuses = asyncio.run(run())
+    assert decomposition.status_code == 200 and decomposition.json()["nodes"]
+    events = [json.loads(line) for line in stream.text.splitlines()]
+    assert [e["node"] for e in events if e["type"] == "node"] == decomposition.json()["nodes"]
+    assert events[-1]["type"] == "done"
+    assert resources.status_code == 200 and resources.json()["resources"]
+    assert status.json()["provider"] == "stub"
+    assert [item["invalidated"]["decomposition"] for item in invalidations] == [0, 1]
+    assert flush_statuses == [422, 404], "未开启调试路由时不能清空所有租户的缓存"
+
+
+def main():
+    print("🤖 测试大模型网关")
+    print("=" * 50)
+
+    failed = False
+    for test in (
+        test_stub_decomposition_is_deterministic,
+        test_gateway_retries_and_times_out,
+        test_metrics_with_openai_provider,
+        test_decomposition_cache,
+        test_gateway_calls_skipped_on_cache_hit,
+        test_streaming_decomposition,
+        test_single_flight_burst,
+        test_single_flight_cancellation,
+        test_subtask_generation_batches_and_falls_back,
+        test_external_routes_offline,
+    ):
+        try:
+            test()
+            print(f"✅ {test.__doc__}")
+        except AssertionError as exc:
+            failed = True
+            print(f"❌ {test.__doc__}\n{exc}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
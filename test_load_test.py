@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+进程内压测工具测试
+用少量学习者跑一遍完整流程，验证每个接口都有统计、结果可序列化且能发现回退
+可直接运行，也可以用 pytest 执行
+"""
+
+import asyncio
+import copy
+import json
+import os
+import sys
+import tempfile
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT_DIR, "backend"))
+sys.path.insert(0, os.path.join(ROOT_DIR, "benchmarks"))
+
+os.environ["ASYNC_DATABASE_URL"] = f"sqlite+aiosqlite:///{tempfile.mkdtemp(prefix='metalearn_load_')}/test.db"
+os.environ["LLM_PROVIDER"] = "stub"
+os.environ["DECOMPOSITION_CACHE_PATH"] = ""
+
+from load_test import compare_results, percentile, run_load_test  # noqa: E402
+
+LEARNERS = 6
+
+
+def test_percentile():
+    """最近秩法百分位"""
+    samples = [float(i) for i in range(1, 101)]
+    assert percentile(samples, 0.5) == 50 and percentile(samples, 0.95) == 95 and percentile(samples, 0.99) == 99
+    assert percentile([3.0], 0.99) == 3.0
+
+
+def test_full_flow_load():
+    """并发学习者走完整个流程，每个接口都有延迟统计，并能按基线发现回退"""
+    result = asyncio.run(run_load_test(LEARNERS, concurrency=3))
+
+    assert result["summary"]["failed_learners"] == 0, result["failures"]
+    endpoints = result["endpoints"]
+    for name in (
+        "POST /learning-flow/sessions",
+        "POST /external/task-decomposition",
+        "POST /cognitive-map",
+        "POST /cognitive-map/{id}/select-edge",
+        "POST /learning-flow/sessions/{id}/sub-tasks",
+        "POST /learning-flow/sessions/{id}/jol-assessment",
+        "POST /learning-flow/sessions/{id}/fok-assessment",
+        "POST /learning-flow/sessions/{id}/confidence-assessment",
+        "POST /learning-flow/sessions/{id}/time-allocation",
+    ):
+        stats = endpoints[name]
+        assert stats["requests"] == LEARNERS and stats["errors"] == 0
+        assert stats["p50_ms"] <= stats["p95_ms"] <= stats["p99_ms"] <= stats["max_ms"]
+    json.dumps(result)
+
+    assert compare_results(result, result, threshold=0.2) == []
+    faster_baseline = copy.deepcopy(result)
+    faster_baseline["endpoints"]["POST /cognitive-map"]["p95_ms"] /= 2
+    regressions = compare_results(result, faster_baseline, threshold=0.2)
+    assert len(regressions) == 1 and regressions[0].startswith("POST /cognitive-map:")
+
+
+def main():
+    print("🏋️ 测试进程内压测工具")
+    print("=" * 50)
+
+    failed = False
+    for test in (test_percentile, test_full_flow_load):
+        try:
+            test()
+            print(f"✅ {test.__doc__}")
+        except AssertionError as exc:
+            failed = True
+            print(f"❌ {test.__doc__}\n{exc}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+键集分页测试
+验证卡片列表、卡片搜索和会话列表沿 next_cursor 翻页时，updated_at 相同的行既不重复也不遗漏，
+最后一页的 next_cursor 为 null，以及格式非法或被篡改的游标返回 400
+可直接运行，也可以用 pytest 执行
+"""
+
+import asyncio
+import base64
+import json
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+os.environ["ASYNC_DATABASE_URL"] = f"sqlite+aiosqlite:///{tempfile.mkdtemp(prefix='metalearn_pagination_')}/test.db"
+os.environ["LLM_PROVIDER"] = "stub"
+os.environ["DECOMPOSITION_CACHE_PATH"] = ""
+
+PAGER = {"X-User-Id": "pager"}
+
+# 中间四行的 updated_at 相同，limit=3 时第一页的游标落在相同时间的行之间
+TIED_AT = datetime(2024, 6, 1, 8, 0)
+UPDATED_AT = [
+    datetime(2024, 6, 2, 8, 0),
+    TIED_AT, TIED_AT, TIED_AT, TIED_AT,
+    datetime(2024, 5, 31, 8, 0),
+    datetime(2024, 5, 30, 8, 0),
+]
+
+
+def _client(app):
+    import httpx
+
+    transport = httpx.ASGITransport(app=app)
+    return httpx.AsyncClient(transport=transport, base_url="http://test")
+
+
+def _expected_order(rows):
+    """(updated_at, id) 降序"""
+    return [row_id for _, row_id in sorted(rows, reverse=True)]
+
+
+async def _seed():
+    """直接写入相同 updated_at 的卡片和会话，返回各自的 (updated_at, id)"""
+    from database.database import AsyncSessionLocal
+    from database.models import KnowledgeCardDB, LearningSessionDB
+
+    cards = [(updated_at, f"pager-card-{i}") for i, updated_at in enumerate(UPDATED_AT)]
+    sessions = [(updated_at, f"pager-session-{i}") for i, updated_at in enumerate(UPDATED_AT)]
+    async with AsyncSessionLocal() as db:
+        db.add_all([
+            KnowledgeCardDB(
+                id=card_id, tenant_id="pager", title=f"分页卡片 {card_id}", content="键集分页",
+                keywords=[], created_at=updated_at, updated_at=updated_at
+            )
+            for updated_at, card_id in cards
+        ])
+        db.add_all([
+            LearningSessionDB(
+                id=session_id, tenant_id="pager", problem_statement="键集分页", current_step="problem_input",
+                session_data={}, created_at=updated_at, updated_at=updated_at
+            )
+            for updated_at, session_id in sessions
+        ])
+        await db.commit()
+    return cards, sessions
+
+
+async def _follow(client, path: str, params: dict):
+    """沿 next_cursor 翻到最后一页，返回每页的 id 列表和最后一页的游标"""
+    pages, cursor = [], None
+    while True:
+        query = dict(params, cursor=cursor) if cursor else params
+        response = await client.get(path, params=query, headers=PAGER)
+        assert response.status_code == 200, response.text
+        body = response.json()
+        pages.append([item["id"] for item in body["items"]])
+        cursor = body["next_cursor"]
+        if cursor is None or len(pages) > len(UPDATED_AT):
+            return pages, cursor
+
+
+def _forged(value) -> str:
+    return base64.urlsafe_b64encode(json.dumps(value).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def test_pages_follow_cursor_across_ties():
+    """沿游标翻页时 updated_at 相同的行不重复、不遗漏，顺序与 (updated_at, id) 降序一致"""
+    from main import app
+    from database.database import init_db, close_db
+
+    async def run():
+        await init_db()
+        try:
+            cards, sessions = await _seed()
+            async with _client(app) as client:
+                results = {
+                    "cards": await _follow(client, "/api/knowledge-cards/page/", {"limit": 3}),
+                    "search": await _follow(client, "/api/knowledge-cards/search/page/", {"query": "分页", "limit": 3}),
+                    "sessions": await _follow(client, "/api/learning-flow/sessions", {"limit": 3}),
+                }
+                exact = await client.get("/api/knowledge-cards/page/", params={"limit": len(UPDATED_AT)}, headers=PAGER)
+            return cards, sessions, results, exact.json()
+        finally:
+            await close_db()
+
+    cards, sessions, results, exact = asyncio.run(run())
+    expected = {"cards": _expected_order(cards), "search": _expected_order(cards), "sessions": _expected_order(sessions)}
+    for name, (pages, last_cursor) in results.items():
+        assert [len(page) for page in pages] == [3, 3, 1], (name, pages)
+        assert [row_id for page in pages for row_id in page] == expected[name], name
+        assert last_cursor is None, name
+    # 行数恰好等于 limit 时没有下一页
+    assert len(exact["items"]) == len(UPDATED_AT) and exact["next_cursor"] is None
+
+
+def test_invalid_cursor_rejected():
+    """格式非法或被篡改的游标返回 400"""
+    from main import app
+    from database.database import init_db, close_db
+
+    cursors = [
+        "not-a-cursor!",
+        _forged(["not-a-date", "pager-card-0"]),
+        _forged({"updated_at": "2024-06-01T08:00:00"}),
+        _forged(["2024-06-01T08:00:00"]),
+        base64.urlsafe_b64encode(b"\xff\xfe").decode("ascii"),
+    ]
+
+    async def run():
+        await init_db()
+        try:
+            async with _client(app) as client:
+                valid = (await client.get("/api/knowledge-cards/page/", params={"limit": 1}, headers=PAGER)).json()
+                tampered = (valid["next_cursor"] or _forged(["2024-06-01T08:00:00", "x"]))[:-2] + "!!"
+                statuses = []
+                for cursor in cursors + [tampered]:
+                    for path, params in (
+                        ("/api/knowledge-cards/page/", {}),
+                        ("/api/knowledge-cards/search/page/", {"query": "分页"}),
+                        ("/api/learning-flow/sessions", {}),
+                    ):
+                        response = await client.get(path, params={**params, "cursor": cursor}, headers=PAGER)
+                        statuses.append((response.status_code, response.json()["detail"]))
+                return statuses
+        finally:
+            await close_db()
+
+    statuses = asyncio.run(run())
+    assert set(statuses) == {(400, "Invalid cursor")}, statuses
+
+
+def main():
+    print("📄 测试键集分页")
+    print("=" * 50)
+
+    failed = False
+    for test in (
+        test_pages_follow_cursor_across_ties,
+        test_invalid_cursor_rejected,
+    ):
+        try:
+            test()
+            print(f"✅ {test.__doc__}")
+        except AssertionError as exc:
+            failed = True
+            print(f"❌ {test.__doc__}\n{exc}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
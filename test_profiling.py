@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+性能剖析中间件测试
+验证路由延迟直方图、每个请求的数据库查询统计、服务耗时、慢请求剖析文件和Prometheus输出
+可直接运行，也可以用 pytest 执行
+"""
+
+import asyncio
+import os
+import re
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+os.environ["ASYNC_DATABASE_URL"] = f"sqlite+aiosqlite:///{tempfile.mkdtemp(prefix='metalearn_profiling_')}/test.db"
+os.environ["LLM_PROVIDER"] = "stub"
+os.environ["DECOMPOSITION_CACHE_PATH"] = ""
+
+import httpx  # noqa: E402
+from fastapi import FastAPI  # noqa: E402
+
+from services.profiling import (  # noqa: E402
+    Histogram, MetricsRegistry, RequestProfiler, enable_profiling, timed_section
+)
+
+
+def test_histogram_and_nested_sections():
+    """直方图分位数估算，同名区段嵌套时只统计最外层"""
+    histogram = Histogram((0.1, 0.2, 0.4))
+    for value in (0.05, 0.15, 0.15, 0.3, 1.0):
+        histogram.observe(value)
+    assert histogram.cumulative() == [("0.1", 1), ("0.2", 3), ("0.4", 4), ("+Inf", 5)]
+    assert 0.1 < histogram.quantile(0.5) <= 0.2
+
+    from services import profiling
+    registry = MetricsRegistry()
+    original, profiling.metrics_registry = profiling.metrics_registry, registry
+    try:
+        with timed_section("outer"):
+            with timed_section("outer"):
+                pass
+    finally:
+        profiling.metrics_registry = original
+    assert registry.sections["outer"].count == 1
+
+
+def test_profiling_middleware():
+    """按路由统计延迟、查询次数和服务耗时，慢请求写出剖析文件，输出Prometheus文本，调试路由可清空模型结果缓存"""
+    from database.database import init_db, close_db
+    from routers import debug, learning_flow
+    from services import profiling
+    from services.keyword_extractor import KeywordExtractor
+
+    profile_dir = tempfile.mkdtemp(prefix="metalearn_profiles_")
+    profiling.metrics_registry.reset()
+    app = FastAPI()
+    app.include_router(learning_flow.router, prefix="/api/learning-flow")
+    app.include_router(debug.router, prefix="/debug")
+    enable_profiling(app, profiler=RequestProfiler(
+        sample_rate=1.0, slow_ms=0, directory=profile_dir, profiler="cprofile", max_files=3
+    ))
+
+    async def run():
+        await init_db()
+        try:
+            async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+                for _ in range(2):
+                    session = (await client.post(
+                        "/api/learning-flow/sessions", json={"problem_statement": "学习Python数据分析"}
+                    )).json()
+                    await client.post(
+                        f"/api/learning-flow/sessions/{session['id']}/jol-assessment",
+                        json={"session_id": session["id"], "assessment": "完全记得住"}
+                    )
+                    await client.post(
+                        f"/api/learning-flow/sessions/{session['id']}/sub-tasks/suggestions",
+                        json={"edges": [{"source_node_name": "A", "target_node_name": "B", "relationship_type": "下级"}]}
+                    )
+                await client.get("/api/learning-flow/sessions/missing")
+                metrics = await client.get("/debug/metrics")
+                prometheus = await client.get("/debug/metrics/prometheus")
+                flushed = await client.delete("/debug/cache", params={"name": "decomposition"})
+            return metrics, prometheus, flushed
+        finally:
+            await close_db()
+
+    metrics, prometheus, flushed = asyncio.run(run())
+    KeywordExtractor().extract_keywords("Transformer 注意力机制")
+
+    routes = metrics.json()["routes"]
+    jol = routes["POST /api/learning-flow/sessions/{session_id}/jol-assessment"]
+    assert jol["requests"] == 2 and jol["statuses"] == {"2xx": 2}
+    assert jol["db_queries_per_request"] >= 2, "查询次数应计入发起它的请求"
+    assert jol["section_ms_per_request"].get("flow_engine", 0) > 0
+    assert routes["GET /api/learning-flow/sessions/{session_id}"]["statuses"] == {"4xx": 1}
+
+    sections = profiling.metrics_registry.snapshot()["sections"]
+    assert sections["subtask_generator"]["calls"] == 2, "嵌套调用只统计最外层"
+    assert sections["keyword_extractor"]["calls"] >= 1
+
+    recent = metrics.json()["profiler"]["recent"]
+    assert 0 < len(recent) <= 3 and all(item["file"].endswith(".prof") for item in recent)
+
+    text = prometheus.text
+    assert prometheus.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert "# TYPE metalearn_http_request_duration_seconds histogram" in text
+    assert re.search(
+        r'metalearn_http_request_duration_seconds_bucket\{method="POST",'
+        r'route="/api/learning-flow/sessions/\{session_id\}/jol-assessment",le="\+Inf"\} 2', text
+    )
+    assert re.search(r"^metalearn_db_queries_total \d+$", text, flags=re.M)
+    assert flushed.status_code == 200 and set(flushed.json()["invalidated"]) == {"decomposition"}
+
+
+def main():
+    print("⏱️ 测试性能剖析中间件")
+    print("=" * 50)
+
+    failed = False
+    for test in (test_histogram_and_nested_sections, test_profiling_middleware):
+        try:
+            test()
+            print(f"✅ {test.__doc__}")
+        except AssertionError as exc:
+            failed = True
+            print(f"❌ {test.__doc__}\n{exc}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+查询预算与 N+1 检测测试
+验证认知地图和子任务接口的查询次数不随节点/连线/子任务数量增长，
+能识别逐条查询的处理函数，并且超出声明预算的路由会被判定失败
+可直接运行，也可以用 pytest 执行
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+os.environ["ASYNC_DATABASE_URL"] = f"sqlite+aiosqlite:///{tempfile.mkdtemp(prefix='metalearn_queries_')}/test.db"
+os.environ["LLM_PROVIDER"] = "stub"
+os.environ["DECOMPOSITION_CACHE_PATH"] = ""
+
+import httpx  # noqa: E402
+from sqlalchemy import select  # noqa: E402
+
+from database.query_counter import (  # noqa: E402
+    QueryBudgetExceeded, QueryCounter, measure_query_scaling,
+    query_budget, strict_query_budgets
+)
+
+SIZES = (1, 5, 25)
+
+
+def _map_payload(session_id: str, size: int) -> dict:
+    return {
+        "session_id": session_id,
+        "nodes": [{"name": f"节点{i}", "x": float(i), "y": 0.0} for i in range(size)],
+        "edges": [
+            {"source_id": f"n{i}", "target_id": f"n{i + 1}", "relationship_type": "并列"}
+            for i in range(size)
+        ],
+    }
+
+
+def _sub_task_payload(size: int) -> list:
+    return [{"name": f"子任务{i}", "order": i + 1} for i in range(size)]
+
+
+async def _run_with_client(scenario):
+    from main import app
+    from database.database import init_db, close_db
+
+    await init_db()
+    try:
+        async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+            return await scenario(client)
+    finally:
+        await close_db()
+
+
+def test_query_count_is_constant_in_payload_size(query_budget_guard):
+    """创建/更新认知地图和子任务的查询次数不随数据量增长，且都在声明的预算内"""
+
+    async def scenario(client):
+        session = (await client.post(
+            "/api/learning-flow/sessions", json={"problem_statement": "学习线性代数"}
+        )).json()
+        map_id = None
+
+        async def create_map(size):
+            nonlocal map_id
+            response = await client.post("/api/cognitive-map/", json=_map_payload(session["id"], size))
+            assert response.status_code == 200 and len(response.json()["nodes"]) == size
+            map_id = response.json()["id"]
+
+        async def update_map(size):
+            response = await client.put(f"/api/cognitive-map/{map_id}", json=_map_payload(session["id"], size))
+            assert response.status_code == 200 and len(response.json()["edges"]) == size
+
+        async def create_sub_tasks(size):
+            response = await client.post(
+                f"/api/learning-flow/sessions/{session['id']}/sub-tasks", json=_sub_task_payload(size)
+            )
+            assert response.status_code == 200 and len(response.json()) == size
+            assert all(task["id"] for task in response.json())
+
+        reports = {}
+        for name, run in (("create_map", create_map), ("update_map", update_map),
+                          ("create_sub_tasks", create_sub_tasks)):
+            reports[name] = await measure_query_scaling(run, SIZES)
+
+        fetched = await client.get(f"/api/cognitive-map/{map_id}")
+        linked = await client.get(f"/api/learning-flow/sessions/{session['id']}")
+        return reports, fetched, linked
+
+    reports, fetched, linked = asyncio.run(_run_with_client(scenario))
+
+    assert query_budget_guard.mode == "strict" and not query_budget_guard.violations
+    for name, report in reports.items():
+        assert not report.grows_with_size, f"{name}: {report}"
+    assert len(fetched.json()["nodes"]) == SIZES[-1]
+    assert linked.json()["cognitive_map_id"] == fetched.json()["id"]
+    assert len(linked.json()["sub_tasks"]) == SIZES[-1]
+
+
+def test_detects_per_item_queries():
+    """逐条 refresh 的写法会被识别为随数据量增长"""
+    from database.database import AsyncSessionLocal, init_db, close_db
+    from database.models import LearningSessionDB, SubTaskDB
+
+    async def run():
+        await init_db()
+        try:
+            async with AsyncSessionLocal() as db:
+                learning_session = LearningSessionDB(problem_statement="N+1", current_step="problem_input")
+                db.add(learning_session)
+                await db.commit()
+
+                async def refresh_each(size):
+                    tasks = [SubTaskDB(session_id=learning_session.id, name=f"t{i}", order=i) for i in range(size)]
+                    db.add_all(tasks)
+                    await db.commit()
+                    for task in tasks:
+                        await db.refresh(task)
+
+                async def load_once(size):
+                    await db.execute(select(SubTaskDB).where(SubTaskDB.session_id == learning_session.id))
+
+                return (await measure_query_scaling(refresh_each, SIZES),
+                        await measure_query_scaling(load_once, SIZES))
+        finally:
+            await close_db()
+
+    per_item, constant = asyncio.run(run())
+    assert per_item.grows_with_size and per_item.extra_queries_per_item >= 1, str(per_item)
+    assert not constant.grows_with_size, str(constant)
+
+
+def test_budget_violations():
+    """超出预算时 strict 模式报错、warn 模式只记录；计数器可嵌套，并发任务各自计数"""
+    from database.database import AsyncSessionLocal, init_db, close_db
+    from database.models import LearningSessionDB
+    from database.query_counter import query_budget_checker
+
+    previous_mode, previous_violations = query_budget_checker.mode, query_budget_checker.violations
+
+    async def run():
+        await init_db()
+        try:
+            async with AsyncSessionLocal() as db:
+                async def handler(queries):
+                    for _ in range(queries):
+                        await db.execute(select(LearningSessionDB.id).limit(1))
+
+                limited = query_budget(2)(handler)
+                assert limited.__query_budget__ == 2
+
+                with strict_query_budgets() as checker:
+                    await limited(2)
+                    try:
+                        await limited(3)
+                        raise AssertionError("expected QueryBudgetExceeded")
+                    except QueryBudgetExceeded as exc:
+                        assert "budget 2" in str(exc)
+
+                    checker.mode = "warn"
+                    await limited(4)
+                    violations = [(v.count, v.budget) for v in checker.violations]
+
+                # 退出后恢复原来的模式和违规记录
+                assert checker.mode == previous_mode and checker.violations is previous_violations
+
+                # 计数器可以嵌套，并发执行的任务各自计数
+                with QueryCounter() as outer:
+                    await handler(1)
+                    with QueryCounter() as inner:
+                        await handler(2)
+                concurrent = await asyncio.gather(_count_queries(1), _count_queries(3))
+                return violations, outer.count, inner.count, concurrent
+        finally:
+            await close_db()
+
+    async def _count_queries(queries):
+        with QueryCounter() as counter:
+            async with AsyncSessionLocal() as db:
+                for _ in range(queries):
+                    await db.execute(select(LearningSessionDB.id).limit(1))
+                    await asyncio.sleep(0)
+        return counter.count
+
+    violations, outer_count, inner_count, concurrent = asyncio.run(run())
+    assert violations == [(3, 2), (4, 2)]
+    assert inner_count == 2 and outer_count == 3
+    assert concurrent == [1, 3]
+
+
+def main():
+    print("🔢 测试查询预算与 N+1 检测")
+    print("=" * 50)
+
+    failed = False
+    # 与 pytest 下的 query_budget_guard 夹具一致，直接运行时同样严格检查查询预算
+    with strict_query_budgets() as checker:
+        for test, args in (
+            (test_query_count_is_constant_in_payload_size, (checker,)),
+            (test_detects_per_item_queries, ()),
+            (test_budget_violations, ()),
+        ):
+            try:
+                test(*args)
+                print(f"✅ {test.__doc__}")
+            except AssertionError as exc:
+                failed = True
+                print(f"❌ {test.__doc__}\n{exc}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+查询计划回归测试
+验证迁移能给旧数据库补齐索引，且热点查询都走索引而不是全表扫描
+可直接运行，也可以用 pytest 执行
+"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+from sqlalchemy import create_engine, inspect  # noqa: E402
+
+from database.models import Base  # noqa: E402
+from database.migrations import run_migrations, get_applied_versions, SCHEMA_VERSION  # noqa: E402
+from database.query_plans import HOT_QUERIES, find_plan_regressions  # noqa: E402
+
+# 没有任何索引、也没有版本列和租户列的旧版表结构
+LEGACY_SCHEMA = """
+CREATE TABLE learning_sessions (id VARCHAR PRIMARY KEY, problem_statement TEXT NOT NULL, current_step VARCHAR,
+    cognitive_map_id VARCHAR, selected_edge_id VARCHAR, session_data JSON, created_at DATETIME, updated_at DATETIME);
+CREATE TABLE cognitive_maps (id VARCHAR PRIMARY KEY, session_id VARCHAR NOT NULL, created_at DATETIME, updated_at DATETIME);
+CREATE TABLE cognitive_nodes (id VARCHAR PRIMARY KEY, cognitive_map_id VARCHAR NOT NULL, name VARCHAR NOT NULL,
+    description TEXT, x FLOAT NOT NULL, y FLOAT NOT NULL, created_at DATETIME);
+CREATE TABLE cognitive_edges (id VARCHAR PRIMARY KEY, cognitive_map_id VARCHAR NOT NULL, source_id VARCHAR NOT NULL,
+    target_id VARCHAR NOT NULL, relationship_type VARCHAR NOT NULL, custom_name VARCHAR, created_at DATETIME);
+CREATE TABLE sub_tasks (id VARCHAR PRIMARY KEY, session_id VARCHAR NOT NULL, name VARCHAR NOT NULL, description TEXT,
+    "order" INTEGER NOT NULL, mastery_expectation VARCHAR, created_at DATETIME);
+CREATE TABLE knowledge_cards (id VARCHAR PRIMARY KEY, title VARCHAR NOT NULL, content TEXT NOT NULL, keywords JSON,
+    created_at DATETIME, updated_at DATETIME);
+CREATE TABLE learning_resources (id VARCHAR PRIMARY KEY, title VARCHAR NOT NULL, url VARCHAR, content TEXT,
+    resource_type VARCHAR NOT NULL, keywords JSON, created_at DATETIME);
+"""
+
+# 只用到旧版表结构中已有列的热点查询
+LEGACY_COMPATIBLE_QUERIES = {
+    "sessions_in_step", "nodes_by_map", "edges_by_map", "sub_tasks_by_session", "resource_by_url"
+}
+
+
+def _temp_db_path() -> str:
+    return os.path.join(tempfile.mkdtemp(prefix="metalearn_plans_"), "test.db")
+
+
+def test_fresh_database_has_no_full_scans():
+    """新建数据库上的热点查询都走索引"""
+    engine = create_engine(f"sqlite:///{_temp_db_path()}")
+    with engine.begin() as conn:
+        Base.metadata.create_all(conn)
+        run_migrations(conn)
+        problems = find_plan_regressions(conn)
+    engine.dispose()
+
+    assert not problems, "热点查询出现全表扫描:\n" + "\n".join(problems)
+
+
+def test_migrations_upgrade_legacy_database():
+    """旧数据库执行迁移后补齐索引，且数据保持不变"""
+    path = _temp_db_path()
+    legacy = sqlite3.connect(path)
+    legacy.executescript(LEGACY_SCHEMA)
+    legacy.execute("INSERT INTO knowledge_cards (id, title, content, keywords) VALUES ('c1', 't', 'c', '[]')")
+    legacy.commit()
+    legacy.close()
+
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.begin() as conn:
+        Base.metadata.create_all(conn)
+        # 会话、地图和卡片查询会读取迁移 4、5 才补上的版本列和租户列，迁移前只检查其余表
+        legacy_queries = [query for query in HOT_QUERIES if query.name in LEGACY_COMPATIBLE_QUERIES]
+        assert find_plan_regressions(conn, legacy_queries), "旧表结构应当检测出全表扫描"
+
+        applied = run_migrations(conn)
+        assert applied and applied[-1] == SCHEMA_VERSION
+        assert run_migrations(conn) == [], "迁移应当是幂等的"
+        assert get_applied_versions(conn)[-1] == SCHEMA_VERSION
+
+        problems = find_plan_regressions(conn)
+        index_names = {index["name"] for index in inspect(conn).get_indexes("cognitive_nodes")}
+        card_count = conn.exec_driver_sql("SELECT COUNT(*) FROM knowledge_cards").scalar()
+    engine.dispose()
+
+    assert not problems, "迁移后仍有全表扫描:\n" + "\n".join(problems)
+    assert "ix_cognitive_nodes_cognitive_map_id" in index_names
+    assert card_count == 1
+
+
+def main():
+    print("🔍 测试查询计划")
+    print("=" * 50)
+
+    failed = False
+    for test in (test_fresh_database_has_no_full_scans, test_migrations_upgrade_legacy_database):
+        try:
+            test()
+            print(f"✅ {test.__doc__}")
+        except AssertionError as exc:
+            failed = True
+            print(f"❌ {test.__doc__}\n{exc}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+本地学习资源搜索测试
+验证BM25排序、按类型分面、任务上下文重排，以及资源目录导入和检索接口（不访问网络）
+可直接运行，也可以用 pytest 执行
+"""
+
+import asyncio
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+LIBRARY_DIR = tempfile.mkdtemp(prefix="metalearn_library_")
+os.environ["ASYNC_DATABASE_URL"] = f"sqlite+aiosqlite:///{tempfile.mkdtemp(prefix='metalearn_resources_')}/test.db"
+os.environ["RESOURCE_LIBRARY_DIR"] = LIBRARY_DIR
+os.environ["LLM_PROVIDER"] = "stub"
+os.environ["DECOMPOSITION_CACHE_PATH"] = ""
+
+import httpx  # noqa: E402
+
+from services.resource_index import ResourceSearchIndex, tokenize  # noqa: E402
+
+
+def _build_index(context_weight: float = 0.3) -> ResourceSearchIndex:
+    index = ResourceSearchIndex(context_weight=context_weight)
+    index.loaded = True
+    index.upsert_many([
+        ("r1", "Pandas 数据分析入门", None, "用 pandas 读取表格并做分组统计", "article", ["pandas"]),
+        ("r2", "机器学习实战", None, "pandas 预处理之后训练 sklearn 模型，介绍神经网络", "video", ["机器学习"]),
+        ("r3", "Pandas 可视化", None, "pandas 结合 matplotlib 画图", "video", ["可视化"]),
+        ("r4", "React 入门", None, "组件和状态", "article", ["react"]),
+    ])
+    return index
+
+
+def test_tokenize_and_ranking():
+    """标题命中排在正文命中之前，分面统计在类型过滤之前计算"""
+    assert tokenize("学习 Pandas 数据分析") == ["pandas", "数据", "据分", "分析"]
+
+    index = _build_index()
+    hits, facets, total = index.search("pandas")
+    assert total == 3 and facets == {"article": 1, "video": 2}
+    assert hits[-1].resource_id == "r2", "只在正文出现的资源应排在最后"
+
+    hits, facets, total = index.search("pandas", resource_types=["video"])
+    assert {hit.resource_id for hit in hits} == {"r2", "r3"} and total == 2
+    assert facets == {"article": 1, "video": 2}
+
+    index.remove("r3")
+    index.upsert_many([("r1", "React 组件设计", None, "", "article", [])])
+    assert [hit.resource_id for hit in index.search("pandas")[0]] == ["r2"]
+    assert index.search("react")[2] == 2
+
+
+def test_context_reranking():
+    """相同查询在不同学习任务下按上下文重排"""
+    index = _build_index(context_weight=0.6)
+    baseline = [hit.resource_id for hit in index.search("pandas")[0]]
+    reranked = [hit.resource_id for hit in index.search("pandas", task_context="机器学习神经网络")[0]]
+    assert baseline[0] != "r2" and reranked[0] == "r2"
+
+    plain = _build_index(context_weight=0)
+    assert [hit.resource_id for hit in plain.search("pandas", task_context="机器学习神经网络")[0]] == baseline
+
+
+def _write_library():
+    root = Path(LIBRARY_DIR)
+    (root / "notes").mkdir(exist_ok=True)
+    (root / "notes" / "pandas.md").write_text("# Pandas 分组统计\n\n用 groupby 做数据分析。", encoding="utf-8")
+    (root / "notes" / "nn.html").write_text(
+        "<html><head><title>神经网络基础</title><script>var x;</script></head>"
+        "<body><p>反向传播与梯度下降</p></body></html>", encoding="utf-8"
+    )
+    (root / "notes" / "lab.ipynb").write_text(json.dumps({"cells": [
+        {"cell_type": "markdown", "source": ["# Pandas 实验\n", "数据清洗"]},
+    ]}), encoding="utf-8")
+    (root / "pandas 讲解.mp4").write_bytes(b"\x00\x01")
+    (root / "data.bin").write_bytes(b"\x00")
+    (root / "react.url").write_text("[InternetShortcut]\nURL=https://react.dev/learn\n", encoding="utf-8")
+    (root / "links.links").write_text(
+        "# 收藏\nhttps://www.youtube.com/watch?v=pandas\tPandas 视频教程\nnot-a-url\n", encoding="utf-8"
+    )
+
+
+def test_ingest_and_search_routes():
+    """导入资源目录后通过接口检索，重复导入只更新不新增"""
+    from main import app
+    from database.database import init_db, close_db
+
+    _write_library()
+
+    async def run():
+        await init_db()
+        try:
+            async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+                first = await client.post("/api/resources/ingest", json={})
+                second = await client.post("/api/resources/ingest", json={"path": "notes"})
+                escaped = await client.post("/api/resources/ingest", json={"path": "../"})
+                session = await client.post(
+                    "/api/learning-flow/sessions", json={"problem_statement": "用Pandas做数据清洗"}
+                )
+                search = await client.post("/api/resources/search", json={
+                    "query": "pandas", "session_id": session.json()["id"]
+                })
+                videos = await client.post("/api/resources/search", json={
+                    "query": "pandas", "resource_types": ["video"]
+                })
+                external = await client.post("/api/external/resource-search", json={"query": "神经网络"})
+                fallback = await client.post("/api/external/resource-search", json={"query": "Rust 所有权"})
+                facets = await client.get("/api/resources/facets")
+            return first, second, escaped, search, videos, external, fallback, facets
+        finally:
+            await close_db()
+
+    first, second, escaped, search, videos, external, fallback, facets = asyncio.run(run())
+
+    report = first.json()
+    assert first.status_code == 200
+    assert report["created"] == 6 and report["updated"] == 0 and report["skipped"] == 1, report
+    assert second.json()["created"] == 0 and second.json()["updated"] == 3
+    assert escaped.status_code == 400
+
+    results = search.json()
+    assert results["source"] == "local" and results["total"] == 4
+    assert results["facets"] == {"article": 1, "notebook": 1, "video": 2}
+    assert results["resources"][0]["title"] == "Pandas 实验", "会话的问题描述应把数据清洗相关资源排到前面"
+    assert {r["resource_type"] for r in videos.json()["resources"]} == {"video"}
+
+    assert external.json()["source"] == "local"
+    assert external.json()["resources"][0]["title"] == "神经网络基础"
+    assert fallback.json()["source"] == "llm" and fallback.json()["resources"]
+    assert facets.json()["total"] == 6
+
+
+def main():
+    print("📚 测试本地学习资源搜索")
+    print("=" * 50)
+
+    failed = False
+    for test in (
+        test_tokenize_and_ranking,
+        test_context_reranking,
+        test_ingest_and_search_routes,
+    ):
+        try:
+            test()
+            print(f"✅ {test.__doc__}")
+        except AssertionError as exc:
+            failed = True
+            print(f"❌ {test.__doc__}\n{exc}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
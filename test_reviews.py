@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+间隔重复调度测试
+验证 SM-2 状态推进、向量化与逐行计算结果一致、JOL/FOK 评估为子任务安排复习、
+卡片复习结果写入到期队列并按到期时间分页（租户隔离），调整间隔系数后的批量重算，
+以及并发的首次复习不因唯一索引冲突而失败
+可直接运行，也可以用 pytest 执行
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+os.environ["ASYNC_DATABASE_URL"] = f"sqlite+aiosqlite:///{tempfile.mkdtemp(prefix='metalearn_reviews_')}/test.db"
+os.environ["LLM_PROVIDER"] = "stub"
+os.environ["DECOMPOSITION_CACHE_PATH"] = ""
+
+CAROL = {"X-User-Id": "carol"}
+DAVE = {"X-User-Id": "dave"}
+
+
+def _run_strict(run):
+    """路由超出声明的查询预算时直接失败"""
+    from database.query_counter import strict_query_budgets
+
+    with strict_query_budgets():
+        return asyncio.run(run())
+
+
+def _client(app):
+    import httpx
+
+    transport = httpx.ASGITransport(app=app)
+    return httpx.AsyncClient(transport=transport, base_url="http://test")
+
+
+def test_sm2_progression():
+    """连续答对时间隔为 1、6、6×易度天，答错重置间隔并记一次遗忘，易度不低于 1.3"""
+    from services.review_scheduler import INITIAL_EASE, sm2_step
+
+    state = (0, 0, INITIAL_EASE, 0.0)
+    intervals = []
+    for quality in (5, 5, 4):
+        state = sm2_step(state, quality)
+        intervals.append(state[3])
+    assert intervals[:2] == [1.0, 6.0]
+    assert abs(intervals[2] - 6.0 * 2.7) < 1e-9, intervals
+    assert state[0] == 3
+
+    failed = sm2_step(state, 1)
+    assert failed[:2] == (0, 1) and failed[3] == 1.0
+    assert failed[2] < state[2]
+
+    floor = (0, 0, 1.3, 0.0)
+    for _ in range(3):
+        floor = sm2_step(floor, 0)
+    assert floor[2] == 1.3 and floor[1] == 3
+
+
+def test_vectorized_matches_scalar():
+    """批量推进状态和计算到期时间时，numpy 路径与逐行路径结果一致"""
+    import random
+    from services import review_scheduler as module
+
+    if module.np is None:
+        print("   numpy 未安装，只验证逐行路径")
+
+    rng = random.Random(7)
+    states = [
+        (rng.randint(0, 6), rng.randint(0, 3), rng.uniform(1.3, 3.0), rng.uniform(0, 200))
+        for _ in range(500)
+    ]
+    qualities = [rng.choice((1, 3, 4, 5)) for _ in states]
+    scheduler = module.ReviewScheduler(interval_modifier=0.8, max_interval_days=90)
+    reviewed_at = [datetime(2024, 1, 1) + timedelta(minutes=rng.randint(0, 10 ** 6)) for _ in states]
+    intervals = [state[3] for state in states]
+
+    batched = module.next_states(states, qualities)
+    due = scheduler.due_dates(reviewed_at, intervals)
+
+    assert batched == [module.sm2_step(state, quality) for state, quality in zip(states, qualities)]
+    assert due == [scheduler.due_at(at, interval) for at, interval in zip(reviewed_at, intervals)]
+    assert max(d - at for d, at in zip(due, reviewed_at)) <= timedelta(days=90)
+
+
+def test_assessments_schedule_subtasks():
+    """会话的 JOL/FOK 评估为其全部子任务安排复习，重新生成子任务时清理旧的复习项"""
+    from main import app
+    from database.database import init_db, close_db
+
+    async def run():
+        await init_db()
+        try:
+            async with _client(app) as client:
+                session = (await client.post(
+                    "/api/learning-flow/sessions", headers=CAROL, json={"problem_statement": "学习间隔重复"}
+                )).json()
+                tasks = (await client.post(f"/api/learning-flow/sessions/{session['id']}/sub-tasks", headers=CAROL, json=[
+                    {"name": "回忆定义", "order": 1}, {"name": "推导公式", "order": 2}
+                ])).json()
+                await client.post(f"/api/learning-flow/sessions/{session['id']}/jol-assessment", headers=CAROL, json={
+                    "session_id": session["id"], "assessment": "完全记得住"
+                })
+                first = (await client.get(f"/api/reviews/subtask/{tasks[0]['id']}", headers=CAROL)).json()
+                await client.post(f"/api/learning-flow/sessions/{session['id']}/fok-assessment", headers=CAROL, json={
+                    "session_id": session["id"], "assessment": "啃不下来"
+                })
+                second = (await client.get(f"/api/reviews/subtask/{tasks[1]['id']}", headers=CAROL)).json()
+                await client.post(f"/api/learning-flow/sessions/{session['id']}/sub-tasks", headers=CAROL, json=[
+                    {"name": "新子任务", "order": 1}
+                ])
+                stale = await client.get(f"/api/reviews/subtask/{tasks[0]['id']}", headers=CAROL)
+                return first, second, stale.status_code
+        finally:
+            await close_db()
+
+    first, second, stale_status = _run_strict(run)
+    assert first["repetitions"] == 1 and first["interval_days"] == 1.0 and first["last_quality"] == 5
+    assert second["repetitions"] == 0 and second["lapses"] == 1 and second["last_quality"] == 1
+    assert stale_status == 404
+
+
+def test_due_queue_pages_in_due_order():
+    """复习卡片后进入到期队列，按到期时间升序分页，其他租户看不到也不能复习"""
+    from main import app
+    from database.database import AsyncSessionLocal, init_db, close_db
+    from services.review_scheduler import ReviewOutcome, review_scheduler
+
+    async def run():
+        await init_db()
+        try:
+            async with _client(app) as client:
+                cards = []
+                for i in range(5):
+                    cards.append((await client.post("/api/knowledge-cards/", headers=DAVE, json={
+                        "title": f"复习卡片 {i}", "content": "间隔重复", "keywords": ["复习"]
+                    })).json())
+                recorded = await client.post("/api/reviews/", headers=DAVE, json={
+                    "item_type": "card", "item_id": cards[0]["id"], "jol": "完全记得住", "fok": "能了解一点点"
+                })
+                missing_outcome = await client.post("/api/reviews/", headers=DAVE, json={
+                    "item_type": "card", "item_id": cards[0]["id"]
+                })
+                foreign = await client.post("/api/reviews/", headers=CAROL, json={
+                    "item_type": "card", "item_id": cards[0]["id"], "jol": "完全记得住"
+                })
+
+                # 把复习时间放到过去，让它们按不同时间到期
+                async with AsyncSessionLocal() as db:
+                    for i, card in enumerate(cards[1:], start=1):
+                        await review_scheduler.record("dave", [ReviewOutcome("card", card["id"], 1)], db,
+                                                      now=datetime.utcnow() - timedelta(days=10 - i))
+                    await db.commit()
+
+                first_page = (await client.get("/api/reviews/due", params={"limit": 3}, headers=DAVE)).json()
+                second_page = (await client.get("/api/reviews/due", params={
+                    "limit": 3, "cursor": first_page["next_cursor"]
+                }, headers=DAVE)).json()
+                carol_due = (await client.get("/api/reviews/due", headers=CAROL)).json()
+                bad_cursor = await client.get("/api/reviews/due", params={"cursor": "???"}, headers=DAVE)
+                await client.delete(f"/api/knowledge-cards/{cards[1]['id']}", headers=DAVE)
+                deleted = await client.get(f"/api/reviews/card/{cards[1]['id']}", headers=DAVE)
+                return (cards, recorded, missing_outcome.status_code, foreign.status_code,
+                        first_page, second_page, carol_due, bad_cursor.status_code, deleted.status_code)
+        finally:
+            await close_db()
+
+    (cards, recorded, missing_status, foreign_status, first_page, second_page,
+     carol_due, bad_cursor_status, deleted_status) = _run_strict(run)
+    # JOL 4 分、FOK 2 分时按较低的一项（质量 3）调度，今天复习过的卡片明天才到期
+    assert recorded.status_code == 200 and recorded.json()["last_quality"] == 3
+    assert missing_status == 400 and foreign_status == 404
+    due_ids = [item["item_id"] for item in first_page["items"] + second_page["items"]]
+    assert due_ids == [card["id"] for card in cards[1:]], due_ids
+    assert second_page["next_cursor"] is None
+    due_times = [item["due_at"] for item in first_page["items"] + second_page["items"]]
+    assert due_times == sorted(due_times)
+    assert not {item["item_id"] for item in carol_due["items"]} & set(due_ids)
+    assert bad_cursor_status == 400 and deleted_status == 404
+
+
+def test_recompute_applies_new_modifier():
+    """调整间隔系数后批量重算，到期时间按新系数从上次复习时间算起"""
+    from database.database import AsyncSessionLocal, init_db, close_db
+    from database.models import ReviewItemDB
+    from services.review_scheduler import RECOMPUTE_CHUNK_SIZE, ReviewOutcome, ReviewScheduler
+    from sqlalchemy import select
+
+    reviewed_at = datetime(2024, 3, 1, 12, 0)
+
+    async def run():
+        await init_db()
+        try:
+            scheduler = ReviewScheduler(interval_modifier=1.0, max_interval_days=365)
+            async with AsyncSessionLocal() as db:
+                outcomes = [ReviewOutcome("card", f"recompute-{i}", 5) for i in range(RECOMPUTE_CHUNK_SIZE + 10)]
+                await scheduler.record("erin", outcomes, db, now=reviewed_at)
+                await scheduler.record("erin", outcomes[:1], db, now=reviewed_at)
+                await db.commit()
+
+            scheduler.interval_modifier = 0.5
+            async with AsyncSessionLocal() as db:
+                updated = await scheduler.recompute_due_dates(db, "erin")
+                rows = (await db.execute(
+                    select(ReviewItemDB.item_id, ReviewItemDB.interval_days, ReviewItemDB.due_at)
+                    .where(ReviewItemDB.tenant_id == "erin")
+                )).all()
+                return updated, rows
+        finally:
+            await close_db()
+
+    updated, rows = asyncio.run(run())
+    assert updated == RECOMPUTE_CHUNK_SIZE + 10
+    by_id = {item_id: (interval, due_at) for item_id, interval, due_at in rows}
+    assert by_id["recompute-0"] == (6.0, reviewed_at + timedelta(days=3))
+    assert by_id["recompute-1"] == (1.0, reviewed_at + timedelta(hours=12))
+
+
+def test_concurrent_first_reviews():
+    """两个请求同时首次复习同一复习项时，后写入的一方改为在对方插入的行上更新"""
+    from database.database import AsyncSessionLocal, init_db, close_db
+    from database.models import ReviewItemDB
+    from services.review_scheduler import ReviewOutcome, ReviewScheduler
+    from sqlalchemy import select
+
+    reviewed_at = datetime(2024, 4, 1, 9, 0)
+    outcome = ReviewOutcome("card", "race-card", 5)
+
+    async def record_once(scheduler, item_id):
+        async with AsyncSessionLocal() as db:
+            items = await scheduler.record("frank", [ReviewOutcome("card", item_id, 5)], db, now=reviewed_at)
+            await db.commit()
+            return items
+
+    async def run():
+        await init_db()
+        try:
+            scheduler = ReviewScheduler()
+            # 两个会话都在对方插入前读到“没有复习项”
+            async with AsyncSessionLocal() as first, AsyncSessionLocal() as second:
+                stale = await scheduler._load_existing("frank", [("card", "race-card")], first)
+                assert stale == await scheduler._load_existing("frank", [("card", "race-card")], second) == {}
+                await scheduler._write("frank", [outcome], stale, first, reviewed_at)
+                await first.commit()
+                raced = await scheduler._write("frank", [outcome], stale, second, reviewed_at)
+                await second.commit()
+
+            concurrent = await asyncio.gather(*[record_once(scheduler, "race-gather") for _ in range(2)])
+            async with AsyncSessionLocal() as db:
+                rows = (await db.execute(
+                    select(ReviewItemDB.item_id, ReviewItemDB.id, ReviewItemDB.repetitions)
+                    .where(ReviewItemDB.tenant_id == "frank")
+                )).all()
+            return raced, concurrent, rows
+        finally:
+            await close_db()
+
+    raced, concurrent, rows = asyncio.run(run())
+    by_item = {item_id: (row_id, repetitions) for item_id, row_id, repetitions in rows}
+    assert len(rows) == 2
+    assert by_item["race-card"] == (raced[0].id, 2) and raced[0].interval_days == 6.0
+    assert {items[0].id for items in concurrent} == {by_item["race-gather"][0]}
+
+
+def main():
+    print("🔁 测试间隔重复调度")
+    print("=" * 50)
+
+    failed = False
+    for test in (
+        test_sm2_progression,
+        test_vectorized_matches_scalar,
+        test_assessments_schedule_subtasks,
+        test_due_queue_pages_in_due_order,
+        test_recompute_applies_new_modifier,
+        test_concurrent_first_reviews,
+    ):
+        try:
+            test()
+            print(f"✅ {test.__doc__}")
+        except AssertionError as exc:
+            failed = True
+            print(f"❌ {test.__doc__}\n{exc}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
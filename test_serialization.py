@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+响应映射测试
+验证 models.responses 中按字段映射的响应体与 Pydantic 响应模型（from_attributes 校验）的输出一致，
+以及卡片、地图和会话接口用 orjson 输出、写入时间只在事务提交成功后告知客户端
+可直接运行，也可以用 pytest 执行
+"""
+
+import asyncio
+import json
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+os.environ["ASYNC_DATABASE_URL"] = f"sqlite+aiosqlite:///{tempfile.mkdtemp(prefix='metalearn_serial_')}/test.db"
+os.environ["LLM_PROVIDER"] = "stub"
+os.environ["DECOMPOSITION_CACHE_PATH"] = ""
+
+from database.models import (  # noqa: E402
+    CognitiveEdgeDB, CognitiveMapDB, CognitiveNodeDB, KnowledgeCardDB, LearningSessionDB, SubTaskDB
+)
+from models import responses  # noqa: E402
+from models.schemas import (  # noqa: E402
+    CognitiveMap, CognitiveNode, CognitiveEdge, KnowledgeCard, LearningSession, MasteryLevel, SubTask
+)
+
+
+def _json(payload) -> dict:
+    return json.loads(responses.render(payload).body)
+
+
+def vars_of(row) -> dict:
+    """ORM 行中已加载的列值（关系字段由调用方提供）"""
+    return {column.key: getattr(row, column.key) for column in row.__table__.columns}
+
+
+def test_payloads_match_response_models():
+    """映射出的响应体与按 from_attributes 校验后的模型序列化结果一致"""
+    now = datetime(2024, 5, 1, 12, 30, 15, 123456)
+    card = KnowledgeCardDB(id="c1", title="梯度", content="链式法则", keywords=["优化"], created_at=now, updated_at=now)
+    node = CognitiveNodeDB(id="n1", name="梯度", description=None, x=1.5, y=2.0, created_at=now)
+    edge = CognitiveEdgeDB(
+        id="e1", source_id="n1", target_id="n1", relationship_type="相关", custom_name="依赖", created_at=now
+    )
+    db_map = CognitiveMapDB(id="m1", session_id="s1", created_at=now, updated_at=now)
+    task = SubTaskDB(id="t1", name="推导", description="", order=1,
+                     mastery_expectation=MasteryLevel.SEMANTIC_DERIVATION.value)
+    db_session = LearningSessionDB(
+        id="s1", problem_statement="学习反向传播", current_step="learning_in_progress",
+        session_data={"allocated_minutes": 20}, created_at=now, updated_at=now
+    )
+
+    cases = [
+        (responses.card_payload(card), KnowledgeCard.model_validate(card)),
+        (responses.node_payload(node), CognitiveNode.model_validate(node)),
+        (responses.edge_payload(edge), CognitiveEdge.model_validate(edge)),
+        (responses.subtask_payload(task), SubTask.model_validate(task)),
+        (
+            responses.map_payload(db_map, [node], [edge]),
+            CognitiveMap.model_validate({**vars_of(db_map), "nodes": [node], "edges": [edge]}, from_attributes=True)
+        ),
+        (
+            responses.session_payload(db_session, [task]),
+            LearningSession.model_validate({**vars_of(db_session), "sub_tasks": [task]}, from_attributes=True)
+        ),
+    ]
+    for payload, model in cases:
+        assert set(payload) == set(type(model).model_fields), type(model).__name__
+        assert _json(payload) == json.loads(model.model_dump_json()), type(model).__name__
+
+
+def test_routes_render_with_orjson():
+    """卡片、地图和会话接口直接输出映射后的响应体，空值按响应模型补齐，写接口保留写入时间"""
+    import httpx
+
+    from main import app
+    from database.database import init_db, close_db
+    from routers.dependencies import LAST_WRITE_HEADER
+
+    async def run():
+        await init_db()
+        try:
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                created = await client.post("/api/knowledge-cards/", json={
+                    "title": "注意力机制", "content": "缩放点积注意力", "keywords": ["transformer"]
+                })
+                card = created.json()
+                listed = await client.get("/api/knowledge-cards/")
+                page = (await client.get("/api/knowledge-cards/page/?limit=5")).json()
+
+                session = (await client.post("/api/learning-flow/sessions", json={"problem_statement": "学习注意力"})).json()
+                created_map = (await client.post("/api/cognitive-map/", json={
+                    "session_id": session["id"],
+                    "nodes": [{"name": "Q", "x": 0, "y": 0}, {"name": "K", "x": 10, "y": 0}],
+                    "edges": [],
+                })).json()
+                fetched_map = (await client.get(f"/api/cognitive-map/{created_map['id']}")).json()
+                fetched_session = (await client.get(f"/api/learning-flow/sessions/{session['id']}")).json()
+                return created, card, listed, page, created_map, fetched_map, fetched_session
+        finally:
+            await close_db()
+
+    created, card, listed, page, created_map, fetched_map, fetched_session = asyncio.run(run())
+    # 写接口直接返回 Response 时仍带上读己之写所需的写入时间
+    assert LAST_WRITE_HEADER in created.headers and "set-cookie" in created.headers
+    assert listed.headers["content-type"] == "application/json"
+    assert listed.json()[0] == card
+    assert page["items"][0] == card and page["next_cursor"] is None
+    KnowledgeCard.model_validate(card)
+    assert fetched_map == created_map
+    assert [node["name"] for node in fetched_map["nodes"]] == ["Q", "K"]
+    CognitiveMap.model_validate(fetched_map)
+    assert fetched_session["cognitive_map_id"] == created_map["id"]
+    assert fetched_session["sub_tasks"] == [] and fetched_session["session_data"] == {}
+    LearningSession.model_validate(fetched_session)
+
+
+def test_last_write_set_only_after_commit():
+    """写入时间的 Cookie 和响应头只在事务提交后设置，回滚或没有提交时不设置，多次提交只保留一个 Cookie"""
+    import httpx
+    from fastapi import Response
+
+    from main import app
+    from database.database import init_db, close_db
+    from routers.dependencies import LAST_WRITE_COOKIE, LAST_WRITE_HEADER, get_write_db
+
+    async def use_session(action) -> Response:
+        response = Response()
+        sessions = get_write_db(response)
+        db = await sessions.__anext__()
+        await action(db)
+        await sessions.aclose()
+        return response
+
+    async def commit_twice(db):
+        await db.commit()
+        await db.commit()
+
+    async def run():
+        await init_db()
+        try:
+            rolled_back = await use_session(lambda db: db.rollback())
+            committed = await use_session(commit_twice)
+
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                rejected = await client.post("/api/knowledge-cards/import", content=b'{"title": "x"}')
+                accepted = await client.post(
+                    "/api/knowledge-cards/import", content='{"title": "写入", "content": "时间"}'.encode("utf-8")
+                )
+            return rolled_back, committed, rejected, accepted
+        finally:
+            await close_db()
+
+    rolled_back, committed, rejected, accepted = asyncio.run(run())
+    assert LAST_WRITE_HEADER not in rolled_back.headers and "set-cookie" not in rolled_back.headers
+    cookies = [value for name, value in committed.headers.items() if name == "set-cookie"]
+    assert len(cookies) == 1 and cookies[0].startswith(f"{LAST_WRITE_COOKIE}={committed.headers[LAST_WRITE_HEADER]};")
+    assert rejected.status_code == 200 and rejected.json()["imported"] == 0
+    assert LAST_WRITE_HEADER not in rejected.headers and "set-cookie" not in rejected.headers
+    assert LAST_WRITE_HEADER in accepted.headers and LAST_WRITE_COOKIE in accepted.headers["set-cookie"]
+
+
+def main():
+    print("📦 测试响应映射")
+    print("=" * 50)
+
+    failed = False
+    for test in (
+        test_payloads_match_response_models,
+        test_routes_render_with_orjson,
+        test_last_write_set_only_after_commit,
+    ):
+        try:
+            test()
+            print(f"✅ {test.__doc__}")
+        except AssertionError as exc:
+            failed = True
+            print(f"❌ {test.__doc__}\n{exc}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+学习倒计时调度测试
+验证大量调度、重设和取消后堆的大小受压缩约束，重启恢复只重新调度仍在学习中的会话，
+以及调度循环按截止时间推进会话、已取消的计时器不触发
+可直接运行，也可以用 pytest 执行
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+os.environ["ASYNC_DATABASE_URL"] = f"sqlite+aiosqlite:///{tempfile.mkdtemp(prefix='metalearn_timer_')}/test.db"
+os.environ["LLM_PROVIDER"] = "stub"
+os.environ["DECOMPOSITION_CACHE_PATH"] = ""
+
+
+def test_compaction_bounds_heap():
+    """取消和重设留下的过期堆条目超过阈值时重建堆，堆大小始终受有效计时器数量约束"""
+    from services.session_timer import SessionTimerScheduler
+
+    timer = SessionTimerScheduler()
+    base = datetime.utcnow() + timedelta(hours=1)
+    largest = 0
+
+    for round_number in range(3):
+        for i in range(5000):
+            timer.schedule(f"timer-{i}", base + timedelta(seconds=i + round_number))
+            largest = max(largest, len(timer._heap) - 2 * timer.pending)
+    for i in range(4000):
+        timer.cancel(f"timer-{i}")
+        largest = max(largest, len(timer._heap) - 2 * timer.pending)
+
+    assert timer.pending == 1000
+    assert largest <= 1024 + 1, largest
+    assert len(timer._heap) <= 2 * timer.pending + 1024
+    assert timer.get_deadline("timer-4999") == base + timedelta(seconds=4999 + 2), "重设以最后一次为准"
+    assert timer.get_deadline("timer-0") is None
+
+
+def test_recover_reschedules_learning_sessions():
+    """重启恢复按记录的截止时间（或旧会话的分配时长）重新调度学习中的会话，内存中已有的计时器不被覆盖"""
+    from database.database import AsyncSessionLocal, init_db, close_db
+    from database.models import LearningSessionDB
+    from services.session_timer import LEARNING_STEP, SessionTimerScheduler
+
+    deadline = datetime.utcnow().replace(microsecond=0) + timedelta(minutes=30)
+    updated_at = datetime.utcnow().replace(microsecond=0)
+    sessions = {
+        "recover-deadline": (LEARNING_STEP, {"timer_deadline": deadline.isoformat()}),
+        "recover-legacy": (LEARNING_STEP, {"allocated_minutes": 15}),
+        "recover-unknown": (LEARNING_STEP, {}),
+        "recover-finished": ("obstacle_assessment", {"timer_deadline": deadline.isoformat()}),
+        "recover-in-memory": (LEARNING_STEP, {"timer_deadline": deadline.isoformat()}),
+    }
+
+    async def run():
+        await init_db()
+        try:
+            async with AsyncSessionLocal() as db:
+                db.add_all([
+                    LearningSessionDB(
+                        id=session_id, problem_statement="恢复计时器", current_step=step,
+                        session_data=session_data, updated_at=updated_at
+                    )
+                    for session_id, (step, session_data) in sessions.items()
+                ])
+                await db.commit()
+
+            timer = SessionTimerScheduler()
+            in_memory = deadline + timedelta(minutes=5)
+            timer.schedule("recover-in-memory", in_memory)
+            recovered = await timer.recover()
+            again = await timer.recover()
+            return timer, recovered, again, in_memory
+        finally:
+            await close_db()
+
+    timer, recovered, again, in_memory = asyncio.run(run())
+    assert recovered >= 2 and again == 0, (recovered, again)
+    assert timer.get_deadline("recover-deadline") == deadline
+    assert timer.get_deadline("recover-legacy") == updated_at + timedelta(minutes=15)
+    assert timer.get_deadline("recover-unknown") is None
+    assert timer.get_deadline("recover-finished") is None
+    assert timer.get_deadline("recover-in-memory") == in_memory
+
+
+def test_due_timers_expire_sessions():
+    """调度循环在截止时间推进会话并推送通知，已取消的计时器不触发"""
+    from database.database import AsyncSessionLocal, init_db, close_db
+    from database.models import LearningSessionDB
+    from services.notifications import notification_hub
+    from services.session_timer import EXPIRED_STEP, LEARNING_STEP, SessionTimerScheduler
+
+    async def run():
+        await init_db()
+        try:
+            async with AsyncSessionLocal() as db:
+                db.add_all([
+                    LearningSessionDB(id=session_id, problem_statement="到期", current_step=LEARNING_STEP, session_data={})
+                    for session_id in ("expire-due", "expire-cancelled")
+                ])
+                await db.commit()
+
+            timer = SessionTimerScheduler()
+            await timer.start()
+            queue = notification_hub.subscribe("expire-due")
+            try:
+                soon = datetime.utcnow() + timedelta(milliseconds=100)
+                timer.schedule("expire-cancelled", soon)
+                timer.schedule("expire-due", soon)
+                timer.cancel("expire-cancelled")
+                event = await asyncio.wait_for(queue.get(), 5)
+            finally:
+                notification_hub.unsubscribe("expire-due", queue)
+                await timer.stop()
+
+            async with AsyncSessionLocal() as db:
+                steps = {
+                    session_id: (await db.get(LearningSessionDB, session_id)).current_step
+                    for session_id in ("expire-due", "expire-cancelled")
+                }
+            return event, steps, [timer.get_deadline(session_id) for session_id in steps]
+        finally:
+            await close_db()
+
+    event, steps, deadlines = asyncio.run(run())
+    assert event["type"] == "timer_expired" and event["next_step"] == EXPIRED_STEP
+    assert steps == {"expire-due": EXPIRED_STEP, "expire-cancelled": LEARNING_STEP}
+    assert deadlines == [None, None]
+
+
+def main():
+    print("⏲️ 测试学习倒计时调度")
+    print("=" * 50)
+
+    failed = False
+    for test in (
+        test_compaction_bounds_heap,
+        test_recover_reschedules_learning_sessions,
+        test_due_timers_expire_sessions,
+    ):
+        try:
+            test()
+            print(f"✅ {test.__doc__}")
+        except AssertionError as exc:
+            failed = True
+            print(f"❌ {test.__doc__}\n{exc}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
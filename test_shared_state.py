@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+多进程共享状态测试
+用两个共享状态总线模拟连在同一个数据库上的两个工作进程，验证缓存、索引和通知的跨进程同步，
+以及多个进程同时到期的学习倒计时只触发一次
+可直接运行，也可以用 pytest 执行
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+os.environ["ASYNC_DATABASE_URL"] = f"sqlite+aiosqlite:///{tempfile.mkdtemp(prefix='metalearn_shared_')}/test.db"
+os.environ["LLM_PROVIDER"] = "stub"
+os.environ["DECOMPOSITION_CACHE_PATH"] = ""
+
+from models.schemas import CognitiveNodeCreate, TaskDecompositionResponse  # noqa: E402
+
+
+def _workers(count: int = 2):
+    from services.shared_state import SharedStateBus
+
+    return [SharedStateBus(backend="database", poll_interval=0.01) for _ in range(count)]
+
+
+async def _sync(*buses):
+    for bus in buses:
+        await bus.flush()
+    for bus in buses:
+        await bus.poll()
+
+
+def test_bus_delivers_to_other_workers_only():
+    """事件只分发给其他进程，启动前的历史事件不回放"""
+    from database.database import init_db, close_db
+
+    async def run():
+        await init_db()
+        try:
+            old, = _workers(1)
+            await old.start()
+            old.publish("demo", {"n": 0})
+            await old.stop()
+
+            first, second = _workers()
+            received = {"first": [], "second": []}
+            first.subscribe("demo", lambda payload: received["first"].append(payload["n"]))
+            second.subscribe("demo", lambda payload: received["second"].append(payload["n"]))
+            await first.start()
+            await second.start()
+            try:
+                first.publish("demo", {"n": 1})
+                second.publish("demo", {"n": 2})
+                await _sync(first, second)
+            finally:
+                await first.stop()
+                await second.stop()
+            return received
+        finally:
+            await close_db()
+
+    received = asyncio.run(run())
+    assert received == {"first": [2], "second": [1]}, received
+
+
+def test_cache_writes_and_invalidations_replicate():
+    """任务拆解缓存的写入、失效和清空同步到其他进程，其他进程应用时不再广播"""
+    from database.database import init_db, close_db
+    from services.decomposition_cache import DecompositionCache
+    from services.worker_sync import _sync_cache
+
+    response = TaskDecompositionResponse(
+        nodes=[CognitiveNodeCreate(name="注意力机制", x=0, y=0)],
+        edges=[]
+    )
+
+    async def run():
+        await init_db()
+        try:
+            buses = _workers()
+            caches = [DecompositionCache(path=None) for _ in buses]
+            for bus, cache in zip(buses, caches):
+                _sync_cache(
+                    bus, "decomposition_cache", cache,
+                    dump=lambda value: value.model_dump(mode="json"),
+                    load=TaskDecompositionResponse.model_validate
+                )
+                await bus.start()
+            try:
+                caches[0].put("学习 Transformer", response)
+                await _sync(*buses)
+                replicated = caches[1].get("学习 Transformer")
+                foreign = caches[1].get("学习 Transformer", "mallory")
+
+                caches[1].invalidate("学习 Transformer")
+                await _sync(*buses)
+                after_invalidate = caches[0].get("学习 Transformer")
+
+                caches[0].put("学习 pandas", response)
+                await _sync(*buses)
+                caches[0].clear()
+                await _sync(*buses)
+                published = [bus.published for bus in buses]
+                return replicated, foreign, after_invalidate, len(caches[1]), published
+            finally:
+                for bus in buses:
+                    await bus.stop()
+        finally:
+            await close_db()
+
+    replicated, foreign, after_invalidate, remaining, published = asyncio.run(run())
+    assert replicated is not None and replicated.nodes[0].name == "注意力机制"
+    assert foreign is None, "同步的条目仍只属于写入它的租户"
+    assert after_invalidate is None
+    assert remaining == 0
+    assert published == [3, 1], published
+
+
+def test_card_index_refreshes_from_database():
+    """一个进程写入卡片后，其他进程的搜索索引从数据库读取最新内容"""
+    from database.database import AsyncSessionLocal, init_db, close_db
+    from database.models import KnowledgeCardDB
+    from services.card_index import CardSearchIndex
+    from services.worker_sync import _sync_index
+
+    async def run():
+        await init_db()
+        try:
+            buses = _workers()
+            indexes = [CardSearchIndex() for _ in buses]
+            async with AsyncSessionLocal() as db:
+                for index in indexes:
+                    await index.ensure_loaded(db)
+            for bus, index in zip(buses, indexes):
+                _sync_index(bus, "card_index", index)
+                await bus.start()
+            try:
+                async with AsyncSessionLocal() as db:
+                    card = KnowledgeCardDB(title="梯度下降", content="反向传播与学习率", keywords=["优化"])
+                    db.add(card)
+                    await db.commit()
+                indexes[0].upsert_many([(card.id, card.title, card.content, card.keywords)])
+                await _sync(*buses)
+                return card.id, indexes[1].candidates("梯度下降")
+            finally:
+                for bus in buses:
+                    await bus.stop()
+        finally:
+            await close_db()
+
+    card_id, candidates = asyncio.run(run())
+    assert candidates is not None and card_id in candidates, candidates
+
+
+def test_timer_expires_once_across_workers():
+    """两个进程持有同一个计时器时，到期只推进一次会话、只推送一次通知"""
+    from database.database import AsyncSessionLocal, init_db, close_db
+    from database.models import LearningSessionDB
+    from services.notifications import notification_hub
+    from services.session_timer import EXPIRED_STEP, LEARNING_STEP, SessionTimerScheduler, _to_timestamp
+
+    async def run():
+        await init_db()
+        try:
+            async with AsyncSessionLocal() as db:
+                session = LearningSessionDB(problem_statement="计时器", current_step=LEARNING_STEP, session_data={})
+                db.add(session)
+                await db.commit()
+
+            queue = notification_hub.subscribe(session.id)
+            deadline = _to_timestamp(datetime.utcnow() - timedelta(seconds=1))
+            timers = [SessionTimerScheduler(), SessionTimerScheduler()]
+            await asyncio.gather(*[timer._expire([(session.id, deadline)]) for timer in timers])
+            notification_hub.unsubscribe(session.id, queue)
+
+            async with AsyncSessionLocal() as db:
+                stored = await db.get(LearningSessionDB, session.id)
+            return queue.qsize(), stored.current_step, stored.session_data
+        finally:
+            await close_db()
+
+    notifications, step, session_data = asyncio.run(run())
+    assert notifications == 1, notifications
+    assert step == EXPIRED_STEP
+    assert "timer_expired_at" in session_data
+
+
+def test_serve_enables_shared_state_for_multiple_workers():
+    """多进程启动时自动启用数据库共享状态"""
+    import serve
+
+    previous = os.environ.pop("SHARED_STATE_BACKEND", None)
+    try:
+        assert serve.configure_shared_state(1) == "memory"
+        assert serve.configure_shared_state(4) == "database"
+        assert os.environ["SHARED_STATE_BACKEND"] == "database"
+    finally:
+        os.environ.pop("SHARED_STATE_BACKEND", None)
+        if previous is not None:
+            os.environ["SHARED_STATE_BACKEND"] = previous
+
+
+def main():
+    print("🔄 测试多进程共享状态")
+    print("=" * 50)
+
+    failed = False
+    for test in (
+        test_bus_delivers_to_other_workers_only,
+        test_cache_writes_and_invalidations_replicate,
+        test_card_index_refreshes_from_database,
+        test_timer_expires_once_across_workers,
+        test_serve_enables_shared_state_for_multiple_workers,
+    ):
+        try:
+            test()
+            print(f"✅ {test.__doc__}")
+        except AssertionError as exc:
+            failed = True
+            print(f"❌ {test.__doc__}\n{exc}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
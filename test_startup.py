@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+快速启动测试
+验证表和迁移已是最新时跳过 create_all、后台预热能正常完成，以及启动时不加载按需导入的模块
+可直接运行，也可以用 pytest 执行
+"""
+
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend")
+sys.path.insert(0, BACKEND_DIR)
+
+os.environ["ASYNC_DATABASE_URL"] = f"sqlite+aiosqlite:///{tempfile.mkdtemp(prefix='metalearn_startup_')}/test.db"
+os.environ["LLM_PROVIDER"] = "stub"
+os.environ["DECOMPOSITION_CACHE_PATH"] = ""
+
+
+_SKIP_CREATE_ALL_SCRIPT = """
+import asyncio
+from sqlalchemy import text
+from database.database import async_engine, init_db, close_db
+
+async def run():
+    try:
+        created = await init_db(skip_if_current=True)
+        skipped = await init_db(skip_if_current=True)
+        async with async_engine.begin() as conn:
+            await conn.execute(text("DELETE FROM schema_migrations WHERE version = 3"))
+        repaired = await init_db(skip_if_current=True)
+        forced = await init_db()
+        return created, skipped, repaired, forced
+    finally:
+        await close_db()
+
+print(",".join(str(bool(flag)) for flag in asyncio.run(run())))
+"""
+
+
+def test_skip_create_all_when_schema_is_current():
+    """表和迁移都已是最新时跳过建表，缺少迁移记录时照常执行"""
+    # 在子进程中使用全新的数据库：同一次 pytest 中其他测试模块已把引擎绑定到自己的数据库并建好表
+    database_url = f"sqlite+aiosqlite:///{tempfile.mkdtemp(prefix='metalearn_startup_')}/fresh.db"
+    result = subprocess.run(
+        [sys.executable, "-c", _SKIP_CREATE_ALL_SCRIPT], cwd=BACKEND_DIR,
+        env={**os.environ, "ASYNC_DATABASE_URL": database_url},
+        capture_output=True, text=True, timeout=60
+    )
+    assert result.returncode == 0, result.stderr[-2000:]
+    created, skipped, repaired, forced = (flag == "True" for flag in result.stdout.strip().splitlines()[-1].split(","))
+    assert created and not skipped
+    assert repaired, "缺少迁移记录时应执行迁移"
+    assert forced
+
+
+def test_prewarm():
+    """后台预热的各项都能完成，预热后 OpenAPI 文档已生成"""
+    from main import app
+    from database.database import init_db, close_db
+    from services.warmup import start_prewarm
+
+    async def run():
+        await init_db()
+        try:
+            app.openapi_schema = None
+            await start_prewarm(app, delay_ms=0)
+            return app.state.warmup_timings, app.openapi_schema
+        finally:
+            await close_db()
+
+    timings, schema = asyncio.run(run())
+    assert set(timings) >= {"queries", "keywords", "imports", "models"}, timings
+    assert schema is not None
+
+
+def test_heavy_modules_are_not_imported_at_startup():
+    """导入应用时不加载 httpx、PostgreSQL 方言和 uvicorn"""
+    code = (
+        "import sys, main; "
+        "print(','.join(m for m in ('httpx', 'sqlalchemy.dialects.postgresql', 'uvicorn') if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=BACKEND_DIR, env=dict(os.environ),
+        capture_output=True, text=True, timeout=60
+    )
+    assert result.returncode == 0, result.stderr[-2000:]
+    assert result.stdout.strip() == "", f"loaded at import time: {result.stdout.strip()}"
+
+
+def main():
+    print("🚀 测试快速启动")
+    print("=" * 50)
+
+    failed = False
+    for test in (
+        test_skip_create_all_when_schema_is_current,
+        test_prewarm,
+        test_heavy_modules_are_not_imported_at_startup,
+    ):
+        try:
+            test()
+            print(f"✅ {test.__doc__}")
+        except AssertionError as exc:
+            failed = True
+            print(f"❌ {test.__doc__}\n{exc}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+多租户隔离测试
+验证会话、认知地图和知识卡片按租户隔离（列表、详情、修改、搜索、导出），
+卡片搜索索引按租户分片懒加载、超出预算时淘汰最久未用的分片，以及旧数据归入默认租户
+可直接运行，也可以用 pytest 执行
+"""
+
+import asyncio
+import json
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+os.environ["ASYNC_DATABASE_URL"] = f"sqlite+aiosqlite:///{tempfile.mkdtemp(prefix='metalearn_tenancy_')}/test.db"
+os.environ["LLM_PROVIDER"] = "stub"
+os.environ["DECOMPOSITION_CACHE_PATH"] = ""
+
+from sqlalchemy import text  # noqa: E402
+
+ALICE = {"X-User-Id": "alice"}
+BOB = {"X-User-Id": "bob"}
+
+
+def _client(app):
+    import httpx
+
+    transport = httpx.ASGITransport(app=app)
+    return httpx.AsyncClient(transport=transport, base_url="http://test")
+
+
+def test_routes_are_scoped_to_tenant():
+    """其他租户的会话、地图和卡片不可见、不可修改，搜索和导出只包含自己的卡片"""
+    from main import app
+    from database.database import init_db, close_db
+
+    async def run():
+        await init_db()
+        try:
+            async with _client(app) as client:
+                card = (await client.post("/api/knowledge-cards/", headers=ALICE, json={
+                    "title": "私有笔记", "content": "alice 的梯度下降笔记", "keywords": ["梯度"]
+                })).json()
+                await client.post("/api/knowledge-cards/", headers=BOB, json={
+                    "title": "公开笔记", "content": "bob 的梯度下降笔记", "keywords": ["梯度"]
+                })
+                session = (await client.post(
+                    "/api/learning-flow/sessions", headers=ALICE, json={"problem_statement": "学习优化"}
+                )).json()
+                created_map = await client.post("/api/cognitive-map/", headers=ALICE, json={
+                    "session_id": session["id"], "nodes": [{"name": "A", "x": 0, "y": 0}], "edges": []
+                })
+                map_id = created_map.json()["id"]
+                bob_map_on_alice_session = await client.post("/api/cognitive-map/", headers=BOB, json={
+                    "session_id": session["id"], "nodes": [], "edges": []
+                })
+
+                statuses = {
+                    "card": (await client.get(f"/api/knowledge-cards/{card['id']}", headers=BOB)).status_code,
+                    "card_update": (await client.put(f"/api/knowledge-cards/{card['id']}", headers=BOB, json={
+                        "title": "篡改", "content": "x", "keywords": ["x"]
+                    })).status_code,
+                    "card_delete": (await client.delete(f"/api/knowledge-cards/{card['id']}", headers=BOB)).status_code,
+                    "session": (await client.get(f"/api/learning-flow/sessions/{session['id']}", headers=BOB)).status_code,
+                    "timer": (await client.get(f"/api/learning-flow/sessions/{session['id']}/timer", headers=BOB)).status_code,
+                    "map": (await client.get(f"/api/cognitive-map/{map_id}", headers=BOB)).status_code,
+                    "map_update": (await client.put(f"/api/cognitive-map/{map_id}", headers=BOB, json={
+                        "session_id": session["id"], "nodes": [], "edges": []
+                    })).status_code,
+                    "map_on_other_session": bob_map_on_alice_session.status_code,
+                }
+                own = {
+                    "card": (await client.get(f"/api/knowledge-cards/{card['id']}", headers=ALICE)).status_code,
+                    "map": (await client.get(f"/api/cognitive-map/{map_id}", headers=ALICE)).status_code,
+                    "session": (await client.get(f"/api/learning-flow/sessions/{session['id']}", headers=ALICE)).status_code,
+                }
+                listings = {
+                    "alice_cards": [c["title"] for c in (await client.get("/api/knowledge-cards/", headers=ALICE)).json()],
+                    "bob_page": [c["title"] for c in (await client.get("/api/knowledge-cards/page/", headers=BOB)).json()["items"]],
+                    "bob_search": [c["title"] for c in (await client.get(
+                        "/api/knowledge-cards/search/", params={"query": "梯度下降"}, headers=BOB
+                    )).json()],
+                    "alice_keywords": [c["title"] for c in (await client.post(
+                        "/api/knowledge-cards/search/by-keywords", json=["梯度"], headers=ALICE
+                    )).json()],
+                    "bob_sessions": (await client.get("/api/learning-flow/sessions", headers=BOB)).json()["items"],
+                    "default_cards": [c["title"] for c in (await client.get("/api/knowledge-cards/?limit=100")).json()],
+                }
+                export = await client.get("/api/knowledge-cards/export", headers=BOB)
+                exported = [json.loads(line)["title"] for line in export.text.splitlines()]
+                return statuses, own, listings, exported
+        finally:
+            await close_db()
+
+    statuses, own, listings, exported = asyncio.run(run())
+    assert all(status == 404 for status in statuses.values()), statuses
+    assert own == {"card": 200, "map": 200, "session": 200}, own
+    assert listings["alice_cards"] == ["私有笔记"]
+    assert listings["bob_page"] == ["公开笔记"]
+    assert listings["bob_search"] == ["公开笔记"]
+    assert listings["alice_keywords"] == ["私有笔记"]
+    assert listings["bob_sessions"] == []
+    assert not {"私有笔记", "公开笔记"} & set(listings["default_cards"]), "未带请求头的请求属于默认租户"
+    assert exported == ["公开笔记"]
+
+
+def test_invalid_tenant_header():
+    """租户ID格式不合法时返回 400"""
+    from main import app
+    from database.database import init_db, close_db
+
+    async def run():
+        await init_db()
+        try:
+            async with _client(app) as client:
+                return await client.get("/api/knowledge-cards/", headers={"X-User-Id": "a b/c"})
+        finally:
+            await close_db()
+
+    assert asyncio.run(run()).status_code == 400
+
+
+def test_index_shards_load_lazily_and_evict():
+    """分片在首次搜索时加载，超出倒排项预算时淘汰最久未用的分片，淘汰后再搜索会重新加载"""
+    from database.database import AsyncSessionLocal, init_db, close_db
+    from database.models import KnowledgeCardDB
+    from services.card_index import ShardedCardIndex
+
+    async def run():
+        await init_db()
+        try:
+            async with AsyncSessionLocal() as db:
+                for tenant_id in ("t1", "t2", "t3"):
+                    db.add(KnowledgeCardDB(
+                        tenant_id=tenant_id, title=f"{tenant_id} 卡片", content="反向传播与链式法则", keywords=[]
+                    ))
+                await db.commit()
+
+            index = ShardedCardIndex()
+            async with AsyncSessionLocal() as db:
+                before = index.candidates("t1", "链式")
+                shard = await index.ensure_loaded("t1", db)
+                per_shard = shard.postings
+                # 预算只够两个分片
+                index.max_postings = per_shard * 2
+                await index.ensure_loaded("t2", db)
+                index.candidates("t1", "链式")  # t1 最近使用过，t2 成为最久未用的分片
+                await index.ensure_loaded("t3", db)
+                shards_after_evict = {tenant_id for tenant_id in ("t1", "t2", "t3") if index.shard(tenant_id)}
+                # 未加载分片的写入只通知，不建索引
+                index.upsert("t2", "ghost", "幽灵", "链式法则", [])
+                t2_unloaded = index.candidates("t2", "链式")
+                reloaded = await index.ensure_loaded("t2", db)
+                t2_candidates = reloaded.candidates("链式")
+                return before, shards_after_evict, t2_unloaded, t2_candidates, index.metrics()
+        finally:
+            await close_db()
+
+    before, shards, t2_unloaded, t2_candidates, metrics = asyncio.run(run())
+    assert before is None, "分片未加载时不预筛"
+    assert shards == {"t1", "t3"}, shards
+    assert t2_unloaded is None
+    assert t2_candidates is not None and len(t2_candidates) == 1 and "ghost" not in t2_candidates
+    assert metrics["loads"] == 4 and metrics["evictions"] == 2, metrics
+    assert metrics["postings"] <= metrics["max_postings"]
+
+
+def test_existing_rows_join_default_tenant():
+    """升级前的数据由迁移 5 归入默认租户，列表索引改为以 tenant_id 开头"""
+    from database.database import async_engine, init_db, close_db
+
+    async def run():
+        try:
+            await init_db()
+            async with async_engine.begin() as conn:
+                await conn.execute(text("DROP TABLE knowledge_cards"))
+                await conn.execute(text(
+                    "CREATE TABLE knowledge_cards (id VARCHAR PRIMARY KEY, title VARCHAR NOT NULL, content TEXT NOT NULL, "
+                    "keywords JSON, version INTEGER NOT NULL DEFAULT 1, created_at DATETIME, updated_at DATETIME)"
+                ))
+                await conn.execute(text(
+                    "CREATE INDEX ix_knowledge_cards_updated_at_id ON knowledge_cards (updated_at, id)"
+                ))
+                await conn.execute(text(
+                    "INSERT INTO knowledge_cards (id, title, content, keywords) VALUES ('old', '旧卡片', '内容', '[]')"
+                ))
+                await conn.execute(text("DELETE FROM schema_migrations WHERE version = 5"))
+            await init_db()
+            async with async_engine.connect() as conn:
+                tenant = (await conn.execute(text("SELECT tenant_id FROM knowledge_cards WHERE id = 'old'"))).scalar()
+                indexes = {row[1] for row in await conn.execute(text("PRAGMA index_list(knowledge_cards)"))}
+                return tenant, indexes
+        finally:
+            await close_db()
+
+    tenant, indexes = asyncio.run(run())
+    assert tenant == "default"
+    assert "ix_knowledge_cards_tenant_updated_at_id" in indexes
+    assert "ix_knowledge_cards_updated_at_id" not in indexes
+
+
+def main():
+    print("👥 测试多租户隔离")
+    print("=" * 50)
+
+    failed = False
+    for test in (
+        test_routes_are_scoped_to_tenant,
+        test_invalid_tenant_header,
+        test_index_shards_load_lazily_and_evict,
+        test_existing_rows_join_default_tenant,
+    ):
+        try:
+            test()
+            print(f"✅ {test.__doc__}")
+        except AssertionError as exc:
+            failed = True
+            print(f"❌ {test.__doc__}\n{exc}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()